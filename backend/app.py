@@ -1,3 +1,6 @@
+# Must come first: with STARTUP_PROFILE=true it times every import that follows
+from utils.startup_profile import profiler
+
 from flask import Flask, send_from_directory, send_file, redirect, request, jsonify
 from flask_socketio import SocketIO
 from flask_cors import CORS
@@ -6,6 +9,7 @@ from pymongo import MongoClient
 import os
 import sys
 import time
+import hmac
 import logging
 # Import config from config.py (avoiding conflict with config/ directory)
 # Import directly from the file using importlib to avoid package conflict
@@ -27,6 +31,10 @@ def create_app(config_name=None):
     """Create and configure Flask application."""
     app = Flask(__name__)
 
+    # orjson-backed JSON with native ObjectId/datetime encoding (utils/json_provider)
+    from utils.json_provider import FastJSONProvider
+    app.json = FastJSONProvider(app)
+
     # Disable strict slashes to prevent 308 redirects
     app.url_map.strict_slashes = False
 
@@ -34,6 +42,12 @@ def create_app(config_name=None):
     config_name = config_name or os.getenv('FLASK_ENV', 'default')
     app.config.from_object(config[config_name])
 
+    # Structured logging: queue writer, per-category levels/sampling, correlation ids
+    from utils.structured_logging import configure_logging, init_request_correlation
+    configure_logging(app)
+    init_request_correlation(app)
+    profiler.mark('imports_and_config')
+
     # Log environment mode clearly
     env_mode = "🌩️  AZURE CLOUD" if app.config.get('IS_AZURE') else "🏠 LOCAL"
     logger.info("="*60)
@@ -71,7 +85,7 @@ def create_app(config_name=None):
     # Azure's default CORS handling can be problematic with credentials (cookies)
     cors.init_app(app, 
                  resources={r"/*": {"origins": allowed_origins}},
-                 allow_headers=["Content-Type", "Authorization", "X-Requested-With"],
+                 allow_headers=["Content-Type", "Authorization", "X-Requested-With", "X-Response-Format"],
                  methods=["GET", "POST", "PUT", "DELETE", "OPTIONS", "PATCH"],
                  supports_credentials=True)  # Enable credentials for session cookies
 
@@ -161,16 +175,18 @@ def create_app(config_name=None):
                             username=redis_params.get('username'),
                             socket_connect_timeout=5,
                             socket_timeout=5,
+                            max_connections=app.config.get('REDIS_MAX_CONNECTIONS', 50),
                             decode_responses=False  # Keep bytes for session storage
                         )
                     else:
                         # Use URL format (for standard Redis URLs)
-                        redis_client = redis.from_url(redis_url, socket_connect_timeout=5, socket_timeout=5)
+                        redis_client = redis.from_url(redis_url, socket_connect_timeout=5, socket_timeout=5,
+                                                      max_connections=app.config.get('REDIS_MAX_CONNECTIONS', 50))
                     
                     # Test connection with ping
                     redis_client.ping()
                     
-                    # Store Redis client for later use (for both sessions and cache)
+                    # Store Redis client for later use (sessions, cache and rate limiting share its pool)
                     app.config['REDIS_CLIENT'] = redis_client
                     app.config['SESSION_REDIS'] = redis_client
                     app.config['_USE_REDIS_FALLBACK'] = True  # Flag to use fallback interface
@@ -203,6 +219,8 @@ def create_app(config_name=None):
         app.config['SESSION_TYPE'] = 'filesystem'
         app.config['REDIS_AVAILABLE'] = False
 
+    profiler.mark('redis_connect')
+
     # Initialize Flask-Session
     session.init_app(app)
     
@@ -215,12 +233,13 @@ def create_app(config_name=None):
                 session_interface = FallbackSessionInterface(
                     redis_client=redis_client,
                     key_prefix=app.config.get('SESSION_KEY_PREFIX', 'session:'),
-                    use_signer=app.config.get('SESSION_USE_SIGNER', False),
                     permanent=app.config.get('SESSION_PERMANENT', False),
-                    session_file_dir=app.config.get('SESSION_FILE_DIR')
+                    mode=app.config.get('SESSION_STORE_MODE', 'redis'),
+                    refresh_interval=app.config.get('SESSION_REFRESH_INTERVAL_SECONDS', 300),
+                    revocation_check_interval=app.config.get('SESSION_REVOCATION_CHECK_SECONDS', 30)
                 )
                 app.session_interface = session_interface
-                logger.info("Configured Redis session with filesystem fallback")
+                logger.info(f"Configured {session_interface.mode} session store with signed-cookie fallback")
             else:
                 logger.warning("FallbackSessionInterface not available. Using default Redis session interface.")
         except ImportError as e:
@@ -231,22 +250,37 @@ def create_app(config_name=None):
     # Initialize Redis Cache and Cache Invalidator
     try:
         from utils.redis_cache import RedisCache
+        from utils.cache_codec import CacheCodec
         from utils.cache_invalidator import CacheInvalidator
         
         redis_available = app.config.get('REDIS_AVAILABLE', False)
         redis_client = app.config.get('REDIS_CLIENT')
         is_azure = app.config.get('IS_AZURE', False)
+
+        cache_options = {
+            'l1_enabled': app.config.get('CACHE_L1_ENABLED', True),
+            'l1_max_entries': app.config.get('CACHE_L1_MAX_ENTRIES', 2000),
+            'l1_ttl': app.config.get('CACHE_L1_TTL_SECONDS', 5),
+            'breaker_threshold': app.config.get('CACHE_BREAKER_FAILURE_THRESHOLD', 3),
+            'breaker_base_backoff': app.config.get('CACHE_BREAKER_BASE_BACKOFF_SECONDS', 1.0),
+            'breaker_max_backoff': app.config.get('CACHE_BREAKER_MAX_BACKOFF_SECONDS', 30.0),
+            'codec': CacheCodec(
+                fmt=app.config.get('CACHE_CODEC_FORMAT', 'json'),
+                compression=app.config.get('CACHE_COMPRESSION', 'auto'),
+                min_compress_bytes=app.config.get('CACHE_COMPRESSION_MIN_BYTES', 1024)
+            ),
+        }
         
         if redis_available and redis_client:
-            cache = RedisCache(redis_client=redis_client, available=True)
+            cache = RedisCache(redis_client=redis_client, available=True, **cache_options)
             cache_invalidator = CacheInvalidator(cache=cache)
             app.config['CACHE'] = cache
             app.config['CACHE_INVALIDATOR'] = cache_invalidator
             logger.info("Redis cache enabled. TTL: users/topics=1h, dynamic=5m")
         else:
-            # Redis unavailable, create cache instance that always returns None
-            cache = RedisCache(redis_client=None, available=False)
-            cache_invalidator = CacheInvalidator(cache=None)
+            # Redis unavailable: only the in-process tier (if enabled) serves cached values
+            cache = RedisCache(redis_client=None, available=False, **cache_options)
+            cache_invalidator = CacheInvalidator(cache=cache)
             app.config['CACHE'] = cache
             app.config['CACHE_INVALIDATOR'] = cache_invalidator
             # Only log as error if we were supposed to use Redis (Azure/Docker)
@@ -264,55 +298,53 @@ def create_app(config_name=None):
         from utils.redis_cache import RedisCache
         from utils.cache_invalidator import CacheInvalidator
         cache = RedisCache(redis_client=None, available=False)
-        cache_invalidator = CacheInvalidator(cache=None)
+        cache_invalidator = CacheInvalidator(cache=cache)
         app.config['CACHE'] = cache
         app.config['CACHE_INVALIDATOR'] = cache_invalidator
 
+    profiler.mark('sessions_and_cache')
+
+    # Rate limiter (atomic on the shared Redis client, in-process token buckets otherwise)
+    try:
+        from utils.rate_limiter import init_rate_limiter
+        init_rate_limiter(app)
+    except Exception as e:
+        logger.error(f"Failed to initialize rate limiter: {e}")
+
     # Initialize SocketIO with session support
     # Use threading mode on Windows (eventlet not reliable on Windows)
     async_mode = 'threading' if sys.platform == 'win32' else 'eventlet'
     logger.info(f"Using SocketIO async_mode: {async_mode}")
 
     # SocketIO CORS - same origins as main app
-    # SocketIO CORS - same origins as main app
+    # Packets use the same encoder as HTTP responses
+    from utils import json_provider
     socketio.init_app(app, 
                      cors_allowed_origins=allowed_origins,
                      async_mode=async_mode,
-                     cors_credentials=True)  # Enable credentials for session cookies
+                     cors_credentials=True,  # Enable credentials for session cookies
+                     json=json_provider)
 
-    # Database connection
-    while True:
-        try:
-            # Configure MongoDB/CosmosDB connection based on environment
-            mongo_options = {}
-
-            if app.config.get('IS_AZURE'):
-                # Azure CosmosDB specific options
-                mongo_options = {
-                    'ssl': app.config.get('COSMOS_SSL', True),
-                    'retryWrites': app.config.get('COSMOS_RETRY_WRITES', False),
-                    'serverSelectionTimeoutMS': 30000,
-                    'connectTimeoutMS': 30000,
-                    'socketTimeoutMS': 30000,
-                }
-                logger.info("Connecting to Azure CosmosDB...")
-            else:
-                # Local MongoDB options
-                logger.info("Connecting to local MongoDB...")
-
-            client = MongoClient(app.config['MONGO_URI'], **mongo_options)
-            app.db = client[app.config['MONGO_DB_NAME']]
+    # Request / socket event / MongoDB latency metrics, served on /metrics
+    try:
+        from utils.metrics import init_metrics
+        init_metrics(app, socketio)
+    except Exception as e:
+        logger.error(f"Failed to initialize metrics: {e}")
 
-            # Test connection
-            client.admin.command('ping')
+    profiler.mark('rate_limiter_and_socketio')
 
-            db_type = "Azure CosmosDB" if app.config.get('IS_AZURE') else "MongoDB"
-            logger.info(f"Connected to {db_type} successfully")
-            break  # Exit loop if successful
-        except Exception as e:
-            logger.warning(f"Database connection failed: {e}")
-            logger.info("Retrying in 30 seconds...")
-            time.sleep(30)
+    # Database connection. With STARTUP_WARMUP_IN_BACKGROUND the client is created
+    # without waiting for the server (pymongo connects lazily); the first ping,
+    # index check and cache warm-up run after the worker starts accepting requests.
+    if app.config.get('STARTUP_WARMUP_IN_BACKGROUND', True):
+        client = MongoClient(app.config['MONGO_URI'], **_mongo_options(app))
+        app.db = client[app.config['MONGO_DB_NAME']]
+        app.config['DB_READY'] = False
+    else:
+        app.db = _connect_database_blocking(app)
+        app.config['DB_READY'] = True
+    profiler.mark('database')
 
     # Register blueprints
     from routes.auth import auth_bp
@@ -350,16 +382,73 @@ def create_app(config_name=None):
     app.register_blueprint(notification_settings_bp, url_prefix='/api/notification-settings')
     app.register_blueprint(notifications_bp, url_prefix='/api/notifications')
     app.register_blueprint(short_links_bp) # Mount at root for /s/<code>
+    profiler.mark('blueprints')
 
     # Health check endpoint (register before static routes)
     @app.route('/health')
     def health_check():
-        return {'status': 'healthy', 'service': 'topicsflow-backend'}
+        return {'status': 'healthy', 'service': 'topicsflow-backend',
+                'db_ready': app.config.get('DB_READY', False)}
+
+    # Prometheus metrics for this replica: admins, or scrapers sending METRICS_TOKEN as a bearer token
+    @app.route('/metrics')
+    def metrics_endpoint():
+        registry = app.config.get('METRICS')
+        if registry is None:
+            return jsonify({'success': False, 'errors': ['Metrics are disabled']}), 404
+
+        def render():
+            return app.response_class(registry.render(), mimetype='text/plain; version=0.0.4')
+
+        token = app.config.get('METRICS_TOKEN')
+        if token and hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            return render()
+        from utils.admin_middleware import require_admin
+        return require_admin()(render)()
+
+    # Write-behind buffer for vote counters
+    try:
+        from utils.vote_buffer import init_vote_buffer
+        init_vote_buffer(app, socketio)
+    except Exception as e:
+        logger.warning(f"Failed to start vote buffer: {e}")
+
+    # Recent messages per room, replayed by the sync_room socket event
+    try:
+        from utils.room_buffer import init_room_buffer
+        init_room_buffer(app)
+    except Exception as e:
+        logger.warning(f"Failed to create room message buffer: {e}")
+
+    # Background enrichment of new reports into moderation snapshots
+    try:
+        from utils.moderation_queue import init_moderation_queue
+        init_moderation_queue(app, socketio)
+    except Exception as e:
+        logger.warning(f"Failed to start moderation queue: {e}")
+
+    # Content filter word list (hot-reloaded from CONTENT_FILTER_WORDS_FILE when set)
+    try:
+        from utils.content_filter import init_content_filter
+        init_content_filter(app)
+    except Exception as e:
+        logger.warning(f"Failed to configure content filter: {e}")
+
+    # Periodic clean-up of expiring data (leader-elected across replicas)
+    try:
+        from utils.scheduler import init_scheduler
+        init_scheduler(app, socketio)
+    except Exception as e:
+        logger.warning(f"Failed to start scheduler: {e}")
 
     # Register SocketIO handlers BEFORE static routes to ensure Socket.IO routes are processed first
     # Flask-SocketIO needs to handle /socket.io/ routes before the catch-all route
     from socketio_handlers import register_socketio_handlers
     register_socketio_handlers(socketio)
+    if app.config.get('METRICS'):
+        from utils.metrics import instrument_socketio
+        instrument_socketio(socketio)
+    profiler.mark('workers_and_socket_handlers')
 
     @app.errorhandler(404)
     def handle_404(e):
@@ -528,316 +617,101 @@ def create_app(config_name=None):
     return app
 
 
-def create_db_indexes(app):
-    """Create database indexes for better performance."""
-    try:
-        from pymongo import IndexModel, ASCENDING, DESCENDING
-        db = app.db
-        
-        # Helper to safely ensure an index exists, avoiding conflicts if possible
-        def ensure_index(collection, keys, unique=True, **kwargs):
-            """
-            Safely ensure an index exists.
-            1. Check if index already exists (to avoid costly conflicts/retries).
-            2. If missing, try to create.
-            3. If conflict/Cosmos error, fallback gracefully.
-            """
-            # Normalize keys to list of tuples
-            if isinstance(keys, str):
-                keys = [(keys, ASCENDING)]
-
-            # Optimization: Check if index exists to skip try/catch overhead
-            try:
-                indexes = collection.index_information()
-                for name, info in indexes.items():
-                    # info['key'] is a list of lists/tuples depending on driver version, usually list of tuples
-                    # Normalize info['key'] to match our keys format for comparison
-                    current_keys = info.get('key')
-                    if current_keys == keys:
-                        # Index exists with same keys.
-                        # We could check 'unique' property, but on Cosmos DB we can't change it easily anyway.
-                        # So if it exists, we assume it's good enough to avoid "IndexOptionsConflict".
-                        # This skips the slow fail-retry loop on every startup.
-                        return
-            except Exception as e:
-                # If checking indexes fails (permissions?), proceed to create attempt
-                pass
-
-            try:
-                collection.create_index(keys, unique=unique, **kwargs)
-            except Exception as e:
-                error_msg = str(e)
-
-                # Case 1: Index exists with different options -> Drop and Retry
-                if "already exists with different options" in error_msg or (hasattr(e, 'code') and e.code == 85):
-                    try:
-                        logging.getLogger(__name__).warning(f"Index conflict on {collection.name} ({keys}). Dropping and recreating...")
-                        collection.drop_index(keys)
-                        # Retry creation
-                        collection.create_index(keys, unique=unique, **kwargs)
-                        return
-                    except Exception as retry_error:
-                        # Check for Code 13 on retry (Cosmos DB restriction)
-                        retry_msg = str(retry_error)
-                        if unique and ((hasattr(retry_error, 'code') and retry_error.code == 13) or "The unique index cannot be modified" in retry_msg):
-                            logging.getLogger(__name__).warning(
-                                f"Cosmos DB restriction on recreate: Falling back to non-unique index for {collection.name}."
-                            )
-                            try:
-                                collection.create_index(keys, unique=False, **kwargs)
-                            except Exception as fb_err:
-                                logging.getLogger(__name__).warning(f"Failed to create fallback index: {fb_err}")
-                            return
-
-                        logging.getLogger(__name__).warning(f"Failed to recreate index on {collection.name}: {retry_error}")
-                        return
-
-                # Case 2: Cosmos DB "unique index cannot be modified" (Code 13)
-                if unique and ((hasattr(e, 'code') and e.code == 13) or "The unique index cannot be modified" in error_msg):
-                    logging.getLogger(__name__).warning(
-                        f"Cosmos DB restriction: Cannot create unique index on {collection.name}. "
-                        "Falling back to non-unique index."
-                    )
-                    try:
-                        collection.create_index(keys, unique=False, **kwargs)
-                        logging.getLogger(__name__).info(f"Successfully created fallback non-unique index on {collection.name}")
-                    except Exception as fallback_error:
-                        logging.getLogger(__name__).warning(f"Failed to create fallback index on {collection.name}: {fallback_error}")
-                    return
-
-                # Other errors
-                logging.getLogger(__name__).warning(f"Failed to create index on {collection.name}: {e}")
-
-        # Users collection indexes
-        ensure_index(db.users, "username", unique=True)
-        ensure_index(db.users, "email", unique=True)
-        
-        # Non-unique indexes usually safe to add
+def _mongo_options(app):
+    """MongoClient options for MongoDB or Azure CosmosDB."""
+    from utils.metrics import mongo_event_listeners
+    options = {'event_listeners': mongo_event_listeners(app)}
+    if app.config.get('IS_AZURE'):
+        # Azure CosmosDB specific options
+        options.update({
+            'ssl': app.config.get('COSMOS_SSL', True),
+            'retryWrites': app.config.get('COSMOS_RETRY_WRITES', False),
+            'serverSelectionTimeoutMS': 30000,
+            'connectTimeoutMS': 30000,
+            'socketTimeoutMS': 30000,
+        })
+    return options
+
+
+def _connect_database_blocking(app):
+    """Connect and ping the database, retrying every 30 seconds until it answers."""
+    db_type = "Azure CosmosDB" if app.config.get('IS_AZURE') else "MongoDB"
+    while True:
         try:
-            db.users.create_index("ip_addresses")
-            db.users.create_index("blocked_users")
-            db.users.create_index("is_admin")
-            db.users.create_index("is_banned")
-            db.users.create_index("banned_at")
-            db.users.create_index("created_at")
-
-            # Topics collection indexes (main containers)
-            db.topics.create_index("created_at")
-            db.topics.create_index([("member_count", -1)])
-            db.topics.create_index([("last_activity", -1)])
-            db.topics.create_index([("post_count", -1)])  # Number of posts
-            db.topics.create_index([("conversation_count", -1)])  # Number of conversations
-            db.topics.create_index("tags")
-            db.topics.create_index("owner_id")
-            db.topics.create_index("members")
-            
-            # Optimized compound indexes for get_topics filtering and sorting
-            db.topics.create_index([("is_public", 1), ("is_deleted", 1), ("last_activity", -1)])
-            db.topics.create_index([("is_public", 1), ("is_deleted", 1), ("member_count", -1)])
-            db.topics.create_index([("is_public", 1), ("is_deleted", 1), ("created_at", -1)])
-            db.topics.create_index([("is_public", 1), ("is_deleted", 1), ("tags", 1)])
-            
-            # Index for pending deletions sorting
-            db.topics.create_index([("is_deleted", 1), ("deletion_status", 1), ("deleted_at", -1)])
-
+            logger.info(f"Connecting to {db_type}...")
+            client = MongoClient(app.config['MONGO_URI'], **_mongo_options(app))
+            client.admin.command('ping')
+            logger.info(f"Connected to {db_type} successfully")
+            return client[app.config['MONGO_DB_NAME']]
         except Exception as e:
-             logging.getLogger(__name__).warning(f"Failed to create some standard indexes: {e}")
-             
-    except Exception as e:
-        logging.getLogger(__name__).error(f"Critical error in create_db_indexes: {e}")
-
-    # Ensure this runs even if previous blocks had partial failures (but not critical ones that skipped the whole block)
-    # We put this in a separate try-except block to differentiate errors
-    try:
-        db.topics.create_index("banned_users")
-
-        # Posts collection indexes (within Topics)
-        db.posts.create_index([("topic_id", 1), ("created_at", -1)])  # Posts belong to topics
-        db.posts.create_index([("topic_id", 1), ("score", -1)])  # Sort by score
-        db.posts.create_index([("topic_id", 1), ("score", -1), ("created_at", -1)])  # For hot sorting
-        db.posts.create_index("user_id")
-        db.posts.create_index("created_at")
-        db.posts.create_index([("score", -1)])  # New: score = upvotes - downvotes
-        db.posts.create_index([("upvote_count", -1)])
-        db.posts.create_index("upvotes")
-        db.posts.create_index("downvotes")  # New: downvotes
-        db.posts.create_index("is_deleted")
-        
-        # Index for pending deletions sorting
-        db.posts.create_index([("is_deleted", 1), ("deletion_status", 1), ("deleted_at", -1)])
-
-
-        # Comments collection indexes (new)
-        db.comments.create_index([("post_id", 1), ("created_at", -1)])
-        db.comments.create_index([("post_id", 1), ("upvote_count", -1)])
-        db.comments.create_index("parent_comment_id")
-        db.comments.create_index("user_id")
-        db.comments.create_index("created_at")
-        db.comments.create_index([("upvote_count", -1)])
-        db.comments.create_index("upvotes")
-        db.comments.create_index("depth")
-        db.comments.create_index("is_deleted")
-
-        # Chat rooms (Conversations) collection indexes (within Topics)
-        db.chat_rooms.create_index("topic_id")  # Conversations belong to Topics
-        db.chat_rooms.create_index([("topic_id", 1), ("last_activity", -1)])
-        db.chat_rooms.create_index([("topic_id", 1), ("tags", 1)])  # Filter by tags
-        db.chat_rooms.create_index("owner_id")
-        db.chat_rooms.create_index("moderators")  # New: moderators
-        db.chat_rooms.create_index("members")
-        db.chat_rooms.create_index("banned_users")  # New: banned users
-        db.chat_rooms.create_index("tags")  # New: tags for search
-        db.chat_rooms.create_index("is_public")
-        db.chat_rooms.create_index("created_at")
-        
-        # Index for pending deletions sorting
-        db.chat_rooms.create_index([("is_deleted", 1), ("deletion_status", 1), ("deleted_at", -1)])
-
-
-        # Messages collection indexes (updated)
-        db.messages.create_index([("topic_id", 1), ("created_at", -1)])  # Legacy
-        db.messages.create_index([("chat_room_id", 1), ("created_at", -1)])  # New
-        db.messages.create_index([("post_id", 1), ("created_at", -1)])  # New
-        db.messages.create_index([("comment_id", 1), ("created_at", -1)])  # New
-        db.messages.create_index("user_id")
-        db.messages.create_index("created_at")
-        db.messages.create_index("mentions")
-        db.messages.create_index("is_deleted")
-        
-        # Index for deleted messages sorting
-        db.messages.create_index([("is_deleted", 1), ("deleted_at", -1)])
-        db.messages.create_index([("deleted_at", -1)])
-
-
-
-        # Reports collection indexes
-        db.reports.create_index([("reported_content_id", 1), ("content_type", 1)])
-        db.reports.create_index("content_type")
-        db.reports.create_index("report_type")
-        db.reports.create_index("reported_user_id")
-        db.reports.create_index("reported_by")
-        db.reports.create_index("created_at")
-        db.reports.create_index("status")
-        db.reports.create_index([("topic_id", 1), ("status", 1)])
-        db.reports.create_index([("status", 1), ("created_at", -1)])
-
-        # Tickets collection indexes
-        db.tickets.create_index("user_id")
-        db.tickets.create_index("status")
-        db.tickets.create_index("category")
-        db.tickets.create_index("priority")
-        db.tickets.create_index([("priority", -1), ("created_at", -1)])
-        db.tickets.create_index([("status", 1), ("priority", -1), ("created_at", -1)])
-        db.tickets.create_index([("category", 1), ("priority", -1), ("created_at", -1)])
-        db.tickets.create_index([("status", 1), ("category", 1), ("priority", -1), ("created_at", -1)])
-        db.tickets.create_index("created_at")
-
-        db.tickets.create_index("reviewed_by")
-
-        # Conversation settings collection indexes (Upgrade to partial indexes)
-        ensure_index(
-            db.conversation_settings,
-            [("user_id", 1), ("other_user_id", 1)],
-            unique=True,
-            partialFilterExpression={"other_user_id": {"$exists": True}}
-        )
-        ensure_index(
-            db.conversation_settings,
-            [("user_id", 1), ("topic_id", 1), ("type", 1)],
-            unique=True,
-            partialFilterExpression={"topic_id": {"$exists": True}}
-        )
-        ensure_index(
-            db.conversation_settings,
-            [("user_id", 1), ("chat_room_id", 1), ("type", 1)],
-            unique=True,
-            partialFilterExpression={"chat_room_id": {"$exists": True}}
-        )
-        db.conversation_settings.create_index("type")
+            logger.warning(f"Database connection failed: {e}")
+            logger.info("Retrying in 30 seconds...")
+            time.sleep(30)
 
-        # User content settings (hide/silence) indexes
-        ensure_index(
-            db.user_content_settings,
-            [("user_id", 1), ("topic_id", 1)],
-            unique=True
-        )
-        db.user_content_settings.create_index("hidden")
-
-        # Notification settings collection indexes
-        ensure_index(
-            db.notification_settings,
-            [("user_id", 1), ("post_id", 1), ("type", 1)], 
-            unique=True,
-            partialFilterExpression={"type": "post"}
-        )
-        ensure_index(
-            db.notification_settings,
-            [("user_id", 1), ("chat_room_id", 1), ("type", 1)], 
-            unique=True,
-            partialFilterExpression={"type": "chat_room"}
-        )
-        ensure_index(
-            db.notification_settings,
-            [("user_id", 1), ("topic_id", 1), ("type", 1)], 
-            unique=True,
-            partialFilterExpression={"type": "topic"}
-        )
-        ensure_index(
-            db.notification_settings,
-            [("user_id", 1), ("other_user_id", 1), ("type", 1)], 
-            unique=True,
-            partialFilterExpression={"type": "private_message"}
-        )
-        db.notification_settings.create_index("type")
-
-        # Private messages collection indexes
-        db.private_messages.create_index([("from_user_id", 1), ("to_user_id", 1)])
-        db.private_messages.create_index([("to_user_id", 1), ("created_at", -1)])
-        db.private_messages.create_index("created_at")
-
-        # Anonymous identities collection indexes
-        ensure_index(
-            db.anonymous_identities,
-            [("user_id", 1), ("topic_id", 1)],
-            unique=True
-        )
 
-        # Friends collection indexes (for Azure Cosmos DB compatibility)
+def warm_up(app):
+    """
+    Post-start warm-up: wait for the database, check indexes, load locale
+    bundles and open the first Redis connection. Runs as a background task so
+    none of it delays the worker's first request.
+    """
+    db_type = "Azure CosmosDB" if app.config.get('IS_AZURE') else "MongoDB"
+    retry_delay = app.config.get('STARTUP_DB_RETRY_SECONDS', 30)
+    while True:
         try:
-            db.friends.create_index([("from_user_id", 1), ("status", 1), ("updated_at", -1)])
-            db.friends.create_index([("to_user_id", 1), ("status", 1), ("updated_at", -1)])
-            db.friends.create_index([("from_user_id", 1), ("status", 1)])
-            db.friends.create_index([("to_user_id", 1), ("status", 1)])
+            app.db.client.admin.command('ping')
+            logger.info(f"Connected to {db_type} successfully")
+            app.config['DB_READY'] = True
+            break
         except Exception as e:
-            logger.warning(f"Failed to create some friends indexes (may already exist): {e}")
+            logger.warning(f"Database connection failed: {e}")
+            logger.info(f"Retrying in {retry_delay} seconds...")
+            socketio.sleep(retry_delay)
+
+    create_db_indexes(app)
+
+    try:
+        from utils.i18n import warm_locale_bundles
+        warm_locale_bundles()
+    except Exception as e:
+        logger.warning(f"Locale warm-up failed: {e}")
 
-        # Comments composite index for order-by queries (Azure Cosmos DB)
+    redis_client = app.config.get('REDIS_CLIENT')
+    if redis_client is not None:
         try:
-            db.comments.create_index([("post_id", 1), ("upvote_count", -1), ("created_at", -1)])
-            db.comments.create_index([("post_id", 1), ("created_at", -1), ("upvote_count", -1)])
+            redis_client.ping()
         except Exception as e:
-            logger.warning(f"Failed to create some comments indexes (may already exist): {e}")
+            logger.warning(f"Redis warm-up ping failed: {e}")
+
+    logger.info("Startup warm-up complete")
 
-        # Short Links collection
-        ensure_index(db.short_links, "code", unique=True)
-        db.short_links.create_index("created_at")
 
-        logger.info("Database indexes created successfully")
+def create_db_indexes(app):
+    """
+    Check database indexes against the manifest (utils/index_manifest).
 
+    Normally a single version read: indexes are reconciled once per deployment
+    by `python manage_indexes.py apply`. Workers only reconcile (under a lease,
+    so one at a time) when the database is behind the manifest.
+    """
+    try:
+        from utils.index_manifest import check_indexes_on_startup
+        check_indexes_on_startup(app)
     except Exception as e:
-        # Prevent crash on Cosmos DB unique index errors (Code 13) or other non-critical index failures
-        # The application handles uniqueness checks at the model level (e.g. backend/models/user.py),
-        # so missing DB unique constraints are acceptable for stability.
-        logger.warning(f"Non-critical index creation failed: {e}. Continuing startup...")
-        # Do not raise - allow server to start
-        pass
+        # Missing indexes degrade performance but must not prevent startup
+        logger.warning(f"Index check failed: {e}. Continuing startup...")
 
 
 # Create global app instance for Gunicorn/production
 app = create_app()
 
-# Create database indexes
-create_db_indexes(app)
+if app.config.get('DB_READY'):
+    # Blocking start-up: database is up, check indexes now
+    create_db_indexes(app)
+else:
+    socketio.start_background_task(warm_up, app)
+
+profiler.report()
 
 if __name__ == '__main__':
 
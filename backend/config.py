@@ -7,6 +7,17 @@ load_dotenv(env_path)
 # Also try loading from parent directory (project root)
 load_dotenv()
 
+
+def _env_mapping(name, default='', cast=str):
+    """Parse 'key=value,key=value' from an environment variable."""
+    mapping = {}
+    for item in os.getenv(name, default).split(','):
+        if '=' in item:
+            key, value = item.split('=', 1)
+            mapping[key.strip()] = cast(value.strip())
+    return mapping
+
+
 class Config:
     """Configuration class for the Flask application."""
 
@@ -52,6 +63,15 @@ class Config:
         COSMOS_SSL = False
         COSMOS_RETRY_WRITES = True
 
+    # Indexes are reconciled per deployment (`python manage_indexes.py apply`);
+    # when enabled, a worker that finds the database behind the manifest reconciles it itself
+    INDEX_AUTO_RECONCILE = os.getenv('INDEX_AUTO_RECONCILE', 'true').lower() == 'true'
+
+    # Start serving without waiting for the database: the first ping, index check and
+    # cache warm-up run as a background task (false restores the blocking connect loop)
+    STARTUP_WARMUP_IN_BACKGROUND = os.getenv('STARTUP_WARMUP_IN_BACKGROUND', 'true').lower() == 'true'
+    STARTUP_DB_RETRY_SECONDS = int(os.getenv('STARTUP_DB_RETRY_SECONDS', '30'))
+
     # CORS Config - Restricted to localhost only for security
     FRONTEND_URL = os.getenv('FRONTEND_URL', 'http://localhost:3000')
     CORS_ALLOW_ALL = os.getenv('CORS_ALLOW_ALL', 'false').lower() == 'true'
@@ -76,6 +96,8 @@ class Config:
     else:
         # Local/dev: do not assume Redis exists unless explicitly configured
         REDIS_URL = os.getenv('REDIS_URL')
+    # Connection pool size of the shared client (sessions, cache, rate limiting)
+    REDIS_MAX_CONNECTIONS = int(os.getenv('REDIS_MAX_CONNECTIONS', '50'))
 
     # Session Config
     # IMPORTANT: Passkeys/WebAuthn relies on the challenge stored in the server session.
@@ -97,6 +119,11 @@ class Config:
     SESSION_USE_SIGNER = False  # Disabled to avoid bytes-to-string conversion issues with Werkzeug
     SESSION_FILE_DIR = os.path.join(os.path.dirname(__file__), 'flask_session')
     SESSION_COOKIE_NAME = 'session'
+    # Redis session store (utils/session_fallback): 'redis' keeps the whole session in Redis,
+    # 'cookie' carries the login principal in a signed cookie and only the rest in Redis
+    SESSION_STORE_MODE = os.getenv('SESSION_STORE_MODE', 'redis')
+    SESSION_REFRESH_INTERVAL_SECONDS = int(os.getenv('SESSION_REFRESH_INTERVAL_SECONDS', '300'))
+    SESSION_REVOCATION_CHECK_SECONDS = int(os.getenv('SESSION_REVOCATION_CHECK_SECONDS', '30'))
 
     # Security Config
     # If cookies are used across different sites (e.g., frontend on topicsflow.me and backend on azurewebsites.net),
@@ -110,6 +137,72 @@ class Config:
     RATE_LIMIT_STORAGE_URL = REDIS_URL
     LOGIN_RATE_LIMIT = os.getenv('LOGIN_RATE_LIMIT', '5/minute')
     MESSAGE_RATE_LIMIT = os.getenv('MESSAGE_RATE_LIMIT', '30/minute')
+    RATE_LIMIT_MAX_LOCAL_KEYS = int(os.getenv('RATE_LIMIT_MAX_LOCAL_KEYS', '10000'))
+
+    # Cache: in-process L1 in front of Redis, and the Redis circuit breaker
+    CACHE_L1_ENABLED = os.getenv('CACHE_L1_ENABLED', 'true').lower() == 'true'
+    CACHE_L1_MAX_ENTRIES = int(os.getenv('CACHE_L1_MAX_ENTRIES', '2000'))
+    CACHE_L1_TTL_SECONDS = int(os.getenv('CACHE_L1_TTL_SECONDS', '5'))
+    CACHE_BREAKER_FAILURE_THRESHOLD = int(os.getenv('CACHE_BREAKER_FAILURE_THRESHOLD', '3'))
+    CACHE_BREAKER_BASE_BACKOFF_SECONDS = float(os.getenv('CACHE_BREAKER_BASE_BACKOFF_SECONDS', '1'))
+    CACHE_BREAKER_MAX_BACKOFF_SECONDS = float(os.getenv('CACHE_BREAKER_MAX_BACKOFF_SECONDS', '30'))
+    # Cached value encoding: 'json' or 'msgpack'; compression 'auto', 'zstd', 'lz4', 'zlib' or 'none'
+    CACHE_CODEC_FORMAT = os.getenv('CACHE_CODEC_FORMAT', 'json')
+    CACHE_COMPRESSION = os.getenv('CACHE_COMPRESSION', 'auto')
+    CACHE_COMPRESSION_MIN_BYTES = int(os.getenv('CACHE_COMPRESSION_MIN_BYTES', '1024'))
+
+    # Hot ranking (posts): decay re-rank, a leader-only scheduler job
+    HOT_RERANK_ENABLED = os.getenv('HOT_RERANK_ENABLED', 'true').lower() == 'true'
+    HOT_RERANK_INTERVAL_SECONDS = int(os.getenv('HOT_RERANK_INTERVAL_SECONDS', '300'))
+
+    # Maintenance scheduler (utils/scheduler): one replica, the lease holder, runs cluster-wide jobs
+    SCHEDULER_ENABLED = os.getenv('SCHEDULER_ENABLED', 'true').lower() == 'true'
+    SCHEDULER_LEASE_TTL_SECONDS = int(os.getenv('SCHEDULER_LEASE_TTL_SECONDS', '60'))
+    SCHEDULER_TICK_SECONDS = int(os.getenv('SCHEDULER_TICK_SECONDS', '5'))
+    # Clean-up jobs (utils/maintenance_jobs); an interval of 0 disables the job
+    CLEANUP_BATCH_SIZE = int(os.getenv('CLEANUP_BATCH_SIZE', '500'))
+    CLEANUP_DELETED_MESSAGES_INTERVAL_SECONDS = int(os.getenv('CLEANUP_DELETED_MESSAGES_INTERVAL_SECONDS', '3600'))
+    CLEANUP_SESSION_BACKUPS_INTERVAL_SECONDS = int(os.getenv('CLEANUP_SESSION_BACKUPS_INTERVAL_SECONDS', '900'))
+    CLEANUP_LEASES_INTERVAL_SECONDS = int(os.getenv('CLEANUP_LEASES_INTERVAL_SECONDS', '86400'))
+    CLEANUP_USER_CODES_INTERVAL_SECONDS = int(os.getenv('CLEANUP_USER_CODES_INTERVAL_SECONDS', '3600'))
+    CLEANUP_ANONYMOUS_IDENTITIES_INTERVAL_SECONDS = int(os.getenv('CLEANUP_ANONYMOUS_IDENTITIES_INTERVAL_SECONDS', '86400'))
+    CLEANUP_STALE_CALLS_INTERVAL_SECONDS = int(os.getenv('CLEANUP_STALE_CALLS_INTERVAL_SECONDS', '600'))
+    CLEANUP_PRESENCE_INTERVAL_SECONDS = int(os.getenv('CLEANUP_PRESENCE_INTERVAL_SECONDS', '300'))
+    # Corrects unread DM totals (unread_counters) that drifted from the conversation summaries
+    UNREAD_RECOUNT_INTERVAL_SECONDS = int(os.getenv('UNREAD_RECOUNT_INTERVAL_SECONDS', '3600'))
+    ANONYMOUS_IDENTITY_RETENTION_DAYS = int(os.getenv('ANONYMOUS_IDENTITY_RETENTION_DAYS', '30'))
+
+    # Vote counter write-behind ('memory' or 'redis')
+    VOTE_BUFFER_ENABLED = os.getenv('VOTE_BUFFER_ENABLED', 'true').lower() == 'true'
+    VOTE_BUFFER_BACKEND = os.getenv('VOTE_BUFFER_BACKEND', 'memory')
+    VOTE_BUFFER_FLUSH_MS = int(os.getenv('VOTE_BUFFER_FLUSH_MS', '250'))
+
+    # Recent-message ring buffer per room for sync_room ('auto' = redis when available, 'memory' or 'redis')
+    ROOM_BUFFER_ENABLED = os.getenv('ROOM_BUFFER_ENABLED', 'true').lower() == 'true'
+    ROOM_BUFFER_BACKEND = os.getenv('ROOM_BUFFER_BACKEND', 'auto')
+    # The memory backend only sees this worker's sends: it is used only when a single worker serves all clients
+    ROOM_BUFFER_SINGLE_WORKER = os.getenv('ROOM_BUFFER_SINGLE_WORKER', 'false').lower() == 'true'
+    ROOM_BUFFER_SIZE = int(os.getenv('ROOM_BUFFER_SIZE', '100'))
+    ROOM_BUFFER_MAX_ROOMS = int(os.getenv('ROOM_BUFFER_MAX_ROOMS', '2000'))
+    ROOM_BUFFER_TTL_SECONDS = int(os.getenv('ROOM_BUFFER_TTL_SECONDS', '86400'))
+
+    # Content filter word list (utils/content_filter); one term per line, re-read when the file changes
+    CONTENT_FILTER_WORDS_FILE = os.getenv('CONTENT_FILTER_WORDS_FILE')  # unset = built-in PROFANITY_WORDS
+    CONTENT_FILTER_RELOAD_SECONDS = float(os.getenv('CONTENT_FILTER_RELOAD_SECONDS', '30'))
+
+    # Report enrichment (utils/moderation_queue): snapshots of reported content, built in the background
+    MODERATION_QUEUE_ENABLED = os.getenv('MODERATION_QUEUE_ENABLED', 'true').lower() == 'true'
+    MODERATION_QUEUE_BATCH_SIZE = int(os.getenv('MODERATION_QUEUE_BATCH_SIZE', '50'))
+    MODERATION_QUEUE_INTERVAL_MS = int(os.getenv('MODERATION_QUEUE_INTERVAL_MS', '1000'))
+    # Sweep for reports a worker queued but did not enrich (0 disables)
+    MODERATION_SWEEP_INTERVAL_SECONDS = int(os.getenv('MODERATION_SWEEP_INTERVAL_SECONDS', '300'))
+
+    # Admin dashboard rollups (utils/stats_rollup): counters and hourly/daily series in `stats`
+    STATS_RECONCILE_INTERVAL_SECONDS = int(os.getenv('STATS_RECONCILE_INTERVAL_SECONDS', '900'))  # 0 disables
+    STATS_RECONCILE_HOURS = int(os.getenv('STATS_RECONCILE_HOURS', '168'))  # hourly buckets recounted per run
+    STATS_RECONCILE_DAYS = int(os.getenv('STATS_RECONCILE_DAYS', '7'))  # daily buckets recounted per run
+    STATS_HOURLY_RETENTION_DAYS = int(os.getenv('STATS_HOURLY_RETENTION_DAYS', '14'))
+    STATS_DAILY_RETENTION_DAYS = int(os.getenv('STATS_DAILY_RETENTION_DAYS', '400'))
 
     # File Upload Config
     MAX_CONTENT_LENGTH = 1 * 1024 * 1024 * 1024  # 1GB
@@ -127,8 +220,28 @@ class Config:
     UPLOADS_DIR = os.getenv('UPLOADS_DIR', os.path.join(os.path.dirname(__file__), 'uploads'))
     FILE_ENCRYPTION_KEY = os.getenv('FILE_ENCRYPTION_KEY', SECRET_KEY)  # Use SECRET_KEY as default
 
-    # Logging
+    # Image delivery (utils/image_refs): pictures are served by URL from /api/attachments
+    IMAGE_BASE_URL = os.getenv('IMAGE_BASE_URL', '')  # e.g. a CDN in front of the app; relative URLs if empty
+    # Store uploaded pictures on local disk when Azure Storage is off (only safe with a shared UPLOADS_DIR)
+    IMAGE_OFFLOAD_LOCAL = os.getenv('IMAGE_OFFLOAD_LOCAL', 'false').lower() == 'true'
+    ATTACHMENT_CACHE_MAX_AGE = int(os.getenv('ATTACHMENT_CACHE_MAX_AGE', '31536000'))  # pictures: 1 year, immutable
+    ATTACHMENT_PRIVATE_CACHE_MAX_AGE = int(os.getenv('ATTACHMENT_PRIVATE_CACHE_MAX_AGE', '300'))  # other files, browser only
+
+    # Metrics (utils/metrics), served on /metrics to admins or with 'Authorization: Bearer <METRICS_TOKEN>'
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+    METRICS_LOOP_LAG_INTERVAL_SECONDS = float(os.getenv('METRICS_LOOP_LAG_INTERVAL_SECONDS', '1.0'))
+
+    # Logging (utils/structured_logging)
     LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+    LOG_FORMAT = os.getenv('LOG_FORMAT', 'text')  # 'text' or 'json'
+    # Write through a bounded queue drained by a writer thread (records are dropped when it is full)
+    LOG_ASYNC = os.getenv('LOG_ASYNC', 'true').lower() == 'true'
+    LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))
+    # Per-category event levels and debug/info sample rates, e.g. 'socket.message=DEBUG,http.request=INFO'
+    LOG_CATEGORY_LEVELS = _env_mapping('LOG_CATEGORY_LEVELS')
+    LOG_SAMPLE_RATES = _env_mapping('LOG_SAMPLE_RATES', 'http.request=0.1,socket.message=0.1,socket.connect=0.2,socket.room=0.2',
+                                    cast=float)
 
     @staticmethod
     def init_app(app):
@@ -139,6 +252,7 @@ class DevelopmentConfig(Config):
     """Development configuration."""
     DEBUG = True
     TESTING = False
+    ROOM_BUFFER_SINGLE_WORKER = os.getenv('ROOM_BUFFER_SINGLE_WORKER', 'true').lower() == 'true'
 
 class ProductionConfig(Config):
     """Production configuration."""
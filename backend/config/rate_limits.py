@@ -63,6 +63,19 @@ REPORT_LIMITS = {
     'review': '50/hour',
 }
 
+# Socket.IO events (per user, or per IP for anonymous sockets)
+SOCKET_LIMITS = {
+    'send_message': MESSAGE_LIMITS['send_topic'],
+    'send_private_message': MESSAGE_LIMITS['send_private'],
+    'typing': '60/minute',
+    'join': '60/minute',
+    'sync_room': '60/minute',
+    'mark_read': '120/minute',
+    'update_anonymous_name': '10/hour',
+    'voip_call': '20/minute',
+    'voip_signal': '600/minute',  # ICE candidates, offers/answers, speaking/mute updates
+}
+
 # Default rate limit for endpoints without specific limits
 DEFAULT_LIMIT = '100/minute'
 
@@ -78,7 +91,7 @@ def get_limit(category, action=None):
     Get rate limit for a specific category and action.
 
     Args:
-        category: Category name (auth, topic, message, user, friend, report)
+        category: Category name (auth, topic, message, user, friend, report, socket)
         action: Specific action within category (optional)
 
     Returns:
@@ -91,6 +104,7 @@ def get_limit(category, action=None):
         'user': USER_LIMITS,
         'friend': FRIEND_LIMITS,
         'report': REPORT_LIMITS,
+        'socket': SOCKET_LIMITS,
     }
 
     category_limits = limits_map.get(category, {})
@@ -114,6 +128,9 @@ EXEMPT_IP_ADDRESSES = [
 
 
 # Rate limit storage backend configuration
+# Note: utils/rate_limiter uses the app's shared Redis client whenever Redis is
+# available and falls back to in-process token buckets; these settings are
+# kept for reference only.
 RATE_LIMIT_STORAGE = {
     'type': 'memory',  # Options: 'memory', 'redis'
     # Redis configuration (if using Redis backend)
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Database index management (see utils/index_manifest.py).
+
+Commands:
+    status   Show the applied manifest version and the pending changes
+    apply    Reconcile indexes with the manifest under a distributed lease
+             and record the manifest version once nothing failed
+             (run once per deployment)
+    report   Index usage from $indexStats; flags unused and redundant indexes
+
+Usage:
+    python manage_indexes.py status
+    python manage_indexes.py apply [--dry-run] [--prune] [--fix-options]
+    python manage_indexes.py report [--collection posts ...]
+"""
+
+import argparse
+import os
+import sys
+from pymongo import MongoClient
+
+# Ensure backend directory is in path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Import config from config.py (avoiding conflict with config/ directory)
+import importlib.util
+config_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config.py')
+spec = importlib.util.spec_from_file_location("config_module", config_path)
+config_module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(config_module)
+config = config_module.config
+
+from utils.index_manifest import INDEX_SCHEMA_VERSION, IndexReconciler, reconcile_with_lease
+
+
+def connect_to_database():
+    """Connect to MongoDB using app configuration."""
+    app_config = config['default']()
+
+    mongo_uri = app_config.MONGO_URI
+    db_name = app_config.MONGO_DB_NAME
+
+    print(f"Database: {db_name}")
+
+    mongo_options = {
+        'serverSelectionTimeoutMS': 5000,
+        'connectTimeoutMS': 30000,
+    }
+
+    if hasattr(app_config, 'COSMOS_SSL') and app_config.COSMOS_SSL:
+        mongo_options['ssl'] = True
+        mongo_options['retryWrites'] = False
+
+    client = MongoClient(mongo_uri, **mongo_options)
+    db = client[db_name]
+
+    try:
+        client.admin.command('ping')
+        print("✓ Successfully connected to MongoDB")
+    except Exception as e:
+        print(f"✗ Failed to connect to MongoDB: {e}")
+        sys.exit(1)
+
+    return db
+
+
+def _format_keys(keys):
+    return ', '.join(f"{field}:{direction}" for field, direction in keys)
+
+
+def print_plan(plan):
+    print(f"\nMissing indexes: {len(plan['create'])}")
+    for item in plan['create']:
+        unique = ' (unique)' if item['unique'] else ''
+        print(f"  + {item['collection']}: {_format_keys(item['keys'])}{unique}")
+
+    print(f"\nIndexes with different options: {len(plan['mismatch'])}")
+    for item in plan['mismatch']:
+        print(f"  ~ {item['collection']}.{item['name']}: {'; '.join(item['differences'])}")
+
+    print(f"\nRetired indexes (dropped on apply): {len(plan['retire'])}")
+    for item in plan['retire']:
+        print(f"  - {item['collection']}.{item['name']}: {_format_keys(item['keys'])}")
+
+    print(f"\nIndexes not in the manifest: {len(plan['extra'])}")
+    for item in plan['extra']:
+        print(f"  - {item['collection']}.{item['name']}: {_format_keys(item['keys'])}")
+
+
+def cmd_status(db, args):
+    reconciler = IndexReconciler(db)
+    applied = reconciler.applied()
+    print(f"\nManifest: v{INDEX_SCHEMA_VERSION} ({reconciler.hash})")
+    if applied:
+        print(f"Applied:  v{applied.get('version')} ({applied.get('manifest_hash')}) "
+              f"at {applied.get('applied_at')} by {applied.get('applied_by')}")
+    else:
+        print("Applied:  never")
+    print(f"Status:   {reconciler.status()}")
+    print_plan(reconciler.plan())
+    return 0
+
+
+def cmd_apply(db, args):
+    if args.dry_run:
+        result = IndexReconciler(db).apply(dry_run=True)
+        print_plan(result['plan'])
+        print("\nDRY RUN - no changes made")
+        return 0
+
+    result = reconcile_with_lease(db, 'cli', prune=args.prune, fix_options=args.fix_options)
+    if result is None:
+        print("✗ Another process is reconciling indexes (lease held); try again later")
+        return 1
+
+    print_plan(result['plan'])
+    summary = result['summary']
+    print(f"\n✓ Created {summary['created']} indexes"
+          + (f" ({summary['created_non_unique']} as non-unique on Cosmos DB)" if summary['created_non_unique'] else ''))
+    if summary['created_without_ttl']:
+        print(f"✓ Created {summary['created_without_ttl']} TTL indexes without TTL (unsupported; "
+              f"the scheduler's clean-up jobs expire those documents)")
+    if summary['recreated']:
+        print(f"✓ Recreated {summary['recreated']} indexes with manifest options")
+    if summary['retired']:
+        print(f"✓ Dropped {summary['retired']} retired indexes")
+    if summary['dropped']:
+        print(f"✓ Dropped {summary['dropped']} unmanaged indexes")
+    if summary['failed']:
+        print(f"✗ {summary['failed']} index operations failed (see log); "
+              f"manifest v{INDEX_SCHEMA_VERSION} not recorded, workers will retry on startup")
+    else:
+        print(f"✓ Recorded manifest v{INDEX_SCHEMA_VERSION}")
+    return 1 if summary['failed'] else 0
+
+
+def cmd_report(db, args):
+    rows = IndexReconciler(db).usage_report(args.collection)
+    if rows and all(row['ops'] is None for row in rows):
+        print("\n$indexStats is not supported by this server; showing redundancy analysis only")
+
+    current = None
+    flagged = 0
+    for row in rows:
+        if row['collection'] != current:
+            current = row['collection']
+            print(f"\n{current}")
+        ops = '-' if row['ops'] is None else row['ops']
+        flags = f"  <- {', '.join(row['flags'])}" if row['flags'] else ''
+        print(f"  {row['name']:<60} ops={ops:<10}{flags}")
+        flagged += 1 if row['flags'] else 0
+
+    since = [row['since'] for row in rows if row['since']]
+    if since:
+        print(f"\nUsage counted since {min(since)} (counters reset on server restart)")
+    print(f"\n{flagged} of {len(rows)} indexes flagged")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Manage database indexes')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    subparsers.add_parser('status', help='Show manifest version and pending changes')
+
+    apply_parser = subparsers.add_parser('apply', help='Reconcile indexes with the manifest')
+    apply_parser.add_argument('--dry-run', action='store_true', help='Show the plan without changing anything')
+    apply_parser.add_argument('--prune', action='store_true', help='Drop indexes that are not in the manifest')
+    apply_parser.add_argument('--fix-options', action='store_true',
+                              help='Drop and recreate indexes whose options differ from the manifest')
+
+    report_parser = subparsers.add_parser('report', help='Index usage report ($indexStats)')
+    report_parser.add_argument('--collection', action='append', help='Limit to a collection (repeatable)')
+
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print(f"Index management: {args.command}")
+    print("=" * 60)
+
+    db = connect_to_database()
+    commands = {'status': cmd_status, 'apply': cmd_apply, 'report': cmd_report}
+    sys.exit(commands[args.command](db, args))
+
+
+if __name__ == '__main__':
+    main()
@@ -366,13 +366,12 @@ class AnonymousIdentity:
             'oldest_created': stats_data.get('oldest_created')
         }
 
-    def cleanup_unused_identities(self, days_threshold: int = 30) -> int:
+    def cleanup_unused_identities(self, days_threshold: int = 30, batch_size: int = 500) -> int:
         """Clean up anonymous identities not used for a long time."""
         from datetime import timedelta
+        from utils.helpers import delete_in_batches
         cutoff_date = datetime.utcnow() - timedelta(days=days_threshold)
 
-        result = self.collection.delete_many({
+        return delete_in_batches(self.collection, {
             'last_used': {'$lt': cutoff_date}
-        })
-
-        return result.deleted_count
\ No newline at end of file
+        }, batch_size=batch_size)
\ No newline at end of file
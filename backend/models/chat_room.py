@@ -3,6 +3,9 @@ from typing import List, Dict, Optional, Any, Union
 from bson import ObjectId
 from flask import current_app
 from utils.cache_decorator import cache_result
+from utils.singletons import get_model
+from utils.image_refs import resolve_image_ref
+from utils.json_provider import to_jsonable
 
 
 class ChatRoom:
@@ -66,12 +69,10 @@ class ChatRoom:
             room['topic_id'] = str(room['topic_id'])
             room['owner_id'] = str(room['owner_id'])
             
-            # Resolve images
-            from utils.imgbb_upload import resolve_image_content
-            if room.get('picture'):
-                room['picture'] = resolve_image_content(room['picture'])
-            if room.get('background_picture'):
-                room['background_picture'] = resolve_image_content(room['background_picture'])
+            # Image references -> URLs (no storage access)
+            for field in ('picture', 'background_picture'):
+                if room.get(field):
+                    room[field] = resolve_image_ref(room[field])
             
             # Convert members list ObjectIds to strings
             if 'members' in room and room['members']:
@@ -89,7 +90,7 @@ class ChatRoom:
             
             # Get owner details
             from .user import User
-            user_model = User(self.db)
+            user_model = get_model(User, self.db)
             owner = user_model.get_user_by_id(room['owner_id'])
             if owner:
                 room['owner'] = {
@@ -173,7 +174,6 @@ class ChatRoom:
 
     def _process_rooms_list(self, rooms: List[Dict[str, Any]], user_id: Optional[str] = None) -> List[Dict[str, Any]]:
         """Helper to process a list of room documents."""
-        from utils.imgbb_upload import resolve_image_content
         # Bulk fetch owners
         owner_ids = set()
         for room in rooms:
@@ -202,16 +202,10 @@ class ChatRoom:
             room['topic_id'] = str(room['topic_id']) if room.get('topic_id') else None
             room['owner_id'] = str(room['owner_id'])
             
-            # Resolve images
-            if room.get('picture'):
-                room['picture'] = resolve_image_content(room['picture'])
-            if room.get('background_picture'):
-                room['background_picture'] = resolve_image_content(room['background_picture'])
-            
-            # Convert deleted_by ObjectId to string if present
-            if 'deleted_by' in room and room['deleted_by']:
-                if isinstance(room['deleted_by'], ObjectId):
-                    room['deleted_by'] = str(room['deleted_by'])
+            # Image references -> URLs (no storage access)
+            for field in ('picture', 'background_picture'):
+                if room.get(field):
+                    room[field] = resolve_image_ref(room[field])
             
             # Check if user is member (before converting members to strings)
             if user_id:
@@ -220,43 +214,6 @@ class ChatRoom:
             else:
                 room['user_is_member'] = False
             
-            # Convert members list ObjectIds to strings
-            if 'members' in room and room['members']:
-                room['members'] = [str(member_id) if isinstance(member_id, ObjectId) else member_id for member_id in room['members']]
-            
-            # Convert moderators list ObjectIds to strings
-            if 'moderators' in room and room['moderators']:
-                converted_moderators = []
-                for mod in room['moderators']:
-                    if isinstance(mod, ObjectId):
-                        converted_moderators.append(str(mod))
-                    elif isinstance(mod, dict):
-                        # Handle moderator objects with nested ObjectIds
-                        converted_mod = {}
-                        for key, value in mod.items():
-                            if isinstance(value, ObjectId):
-                                converted_mod[key] = str(value)
-                            else:
-                                converted_mod[key] = value
-                        converted_moderators.append(converted_mod)
-                    else:
-                        converted_moderators.append(mod)
-                room['moderators'] = converted_moderators
-            
-            # Convert banned_users list ObjectIds to strings if present
-            if 'banned_users' in room and room['banned_users']:
-                room['banned_users'] = [str(ban_id) if isinstance(ban_id, ObjectId) else ban_id for ban_id in room['banned_users']]
-            
-            # Convert datetime to ISO string
-            if 'created_at' in room and isinstance(room['created_at'], datetime):
-                room['created_at'] = room['created_at'].isoformat()
-            if 'last_activity' in room and isinstance(room['last_activity'], datetime):
-                room['last_activity'] = room['last_activity'].isoformat()
-            if 'deleted_at' in room and room['deleted_at'] and isinstance(room['deleted_at'], datetime):
-                room['deleted_at'] = room['deleted_at'].isoformat()
-            if 'permanent_delete_at' in room and room['permanent_delete_at'] and isinstance(room['permanent_delete_at'], datetime):
-                room['permanent_delete_at'] = room['permanent_delete_at'].isoformat()
-            
             # Get owner details from map
             owner_id = room['owner_id']
             owner = owners_map.get(owner_id)
@@ -266,7 +223,8 @@ class ChatRoom:
                     'username': owner['username']
                 }
 
-        return rooms
+        # Members, moderators, bans and timestamps
+        return [to_jsonable(room) for room in rooms]
 
     def join_chat_room(self, room_id: str, user_id: str) -> bool:
         """Join a chat room."""
@@ -417,7 +375,7 @@ class ChatRoom:
             
             # Get owner details
             from .user import User
-            user_model = User(self.db)
+            user_model = get_model(User, self.db)
             owner = user_model.get_user_by_id(room['owner_id'])
             if owner:
                 room['owner'] = {
@@ -715,7 +673,7 @@ class ChatRoom:
             room = self.get_chat_room_by_id(str(inv['room_id']))
             if room:
                 from .user import User
-                user_model = User(self.db)
+                user_model = get_model(User, self.db)
                 inviter = user_model.get_user_by_id(str(inv['invited_by']))
                 
                 # Fetch topic data if topic_id exists and is valid
@@ -7,9 +7,32 @@ import re
 from pymongo.errors import OperationFailure
 
 
+def _is_cosmos_index_sort_error(err: Exception) -> bool:
+    """CosmosDB (Mongo API) rejects some ORDER BY queries without matching composite indexes."""
+    msg = str(err).lower()
+    return (
+        'composite index' in msg
+        or 'order by query' in msg
+        or 'index path' in msg
+        or 'excluded' in msg
+    )
+
+
 class Comment:
     """Comment model for managing comments and replies on posts (Reddit-style nested comments)."""
 
+    # Legacy voter arrays are never sent to the app; votes live in the votes collection
+    LIST_PROJECTION = {'upvotes': 0, 'downvotes': 0}
+
+    # Materialised path: ancestor ids + own id joined by PATH_SEPARATOR. ObjectId hex strings
+    # are fixed-width, so sorting by path yields depth-first order with siblings oldest first,
+    # and a subtree is the range [path + '/', path + '0') ('0' sorts right after '/').
+    PATH_SEPARATOR = '/'
+    PATH_RANGE_END = '0'
+
+    # Hard cap on nesting, mirrors the frontend's maximum indentation
+    MAX_DEPTH = 10
+
     def __init__(self, db):
         self.db = db
         self.collection = db.comments
@@ -22,20 +45,21 @@ class Comment:
         # Validate and filter content
         filtered_content = self._filter_content(content)
 
+        comment_oid = ObjectId()
         comment_data = {
+            '_id': comment_oid,
             'post_id': ObjectId(post_id),
             'user_id': ObjectId(user_id),
             'content': filtered_content,
             'parent_comment_id': ObjectId(parent_comment_id) if parent_comment_id else None,
             'anonymous_identity': anonymous_identity,
             'gif_url': gif_url,
-            'upvotes': [],  # Array of user_ids who upvoted
-            'downvotes': [],  # Array of user_ids who downvoted
-            'upvote_count': 0,
+            'upvote_count': 0,  # Individual votes live in the votes collection
             'downvote_count': 0,
             'score': 0,  # upvote_count - downvote_count
             'reply_count': 0,
             'depth': 0,  # Depth in comment tree (0 = top-level comment)
+            'path': str(comment_oid),  # Materialised path (see PATH_SEPARATOR)
             'is_deleted': False,
             'deleted_by': None,
             'deleted_at': None,
@@ -44,14 +68,18 @@ class Comment:
             'updated_at': datetime.utcnow()
         }
 
-        # Calculate depth if this is a reply
+        # Calculate depth and path if this is a reply
         if parent_comment_id:
-            parent = self.collection.find_one({'_id': ObjectId(parent_comment_id)})
+            parent = self.collection.find_one(
+                {'_id': ObjectId(parent_comment_id)},
+                {'depth': 1, 'path': 1, 'parent_comment_id': 1}
+            )
             if parent:
                 comment_data['depth'] = parent.get('depth', 0) + 1
                 # Limit depth to prevent too deep nesting (max 10 levels)
-                if comment_data['depth'] > 10:
-                    comment_data['depth'] = 10
+                if comment_data['depth'] > self.MAX_DEPTH:
+                    comment_data['depth'] = self.MAX_DEPTH
+                comment_data['path'] = self.PATH_SEPARATOR.join([self._get_path(parent), str(comment_oid)])
 
         result = self.collection.insert_one(comment_data)
         comment_id = str(result.inserted_id)
@@ -100,96 +128,9 @@ class Comment:
     @cache_result(ttl=300, key_prefix='comment')
     def get_comment_by_id(self, comment_id: str, user_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
         """Get a specific comment by ID."""
-        comment = self.collection.find_one({'_id': ObjectId(comment_id)})
+        comment = self.collection.find_one({'_id': ObjectId(comment_id)}, self.LIST_PROJECTION)
         if comment:
-            comment['_id'] = str(comment['_id'])
-            comment['id'] = str(comment['_id'])
-            comment['post_id'] = str(comment['post_id'])
-            comment['user_id'] = str(comment['user_id'])
-            
-            if comment.get('parent_comment_id'):
-                comment['parent_comment_id'] = str(comment['parent_comment_id'])
-            
-            # Convert upvotes and downvotes list ObjectIds to strings
-            if 'upvotes' in comment and comment['upvotes']:
-                comment['upvotes'] = [str(user_id) for user_id in comment['upvotes']]
-            if 'downvotes' in comment and comment['downvotes']:
-                comment['downvotes'] = [str(user_id) for user_id in comment['downvotes']]
-
-            # Calculate score if not present
-            if 'score' not in comment:
-                up_count = comment.get('upvote_count', 0)
-                down_count = comment.get('downvote_count', 0)
-                comment['score'] = up_count - down_count
-            
-            # Check if user has upvoted or downvoted (if user_id provided)
-            # Note: user_id parameter is passed to this method
-            if user_id:
-                user_obj_id = ObjectId(user_id)
-                # Need to check against original ObjectId lists before conversion
-                original_upvotes = comment.get('upvotes', [])
-                original_downvotes = comment.get('downvotes', [])
-                # If already converted, check against string list
-                if original_upvotes and isinstance(original_upvotes[0], str):
-                    comment['user_has_upvoted'] = user_id in original_upvotes
-                else:
-                    comment['user_has_upvoted'] = user_obj_id in original_upvotes
-                if original_downvotes and isinstance(original_downvotes[0], str):
-                    comment['user_has_downvoted'] = user_id in original_downvotes
-                else:
-                    comment['user_has_downvoted'] = user_obj_id in original_downvotes
-            else:
-                comment['user_has_upvoted'] = False
-                comment['user_has_downvoted'] = False
-
-            # Convert datetime to ISO string
-            if 'created_at' in comment and isinstance(comment['created_at'], datetime):
-                comment['created_at'] = comment['created_at'].isoformat()
-            if 'updated_at' in comment and isinstance(comment['updated_at'], datetime):
-                comment['updated_at'] = comment['updated_at'].isoformat()
-            
-            # Get user details (or anonymous identity)
-            if comment.get('anonymous_identity'):
-                comment['display_name'] = comment['anonymous_identity']
-                comment['is_anonymous'] = True
-                comment['author_username'] = comment['anonymous_identity']
-                comment['profile_picture'] = None
-                comment['is_admin'] = False
-                comment['is_owner'] = False
-                comment['is_moderator'] = False
-            else:
-                from .user import User
-                user_model = User(self.db)
-                user = user_model.get_user_by_id(comment['user_id'])
-                if user:
-                    comment['display_name'] = user['username']
-                    comment['author_username'] = user['username']
-                    comment['profile_picture'] = user.get('profile_picture')
-                    comment['is_admin'] = user.get('is_admin', False)
-                    
-                    # Check if owner or moderator of the post's topic
-                    comment['is_owner'] = False
-                    comment['is_moderator'] = False
-                    if comment.get('post_id'):
-                        from .post import Post
-                        post_model = Post(self.db)
-                        post = post_model.get_post_by_id(str(comment['post_id']))
-                        if post and post.get('topic_id'):
-                            from .topic import Topic
-                            topic_model = Topic(self.db)
-                            topic = topic_model.get_topic_by_id(str(post['topic_id']))
-                            if topic:
-                                comment['is_owner'] = str(topic.get('owner_id')) == str(comment['user_id'])
-                                comment['is_moderator'] = topic_model.is_user_moderator(str(post['topic_id']), str(comment['user_id']))
-                else:
-                    comment['display_name'] = 'Deleted User'
-                    comment['author_username'] = 'Deleted User'
-                    comment['profile_picture'] = None
-                    comment['is_admin'] = False
-                    comment['is_owner'] = False
-                    comment['is_moderator'] = False
-                comment['is_anonymous'] = False
-
+            self._hydrate_comments([comment], user_id)
         return comment
 
     @cache_result(ttl=300, key_prefix='comment')
@@ -209,18 +150,9 @@ class Comment:
         else:  # default: 'top' (by upvotes)
             sort_key = [('upvote_count', -1), ('created_at', -1)]
 
-        def _is_cosmos_index_sort_error(err: Exception) -> bool:
-            msg = str(err).lower()
-            return (
-                'composite index' in msg
-                or 'order by query' in msg
-                or 'index path' in msg
-                or 'excluded' in msg
-            )
-
         try:
             comments = list(
-                self.collection.find(query)
+                self.collection.find(query, self.LIST_PROJECTION)
                        .sort(sort_key)
                 .limit(limit)
             )
@@ -233,20 +165,20 @@ class Comment:
             if sort_by == 'new':
                 # _id is roughly creation time for ObjectId
                 comments = list(
-                    self.collection.find(query)
+                    self.collection.find(query, self.LIST_PROJECTION)
                     .sort([('_id', -1)])
                     .limit(limit)
                 )
             elif sort_by == 'old':
                 comments = list(
-                    self.collection.find(query)
+                    self.collection.find(query, self.LIST_PROJECTION)
                     .sort([('_id', 1)])
                     .limit(limit)
                 )
             else:
                 # 'top': avoid composite sort in DB. Fetch a bounded set and sort in Python.
                 fetch_limit = min(max(limit * 5, limit), 2000)
-                raw = list(self.collection.find(query).limit(fetch_limit))
+                raw = list(self.collection.find(query, self.LIST_PROJECTION).limit(fetch_limit))
 
                 def _created_sort_key(doc: Dict[str, Any]):
                     created = doc.get('created_at')
@@ -260,197 +192,355 @@ class Comment:
                 raw.sort(key=_created_sort_key, reverse=True)
                 comments = raw[:limit]
 
-        # Process comments and build tree structure
+        self._hydrate_comments(comments, user_id)
+        return self._build_tree(comments)
+
+    def get_comment_tree(self, post_id: str, sort_by: str = 'top', limit: int = 50,
+                         cursor: Optional[str] = None, user_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Get one page of top-level comments for a post; replies are loaded on demand.
+
+        Each comment carries its `reply_count` so the client can render a
+        "load replies" control and fetch the subtree with get_comment_subtree.
+
+        Args:
+            post_id: Post ID
+            sort_by: 'top', 'new' or 'old'
+            limit: Page size
+            cursor: next_cursor from the previous page
+            user_id: Viewer ID for vote state
+
+        Returns:
+            Dict with comments, next_cursor and has_more
+        """
+        query: Dict[str, Any] = {
+            'post_id': ObjectId(post_id),
+            'parent_comment_id': None,
+            'is_deleted': False
+        }
+
+        if sort_by == 'new':
+            sort_key = [('_id', -1)]
+        elif sort_by == 'old':
+            sort_key = [('_id', 1)]
+        else:
+            sort_key = [('upvote_count', -1), ('_id', -1)]
+
+        after = self._parse_tree_cursor(cursor, sort_by)
+        if after:
+            if sort_by == 'old':
+                query['_id'] = {'$gt': after['_id']}
+            elif sort_by == 'new' or 'upvote_count' not in after:
+                query['_id'] = {'$lt': after['_id']}
+            else:
+                query['$or'] = [
+                    {'upvote_count': {'$lt': after['upvote_count']}},
+                    {'upvote_count': after['upvote_count'], '_id': {'$lt': after['_id']}}
+                ]
+
+        try:
+            comments = list(
+                self.collection.find(query, self.LIST_PROJECTION).sort(sort_key).limit(limit + 1)
+            )
+        except OperationFailure as e:
+            if not _is_cosmos_index_sort_error(e) or sort_by in ('new', 'old'):
+                raise
+            # Without the composite index fall back to newest-first paging
+            query.pop('$or', None)
+            if after:
+                query['_id'] = {'$lt': after['_id']}
+            sort_by = 'new'
+            comments = list(
+                self.collection.find(query, self.LIST_PROJECTION).sort([('_id', -1)]).limit(limit + 1)
+            )
+
+        has_more = len(comments) > limit
+        comments = comments[:limit]
+
+        next_cursor = None
+        if has_more and comments:
+            last = comments[-1]
+            if sort_by in ('new', 'old'):
+                next_cursor = str(last['_id'])
+            else:
+                next_cursor = f"{last.get('upvote_count', 0)}:{last['_id']}"
+
+        self._hydrate_comments(comments, user_id)
+        for comment in comments:
+            comment['replies'] = []
+
+        return {
+            'comments': comments,
+            'next_cursor': next_cursor,
+            'has_more': has_more
+        }
+
+    def get_comment_subtree(self, comment_id: str, limit: int = 100, cursor: Optional[str] = None,
+                            user_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Get one page of the replies below a comment, at any depth.
+
+        The subtree is a single range scan on the (post_id, path) index in
+        depth-first order. Replies whose parent is on an earlier page are
+        returned at the top level of `replies` (they carry parent_comment_id).
+
+        Args:
+            comment_id: Root of the subtree
+            limit: Page size
+            cursor: next_cursor from the previous page
+            user_id: Viewer ID for vote state
+
+        Returns:
+            Dict with comment_id, replies (nested), next_cursor and has_more,
+            or None if the comment doesn't exist
+        """
+        root = self.collection.find_one(
+            {'_id': ObjectId(comment_id)},
+            {'post_id': 1, 'path': 1, 'parent_comment_id': 1}
+        )
+        if not root:
+            return None
+
+        prefix = self._get_path(root) + self.PATH_SEPARATOR
+        path_range: Dict[str, Any] = {'$gte': prefix, '$lt': prefix[:-1] + self.PATH_RANGE_END}
+        if cursor and cursor.startswith(prefix):
+            path_range['$gt'] = cursor
+            del path_range['$gte']
+
+        replies = list(
+            self.collection.find(
+                {'post_id': root['post_id'], 'path': path_range, 'is_deleted': False},
+                self.LIST_PROJECTION
+            ).sort([('path', 1)]).limit(limit + 1)
+        )
+
+        has_more = len(replies) > limit
+        replies = replies[:limit]
+        next_cursor = replies[-1]['path'] if has_more and replies else None
+
+        self._hydrate_comments(replies, user_id)
+
+        # Direct children of the root come back as the top level of the page
+        nested = self._build_tree(replies, sort_replies=False)
+
+        return {
+            'comment_id': comment_id,
+            'replies': nested,
+            'next_cursor': next_cursor,
+            'has_more': has_more
+        }
+
+    def _get_path(self, comment: Dict[str, Any]) -> str:
+        """Materialised path of a raw comment document (derived from ancestors for legacy comments)."""
+        if comment.get('path'):
+            return comment['path']
+
+        ids = [str(comment['_id'])]
+        parent_id = comment.get('parent_comment_id')
+        while parent_id and len(ids) <= self.MAX_DEPTH + 1:
+            parent = self.collection.find_one({'_id': ObjectId(parent_id)}, {'path': 1, 'parent_comment_id': 1})
+            if not parent:
+                break
+            if parent.get('path'):
+                return self.PATH_SEPARATOR.join([parent['path']] + list(reversed(ids)))
+            ids.append(str(parent['_id']))
+            parent_id = parent.get('parent_comment_id')
+        return self.PATH_SEPARATOR.join(reversed(ids))
+
+    def _parse_tree_cursor(self, cursor: Optional[str], sort_by: str) -> Optional[Dict[str, Any]]:
+        """Decode a get_comment_tree cursor; invalid cursors start from the first page."""
+        if not cursor:
+            return None
+        try:
+            # Bare ids are also issued for 'top' when the newest-first fallback was used
+            if sort_by in ('new', 'old') or ':' not in cursor:
+                return {'_id': ObjectId(cursor)}
+            upvote_count, oid = cursor.split(':', 1)
+            return {'upvote_count': int(upvote_count), '_id': ObjectId(oid)}
+        except Exception:
+            return None
+
+    def _build_tree(self, comments: List[Dict[str, Any]], sort_replies: bool = True) -> List[Dict[str, Any]]:
+        """Nest hydrated comments under their parents; comments without a loaded parent become roots."""
         comments_dict = {}
         root_comments = []
 
+        for comment in comments:
+            comment['replies'] = []
+            comments_dict[comment['id']] = comment
+
+        # Build nested tree structure (Reddit-style)
+        for comment_id, comment in comments_dict.items():
+            if comment.get('parent_comment_id') and comment['parent_comment_id'] in comments_dict:
+                # This is a reply, add it to direct parent's replies
+                comments_dict[comment['parent_comment_id']]['replies'].append(comment)
+            else:
+                # This is a root comment
+                root_comments.append(comment)
+
+        # Sort replies recursively by creation time (oldest first)
+        def sort_replies_recursive(comment_list):
+            for comment in comment_list:
+                if comment.get('replies'):
+                    comment['replies'].sort(key=lambda x: x.get('created_at', ''))
+                    sort_replies_recursive(comment['replies'])
+
+        if sort_replies:
+            sort_replies_recursive(root_comments)
+
+        return root_comments
+
+    def _hydrate_comments(self, comments: List[Dict[str, Any]], user_id: Optional[str] = None) -> None:
+        """
+        Serialize raw comment documents in place and attach author and vote details.
+
+        Uses a fixed number of queries regardless of page size: one for the
+        viewer's votes, one for authors, one for the posts and one for their topics.
+        """
+        if not comments:
+            return
+
+        # Batch fetch the user's votes for this page
+        user_votes = {}
+        if user_id:
+            from .vote import Vote
+            user_votes = Vote(self.db).get_user_votes('comment', [c['_id'] for c in comments], user_id)
+
+        author_ids = {c['user_id'] for c in comments if not c.get('anonymous_identity') and c.get('user_id')}
+        authors = {}
+        if author_ids:
+            for user in self.db.users.find(
+                {'_id': {'$in': list(author_ids)}},
+                {'username': 1, 'profile_picture': 1, 'is_admin': 1}
+            ):
+                authors[str(user['_id'])] = user
+
+        # Topic owner/moderator flags: comments on a page share (almost always) one post
+        topic_by_post = {}
+        topics = {}
+        if author_ids:
+            post_ids = list({c['post_id'] for c in comments if c.get('post_id')})
+            for post in self.db.posts.find({'_id': {'$in': post_ids}}, {'topic_id': 1}):
+                if post.get('topic_id'):
+                    topic_by_post[str(post['_id'])] = str(post['topic_id'])
+            if topic_by_post:
+                topic_oids = [ObjectId(tid) for tid in set(topic_by_post.values())]
+                for topic in self.db.topics.find({'_id': {'$in': topic_oids}}, {'owner_id': 1, 'moderators.user_id': 1}):
+                    topics[str(topic['_id'])] = {
+                        'owner_id': str(topic.get('owner_id')),
+                        'moderator_ids': {str(m.get('user_id')) for m in topic.get('moderators', []) if m.get('user_id')}
+                    }
+
         for comment in comments:
             comment['_id'] = str(comment['_id'])
             comment['id'] = str(comment['_id'])
             comment['post_id'] = str(comment['post_id'])
             comment['user_id'] = str(comment['user_id'])
-            
+
             if comment.get('parent_comment_id'):
                 comment['parent_comment_id'] = str(comment['parent_comment_id'])
-            
-            # Check if user has upvoted or downvoted BEFORE converting ObjectIds to strings
-            if user_id:
-                user_obj_id = ObjectId(user_id)
-                comment['user_has_upvoted'] = user_obj_id in comment.get('upvotes', [])
-                comment['user_has_downvoted'] = user_obj_id in comment.get('downvotes', [])
-            else:
-                comment['user_has_upvoted'] = False
-                comment['user_has_downvoted'] = False
-            
-            # Convert upvotes and downvotes list ObjectIds to strings
-            if 'upvotes' in comment and comment['upvotes']:
-                comment['upvotes'] = [str(user_id) for user_id in comment['upvotes']]
-            if 'downvotes' in comment and comment['downvotes']:
-                comment['downvotes'] = [str(user_id) for user_id in comment['downvotes']]
-            
+
+            # Check if user has upvoted or downvoted
+            user_vote = user_votes.get(comment['id'], 0)
+            comment['user_has_upvoted'] = user_vote == 1
+            comment['user_has_downvoted'] = user_vote == -1
+
             # Calculate score if not present
             if 'score' not in comment:
                 up_count = comment.get('upvote_count', 0)
                 down_count = comment.get('downvote_count', 0)
                 comment['score'] = up_count - down_count
-            
+
             # Convert datetime to ISO string
             if 'created_at' in comment and isinstance(comment['created_at'], datetime):
                 comment['created_at'] = comment['created_at'].isoformat()
             if 'updated_at' in comment and isinstance(comment['updated_at'], datetime):
                 comment['updated_at'] = comment['updated_at'].isoformat()
-            
+
             # Get user details (or anonymous identity)
+            comment['is_owner'] = False
+            comment['is_moderator'] = False
             if comment.get('anonymous_identity'):
                 comment['display_name'] = comment['anonymous_identity']
                 comment['is_anonymous'] = True
                 comment['author_username'] = comment['anonymous_identity']
                 comment['profile_picture'] = None
                 comment['is_admin'] = False
-                comment['is_owner'] = False
-                comment['is_moderator'] = False
-            else:
-                from .user import User
-                user_model = User(self.db)
-                user = user_model.get_user_by_id(comment['user_id'])
-                if user:
-                    comment['display_name'] = user['username']
-                    comment['author_username'] = user['username']
-                    comment['profile_picture'] = user.get('profile_picture')
-                    comment['is_admin'] = user.get('is_admin', False)
-                    
-                    # Check if owner or moderator of the post's topic
-                    comment['is_owner'] = False
-                    comment['is_moderator'] = False
-                    if comment.get('post_id'):
-                        from .post import Post
-                        post_model = Post(self.db)
-                        post = post_model.get_post_by_id(str(comment['post_id']))
-                        if post and post.get('topic_id'):
-                            from .topic import Topic
-                            topic_model = Topic(self.db)
-                            topic = topic_model.get_topic_by_id(str(post['topic_id']))
-                            if topic:
-                                comment['is_owner'] = str(topic.get('owner_id')) == str(comment['user_id'])
-                                comment['is_moderator'] = topic_model.is_user_moderator(str(post['topic_id']), str(comment['user_id']))
-                else:
-                    comment['display_name'] = 'Deleted User'
-                    comment['author_username'] = 'Deleted User'
-                    comment['profile_picture'] = None
-                    comment['is_admin'] = False
-                    comment['is_owner'] = False
-                    comment['is_moderator'] = False
-                comment['is_anonymous'] = False
-
-            # Initialize replies list
-            comment['replies'] = []
-            comments_dict[comment['id']] = comment
-
-        # Build nested tree structure (Reddit-style)
-        for comment_id, comment in comments_dict.items():
-            if comment.get('parent_comment_id') and comment['parent_comment_id'] in comments_dict:
-                # This is a reply, add it to direct parent's replies
-                parent = comments_dict[comment['parent_comment_id']]
-                # Don't store parent info for mentions - comments are independent
-                parent['replies'].append(comment)
+                continue
+
+            user = authors.get(comment['user_id'])
+            if user:
+                comment['display_name'] = user['username']
+                comment['author_username'] = user['username']
+                comment['profile_picture'] = user.get('profile_picture')
+                comment['is_admin'] = user.get('is_admin', False)
+
+                # Check if owner or moderator of the post's topic
+                topic = topics.get(topic_by_post.get(comment['post_id']))
+                if topic:
+                    comment['is_owner'] = topic['owner_id'] == comment['user_id']
+                    comment['is_moderator'] = comment['user_id'] in topic['moderator_ids']
             else:
-                # This is a root comment
-                root_comments.append(comment)
-        
-        # Sort replies recursively by creation time (oldest first)
-        def sort_replies_recursive(comment_list):
-            for comment in comment_list:
-                if comment.get('replies'):
-                    comment['replies'].sort(key=lambda x: x.get('created_at', ''))
-                    sort_replies_recursive(comment['replies'])
-        
-        sort_replies_recursive(root_comments)
+                comment['display_name'] = 'Deleted User'
+                comment['author_username'] = 'Deleted User'
+                comment['profile_picture'] = None
+                comment['is_admin'] = False
+            comment['is_anonymous'] = False
+
+    def vote_comment(self, comment_id: str, user_id: str, direction: int) -> Optional[Dict[str, Any]]:
+        """
+        Toggle a user's vote on a comment in O(1), independent of the comment's vote count.
+
+        When the vote buffer is enabled the counter increments are written behind
+        in micro-batches (see utils/vote_buffer); otherwise they are applied inline.
+
+        Args:
+            comment_id: Comment ID
+            user_id: Voter ID
+            direction: 1 for upvote, -1 for downvote
+
+        Returns:
+            The user's resulting vote (plus counters when applied inline), or None if the comment doesn't exist
+        """
+        from .vote import Vote
+        from utils.vote_buffer import get_vote_buffer, publish_score_updates
+
+        vote_model = Vote(self.db)
+        vote_buffer = get_vote_buffer()
+
+        if vote_buffer:
+            if not self.collection.find_one({'_id': ObjectId(comment_id)}, {'_id': 1}):
+                return None
+            transition = vote_model.record_vote('comment', comment_id, user_id, direction)
+            if not transition:
+                return None
+            vote_buffer.add('comment', comment_id,
+                            {field: transition[field] for field in Vote.COUNTER_DELTA_FIELDS})
+            user_vote = transition['user_vote']
+            return {
+                'user_vote': user_vote,
+                'user_has_upvoted': user_vote == 1,
+                'user_has_downvoted': user_vote == -1,
+                'pending': True
+            }
 
-        return root_comments
+        result = vote_model.cast_vote('comment', comment_id, user_id, direction)
+        if result:
+            try:
+                from extensions import socketio
+                publish_score_updates(self.db, socketio, current_app.config.get('CACHE_INVALIDATOR'),
+                                      {'comment': {comment_id}})
+            except Exception:
+                pass
+        return result
 
     def upvote_comment(self, comment_id: str, user_id: str) -> bool:
         """Upvote a comment (toggle - if already upvoted, remove upvote). If downvoted, remove downvote and add upvote."""
-        comment = self.collection.find_one({'_id': ObjectId(comment_id)})
-        if not comment:
-            return False
-
-        user_object_id = ObjectId(user_id)
-        upvotes = comment.get('upvotes', [])
-        downvotes = comment.get('downvotes', [])
-
-        if user_object_id in upvotes:
-            # Remove upvote
-            result = self.collection.update_one(
-                {'_id': ObjectId(comment_id)},
-                {
-                    '$pull': {'upvotes': user_object_id},
-                    '$inc': {'upvote_count': -1, 'score': -1},
-                    '$set': {'updated_at': datetime.utcnow()}
-                }
-            )
-            return result.modified_count > 0
-        else:
-            # Remove from downvotes if present, then add upvote
-            update_op = {
-                '$addToSet': {'upvotes': user_object_id},
-                '$inc': {'upvote_count': 1, 'score': 1},
-                '$set': {'updated_at': datetime.utcnow()}
-            }
-
-            if user_object_id in downvotes:
-                update_op['$pull'] = {'downvotes': user_object_id}
-                if 'downvote_count' not in update_op['$inc']:
-                    update_op['$inc']['downvote_count'] = -1
-                # Score increases by 2: +1 for upvote, +1 for removing downvote
-                update_op['$inc']['score'] = 2
-
-            result = self.collection.update_one(
-                {'_id': ObjectId(comment_id)},
-                update_op
-            )
-            return result.modified_count > 0
+        return self.vote_comment(comment_id, user_id, 1) is not None
 
     def downvote_comment(self, comment_id: str, user_id: str) -> bool:
         """Downvote a comment (toggle - if already downvoted, remove downvote). If upvoted, remove upvote and add downvote."""
-        comment = self.collection.find_one({'_id': ObjectId(comment_id)})
-        if not comment:
-            return False
-
-        user_object_id = ObjectId(user_id)
-        upvotes = comment.get('upvotes', [])
-        downvotes = comment.get('downvotes', [])
-
-        if user_object_id in downvotes:
-            # Remove downvote
-            result = self.collection.update_one(
-                {'_id': ObjectId(comment_id)},
-                {
-                    '$pull': {'downvotes': user_object_id},
-                    '$inc': {'downvote_count': -1, 'score': 1},
-                    '$set': {'updated_at': datetime.utcnow()}
-                }
-            )
-            return result.modified_count > 0
-        else:
-            # Remove from upvotes if present, then add downvote
-            update_op = {
-                '$addToSet': {'downvotes': user_object_id},
-                '$inc': {'downvote_count': 1, 'score': -1},
-                '$set': {'updated_at': datetime.utcnow()}
-            }
-
-            if user_object_id in upvotes:
-                update_op['$pull'] = {'upvotes': user_object_id}
-                if 'upvote_count' not in update_op['$inc']:
-                    update_op['$inc']['upvote_count'] = -1
-                # Score decreases by 2: -1 for downvote, -1 for removing upvote
-                update_op['$inc']['score'] = -2
-
-            result = self.collection.update_one(
-                {'_id': ObjectId(comment_id)},
-                update_op
-            )
-            return result.modified_count > 0
+        return self.vote_comment(comment_id, user_id, -1) is not None
 
     def delete_comment(self, comment_id: str, deleted_by: str, mode: str = 'soft') -> bool:
         """Delete a comment (soft or hard delete)."""
@@ -483,6 +573,9 @@ class Comment:
         if mode == 'hard':
             # Hard delete - remove from collection
             result = self.collection.delete_one({'_id': ObjectId(comment_id)})
+            if result.deleted_count > 0:
+                from .vote import Vote
+                Vote(self.db).delete_votes_for_target('comment', comment_id)
         else:
             # Soft delete - set is_deleted flag
             result = self.collection.update_one(
@@ -0,0 +1,434 @@
+from datetime import datetime
+from typing import List, Dict, Iterable, Optional, Any, Tuple
+from bson import ObjectId
+from pymongo import UpdateOne
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Users whose summaries are known to be backfilled (the marker is never removed)
+_backfilled_users = set()
+
+
+class Conversation:
+    """Per-user DM inbox summary: one document per (user, partner).
+
+    Maintained by PrivateMessage on every send, read and delete so the inbox
+    is an indexed `find` on (user_id, last_message_at) instead of an
+    aggregation over the user's whole message history. Unread counters are
+    incremented on send and reset on read; deletes rebuild the affected
+    summaries from the (indexed) messages of that one pair, which makes them
+    idempotent and self-correcting.
+
+    Read state is a high-water mark: `last_read_message_id` is the newest
+    message the user has read in the conversation, and every message from the
+    partner with a larger `_id` is unread. Reading moves the mark forward
+    with one update instead of flipping `is_read` on each message (messages
+    read before the mark existed keep their stored `is_read`).
+
+    Each user's total across conversations is kept in `unread_counters`
+    ({_id: user_id, private_messages}) and adjusted with every change to a
+    summary's unread_count, so the unread badge is a single `_id` read. The
+    total is dropped whenever summaries are rebuilt and recomputed from them
+    on the next read; `recount_unread_totals` (a scheduler job) corrects
+    totals that missed a change made while they were being recomputed.
+    """
+
+    # Fields of the private message copied into the summary
+    LAST_MESSAGE_FIELDS = ('_id', 'from_user_id', 'to_user_id', 'content', 'message_type',
+                           'gif_url', 'is_read', 'created_at')
+
+    def __init__(self, db):
+        self.db = db
+        self.collection = db.conversations
+        self.totals = db.unread_counters
+
+    def record_message(self, message: Dict[str, Any]) -> None:
+        """Update both participants' summaries for a newly sent message."""
+        from_user_id = message['from_user_id']
+        to_user_id = message['to_user_id']
+        created_at = message['created_at']
+        now = datetime.utcnow()
+        last_message = self._last_message_snapshot(message)
+
+        def _ops(user_id, other_user_id, unread_inc):
+            key = {'user_id': user_id, 'other_user_id': other_user_id}
+            return [
+                UpdateOne(
+                    key,
+                    {
+                        '$max': {'last_message_at': created_at},
+                        '$inc': {'unread_count': unread_inc},
+                        '$set': {'updated_at': now},
+                        '$setOnInsert': {
+                            **key,
+                            'is_muted': False,
+                            'muted_until': None,
+                            'is_blocked': False,
+                            'created_at': now
+                        }
+                    },
+                    upsert=True
+                ),
+                # Only the newest message becomes last_message when two sends race
+                UpdateOne({**key, 'last_message_at': created_at}, {'$set': {'last_message': last_message}})
+            ]
+
+        if from_user_id == to_user_id:
+            ops = _ops(from_user_id, to_user_id, 1)
+        else:
+            ops = _ops(from_user_id, to_user_id, 0) + _ops(to_user_id, from_user_id, 1)
+
+        self.collection.bulk_write(ops, ordered=True)
+        self._adjust_total(to_user_id, 1)
+
+    def mark_read(self, user_id: str, other_user_id: str,
+                  message_id: Optional[str] = None) -> Optional[Dict[str, int]]:
+        """
+        Move the reader's high-water mark forward and recount what is left unread.
+
+        Only the messages after the new mark are counted, on the
+        (from_user_id, to_user_id, _id) index; reading up to the latest
+        message needs no count at all.
+
+        Args:
+            user_id: Reader
+            other_user_id: Conversation partner
+            message_id: Newest message that was read (None = the whole conversation)
+
+        Returns:
+            Dict with the conversation's unread_count and marked_count (messages
+            that became read), or None if the user has no such conversation
+        """
+        uid = ObjectId(user_id)
+        oid = ObjectId(other_user_id)
+        key = {'user_id': uid, 'other_user_id': oid}
+
+        # A send racing with the read changes unread_count between the read
+        # and the conditional write below; recount against the new value
+        rebuilt = False
+        for _ in range(3):
+            summary = self.collection.find_one(
+                key, {'unread_count': 1, 'last_read_message_id': 1, 'last_message._id': 1}
+            )
+            if not summary:
+                # Conversation from before the summaries: build it, then apply the mark
+                if rebuilt or not self.rebuild(user_id, other_user_id):
+                    return None
+                rebuilt = True
+                continue
+
+            previous = summary.get('unread_count', 0)
+            last_id = (summary.get('last_message') or {}).get('_id')
+            mark = ObjectId(message_id) if message_id else last_id
+            current_mark = summary.get('last_read_message_id')
+            if mark is None or (current_mark is not None and current_mark >= mark):
+                return {'unread_count': previous, 'marked_count': 0}
+
+            if last_id is None or mark >= last_id:
+                unread = 0
+            else:
+                unread = self._count_unread(uid, oid, mark)
+
+            update = {
+                '$max': {'last_read_message_id': mark},
+                '$set': {'unread_count': unread, 'last_read_at': datetime.utcnow()}
+            }
+            if last_id is not None and mark >= last_id:
+                update['$set']['last_message.is_read'] = True
+            result = self.collection.update_one({**key, 'unread_count': previous}, update)
+            if result.modified_count:
+                if unread != previous:
+                    self._adjust_total(uid, unread - previous)
+                return {'unread_count': unread, 'marked_count': max(previous - unread, 0)}
+
+        logger.warning(f"Read mark for {user_id}/{other_user_id} kept losing races; rebuilding")
+        summary = self.rebuild(user_id, other_user_id)
+        return {'unread_count': summary.get('unread_count', 0) if summary else 0, 'marked_count': 0}
+
+    def get_read_marks(self, user_id: str, other_user_id: str) -> Dict[str, ObjectId]:
+        """
+        High-water marks of both sides of a conversation.
+
+        Returns:
+            Dict of reader id (string) -> last_read_message_id, for sides that have one
+        """
+        uid = ObjectId(user_id)
+        oid = ObjectId(other_user_id)
+        summaries = self.collection.find(
+            {'$or': [{'user_id': uid, 'other_user_id': oid}, {'user_id': oid, 'other_user_id': uid}]},
+            {'user_id': 1, 'last_read_message_id': 1}
+        )
+        return {
+            str(summary['user_id']): summary['last_read_message_id']
+            for summary in summaries if summary.get('last_read_message_id')
+        }
+
+    def get_read_marks_by_pair(self, user_id: str, other_user_ids: Iterable[str]) -> Dict[Tuple[str, str], ObjectId]:
+        """
+        High-water marks of both sides of several of a user's conversations, in one query.
+
+        Returns:
+            Dict of (reader id, partner id) strings -> last_read_message_id, for sides that have one
+        """
+        uid = ObjectId(user_id)
+        oids = [ObjectId(other_user_id) for other_user_id in set(other_user_ids)]
+        if not oids:
+            return {}
+        summaries = self.collection.find(
+            {'$or': [{'user_id': uid, 'other_user_id': {'$in': oids}},
+                     {'user_id': {'$in': oids}, 'other_user_id': uid}]},
+            {'user_id': 1, 'other_user_id': 1, 'last_read_message_id': 1}
+        )
+        return {
+            (str(summary['user_id']), str(summary['other_user_id'])): summary['last_read_message_id']
+            for summary in summaries if summary.get('last_read_message_id')
+        }
+
+    def get_unread_count(self, user_id: str, other_user_id: str) -> int:
+        """Unread messages from other_user_id (0 without a conversation)."""
+        summary = self.collection.find_one(
+            {'user_id': ObjectId(user_id), 'other_user_id': ObjectId(other_user_id)},
+            {'unread_count': 1}
+        )
+        return summary.get('unread_count', 0) if summary else 0
+
+    def get_unread_total(self, user_id: str) -> int:
+        """
+        Total unread private messages of a user.
+
+        Reads the maintained counter; when it is missing (first use, or after a
+        rebuild) it is recomputed from the user's summaries and stored.
+        """
+        uid = ObjectId(user_id)
+        counter = self.totals.find_one({'_id': uid})
+        if counter:
+            return max(counter.get('private_messages', 0), 0)
+
+        # Inbox predating the summaries: build it before summing it
+        self.ensure_backfilled(user_id)
+
+        totals = list(self.collection.aggregate([
+            {'$match': {'user_id': uid}},
+            {'$group': {'_id': None, 'unread': {'$sum': '$unread_count'}}}
+        ]))
+        total = totals[0]['unread'] if totals else 0
+        self.totals.update_one(
+            {'_id': uid},
+            {'$setOnInsert': {'private_messages': total, 'updated_at': datetime.utcnow()}},
+            upsert=True
+        )
+        return total
+
+    def recount_unread_totals(self, batch_size: int = 500) -> int:
+        """
+        Correct stored unread totals that differ from the sum of the user's summaries.
+
+        A send that lands while a missing total is being recomputed is lost
+        from it (the counter did not exist yet to take the increment); this
+        scheduler job puts such totals right. Totals that change while it
+        runs are left for the next run.
+
+        Returns:
+            Number of totals corrected
+        """
+        expected = {
+            doc['_id']: doc['unread'] for doc in self.collection.aggregate([
+                {'$match': {'unread_count': {'$gt': 0}}},
+                {'$group': {'_id': '$user_id', 'unread': {'$sum': '$unread_count'}}}
+            ])
+        }
+        corrected = 0
+        ops = []
+        now = datetime.utcnow()
+        for counter in self.totals.find({}, {'private_messages': 1}):
+            stored = counter.get('private_messages', 0)
+            total = expected.get(counter['_id'], 0)
+            if stored != total:
+                ops.append(UpdateOne({'_id': counter['_id'], 'private_messages': stored},
+                                     {'$set': {'private_messages': total, 'updated_at': now}}))
+            if len(ops) >= batch_size:
+                corrected += self.totals.bulk_write(ops, ordered=False).modified_count
+                ops = []
+        if ops:
+            corrected += self.totals.bulk_write(ops, ordered=False).modified_count
+        return corrected
+
+    def _count_unread(self, user_id: ObjectId, other_user_id: ObjectId,
+                      mark: Optional[ObjectId]) -> int:
+        """Messages from other_user_id after the mark that were not read before marks existed."""
+        query = {
+            'from_user_id': other_user_id, 'to_user_id': user_id, 'is_read': False,
+            'deleted_for_user_ids': {'$ne': user_id}
+        }
+        if mark is not None:
+            query['_id'] = {'$gt': mark}
+        return self.db.private_messages.count_documents(query)
+
+    def _adjust_total(self, user_id, delta: int) -> None:
+        """Apply a change to a user's unread total (no-op until the counter has been computed)."""
+        self.totals.update_one(
+            {'_id': ObjectId(user_id)},
+            {'$inc': {'private_messages': delta}, '$set': {'updated_at': datetime.utcnow()}}
+        )
+
+    def _reset_totals(self, *user_ids) -> None:
+        """Drop unread totals so they are recomputed from the summaries."""
+        self.totals.delete_many({'_id': {'$in': [ObjectId(user_id) for user_id in user_ids]}})
+
+    def set_muted(self, user_id: str, other_user_id: str, muted: bool,
+                  muted_until: Optional[datetime] = None) -> None:
+        """Mirror the notification mute setting onto the summary (no-op without a conversation)."""
+        self.collection.update_one(
+            {'user_id': ObjectId(user_id), 'other_user_id': ObjectId(other_user_id)},
+            {'$set': {'is_muted': muted, 'muted_until': muted_until if muted else None}}
+        )
+
+    def set_blocked(self, user_id: str, other_user_id: str, blocked: bool) -> None:
+        """Mirror the user's block list onto the summary (no-op without a conversation)."""
+        self.collection.update_one(
+            {'user_id': ObjectId(user_id), 'other_user_id': ObjectId(other_user_id)},
+            {'$set': {'is_blocked': blocked}}
+        )
+
+    def delete_pair(self, user_id: str, other_user_id: str) -> None:
+        """Remove both summaries of a conversation whose messages were all deleted."""
+        self.collection.delete_many({
+            '$or': [
+                {'user_id': ObjectId(user_id), 'other_user_id': ObjectId(other_user_id)},
+                {'user_id': ObjectId(other_user_id), 'other_user_id': ObjectId(user_id)}
+            ]
+        })
+        self._reset_totals(user_id, other_user_id)
+
+    def rebuild_pair(self, user_id: str, other_user_id: str) -> None:
+        """Recompute both participants' summaries from the pair's messages."""
+        self.rebuild(user_id, other_user_id)
+        if str(user_id) != str(other_user_id):
+            self.rebuild(other_user_id, user_id)
+
+    def rebuild(self, user_id: str, other_user_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Recompute one user's summary of a conversation from its messages.
+
+        Messages the user deleted for themselves are ignored. The summary is
+        removed when nothing visible is left.
+
+        Returns:
+            The stored summary, or None if it was removed
+        """
+        uid = ObjectId(user_id)
+        oid = ObjectId(other_user_id)
+        if uid == oid:
+            pair_query = {'from_user_id': uid, 'to_user_id': uid}
+        else:
+            pair_query = {
+                '$or': [
+                    {'from_user_id': uid, 'to_user_id': oid},
+                    {'from_user_id': oid, 'to_user_id': uid}
+                ]
+            }
+        visible_query = {**pair_query, 'deleted_for_user_ids': {'$ne': uid}}
+
+        last = self.db.private_messages.find_one(visible_query, sort=[('created_at', -1)])
+        key = {'user_id': uid, 'other_user_id': oid}
+        self._reset_totals(uid)
+        existing = self.collection.find_one(key, {'last_read_message_id': 1}) or {}
+        mark = existing.get('last_read_message_id')
+        if not last:
+            if mark is not None:
+                # The mark goes with the summary: keep it on the messages it covers
+                self.db.private_messages.update_many(
+                    {'from_user_id': oid, 'to_user_id': uid, '_id': {'$lte': mark}, 'is_read': False},
+                    {'$set': {'is_read': True}}
+                )
+            self.collection.delete_one(key)
+            return None
+
+        unread_count = self._count_unread(uid, oid, mark)
+
+        settings = self._flags(uid, oid)
+        now = datetime.utcnow()
+        last_message = self._last_message_snapshot(last)
+        if mark is not None and last['to_user_id'] == uid and last['_id'] <= mark:
+            last_message['is_read'] = True
+        summary = {
+            'last_message': last_message,
+            'last_message_at': last['created_at'],
+            'unread_count': unread_count,
+            'updated_at': now,
+            **settings
+        }
+        self.collection.update_one(key, {'$set': summary, '$setOnInsert': {**key, 'created_at': now}}, upsert=True)
+        return {**key, **summary}
+
+    def get_conversations(self, user_id: str, limit: int = 20) -> List[Dict[str, Any]]:
+        """Get a user's most recent conversation summaries (raw documents)."""
+        return list(
+            self.collection.find({'user_id': ObjectId(user_id)})
+            .sort([('last_message_at', -1)])
+            .limit(limit)
+        )
+
+    def ensure_backfilled(self, user_id: str) -> bool:
+        """
+        Build a user's summaries from their message history once.
+
+        Completion is marked on the user (`conversations_backfilled_at`), so
+        conversations older than the summaries show up even when a newer
+        message already created a summary.
+
+        Returns:
+            True if the summaries were built now
+        """
+        user_id = str(user_id)
+        if user_id in _backfilled_users:
+            return False
+        user = self.db.users.find_one({'_id': ObjectId(user_id)}, {'conversations_backfilled_at': 1})
+        if user and user.get('conversations_backfilled_at'):
+            _backfilled_users.add(user_id)
+            return False
+        self.rebuild_for_user(user_id)
+        _backfilled_users.add(user_id)
+        return True
+
+    def rebuild_for_user(self, user_id: str) -> int:
+        """
+        Build all of a user's summaries from their message history.
+
+        Used by the backfill script and once per user whose inbox predates
+        the summary collection (ensure_backfilled); marks the user as
+        backfilled.
+
+        Returns:
+            Number of summaries written
+        """
+        uid = ObjectId(user_id)
+        partners = self.db.private_messages.aggregate([
+            {'$match': {'$or': [{'from_user_id': uid}, {'to_user_id': uid}]}},
+            {'$group': {
+                '_id': {'$cond': [{'$eq': ['$from_user_id', uid]}, '$to_user_id', '$from_user_id']}
+            }}
+        ])
+        written = 0
+        for partner in partners:
+            if partner.get('_id') and self.rebuild(str(uid), str(partner['_id'])):
+                written += 1
+        self.db.users.update_one({'_id': uid}, {'$set': {'conversations_backfilled_at': datetime.utcnow()}})
+        return written
+
+    def _flags(self, user_id: ObjectId, other_user_id: ObjectId) -> Dict[str, Any]:
+        """Current mute/block flags for one side of a conversation."""
+        mute = self.db.notification_settings.find_one(
+            {'user_id': user_id, 'other_user_id': other_user_id, 'type': 'private_message'},
+            {'muted': 1, 'muted_until': 1}
+        ) or {}
+        blocked = self.db.users.find_one({'_id': user_id, 'blocked_users': other_user_id}, {'_id': 1})
+        return {
+            'is_muted': bool(mute.get('muted')),
+            'muted_until': mute.get('muted_until') if mute.get('muted') else None,
+            'is_blocked': blocked is not None
+        }
+
+    def _last_message_snapshot(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        return {field: message.get(field) for field in self.LAST_MESSAGE_FIELDS}
@@ -2,6 +2,7 @@ from datetime import datetime
 from typing import List, Dict, Optional, Any
 from bson import ObjectId
 from pymongo.errors import OperationFailure
+from utils.singletons import get_model
 
 
 class Friend:
@@ -208,7 +209,7 @@ class Friend:
 
         friends = []
         from .user import User
-        user_model = User(self.db)
+        user_model = get_model(User, self.db)
 
         for friendship in friendships:
             # Determine the friend's ID
@@ -267,7 +268,7 @@ class Friend:
             sent = list(self.collection.find(sent_query).sort([('_id', -1)]))
 
         from .user import User
-        user_model = User(self.db)
+        user_model = get_model(User, self.db)
 
         received_list = []
         for req in received:
@@ -1,6 +1,7 @@
 from datetime import datetime
 from typing import List, Dict, Optional, Any
 from bson import ObjectId
+from utils.singletons import get_model
 
 
 class FriendRequest:
@@ -146,7 +147,7 @@ class FriendRequest:
     def get_pending_requests(self, user_id: str) -> List[Dict[str, Any]]:
         """Get pending friend requests received by user."""
         from .user import User
-        user_model = User(self.db)
+        user_model = get_model(User, self.db)
 
         requests = list(self.collection.find({
             'to_user_id': ObjectId(user_id),
@@ -172,7 +173,7 @@ class FriendRequest:
     def get_sent_requests(self, user_id: str) -> List[Dict[str, Any]]:
         """Get pending friend requests sent by user."""
         from .user import User
-        user_model = User(self.db)
+        user_model = get_model(User, self.db)
 
         requests = list(self.collection.find({
             'from_user_id': ObjectId(user_id),
@@ -198,7 +199,7 @@ class FriendRequest:
     def get_friends(self, user_id: str) -> List[Dict[str, Any]]:
         """Get list of user's friends."""
         from .user import User
-        user_model = User(self.db)
+        user_model = get_model(User, self.db)
 
         friendships = list(self.friends_collection.find({
             'user_id': ObjectId(user_id)
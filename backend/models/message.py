@@ -3,6 +3,12 @@ from typing import List, Dict, Optional, Any
 from bson import ObjectId
 import re
 
+from utils.structured_logging import get_event_logger
+from utils.singletons import get_model
+from utils.id_paging import fetch_id_page
+from utils.room_buffer import unbuffer_message
+
+db_events = get_event_logger('db.message')
 
 class Message:
     """Message model for chat message management."""
@@ -64,21 +70,10 @@ class Message:
         if comment_id:
             message_data['comment_id'] = ObjectId(comment_id)
 
-        import logging
-        logger = logging.getLogger(__name__)
-        logger.info(f"[DB] Inserting message into database: user_id={user_id}, topic_id={topic_id}, chat_room_id={chat_room_id}")
-        
         result = self.collection.insert_one(message_data)
-        
         inserted_id = str(result.inserted_id)
-        logger.info(f"[DB] Message inserted successfully: _id={inserted_id}")
-        
-        # Verify insertion
-        verify_message = self.collection.find_one({'_id': result.inserted_id})
-        if verify_message:
-            logger.info(f"[DB] Message verification successful: found message with content length {len(verify_message.get('content', ''))}")
-        else:
-            logger.error(f"[DB] Message verification FAILED: message not found after insertion!")
+        db_events.debug('message_inserted', message_id=inserted_id, user_id=user_id,
+                        topic_id=topic_id, chat_room_id=chat_room_id)
 
         # Update last activity based on message type
         if topic_id:
@@ -106,34 +101,41 @@ class Message:
         return inserted_id
 
     def get_messages(self, topic_id: str, limit: int = 50, before_message_id: Optional[str] = None,
-                    user_id: Optional[str] = None) -> List[Dict[str, Any]]:
+                    user_id: Optional[str] = None, after_message_id: Optional[str] = None) -> List[Dict[str, Any]]:
         """Get messages for a topic with pagination."""
+        return self.get_message_page(topic_id, limit, before_message_id, user_id, after_message_id)['messages']
+
+    def get_message_page(self, topic_id: str, limit: int = 50, before_message_id: Optional[str] = None,
+                         user_id: Optional[str] = None, after_message_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Get one page of a topic's messages, oldest first.
+
+        Args:
+            topic_id: Topic ID
+            limit: Page size
+            before_message_id: Page back from this message (see utils/id_paging)
+            user_id: Viewer ID for permissions
+            after_message_id: Page forward from this message
+
+        Returns:
+            Dict with messages and has_more
+        """
         query = {
             'topic_id': ObjectId(topic_id),
             'is_deleted': False
         }
 
-        # Pagination: get messages before a specific message
-        if before_message_id:
-            try:
-                before_message = self.collection.find_one({'_id': ObjectId(before_message_id)})
-                if before_message:
-                    query['created_at'] = {'$lt': before_message['created_at']}
-            except:
-                pass
-
         # If user is banned from topic, return empty list
         from .topic import Topic
         topic_model = Topic(self.db)
         if user_id and topic_model.is_user_banned_from_topic(topic_id, user_id):
-            return []
+            return {'messages': [], 'has_more': False}
 
-        messages = list(self.collection.find(query)
-                       .sort([('created_at', -1)])
-                       .limit(limit))
+        # One indexed range read on (topic_id, is_deleted, _id)
+        messages, has_more = fetch_id_page(self.collection, query, limit,
+                                           before_message_id=before_message_id,
+                                           after_message_id=after_message_id)
 
-        # Reverse to get chronological order and convert ObjectIds
-        messages.reverse()
         for message in messages:
             message['_id'] = str(message['_id'])
             message['id'] = str(message['_id'])  # Also add 'id' field for frontend compatibility
@@ -157,7 +159,7 @@ class Message:
                 message['is_moderator'] = False
             else:
                 from .user import User
-                user_model = User(self.db)
+                user_model = get_model(User, self.db)
                 user = user_model.get_user_by_id(message['user_id'])
                 if user:
                     message['display_name'] = user['username']
@@ -200,7 +202,7 @@ class Message:
                 message['can_delete'] = False
                 message['can_report'] = False
 
-        return messages
+        return {'messages': messages, 'has_more': has_more}
 
     def get_message_by_id(self, message_id: str) -> Optional[Dict[str, Any]]:
         """Get a specific message by ID."""
@@ -251,7 +253,7 @@ class Message:
                 message['is_moderator'] = False
             else:
                 from .user import User
-                user_model = User(self.db)
+                user_model = get_model(User, self.db)
                 user = user_model.get_user_by_id(message['user_id'])
                 if user:
                     message['display_name'] = user['username']
@@ -309,7 +311,9 @@ class Message:
                     chat_room_model.decrement_message_count(str(message['chat_room_id']))
                 except:
                     pass
-            
+
+            if result.deleted_count > 0:
+                self._unbuffer(message)
             return result.deleted_count > 0
         else:
             # Soft delete - set is_deleted flag and pending status
@@ -331,8 +335,19 @@ class Message:
                 {'$set': update_data}
             )
 
+            if result.modified_count > 0:
+                self._unbuffer(message)
             return result.modified_count > 0
 
+    @staticmethod
+    def _unbuffer(message: Dict[str, Any]) -> None:
+        """Drop a deleted message from its room's sync_room buffer, whichever path deleted it."""
+        message_id = str(message['_id'])
+        if message.get('topic_id'):
+            unbuffer_message(f"topic_{message['topic_id']}", message_id)
+        if message.get('chat_room_id'):
+            unbuffer_message(f"chat_room_{message['chat_room_id']}", message_id)
+
     def _can_delete_message(self, message: Dict[str, Any], user_id: str) -> bool:
         """Check if user can delete a message. Supports both topic messages and chat room messages."""
         # Users can always delete their own messages
@@ -470,7 +485,7 @@ class Message:
         reports = []
         for report in message.get('reports', []):
             from .user import User
-            user_model = User(self.db)
+            user_model = get_model(User, self.db)
             reporter = user_model.get_user_by_id(str(report['reported_by']))
             if reporter:
                 reports.append({
@@ -510,7 +525,7 @@ class Message:
                 message['is_anonymous'] = True
             else:
                 from .user import User
-                user_model = User(self.db)
+                user_model = get_model(User, self.db)
                 user = user_model.get_user_by_id(message['user_id'])
                 if user:
                     message['display_name'] = user['username']
@@ -576,7 +591,7 @@ class Message:
             
             # Get user info
             from .user import User
-            user_model = User(self.db)
+            user_model = get_model(User, self.db)
             user = user_model.get_user_by_id(message['user_id'])
             if user:
                 message['username'] = user.get('username', 'Unknown')
@@ -593,14 +608,20 @@ class Message:
     
     def permanently_delete_message(self, message_id: str) -> bool:
         """Permanently delete a message from the database."""
-        result = self.collection.delete_one({'_id': ObjectId(message_id), 'is_deleted': True})
-        return result.deleted_count > 0
+        message = self.collection.find_one_and_delete(
+            {'_id': ObjectId(message_id), 'is_deleted': True},
+            {'topic_id': 1, 'chat_room_id': 1}
+        )
+        if not message:
+            return False
+        self._unbuffer(message)
+        return True
     
-    def permanently_delete_expired_messages(self) -> int:
+    def permanently_delete_expired_messages(self, batch_size: int = 500) -> int:
         """Permanently delete messages that have passed their permanent_delete_at date."""
+        from utils.helpers import delete_in_batches
         now = datetime.utcnow()
-        result = self.collection.delete_many({
+        return delete_in_batches(self.collection, {
             'is_deleted': True,
             'permanent_delete_at': {'$lt': now}
-        })
-        return result.deleted_count
\ No newline at end of file
+        }, batch_size=batch_size)
\ No newline at end of file
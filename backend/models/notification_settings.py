@@ -441,6 +441,8 @@ class NotificationSettings:
                 },
                 upsert=True
             )
+            from .conversation import Conversation
+            Conversation(self.db).set_muted(user_id, other_user_id, True, mute_until)
             return True
         except Exception as e:
             print(f"Error muting private message: {str(e)}")
@@ -463,6 +465,8 @@ class NotificationSettings:
                     }
                 }
             )
+            from .conversation import Conversation
+            Conversation(self.db).set_muted(user_id, other_user_id, False)
             return True
         except Exception as e:
             print(f"Error unmuting private message: {str(e)}")
@@ -4,11 +4,16 @@ from bson import ObjectId
 import re
 from flask import current_app
 from utils.cache_decorator import cache_result
+from utils.hot_ranking import compute_hot_score, hot_score_increment, HOT_COMMENT_WEIGHT
+from utils.singletons import get_model
 
 
 class Post:
     """Post model for managing posts within topics (Reddit-style)."""
 
+    # Legacy voter arrays are never sent to the app; votes live in the votes collection
+    LIST_PROJECTION = {'upvotes': 0, 'downvotes': 0}
+
     def __init__(self, db):
         self.db = db
         self.collection = db.posts
@@ -20,6 +25,7 @@ class Post:
         """Create a new post in a topic."""
         # Validate and filter content
         filtered_content = self._filter_content(content)
+        now = datetime.utcnow()
 
         post_data = {
             'topic_id': ObjectId(topic_id),  # Posts belong directly to Topics
@@ -29,18 +35,17 @@ class Post:
             'anonymous_identity': anonymous_identity,
             'gif_url': gif_url,
             'tags': tags or [],
-            'upvotes': [],  # Array of user_ids who upvoted
-            'downvotes': [],  # Array of user_ids who downvoted
-            'upvote_count': 0,
+            'upvote_count': 0,  # Individual votes live in the votes collection
             'downvote_count': 0,
             'score': 0,  # upvote_count - downvote_count
             'comment_count': 0,
+            'hot_score': compute_hot_score(0, 0, now, now),  # Time-decayed rank, see utils/hot_ranking
             'is_deleted': False,
             'deleted_by': None,
             'deleted_at': None,
             'reports': [],
-            'created_at': datetime.utcnow(),
-            'updated_at': datetime.utcnow()
+            'created_at': now,
+            'updated_at': now
         }
 
         result = self.collection.insert_one(post_data)
@@ -84,19 +89,13 @@ class Post:
     @cache_result(ttl=300, key_prefix='post', should_jsonify=False)
     def get_post_by_id(self, post_id: str, user_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
         """Get a specific post by ID."""
-        post = self.collection.find_one({'_id': ObjectId(post_id)})
+        post = self.collection.find_one({'_id': ObjectId(post_id)}, self.LIST_PROJECTION)
         if post:
             post['_id'] = str(post['_id'])
             post['id'] = str(post['_id'])
             post['topic_id'] = str(post['topic_id'])
             post['user_id'] = str(post['user_id'])
             
-            # Convert upvotes and downvotes list ObjectIds to strings
-            if 'upvotes' in post and post['upvotes']:
-                post['upvotes'] = [str(u) for u in post['upvotes']]
-            if 'downvotes' in post and post['downvotes']:
-                post['downvotes'] = [str(u) for u in post['downvotes']]
-            
             # Calculate score if not present
             if 'score' not in post:
                 up_count = post.get('upvote_count', 0)
@@ -105,8 +104,10 @@ class Post:
             
             # Check if user has upvoted, downvoted, or followed
             if user_id:
-                post['user_has_upvoted'] = user_id in post.get('upvotes', [])
-                post['user_has_downvoted'] = user_id in post.get('downvotes', [])
+                from .vote import Vote
+                user_vote = Vote(self.db).get_user_vote('post', post_id, user_id)
+                post['user_has_upvoted'] = user_vote == 1
+                post['user_has_downvoted'] = user_vote == -1
 
                 # Check if followed
                 from .notification_settings import NotificationSettings
@@ -134,7 +135,7 @@ class Post:
                 post['is_moderator'] = False
             else:
                 from .user import User
-                user_model = User(self.db)
+                user_model = get_model(User, self.db)
                 user = user_model.get_user_by_id(post['user_id'])
                 if user:
                     post['display_name'] = user['username']
@@ -175,8 +176,8 @@ class Post:
 
         # Determine sort order
         if sort_by == 'hot':
-            # Hot posts: combination of score and recency
-            sort_key = [('score', -1), ('created_at', -1)]
+            # Hot posts: precomputed time-decayed score (indexed on topic_id, hot_score)
+            sort_key = [('hot_score', -1), ('created_at', -1)]
         elif sort_by == 'top':
             sort_key = [('score', -1)]
         elif sort_by == 'old':
@@ -184,18 +185,21 @@ class Post:
         else:  # default: 'new'
             sort_key = [('created_at', -1)]
 
-        posts = list(self.collection.find(query)
+        posts = list(self.collection.find(query, self.LIST_PROJECTION)
                     .sort(sort_key)
                     .limit(limit)
                     .skip(offset))
 
-        # Bulk fetch followed posts if user_id is provided
+        # Bulk fetch followed posts and the user's votes if user_id is provided
         followed_post_ids = set()
+        user_votes = {}
         if user_id:
             from .notification_settings import NotificationSettings
+            from .vote import Vote
             notif_settings = NotificationSettings(self.db)
             followed_posts = notif_settings.get_followed_posts(user_id)
             followed_post_ids = {p['post_id'] for p in followed_posts}
+            user_votes = Vote(self.db).get_user_votes('post', [p['_id'] for p in posts], user_id)
 
         # Collect user IDs for batch fetching
         user_ids = set()
@@ -232,12 +236,6 @@ class Post:
             post['topic_id'] = str(post['topic_id'])
             post['user_id'] = str(post['user_id'])
             
-            # Convert upvotes and downvotes list ObjectIds to strings
-            if 'upvotes' in post and post['upvotes']:
-                post['upvotes'] = [str(u) for u in post['upvotes']]
-            if 'downvotes' in post and post['downvotes']:
-                post['downvotes'] = [str(u) for u in post['downvotes']]
-            
             # Calculate score if not present
             if 'score' not in post:
                 up_count = post.get('upvote_count', 0)
@@ -246,8 +244,9 @@ class Post:
             
             # Check if user has upvoted or downvoted
             if user_id:
-                post['user_has_upvoted'] = user_id in post.get('upvotes', [])
-                post['user_has_downvoted'] = user_id in post.get('downvotes', [])
+                user_vote = user_votes.get(post['id'], 0)
+                post['user_has_upvoted'] = user_vote == 1
+                post['user_has_downvoted'] = user_vote == -1
                 # Check if followed
                 post['is_followed'] = post['id'] in followed_post_ids
             else:
@@ -304,28 +303,41 @@ class Post:
 
         return posts
 
+    def get_hot_posts(self, limit: int = 20, offset: int = 0,
+                      user_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Get the hottest posts across all topics."""
+        return self.get_recent_posts(limit=limit, offset=offset, user_id=user_id, sort_by='hot')
+
     def get_recent_posts(self, limit: int = 20, offset: int = 0,
-                        user_id: Optional[str] = None) -> List[Dict[str, Any]]:
+                        user_id: Optional[str] = None,
+                        sort_by: str = 'new') -> List[Dict[str, Any]]:
         """Get recent posts from all topics for the right sidebar."""
         query = {
             'is_deleted': False
         }
 
-        # Sort by most recent
-        sort_key = [('created_at', -1)]
+        if sort_by == 'hot':
+            # Global hot feed: indexed range scan on (is_deleted, hot_score)
+            sort_key = [('hot_score', -1), ('created_at', -1)]
+        else:
+            # Sort by most recent
+            sort_key = [('created_at', -1)]
 
-        posts = list(self.collection.find(query)
+        posts = list(self.collection.find(query, self.LIST_PROJECTION)
                     .sort(sort_key)
                     .limit(limit)
                     .skip(offset))
 
-        # Bulk fetch followed posts if user_id is provided
+        # Bulk fetch followed posts and the user's votes if user_id is provided
         followed_post_ids = set()
+        user_votes = {}
         if user_id:
             from .notification_settings import NotificationSettings
+            from .vote import Vote
             notif_settings = NotificationSettings(self.db)
             followed_posts = notif_settings.get_followed_posts(user_id)
             followed_post_ids = {p['post_id'] for p in followed_posts}
+            user_votes = Vote(self.db).get_user_votes('post', [p['_id'] for p in posts], user_id)
 
         # Collect user IDs & Topic IDs for batch fetching
         user_ids = set()
@@ -381,12 +393,6 @@ class Post:
             post['topic_id'] = str(post['topic_id'])
             post['user_id'] = str(post['user_id'])
             
-            # Convert upvotes and downvotes list ObjectIds to strings
-            if 'upvotes' in post and post['upvotes']:
-                post['upvotes'] = [str(u) for u in post['upvotes']]
-            if 'downvotes' in post and post['downvotes']:
-                post['downvotes'] = [str(u) for u in post['downvotes']]
-            
             # Calculate score if not present
             if 'score' not in post:
                 up_count = post.get('upvote_count', 0)
@@ -395,8 +401,9 @@ class Post:
             
             # Check if user has upvoted or downvoted
             if user_id:
-                post['user_has_upvoted'] = user_id in post.get('upvotes', [])
-                post['user_has_downvoted'] = user_id in post.get('downvotes', [])
+                user_vote = user_votes.get(post['id'], 0)
+                post['user_has_upvoted'] = user_vote == 1
+                post['user_has_downvoted'] = user_vote == -1
                 # Check if followed
                 post['is_followed'] = post['id'] in followed_post_ids
             else:
@@ -462,99 +469,64 @@ class Post:
 
         return processed_posts
 
+    def vote_post(self, post_id: str, user_id: str, direction: int) -> Optional[Dict[str, Any]]:
+        """
+        Toggle a user's vote on a post in O(1), independent of the post's vote count.
+
+        When the vote buffer is enabled the counter increments are written behind
+        in micro-batches (see utils/vote_buffer); otherwise they are applied inline.
+
+        Args:
+            post_id: Post ID
+            user_id: Voter ID
+            direction: 1 for upvote, -1 for downvote
+
+        Returns:
+            The user's resulting vote (plus counters when applied inline), or None if the post doesn't exist
+        """
+        from .vote import Vote
+        from utils.vote_buffer import get_vote_buffer, publish_score_updates
+
+        vote_model = Vote(self.db)
+        vote_buffer = get_vote_buffer()
+
+        if vote_buffer:
+            if not self.collection.find_one({'_id': ObjectId(post_id)}, {'_id': 1}):
+                return None
+            transition = vote_model.record_vote('post', post_id, user_id, direction)
+            if not transition:
+                return None
+            increments = {field: transition[field] for field in Vote.COUNTER_DELTA_FIELDS}
+            increments['hot_score'] = hot_score_increment(post_id, transition['score'])
+            vote_buffer.add('post', post_id, increments)
+            user_vote = transition['user_vote']
+            return {
+                'user_vote': user_vote,
+                'user_has_upvoted': user_vote == 1,
+                'user_has_downvoted': user_vote == -1,
+                'pending': True
+            }
+
+        result = vote_model.cast_vote(
+            'post', post_id, user_id, direction,
+            extra_inc=lambda score_delta: {'hot_score': hot_score_increment(post_id, score_delta)}
+        )
+        if result:
+            try:
+                from extensions import socketio
+                publish_score_updates(self.db, socketio, current_app.config.get('CACHE_INVALIDATOR'),
+                                      {'post': {post_id}})
+            except Exception:
+                pass
+        return result
+
     def upvote_post(self, post_id: str, user_id: str) -> bool:
         """Upvote a post (toggle - if already upvoted, remove upvote). If downvoted, remove downvote and add upvote."""
-        post = self.collection.find_one({'_id': ObjectId(post_id)})
-        if not post:
-            return False
-
-        user_object_id = ObjectId(user_id)
-        upvotes = post.get('upvotes', [])
-        downvotes = post.get('downvotes', [])
-        
-        if user_object_id in upvotes:
-            # Remove upvote
-            result = self.collection.update_one(
-                {'_id': ObjectId(post_id)},
-                {
-                    '$pull': {'upvotes': user_object_id},
-                    '$inc': {'upvote_count': -1, 'score': -1},
-                    '$set': {'updated_at': datetime.utcnow()}
-                }
-            )
-            if result.modified_count > 0:
-                try:
-                    cache_invalidator = current_app.config.get('CACHE_INVALIDATOR')
-                    if cache_invalidator:
-                        cache_invalidator.invalidate_entity('post', post_id)
-                except Exception:
-                    pass
-            return result.modified_count > 0
-        else:
-            # Remove from downvotes if present, then add upvote
-            update_op = {
-                '$addToSet': {'upvotes': user_object_id},
-                '$inc': {'upvote_count': 1, 'score': 1},
-                '$set': {'updated_at': datetime.utcnow()}
-            }
-            
-            if user_object_id in downvotes:
-                update_op['$pull'] = {'downvotes': user_object_id}
-                update_op['$inc']['downvote_count'] = -1
-                update_op['$inc']['score'] = 2  # +1 for upvote, +1 for removing downvote
-            
-            result = self.collection.update_one(
-                {'_id': ObjectId(post_id)},
-                update_op
-            )
-            return result.modified_count > 0
+        return self.vote_post(post_id, user_id, 1) is not None
 
     def downvote_post(self, post_id: str, user_id: str) -> bool:
         """Downvote a post (toggle - if already downvoted, remove downvote). If upvoted, remove upvote and add downvote."""
-        post = self.collection.find_one({'_id': ObjectId(post_id)})
-        if not post:
-            return False
-
-        user_object_id = ObjectId(user_id)
-        upvotes = post.get('upvotes', [])
-        downvotes = post.get('downvotes', [])
-        
-        if user_object_id in downvotes:
-            # Remove downvote
-            result = self.collection.update_one(
-                {'_id': ObjectId(post_id)},
-                {
-                    '$pull': {'downvotes': user_object_id},
-                    '$inc': {'downvote_count': -1, 'score': 1},
-                    '$set': {'updated_at': datetime.utcnow()}
-                }
-            )
-            if result.modified_count > 0:
-                try:
-                    cache_invalidator = current_app.config.get('CACHE_INVALIDATOR')
-                    if cache_invalidator:
-                        cache_invalidator.invalidate_entity('post', post_id)
-                except Exception:
-                    pass
-            return result.modified_count > 0
-        else:
-            # Remove from upvotes if present, then add downvote
-            update_op = {
-                '$addToSet': {'downvotes': user_object_id},
-                '$inc': {'downvote_count': 1, 'score': -1},
-                '$set': {'updated_at': datetime.utcnow()}
-            }
-            
-            if user_object_id in upvotes:
-                update_op['$pull'] = {'upvotes': user_object_id}
-                update_op['$inc']['upvote_count'] = -1
-                update_op['$inc']['score'] = -2  # -1 for downvote, -1 for removing upvote
-            
-            result = self.collection.update_one(
-                {'_id': ObjectId(post_id)},
-                update_op
-            )
-            return result.modified_count > 0
+        return self.vote_post(post_id, user_id, -1) is not None
 
     def delete_post(self, post_id: str, deleted_by: str, mode: str = 'soft') -> bool:
         """Delete a post (soft or hard delete)."""
@@ -581,6 +553,9 @@ class Post:
         if mode == 'hard':
             # Hard delete - remove from collection
             result = self.collection.delete_one({'_id': ObjectId(post_id)})
+            if result.deleted_count > 0:
+                from .vote import Vote
+                Vote(self.db).delete_votes_for_target('post', post_id)
         else:
             # Soft delete - set is_deleted flag and pending status if owner
             from datetime import timedelta
@@ -638,7 +613,7 @@ class Post:
         posts = list(self.collection.find({
             'is_deleted': True,
             'deletion_status': 'pending'
-        }).sort([('deleted_at', -1)]))
+        }, self.LIST_PROJECTION).sort([('deleted_at', -1)]))
         
         for post in posts:
             # Convert all ObjectIds to strings
@@ -658,12 +633,6 @@ class Post:
             else:
                 post['deleted_by'] = ''
             
-            # Convert upvotes and downvotes lists
-            if 'upvotes' in post and post['upvotes']:
-                post['upvotes'] = [str(u) if isinstance(u, ObjectId) else u for u in post['upvotes']]
-            if 'downvotes' in post and post['downvotes']:
-                post['downvotes'] = [str(d) if isinstance(d, ObjectId) else d for d in post['downvotes']]
-            
             # Convert datetime fields to ISO strings
             if 'created_at' in post and isinstance(post['created_at'], datetime):
                 post['created_at'] = post['created_at'].isoformat()
@@ -676,7 +645,7 @@ class Post:
             
             # Get owner details
             from .user import User
-            user_model = User(self.db)
+            user_model = get_model(User, self.db)
             owner = user_model.get_user_by_id(post['user_id'])
             if owner:
                 post['owner'] = {
@@ -765,14 +734,20 @@ class Post:
         """Increment the comment count for a post."""
         self.collection.update_one(
             {'_id': ObjectId(post_id)},
-            {'$inc': {'comment_count': 1}, '$set': {'updated_at': datetime.utcnow()}}
+            {
+                '$inc': {'comment_count': 1, 'hot_score': hot_score_increment(post_id, HOT_COMMENT_WEIGHT)},
+                '$set': {'updated_at': datetime.utcnow()}
+            }
         )
 
     def decrement_comment_count(self, post_id: str) -> None:
         """Decrement the comment count for a post."""
         self.collection.update_one(
             {'_id': ObjectId(post_id)},
-            {'$inc': {'comment_count': -1}, '$set': {'updated_at': datetime.utcnow()}}
+            {
+                '$inc': {'comment_count': -1, 'hot_score': hot_score_increment(post_id, -HOT_COMMENT_WEIGHT)},
+                '$set': {'updated_at': datetime.utcnow()}
+            }
         )
 
     def _filter_content(self, content: str) -> str:
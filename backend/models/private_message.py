@@ -1,6 +1,12 @@
 from datetime import datetime
 from typing import List, Dict, Optional, Any, Tuple
 from bson import ObjectId
+import logging
+from utils.singletons import get_model
+from utils.json_provider import to_jsonable
+from utils.id_paging import fetch_id_page
+
+logger = logging.getLogger(__name__)
 
 
 class PrivateMessage:
@@ -10,6 +16,18 @@ class PrivateMessage:
         self.db = db
         self.collection = db.private_messages
 
+    @property
+    def conversations(self):
+        from .conversation import Conversation
+        return Conversation(self.db)
+
+    def _sync_conversation(self, action: str, *args, **kwargs) -> None:
+        """Apply a change to the conversations summary; a failure is repaired on the next rebuild."""
+        try:
+            getattr(self.conversations, action)(*args, **kwargs)
+        except Exception as e:
+            logger.warning(f"Conversation summary {action} failed: {e}")
+
     def send_message(self, from_user_id: str, to_user_id: str, content: str,
                     message_type: str = 'text', gif_url: Optional[str] = None,
                     attachments: Optional[List[Dict[str, Any]]] = None) -> str:
@@ -54,6 +72,7 @@ class PrivateMessage:
         }
 
         result = self.collection.insert_one(message_data)
+        self._sync_conversation('record_message', message_data)
         return str(result.inserted_id)
 
     def _can_users_message(self, from_user_id: str, to_user_id: str) -> Tuple[bool, Optional[str]]:
@@ -61,7 +80,7 @@ class PrivateMessage:
         Returns: (can_message: bool, reason: Optional[str])
         """
         from .user import User
-        user_model = User(self.db)
+        user_model = get_model(User, self.db)
 
         # Check if either user is banned
         from_user = user_model.get_user_by_id(from_user_id)
@@ -86,7 +105,8 @@ class PrivateMessage:
         return (True, None)
 
     def get_conversation(self, user_id: str, other_user_id: str, limit: int = 50,
-                        before_message_id: Optional[str] = None) -> List[Dict[str, Any]]:
+                        before_message_id: Optional[str] = None,
+                        after_message_id: Optional[str] = None) -> List[Dict[str, Any]]:
         """Get conversation between two users. Handles self-messages (user_id == other_user_id)."""
         # Handle self-messages: if user_id == other_user_id, get all messages where from and to are the same
         if str(user_id) == str(other_user_id):
@@ -105,25 +125,14 @@ class PrivateMessage:
         # Exclude messages deleted for this user
         query['deleted_for_user_ids'] = {'$ne': ObjectId(user_id)}
         
-        # Pagination
-        if before_message_id:
-            try:
-                before_message = self.collection.find_one({'_id': ObjectId(before_message_id)})
-                if before_message:
-                    query['created_at'] = {'$lt': before_message['created_at']}
-            except:
-                pass
-
-        messages = list(self.collection.find(query)
-                       .sort([('created_at', -1)])
-                       .limit(limit))
-
-        # Reverse to get chronological order and add details
-        messages.reverse()
+        # Pagination: one indexed range read per direction of the conversation
+        messages, _ = fetch_id_page(self.collection, query, limit,
+                                    before_message_id=before_message_id,
+                                    after_message_id=after_message_id)
 
         # Optimization: Fetch involved users once (there are only two in a private conversation)
         from .user import User
-        user_model = User(self.db)
+        user_model = get_model(User, self.db)
 
         # Fetch current user and other user
         # We can try to fetch them in one go if they are different
@@ -141,7 +150,13 @@ class PrivateMessage:
             # Fallback
             pass
 
+        # Read receipts: a message is read once its recipient's mark reaches it
+        read_marks = self.conversations.get_read_marks(user_id, other_user_id) if messages else {}
+
         for message in messages:
+            mark = read_marks.get(str(message['to_user_id']))
+            if mark is not None and message['_id'] <= mark:
+                message['is_read'] = True
             message['_id'] = str(message['_id'])
             message['from_user_id'] = str(message['from_user_id'])
             message['to_user_id'] = str(message['to_user_id'])
@@ -184,128 +199,60 @@ class PrivateMessage:
         return message
 
     def mark_as_read(self, message_id: str, user_id: str) -> bool:
-        """Mark a message as read."""
-        message = self.collection.find_one({
-            '_id': ObjectId(message_id),
-            'to_user_id': ObjectId(user_id),
-            'is_read': False
-        })
-
+        """Mark a message (and everything before it in the conversation) as read."""
+        message = self.collection.find_one(
+            {'_id': ObjectId(message_id), 'to_user_id': ObjectId(user_id)},
+            {'from_user_id': 1}
+        )
         if not message:
             return False
 
-        result = self.collection.update_one(
-            {'_id': ObjectId(message_id)},
-            {
-                '$set': {
-                    'is_read': True,
-                    'read_at': datetime.utcnow()
-                }
-            }
-        )
-
-        return result.modified_count > 0
+        result = self.conversations.mark_read(user_id, str(message['from_user_id']), message_id)
+        return bool(result and result['marked_count'] > 0)
 
     def mark_conversation_as_read(self, user_id: str, other_user_id: str) -> int:
-        """Mark all messages from a user as read."""
-        result = self.collection.update_many(
-            {
-                'from_user_id': ObjectId(other_user_id),
-                'to_user_id': ObjectId(user_id),
-                'is_read': False
-            },
-            {
-                '$set': {
-                    'is_read': True,
-                    'read_at': datetime.utcnow()
-                }
-            }
-        )
-
-        return result.modified_count
+        """Mark all messages from a user as read; returns how many became read."""
+        result = self.conversations.mark_read(user_id, other_user_id)
+        return result['marked_count'] if result else 0
 
     def get_unread_count(self, user_id: str) -> int:
-        """Get unread message count for a user."""
-        return self.collection.count_documents({
-            'to_user_id': ObjectId(user_id),
-            'is_read': False
-        })
+        """Get unread message count for a user (the maintained total)."""
+        return self.conversations.get_unread_total(user_id)
+
+    def get_unread_counts(self, user_id: str, other_user_id: str) -> Dict[str, int]:
+        """Unread messages in one conversation and in total, as pushed to the client."""
+        conversation_model = self.conversations
+        return {
+            'conversation_unread': conversation_model.get_unread_count(user_id, other_user_id),
+            'unread_count': conversation_model.get_unread_total(user_id)
+        }
 
     def get_conversations(self, user_id: str, limit: int = 20) -> List[Dict[str, Any]]:
-        """Get list of conversations with recent messages."""
-        # Find unique conversation partners
-        pipeline = [
-            {
-                '$match': {
-                    '$or': [
-                        {'from_user_id': ObjectId(user_id)},
-                        {'to_user_id': ObjectId(user_id)}
-                    ]
-                }
-            },
-            {
-                '$addFields': {
-                    'other_user_id': {
-                        '$cond': {
-                            'if': {'$eq': ['$from_user_id', ObjectId(user_id)]},
-                            'then': '$to_user_id',
-                            'else': '$from_user_id'
-                        }
-                    }
-                }
-            },
-            {
-                '$sort': {'created_at': -1}
-            },
-            {
-                '$group': {
-                    '_id': '$other_user_id',
-                    'last_message': {'$first': '$$ROOT'},
-                    'unread_count': {
-                        '$sum': {
-                            '$cond': [
-                                {
-                                    '$and': [
-                                        {'$eq': ['$to_user_id', ObjectId(user_id)]},
-                                        {'$eq': ['$is_read', False]}
-                                    ]
-                                },
-                                1,
-                                0
-                            ]
-                        }
-                    }
-                }
-            },
-            {
-                '$sort': {'last_message.created_at': -1}  # Sort by last message date
-            },
-            {
-                '$limit': limit
-            }
-        ]
-
-        conversations = list(self.collection.aggregate(pipeline))
-
-        # Helper function to convert ObjectIds recursively
-        def convert_objectids(obj):
-            """Recursively convert ObjectIds to strings."""
-            if isinstance(obj, ObjectId):
-                return str(obj)
-            elif isinstance(obj, dict):
-                return {k: convert_objectids(v) for k, v in obj.items()}
-            elif isinstance(obj, list):
-                return [convert_objectids(item) for item in obj]
-            elif isinstance(obj, datetime):
-                return obj.isoformat()
-            return obj
-
-        # Convert all ObjectIds in all conversations first
-        conversations = [convert_objectids(conv) for conv in conversations]
+        """Get list of conversations with recent messages (one indexed read of the summaries)."""
+        conversation_model = self.conversations
+
+        # Inbox predating the summaries: build it once from the message history
+        conversation_model.ensure_backfilled(user_id)
+        summaries = conversation_model.get_conversations(user_id, limit)
+
+        now = datetime.utcnow()
+        conversations = []
+        for summary in summaries:
+            muted_until = summary.get('muted_until')
+            conversations.append({
+                '_id': summary['other_user_id'],
+                'last_message': summary.get('last_message') or {},
+                'unread_count': summary.get('unread_count', 0),
+                'is_muted': bool(summary.get('is_muted')) and (muted_until is None or muted_until > now),
+                'is_blocked': bool(summary.get('is_blocked'))
+            })
+
+        # Convert all ObjectIds and datetimes in all conversations first
+        conversations = to_jsonable(conversations)
 
         # Add user details
         from .user import User
-        user_model = User(self.db)
+        user_model = get_model(User, self.db)
 
         # Optimization: Batch fetch users to avoid N+1 queries
         # Collect all unique other_user_ids
@@ -321,7 +268,7 @@ class PrivateMessage:
         if other_user_ids:
             try:
                 user_object_ids = [ObjectId(uid) for uid in other_user_ids if ObjectId.is_valid(uid)]
-                users = list(self.db.users.find({'_id': {'$in': user_object_ids}}))
+                users = list(self.db.users.find({'_id': {'$in': user_object_ids}}, {'username': 1}))
                 for user in users:
                     users_map[str(user['_id'])] = user
             except Exception as e:
@@ -403,6 +350,8 @@ class PrivateMessage:
             return False
 
         result = self.collection.delete_one({'_id': ObjectId(message_id)})
+        if result.deleted_count > 0:
+            self._sync_conversation('rebuild_pair', str(message['from_user_id']), str(message['to_user_id']))
         return result.deleted_count > 0
     
     def delete_message_for_me(self, message_id: str, user_id: str) -> bool:
@@ -428,7 +377,9 @@ class PrivateMessage:
                 '$addToSet': {'deleted_for_user_ids': ObjectId(user_id)}
             }
         )
-        
+
+        if result.modified_count > 0:
+            self._sync_conversation('rebuild', user_id, self._other_user_id(message, user_id))
         return result.modified_count > 0
     
     def restore_message_for_me(self, message_id: str, user_id: str) -> bool:
@@ -451,9 +402,33 @@ class PrivateMessage:
                 '$pull': {'deleted_for_user_ids': ObjectId(user_id)}
             }
         )
-        
+
+        if result.modified_count > 0:
+            self._sync_conversation('rebuild', user_id, self._other_user_id(message, user_id))
         return result.modified_count > 0
+
+    def _other_user_id(self, message: Dict[str, Any], user_id: str) -> str:
+        """Conversation partner of user_id in a raw message document."""
+        if str(message['from_user_id']) == str(user_id):
+            return str(message['to_user_id'])
+        return str(message['from_user_id'])
     
+    def _apply_read_marks(self, user_id: str, messages: List[Dict[str, Any]]) -> None:
+        """
+        Set is_read on raw messages of user_id's conversations from the read marks.
+
+        A message is read once its recipient's mark reaches it; the messages
+        may span several partners, whose marks are read in one query.
+        """
+        if not messages:
+            return
+        partners = {self._other_user_id(message, user_id) for message in messages}
+        read_marks = self.conversations.get_read_marks_by_pair(user_id, partners)
+        for message in messages:
+            mark = read_marks.get((str(message['to_user_id']), str(message['from_user_id'])))
+            if mark is not None and message['_id'] <= mark:
+                message['is_read'] = True
+
     def get_deleted_messages_for_user(self, user_id: str) -> List[Dict[str, Any]]:
         """Get all messages deleted for a specific user."""
         query = {
@@ -466,6 +441,8 @@ class PrivateMessage:
         
         messages = list(self.collection.find(query).sort([('created_at', -1)]))
         
+        self._apply_read_marks(user_id, messages)
+
         for message in messages:
             message['_id'] = str(message['_id'])
             message['from_user_id'] = str(message['from_user_id'])
@@ -477,7 +454,7 @@ class PrivateMessage:
             
             # Add sender details
             from .user import User
-            user_model = User(self.db)
+            user_model = get_model(User, self.db)
             sender = user_model.get_user_by_id(message['from_user_id'])
             if sender:
                 message['sender_username'] = sender['username']
@@ -500,6 +477,7 @@ class PrivateMessage:
             ]
         })
 
+        self._sync_conversation('delete_pair', user_id, other_user_id)
         return result.deleted_count
 
     def search_messages(self, user_id: str, query: str, other_user_id: Optional[str] = None) -> List[Dict[str, Any]]:
@@ -527,6 +505,8 @@ class PrivateMessage:
                        .sort([('created_at', -1)])
                        .limit(50))
 
+        self._apply_read_marks(user_id, messages)
+
         for message in messages:
             message['_id'] = str(message['_id'])
             message['from_user_id'] = str(message['from_user_id'])
@@ -534,7 +514,7 @@ class PrivateMessage:
             message['is_from_me'] = message['from_user_id'] == user_id
 
             from .user import User
-            user_model = User(self.db)
+            user_model = get_model(User, self.db)
             sender = user_model.get_user_by_id(message['from_user_id'])
             if sender:
                 message['sender_username'] = sender['username']
@@ -594,29 +574,16 @@ class PrivateMessage:
                                 0
                             ]
                         }
-                    },
-                    'unread_messages': {
-                        '$sum': {
-                            '$cond': [
-                                {
-                                    '$and': [
-                                        {'$eq': ['$to_user_id', ObjectId(user_id)]},
-                                        {'$eq': ['$is_read', False]}
-                                    ]
-                                },
-                                1,
-                                0
-                            ]
-                        }
                     }
                 }
             }
         ]
 
         stats = list(self.collection.aggregate(pipeline))
-        return stats[0] if stats else {
+        result = stats[0] if stats else {
             'total_messages': 0,
             'sent_messages': 0,
-            'received_messages': 0,
-            'unread_messages': 0
-        }
\ No newline at end of file
+            'received_messages': 0
+        }
+        result['unread_messages'] = self.get_unread_count(user_id)
+        return result
@@ -1,6 +1,12 @@
 from datetime import datetime
 from typing import List, Dict, Optional, Any
 from bson import ObjectId
+from pymongo import ReturnDocument
+import logging
+from utils.json_provider import to_jsonable
+from utils.stats_rollup import record_change, transition
+
+logger = logging.getLogger(__name__)
 
 
 class Report:
@@ -38,6 +44,10 @@ class Report:
             current_message_id: ID of the current message to attach
             chat_room_id: ID of chat room for message history
 
+        The message history and the reported content are gathered into the
+        report's snapshot by the moderation queue (utils/moderation_queue),
+        not while the reporter waits.
+
         Returns:
             Report ID as string
         """
@@ -49,14 +59,11 @@ class Report:
         attached_messages = []
         if attach_current_message and current_message_id:
             attached_messages.append(ObjectId(current_message_id))
-        
+
+        # The history between reporter and reported user is resolved by the moderation queue
+        history_request = None
         if attach_message_history and reported_user_id:
-            # Get all messages between reporter and reported user
-            history_messages = self._get_message_history(reporter_id, reported_user_id, chat_room_id)
-            attached_messages.extend([ObjectId(msg_id) for msg_id in history_messages])
-        
-        # Remove duplicates
-        attached_messages = list(set(attached_messages))
+            history_request = {'chat_room_id': chat_room_id}
 
         report_data = {
             'reported_content_id': ObjectId(content_id) if content_id else None,
@@ -68,6 +75,9 @@ class Report:
             'reason': reason,
             'description': description,
             'attached_messages': attached_messages,
+            'history_request': history_request,
+            'snapshot': None,  # Evidence, built by the moderation queue
+            'snapshot_pending': True,
             'owner_id': ObjectId(owner_id) if owner_id else None,
             'owner_username': owner_username,
             'moderators': moderators or [],  # List of {id, username} dicts
@@ -80,7 +90,12 @@ class Report:
         }
 
         result = self.collection.insert_one(report_data)
-        return str(result.inserted_id)
+        report_id = str(result.inserted_id)
+        record_change(self.db, transition('reports.status', None, 'pending'), event='reports_created')
+
+        from utils.moderation_queue import enqueue_report
+        enqueue_report(self.db, report_id)
+        return report_id
 
     def _get_context_messages(self, message_id: str, topic_id: str, count: int = 4) -> List[str]:
         """Get previous messages for context."""
@@ -142,20 +157,9 @@ class Report:
     def get_report_by_id(self, report_id: str) -> Optional[Dict[str, Any]]:
         """Get a specific report by ID."""
         report = self.collection.find_one({'_id': ObjectId(report_id)})
-        if report:
-            report['_id'] = str(report['_id'])
-            if 'reported_message_id' in report and report['reported_message_id']:
-                report['reported_message_id'] = str(report['reported_message_id'])
-            if 'reported_content_id' in report and report['reported_content_id']:
-                report['reported_content_id'] = str(report['reported_content_id'])
-            report['reported_by'] = str(report['reported_by'])
-            if report['reviewed_by']:
-                report['reviewed_by'] = str(report['reviewed_by'])
-
-            # Get message and context details
-            self._enrich_report_with_details(report)
-
-        return report
+        if not report:
+            return None
+        return self.hydrate_reports([report])[0]
 
     def get_pending_reports(self, topic_id: Optional[str] = None, limit: int = 50, offset: int = 0) -> List[Dict[str, Any]]:
         """Get pending reports for moderation."""
@@ -184,116 +188,111 @@ class Report:
                       .limit(limit)
                       .skip(offset))
 
-        for report in reports:
-            report['_id'] = str(report['_id'])
-            if 'reported_message_id' in report and report['reported_message_id']:
-                report['reported_message_id'] = str(report['reported_message_id'])
-            if 'reported_content_id' in report and report['reported_content_id']:
-                report['reported_content_id'] = str(report['reported_content_id'])
-            report['reported_by'] = str(report['reported_by'])
+        return self.hydrate_reports(reports)
 
-            # Enrich with details
-            self._enrich_report_with_details(report)
+    def ensure_snapshots(self, reports: List[Dict[str, Any]]) -> None:
+        """Build the missing snapshots of raw report documents inline, and store them."""
+        from utils.moderation_queue import SNAPSHOT_VERSION, build_snapshots, store_snapshots
 
-        return reports
+        missing = [report for report in reports
+                   if (report.get('snapshot') or {}).get('version') != SNAPSHOT_VERSION]
+        if not missing:
+            return
+
+        built = build_snapshots(self.db, missing)
+        for report in missing:
+            report['snapshot'] = built[report['_id']]['snapshot']
+            report['attached_messages'] = built[report['_id']]['attached_messages']
+        try:
+            store_snapshots(self.db, built)
+        except Exception as e:
+            logger.error(f"Failed to store report snapshots: {e}")
+
+    def get_report_users(self, reports: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """
+        Users referenced by reports (reporter, reported user, content author, room owner, reviewer).
+
+        Returns:
+            {user id: user document (username, is_banned)}, from one query
+        """
+        user_ids = set()
+        for report in reports:
+            for field in ('reported_by', 'reported_user_id', 'reviewed_by'):
+                if report.get(field):
+                    user_ids.add(str(report[field]))
+            snapshot = report.get('snapshot') or {}
+            if snapshot.get('author_id'):
+                user_ids.add(snapshot['author_id'])
+            if (snapshot.get('content') or {}).get('owner_id'):
+                user_ids.add(snapshot['content']['owner_id'])
+
+        object_ids = [ObjectId(user_id) for user_id in user_ids if ObjectId.is_valid(user_id)]
+        if not object_ids:
+            return {}
+        users = self.db.users.find({'_id': {'$in': object_ids}}, {'username': 1, 'is_banned': 1})
+        return {str(user['_id']): user for user in users}
+
+    def hydrate_reports(self, reports: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Serialize raw report documents with their content and user details.
+
+        Content comes from each report's snapshot; user names are read with
+        one query for the whole batch.
+        """
+        self.ensure_snapshots(reports)
+        users = self.get_report_users(reports)
+        return [self._hydrate_report(report, users) for report in reports]
+
+    def _hydrate_report(self, report: Dict[str, Any], users: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+        """Add reported content, user and attached message details to one report."""
+        snapshot = report.pop('snapshot', None) or {}
+        report.pop('history_request', None)
+        report = to_jsonable(report)
+
+        # Get reported content details (message, post, comment, ...)
+        content = snapshot.get('content')
+        if content and report.get('content_type') in ('message', 'private_message', 'post', 'comment'):
+            content = dict(content)
+            content['id'] = content['_id']
+            if snapshot.get('anonymous_name'):
+                content['display_name'] = snapshot['anonymous_name']
+            if report['content_type'] == 'message':
+                content.setdefault('attachments', [])
+            report['reported_content'] = content
 
-    def _enrich_report_with_details(self, report: Dict[str, Any]) -> None:
-        """Enrich report with message and user details."""
-        from .message import Message
-        from .user import User
-        
-        message_model = Message(self.db)
-        user_model = User(self.db)
-        
-        # Get reported content details (message, post, or comment)
-        if report.get('reported_content_id'):
-            content_id = str(report['reported_content_id'])
-            if report.get('content_type') == 'message':
-                reported_message = message_model.get_message_by_id(content_id)
-                if reported_message:
-                    report['reported_content'] = reported_message
-            elif report.get('content_type') == 'private_message':
-                from .private_message import PrivateMessage
-                pm_model = PrivateMessage(self.db)
-                reported_message = pm_model.get_message_by_id(content_id)
-                if reported_message:
-                    report['reported_content'] = reported_message
-            elif report.get('content_type') == 'post':
-                # Fetch reported post details
-                from .post import Post
-                post_model = Post(self.db)
-                reported_post = post_model.get_post_by_id(content_id)
-                if reported_post:
-                    report['reported_content'] = reported_post
-            elif report.get('content_type') == 'comment':
-                # Fetch reported comment details
-                from .comment import Comment
-                comment_model = Comment(self.db)
-                reported_comment = comment_model.get_comment_by_id(content_id)
-                if reported_comment:
-                    report['reported_content'] = reported_comment
-        
         # Get reported user details
-        if report.get('reported_user_id'):
-            reported_user = user_model.get_user_by_id(str(report['reported_user_id']))
-            if reported_user:
-                original_username = reported_user['username']
-                
-                # Check if reported content is anonymous
-                anonymous_name = None
-                if report.get('reported_content'):
-                    content = report['reported_content']
-                    if content.get('is_anonymous') or content.get('anonymous_identity'):
-                        anonymous_name = content.get('display_name') or content.get('sender_username') or content.get('author_username') or content.get('anonymous_identity')
-                
-                # Format username for admins: show anonymous name with original in parentheses
-                if anonymous_name:
-                    report['reported_user'] = {
-                        'id': str(reported_user['_id']),
-                        'username': f"{anonymous_name} ({original_username})",
-                        'username_display': anonymous_name,
-                        'username_original': original_username
-                    }
-                else:
-                    report['reported_user'] = {
-                        'id': str(reported_user['_id']),
-                        'username': original_username,
-                        'username_display': original_username,
-                        'username_original': original_username
-                    }
-
-        # Get reporter details
-        reporter = user_model.get_user_by_id(report['reported_by'])
-        if reporter:
-            report['reporter'] = {
-                'id': str(reporter['_id']),
-                'username': reporter['username']
+        reported_user = users.get(report.get('reported_user_id') or '')
+        if reported_user:
+            original_username = reported_user['username']
+            anonymous_name = snapshot.get('anonymous_name') if report.get('reported_content') else None
+
+            # Format username for admins: show anonymous name with original in parentheses
+            report['reported_user'] = {
+                'id': str(reported_user['_id']),
+                'username': f"{anonymous_name} ({original_username})" if anonymous_name else original_username,
+                'username_display': anonymous_name or original_username,
+                'username_original': original_username
             }
 
+        # Get reporter and reviewer details
+        for field, key in (('reported_by', 'reporter'), ('reviewed_by', 'reviewer')):
+            user = users.get(report.get(field) or '')
+            if user:
+                report[key] = {
+                    'id': str(user['_id']),
+                    'username': user['username']
+                }
+
         # Get attached messages details (including attachments)
         attached_messages_details = []
-        for msg_id in report.get('attached_messages', []):
-            context_msg = message_model.get_message_by_id(str(msg_id))
-            if context_msg:
-                # Ensure attachments are included
-                if 'attachments' not in context_msg:
-                    context_msg['attachments'] = []
-                attached_messages_details.append(context_msg)
+        for message in snapshot.get('attached_messages', []):
+            message = dict(message)
+            message['id'] = message['_id']
+            message.setdefault('attachments', [])
+            attached_messages_details.append(message)
         report['attached_messages_details'] = attached_messages_details
-        
-        # Also include attachments in the reported content if it's a message
-        if report.get('reported_content') and report.get('content_type') == 'message':
-            if 'attachments' not in report['reported_content']:
-                report['reported_content']['attachments'] = []
-
-        # Get reviewer details if reviewed
-        if report.get('reviewed_by'):
-            reviewer = user_model.get_user_by_id(report['reviewed_by'])
-            if reviewer:
-                report['reviewer'] = {
-                    'id': str(reviewer['_id']),
-                    'username': reviewer['username']
-                }
+
+        return report
 
     def review_report(self, report_id: str, reviewer_id: str, action_taken: str,
                      moderator_notes: str = '') -> bool:
@@ -310,7 +309,7 @@ class Report:
         else:
             status = 'reviewed'
 
-        result = self.collection.update_one(
+        previous = self.collection.find_one_and_update(
             {'_id': ObjectId(report_id)},
             {
                 '$set': {
@@ -320,10 +319,16 @@ class Report:
                     'action_taken': action_taken,
                     'moderator_notes': moderator_notes
                 }
-            }
+            },
+            projection={'status': 1, 'action_taken': 1},
+            return_document=ReturnDocument.BEFORE
         )
+        if not previous:
+            return False
 
-        return result.modified_count > 0
+        record_change(self.db, {**transition('reports.status', previous.get('status'), status),
+                                **transition('reports.actions', previous.get('action_taken'), action_taken)})
+        return True
 
     def reopen_report(self, report_id: str, admin_id: str, reason: Optional[str] = None) -> bool:
         """Reopen a dismissed or resolved report.
@@ -357,6 +362,9 @@ class Report:
             {'$set': update_data}
         )
 
+        if result.modified_count > 0:
+            record_change(self.db, {**transition('reports.status', report.get('status'), 'pending'),
+                                    **transition('reports.actions', report.get('action_taken'), None)})
         return result.modified_count > 0
 
     def dismiss_report(self, report_id: str, reviewer_id: str, reason: str = '') -> bool:
@@ -367,32 +375,19 @@ class Report:
         """Escalate a report for higher level review."""
         return self.review_report(report_id, reviewer_id, 'escalated', reason)
 
-    def get_reports_by_status(self, status: str, topic_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    def get_reports_by_status(self, status: str, topic_id: Optional[str] = None,
+                              limit: int = 50, offset: int = 0) -> List[Dict[str, Any]]:
         """Get reports by status."""
         query = {'status': status}
         if topic_id:
             query['topic_id'] = ObjectId(topic_id)
 
         reports = list(self.collection.find(query)
-                      .sort([('created_at', -1)]))
+                      .sort([('created_at', -1)])
+                      .skip(offset)
+                      .limit(limit))
 
-        for report in reports:
-            report['_id'] = str(report['_id'])
-            if 'reported_content_id' in report and report['reported_content_id']:
-                report['reported_content_id'] = str(report['reported_content_id'])
-            if 'reported_user_id' in report and report['reported_user_id']:
-                report['reported_user_id'] = str(report['reported_user_id'])
-            if 'topic_id' in report and report['topic_id']:
-                report['topic_id'] = str(report['topic_id'])
-            report['reported_by'] = str(report['reported_by'])
-            if report.get('reviewed_by'):
-                report['reviewed_by'] = str(report['reviewed_by'])
-            if 'attached_messages' in report and report['attached_messages']:
-                report['attached_messages'] = [str(msg_id) for msg_id in report['attached_messages']]
-
-            self._enrich_report_with_details(report)
-
-        return reports
+        return self.hydrate_reports(reports)
 
     def get_user_reports(self, user_id: str, as_reporter: bool = True) -> List[Dict[str, Any]]:
         """Get reports where user was either reporter or reported."""
@@ -417,19 +412,7 @@ class Report:
         reports = list(self.collection.find(query)
                       .sort([('created_at', -1)]))
 
-        for report in reports:
-            report['_id'] = str(report['_id'])
-            if 'reported_message_id' in report and report['reported_message_id']:
-                report['reported_message_id'] = str(report['reported_message_id'])
-            if 'reported_content_id' in report and report['reported_content_id']:
-                report['reported_content_id'] = str(report['reported_content_id'])
-            report['reported_by'] = str(report['reported_by'])
-            if report['reviewed_by']:
-                report['reviewed_by'] = str(report['reviewed_by'])
-
-            self._enrich_report_with_details(report)
-
-        return reports
+        return self.hydrate_reports(reports)
 
     def get_report_statistics(self, topic_id: Optional[str] = None) -> Dict[str, Any]:
         """Get report statistics for moderation dashboard."""
@@ -501,21 +484,15 @@ class Report:
                       .sort([('created_at', -1)])
                       .limit(limit))
 
-        for report in reports:
-            report['_id'] = str(report['_id'])
-            if 'reported_message_id' in report and report['reported_message_id']:
-                report['reported_message_id'] = str(report['reported_message_id'])
-            if 'reported_content_id' in report and report['reported_content_id']:
-                report['reported_content_id'] = str(report['reported_content_id'])
-            report['reported_by'] = str(report['reported_by'])
-            if report['reviewed_by']:
-                report['reviewed_by'] = str(report['reviewed_by'])
-
-            self._enrich_report_with_details(report)
-
-        return reports
+        return self.hydrate_reports(reports)
 
     def delete_report(self, report_id: str, deleted_by: str) -> bool:
         """Delete a report (for system maintenance)."""
-        result = self.collection.delete_one({'_id': ObjectId(report_id)})
-        return result.deleted_count > 0
\ No newline at end of file
+        report = self.collection.find_one_and_delete({'_id': ObjectId(report_id)},
+                                                     projection={'status': 1, 'action_taken': 1})
+        if not report:
+            return False
+
+        record_change(self.db, {**transition('reports.status', report.get('status'), None),
+                                **transition('reports.actions', report.get('action_taken'), None)})
+        return True
\ No newline at end of file
@@ -1,6 +1,9 @@
 from datetime import datetime
 from typing import List, Dict, Optional, Any
 from bson import ObjectId
+from pymongo import ReturnDocument
+from utils.singletons import get_model
+from utils.stats_rollup import record_change, transition
 
 
 class Ticket:
@@ -61,6 +64,10 @@ class Ticket:
         }
 
         result = self.collection.insert_one(ticket_data)
+        record_change(self.db, {**transition('tickets.status', None, 'pending'),
+                                **transition('tickets.category', None, category),
+                                **transition('tickets.priority', None, priority)},
+                      event='tickets_created')
         return str(result.inserted_id)
 
     def get_ticket_by_id(self, ticket_id: str) -> Optional[Dict[str, Any]]:
@@ -147,12 +154,17 @@ class Ticket:
         if admin_response:
             update_data['admin_response'] = admin_response.strip()
 
-        result = self.collection.update_one(
+        previous = self.collection.find_one_and_update(
             {'_id': ObjectId(ticket_id)},
-            {'$set': update_data}
+            {'$set': update_data},
+            projection={'status': 1},
+            return_document=ReturnDocument.BEFORE
         )
+        if not previous:
+            return False
 
-        return result.modified_count > 0
+        record_change(self.db, transition('tickets.status', previous.get('status'), status))
+        return True
 
     def reopen_ticket(self, ticket_id: str, admin_id: str, reason: Optional[str] = None) -> bool:
         """Reopen a closed or resolved ticket.
@@ -175,7 +187,7 @@ class Ticket:
 
         # Get admin username
         from .user import User
-        user_model = User(self.db)
+        user_model = get_model(User, self.db)
         admin_user = user_model.get_user_by_id(admin_id)
         admin_username = admin_user.get('username', 'Admin') if admin_user else 'Admin'
 
@@ -205,6 +217,8 @@ class Ticket:
             }
         )
 
+        if result.modified_count > 0:
+            record_change(self.db, transition('tickets.status', ticket.get('status'), 'open'))
         return result.modified_count > 0
 
     def add_admin_response(self, ticket_id: str, admin_id: str, response: str) -> bool:
@@ -220,7 +234,7 @@ class Ticket:
         """
         # Get admin username
         from .user import User
-        user_model = User(self.db)
+        user_model = get_model(User, self.db)
         admin_user = user_model.get_user_by_id(admin_id)
         admin_username = admin_user.get('username', 'Admin') if admin_user else 'Admin'
 
@@ -263,7 +277,7 @@ class Ticket:
         """
         # Get user info
         from .user import User
-        user_model = User(self.db)
+        user_model = get_model(User, self.db)
         user = user_model.get_user_by_id(user_id)
         username = user.get('username', 'Unknown') if user else 'Unknown'
 
@@ -367,8 +381,15 @@ class Ticket:
 
     def delete_ticket(self, ticket_id: str) -> bool:
         """Delete a ticket (admin only)."""
-        result = self.collection.delete_one({'_id': ObjectId(ticket_id)})
-        return result.deleted_count > 0
+        ticket = self.collection.find_one_and_delete({'_id': ObjectId(ticket_id)},
+                                                     projection={'status': 1, 'category': 1, 'priority': 1})
+        if not ticket:
+            return False
+
+        record_change(self.db, {**transition('tickets.status', ticket.get('status'), None),
+                                **transition('tickets.category', ticket.get('category'), None),
+                                **transition('tickets.priority', ticket.get('priority'), None)})
+        return True
 
     def _format_ticket(self, ticket: Dict[str, Any]) -> Dict[str, Any]:
         """Format ticket for API response."""
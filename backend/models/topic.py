@@ -3,6 +3,7 @@ from typing import List, Dict, Optional, Any
 from bson import ObjectId
 from flask import current_app
 from utils.cache_decorator import cache_result
+from utils.singletons import get_model
 
 
 class Topic:
@@ -87,7 +88,7 @@ class Topic:
 
             # Get owner details
             from .user import User
-            user_model = User(self.db)
+            user_model = get_model(User, self.db)
             owner = user_model.get_user_by_id(topic['owner_id'])
             if owner:
                 topic['owner'] = {
@@ -310,7 +311,7 @@ class Topic:
                 
                 # Get inviter details
                 from .user import User
-                user_model = User(self.db)
+                user_model = get_model(User, self.db)
                 inviter = user_model.get_user_by_id(invite['invited_by'])
                 if inviter:
                     invite['inviter'] = {
@@ -471,7 +472,7 @@ class Topic:
         moderators = []
         for mod in topic.get('moderators', []):
             from .user import User
-            user_model = User(self.db)
+            user_model = get_model(User, self.db)
             user = user_model.get_user_by_id(str(mod['user_id']))
             if user:
                 moderators.append({
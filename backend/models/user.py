@@ -1,14 +1,18 @@
 from datetime import datetime
 from typing import List, Dict, Optional, Any
 from bson import ObjectId
+from pymongo import ReturnDocument
 from werkzeug.security import generate_password_hash, check_password_hash
 import pyotp
 import bcrypt
-from cryptography.fernet import Fernet
 import os
 import base64
 from flask import current_app
 from utils.cache_decorator import cache_result
+from utils.totp_keys import get_totp_encryption_key, get_totp_fernet
+from utils.image_refs import resolve_image_ref
+from utils.json_provider import to_jsonable
+from utils.stats_rollup import record_change
 
 
 class User:
@@ -17,124 +21,20 @@ class User:
     def __init__(self, db):
         self.db = db
         self.collection = db.users
-        self.encryption_key = self._get_or_create_encryption_key()
 
-    def _get_or_create_encryption_key(self) -> bytes:
-        """Get or create encryption key for TOTP secrets. Prioritizes environment variables, then Redis, then local file."""
-        import os
-        import logging
-        from cryptography.fernet import Fernet
-
-        logger = logging.getLogger(__name__)
-
-        # 1. Try Environment Variables
-        # Prioritize environment variable for Azure and production stability
-        # Check multiple potential variable names
-        env_keys = ['TOTP_ENCRYPTION_KEY', 'TOTP_SECRET', 'ENCRYPTION_KEY']
-        env_key = None
-
-        for var_name in env_keys:
-            val = os.environ.get(var_name)
-            if val:
-                env_key = val
-                logger.info(f"Found encryption key in environment variable: {var_name}")
-                break
-
-        if env_key:
-            try:
-                # Ensure it's a valid Fernet key
-                Fernet(env_key.encode())
-                logger.info("Using encryption key from environment variable")
-                return env_key.encode()
-            except Exception as e:
-                logger.error(f"Invalid encryption key in environment variable: {str(e)}")
-                # Fall through to other methods if env key is invalid
-
-        # 2. Try Redis (for persistence between deploys without env vars)
-        redis_client = None
-        try:
-            from flask import current_app
-            if current_app:
-                redis_client = current_app.config.get('REDIS_CLIENT')
-                if redis_client:
-                    try:
-                        stored_key = redis_client.get('totp_encryption_key')
-                        if stored_key:
-                            if isinstance(stored_key, bytes):
-                                stored_key = stored_key.decode('utf-8')
-
-                            Fernet(stored_key.encode())
-                            logger.info("Using encryption key from Redis")
-                            return stored_key.encode()
-                    except Exception as e:
-                        logger.error(f"Invalid encryption key in Redis: {e}")
-        except Exception as e:
-            logger.warning(f"Failed to check Redis for encryption key: {e}")
-
-        # 3. Try Local File (Legacy/Fallback)
-        # Use absolute path to ensure key is found regardless of working directory
-        # Key file should be in the backend root directory (parent of models directory)
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        backend_dir = os.path.dirname(current_dir)
-        key_file = os.path.join(backend_dir, 'totp_encryption.key')
-
-        final_key = None
-
-        if os.path.exists(key_file):
-            with open(key_file, 'rb') as f:
-                key = f.read()
-                # Validate key to ensure it's not corrupt
-                try:
-                    Fernet(key)
-                    final_key = key
-                    logger.info(f"Using encryption key from local file: {key_file}")
-                except Exception as e:
-                    logger.error(f"Invalid encryption key in {key_file}: {e}")
-
-        # 4. Generate New Key if nothing found
-        if not final_key:
-            final_key = Fernet.generate_key()
-            logger.info("Generated NEW encryption key")
-
-            # Save to file
-            try:
-                with open(key_file, 'wb') as f:
-                    f.write(final_key)
-                logger.info(f"Saved new encryption key to {key_file}")
-            except Exception as e:
-                logger.error(f"Failed to write encryption key to {key_file}: {e}")
-
-        # 5. Persist to Redis if available (to prevent future loss)
-        if final_key and redis_client:
-            try:
-                # Store indefinitely (no TTL) or with very long TTL
-                redis_client.set('totp_encryption_key', final_key.decode('utf-8'))
-                logger.info("Persisted encryption key to Redis for future deployments")
-            except Exception as e:
-                logger.error(f"Failed to persist encryption key to Redis: {e}")
-
-        # 6. Log the key for the user (as requested)
-        try:
-            key_str = final_key.decode('utf-8')
-            logger.warning("="*60)
-            logger.warning("TOTP ENCRYPTION KEY (SAVE THIS TO AZURE ENV VAR 'TOTP_ENCRYPTION_KEY'):")
-            logger.warning(f"{key_str}")
-            logger.warning("="*60)
-        except:
-            pass
-
-        return final_key
+    @property
+    def encryption_key(self) -> bytes:
+        """TOTP encryption key (resolved once per process, see utils.totp_keys)."""
+        return get_totp_encryption_key()
 
     def _encrypt_totp_secret(self, secret: str) -> str:
         """Encrypt TOTP secret before storing."""
-        f = Fernet(self.encryption_key)
-        return f.encrypt(secret.encode()).decode()
+        return get_totp_fernet().encrypt(secret.encode()).decode()
 
     def _decrypt_totp_secret(self, encrypted_secret: str) -> str:
         """Decrypt TOTP secret from database."""
         try:
-            f = Fernet(self.encryption_key)
-            return f.decrypt(encrypted_secret.encode()).decode()
+            return get_totp_fernet().decrypt(encrypted_secret.encode()).decode()
         except Exception as e:
             import logging
             logger = logging.getLogger(__name__)
@@ -209,6 +109,7 @@ class User:
 
         result = self.collection.insert_one(user_data)
         user_id = str(result.inserted_id)
+        record_change(self.db, {'users.total': 1}, event='users_created')
         
         # Invalidate cache
         try:
@@ -400,22 +301,14 @@ class User:
         """Get user by ID."""
         user = self.collection.find_one({'_id': ObjectId(user_id)})
         if user:
-            # Recursively convert all ObjectIds and datetimes
-            def convert_objectids(obj):
-                if isinstance(obj, ObjectId):
-                    return str(obj)
-                elif isinstance(obj, dict):
-                    return {k: convert_objectids(v) for k, v in obj.items()}
-                elif isinstance(obj, list):
-                    return [convert_objectids(item) for item in obj]
-                elif isinstance(obj, datetime):
-                    return obj.isoformat()
-                return obj
-            
             # Convert all ObjectIds and datetimes in the user dict
-            user = convert_objectids(user)
+            user = to_jsonable(user)
             # Ensure id field is set
             user['id'] = user['_id']
+            # Legacy azure:<id> picture references -> attachment URLs
+            for field in ('profile_picture', 'banner'):
+                if user.get(field):
+                    user[field] = resolve_image_ref(user[field])
         return user
 
     @cache_result(ttl=3600, key_prefix='user', should_jsonify=False)
@@ -423,32 +316,9 @@ class User:
         """Get user by username."""
         user = self.collection.find_one({'username': username})
         if user:
-            # Convert ObjectId to string
-            user['_id'] = str(user['_id'])
-            user['id'] = str(user['_id'])
-            
-            # Convert any other ObjectId fields recursively
-            def convert_objectids(obj):
-                if isinstance(obj, ObjectId):
-                    return str(obj)
-                elif isinstance(obj, dict):
-                    return {k: convert_objectids(v) for k, v in obj.items()}
-                elif isinstance(obj, list):
-                    return [convert_objectids(item) for item in obj]
-                elif isinstance(obj, datetime):
-                    return obj.isoformat()
-                return obj
-            
             # Convert all ObjectIds and datetimes in the user dict
-            for key, value in list(user.items()):
-                if isinstance(value, ObjectId):
-                    user[key] = str(value)
-                elif isinstance(value, datetime):
-                    user[key] = value.isoformat()
-                elif isinstance(value, dict):
-                    user[key] = convert_objectids(value)
-                elif isinstance(value, list):
-                    user[key] = convert_objectids(value)
+            user = to_jsonable(user)
+            user['id'] = user['_id']
         return user
 
     @cache_result(ttl=3600, key_prefix='user', should_jsonify=False)
@@ -456,32 +326,9 @@ class User:
         """Get user by email."""
         user = self.collection.find_one({'email': email})
         if user:
-            # Convert ObjectId to string
-            user['_id'] = str(user['_id'])
-            user['id'] = str(user['_id'])
-            
-            # Convert any other ObjectId fields recursively
-            def convert_objectids(obj):
-                if isinstance(obj, ObjectId):
-                    return str(obj)
-                elif isinstance(obj, dict):
-                    return {k: convert_objectids(v) for k, v in obj.items()}
-                elif isinstance(obj, list):
-                    return [convert_objectids(item) for item in obj]
-                elif isinstance(obj, datetime):
-                    return obj.isoformat()
-                return obj
-            
             # Convert all ObjectIds and datetimes in the user dict
-            for key, value in list(user.items()):
-                if isinstance(value, ObjectId):
-                    user[key] = str(value)
-                elif isinstance(value, datetime):
-                    user[key] = value.isoformat()
-                elif isinstance(value, dict):
-                    user[key] = convert_objectids(value)
-                elif isinstance(value, list):
-                    user[key] = convert_objectids(value)
+            user = to_jsonable(user)
+            user['id'] = user['_id']
         return user
 
     def update_user_preferences(self, user_id: str, preferences: Dict[str, Any]) -> bool:
@@ -548,11 +395,18 @@ class User:
         else:
             update_data['ban_expiry'] = None
 
-        result = self.collection.update_one(
+        previous = self.collection.find_one_and_update(
             {'_id': ObjectId(user_id)},
-            {'$set': update_data}
+            {'$set': update_data},
+            projection={'is_banned': 1},
+            return_document=ReturnDocument.BEFORE
         )
-        return result.modified_count > 0
+        if not previous:
+            return False
+
+        if not previous.get('is_banned'):
+            record_change(self.db, {'users.banned': 1})
+        return True
 
     def unban_user(self, user_id: str, admin_id: str) -> bool:
         """Unban a user.
@@ -564,7 +418,7 @@ class User:
         Returns:
             True if unban successful, False otherwise
         """
-        result = self.collection.update_one(
+        previous = self.collection.find_one_and_update(
             {'_id': ObjectId(user_id)},
             {'$set': {
                 'is_banned': False,
@@ -574,9 +428,16 @@ class User:
                 'banned_by': None,
                 'unbanned_at': datetime.utcnow(),
                 'unbanned_by': ObjectId(admin_id)
-            }}
+            }},
+            projection={'is_banned': 1},
+            return_document=ReturnDocument.BEFORE
         )
-        return result.modified_count > 0
+        if not previous:
+            return False
+
+        if previous.get('is_banned'):
+            record_change(self.db, {'users.banned': -1})
+        return True
 
     def is_user_banned(self, user_id: str) -> bool:
         """Check if user is currently banned."""
@@ -992,6 +853,23 @@ class User:
         return new_secret
 
     # Account Deletion Methods
+    def clear_expired_codes(self) -> int:
+        """Remove expired verification, login, recovery and deletion codes. Returns users updated."""
+        now = datetime.utcnow()
+        updated = 0
+        for code_field, expires_field in (
+            ('email_verification_code', 'email_verification_expires'),
+            ('login_email_code', 'login_email_code_expires'),
+            ('recovery_code', 'recovery_expires'),
+            ('deletion_code', 'deletion_expires'),
+        ):
+            result = self.collection.update_many(
+                {expires_field: {'$lt': now}},
+                {'$set': {code_field: None, expires_field: None}}
+            )
+            updated += result.modified_count
+        return updated
+
     def set_deletion_code(self, user_id: str, code: str, expires_in_minutes: int = 15) -> bool:
         """Set account deletion verification code with expiry."""
         from datetime import timedelta
@@ -1028,18 +906,22 @@ class User:
         # Additional cleanup should be done here or triggered via signals/hooks
         # (e.g. deleting messages, files, etc. depending on cascading rules)
         
-        result = self.collection.delete_one({'_id': ObjectId(user_id)})
-        
+        user = self.collection.find_one_and_delete({'_id': ObjectId(user_id)},
+                                                   projection={'is_banned': 1, 'is_admin': 1})
+
         # Invalidate cache
-        if result.deleted_count > 0:
+        if user:
+            record_change(self.db, {'users.total': -1,
+                                    'users.banned': -1 if user.get('is_banned') else 0,
+                                    'users.admins': -1 if user.get('is_admin') else 0})
             try:
                 cache_invalidator = current_app.config.get('CACHE_INVALIDATOR')
                 if cache_invalidator:
                     cache_invalidator.invalidate_related('user', user_id)
             except Exception:
                 pass  # Cache invalidation is optional
-        
-        return result.deleted_count > 0
+
+        return user is not None
 
     def set_user_recovery_code(self, user_id: str, recovery_code: str) -> bool:
         """Set user-defined recovery code (hashed)."""
@@ -1219,6 +1101,8 @@ class User:
             {'_id': ObjectId(blocker_id)},
             {'$addToSet': {'blocked_users': ObjectId(blocked_id)}}
         )
+        from .conversation import Conversation
+        Conversation(self.db).set_blocked(blocker_id, blocked_id, True)
         return result.modified_count > 0 or result.matched_count > 0
     
     def unblock_user(self, blocker_id: str, blocked_id: str) -> bool:
@@ -1227,6 +1111,8 @@ class User:
             {'_id': ObjectId(blocker_id)},
             {'$pull': {'blocked_users': ObjectId(blocked_id)}}
         )
+        from .conversation import Conversation
+        Conversation(self.db).set_blocked(blocker_id, blocked_id, False)
         return result.modified_count > 0
     
     def update_last_online(self, user_id: str) -> bool:
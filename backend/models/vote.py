@@ -0,0 +1,184 @@
+from datetime import datetime
+from typing import Callable, List, Dict, Optional, Any
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+
+class Vote:
+    """Vote model: one document per (target, user) with denormalised counters on the target.
+
+    Each vote is a conditional state transition on the `votes` collection
+    (insert / delete-if-same / flip-if-opposite), backed by a unique
+    (target_type, target_id, user_id) index, so concurrent votes can't
+    double-count. The resulting counter delta is applied to the post or
+    comment with a single `$inc`, which keeps the cost of a vote O(1)
+    regardless of how many votes the target already has.
+    """
+
+    TARGET_COLLECTIONS = {
+        'post': 'posts',
+        'comment': 'comments',
+    }
+
+    # Attempts before giving up when another request changes the vote concurrently
+    MAX_ATTEMPTS = 3
+
+    # Counter fields maintained on the target
+    COUNTER_DELTA_FIELDS = ('upvote_count', 'downvote_count', 'score')
+
+    # Fields returned from the target after applying the counter update
+    COUNTER_FIELDS = {'upvote_count': 1, 'downvote_count': 1, 'score': 1, 'topic_id': 1, 'post_id': 1}
+
+    def __init__(self, db):
+        self.db = db
+        self.collection = db.votes
+
+    def cast_vote(self, target_type: str, target_id: str, user_id: str, direction: int,
+                  extra_inc: Optional[Callable[[int], Dict[str, float]]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Toggle a vote on a post or comment.
+
+        Voting in the same direction again removes the vote; voting in the
+        opposite direction flips it.
+
+        Args:
+            target_type: 'post' or 'comment'
+            target_id: ID of the voted item
+            user_id: ID of the voter
+            direction: 1 for upvote, -1 for downvote
+            extra_inc: Optional callable mapping the score delta to extra
+                       {field: increment} pairs applied in the same target update
+
+        Returns:
+            Dict with upvote_count, downvote_count, score, user_vote and the target's
+            topic_id/post_id, or None if the target doesn't exist or the vote failed
+        """
+        transition = self.record_vote(target_type, target_id, user_id, direction)
+        if transition is None:
+            return None
+
+        inc = {field: transition[field] for field in self.COUNTER_DELTA_FIELDS}
+        if extra_inc:
+            for field, value in extra_inc(transition['score']).items():
+                if value:
+                    inc[field] = value
+
+        target = self.db[self.TARGET_COLLECTIONS[target_type]].find_one_and_update(
+            {'_id': ObjectId(target_id)},
+            {'$inc': inc, '$set': {'updated_at': datetime.utcnow()}},
+            projection=self.COUNTER_FIELDS,
+            return_document=ReturnDocument.AFTER
+        )
+
+        if not target:
+            # Target vanished: undo the vote so the collections stay consistent
+            self.collection.delete_one(self._key(target_type, target_id, user_id))
+            return None
+
+        user_vote = transition['user_vote']
+        return {
+            'upvote_count': target.get('upvote_count', 0),
+            'downvote_count': target.get('downvote_count', 0),
+            'score': target.get('score', 0),
+            'user_vote': user_vote,
+            'user_has_upvoted': user_vote == 1,
+            'user_has_downvoted': user_vote == -1,
+            'topic_id': str(target['topic_id']) if target.get('topic_id') else None,
+            'post_id': str(target['post_id']) if target.get('post_id') else None,
+        }
+
+    def record_vote(self, target_type: str, target_id: str, user_id: str,
+                    direction: int) -> Optional[Dict[str, int]]:
+        """
+        Record the vote document only, without touching the target's counters.
+
+        Used directly by the write-behind vote buffer, which applies the
+        returned deltas to the target in micro-batches.
+
+        Returns:
+            Dict with upvote_count/downvote_count/score deltas and the resulting
+            user_vote, or None if the vote is invalid or kept being contended
+        """
+        if direction not in (1, -1) or target_type not in self.TARGET_COLLECTIONS:
+            return None
+
+        transition = self._transition(self._key(target_type, target_id, user_id), direction)
+        if transition is None:
+            return None
+        up_delta, down_delta, user_vote = transition
+        return {
+            'upvote_count': up_delta,
+            'downvote_count': down_delta,
+            'score': up_delta - down_delta,
+            'user_vote': user_vote,
+        }
+
+    def _key(self, target_type: str, target_id: str, user_id: str) -> Dict[str, Any]:
+        """Unique key of a vote document."""
+        return {'target_type': target_type, 'target_id': ObjectId(target_id), 'user_id': ObjectId(user_id)}
+
+    def _transition(self, key: Dict[str, Any], direction: int) -> Optional[tuple]:
+        """
+        Apply the vote as one atomic, state-conditional write.
+
+        Returns:
+            (upvote_delta, downvote_delta, resulting_vote) or None on persistent contention
+        """
+        now = datetime.utcnow()
+        is_up = direction == 1
+
+        for _ in range(self.MAX_ATTEMPTS):
+            # No vote yet -> create it
+            try:
+                self.collection.insert_one({**key, 'value': direction, 'created_at': now, 'updated_at': now})
+                return (1, 0, direction) if is_up else (0, 1, direction)
+            except DuplicateKeyError:
+                pass
+
+            # Same vote exists -> remove it (toggle off)
+            if self.collection.find_one_and_delete({**key, 'value': direction}, projection={'_id': 1}):
+                return (-1, 0, 0) if is_up else (0, -1, 0)
+
+            # Opposite vote exists -> flip it
+            if self.collection.find_one_and_update(
+                {**key, 'value': -direction},
+                {'$set': {'value': direction, 'updated_at': now}},
+                projection={'_id': 1}
+            ):
+                return (1, -1, direction) if is_up else (-1, 1, direction)
+
+            # The vote changed between our writes; retry from the top
+
+        return None
+
+    def get_user_vote(self, target_type: str, target_id: str, user_id: Optional[str]) -> int:
+        """Get a user's vote on a single item (1, -1 or 0)."""
+        if not user_id:
+            return 0
+        vote = self.collection.find_one(
+            {'target_type': target_type, 'target_id': ObjectId(target_id), 'user_id': ObjectId(user_id)},
+            {'value': 1}
+        )
+        return vote.get('value', 0) if vote else 0
+
+    def get_user_votes(self, target_type: str, target_ids: List[Any], user_id: Optional[str]) -> Dict[str, int]:
+        """
+        Batch-fetch a user's votes for a page of items in one query.
+
+        Returns:
+            Dict mapping target_id (str) -> vote value (1 or -1); items without a vote are absent
+        """
+        if not user_id or not target_ids:
+            return {}
+        oids = [tid if isinstance(tid, ObjectId) else ObjectId(str(tid)) for tid in target_ids]
+        votes = self.collection.find(
+            {'target_type': target_type, 'target_id': {'$in': oids}, 'user_id': ObjectId(user_id)},
+            {'target_id': 1, 'value': 1}
+        )
+        return {str(v['target_id']): v.get('value', 0) for v in votes}
+
+    def delete_votes_for_target(self, target_type: str, target_id: str) -> int:
+        """Remove all votes for a hard-deleted item."""
+        result = self.collection.delete_many({'target_type': target_type, 'target_id': ObjectId(target_id)})
+        return result.deleted_count
@@ -7,10 +7,15 @@ from models.message import Message
 from models.post import Post
 from models.comment import Comment
 from models.topic import Topic
-from models.private_message import PrivateMessage
 from utils.decorators import require_auth, require_json, log_requests
 from utils.admin_middleware import require_admin
 from utils.cache_decorator import cache_result
+from utils.session_fallback import revoke_user_sessions
+from utils.scheduler import get_scheduler
+from utils.stats_rollup import get_dashboard_stats, get_series
+from utils.structured_logging import get_logging_state, set_category_level, set_sample_rate
+from utils.id_paging import parse_cursor
+from utils.json_provider import to_jsonable
 from bson import ObjectId
 from datetime import datetime
 import logging
@@ -23,19 +28,34 @@ admin_bp = Blueprint('admin', __name__)
 # REPORTS MANAGEMENT
 # ============================================================================
 
+def get_admin_reports_key(func_name, args, kwargs):
+    """Generate cache key for the admin report listing (one entry per filter and page)."""
+    params = [request.args.get(name, '') for name in
+              ('status', 'report_type', 'content_type', 'limit', 'offset', 'cursor')]
+    key_string = '_'.join(params)
+    import hashlib
+    key_hash = hashlib.md5(key_string.encode()).hexdigest()
+    return f"admin:reports:{key_hash}"
+
+
 @admin_bp.route('/reports', methods=['GET'])
 @require_auth()
 @require_admin()
-@cache_result(ttl=60, key_prefix='admin:reports')
+@cache_result(ttl=60, key_func=get_admin_reports_key)
 @log_requests
 def get_all_reports():
-    """Get all reports with filtering (admin only)."""
+    """Get all reports with filtering (admin only).
+
+    Pages with offset, or with cursor (the next_cursor of the previous page),
+    which reads from the index position instead of skipping.
+    """
     try:
         status = request.args.get('status')
         report_type = request.args.get('report_type')  # 'user' or 'content'
         content_type = request.args.get('content_type')  # 'user', 'message', 'post', 'comment', 'chatroom', etc.
         limit = int(request.args.get('limit', 50))
         offset = int(request.args.get('offset', 0))
+        cursor = parse_cursor(request.args.get('cursor'))
         
         logger.info(f"get_all_reports params: limit={limit}, offset={offset}, status={status}, content_type={content_type}")
 
@@ -78,38 +98,31 @@ def get_all_reports():
 
         logger.info(f"Report filters - status: {status}, report_type: {report_type}, content_type: {content_type}, final query: {query}")
 
-        # Get reports with the query
-        reports_cursor = report_model.collection.find(query).sort([('created_at', -1)])
-        total_before_limit = report_model.collection.count_documents(query)
-        reports = list(reports_cursor.skip(offset).limit(limit))
-        logger.info(f"Fetched {len(reports)} reports from DB")
-        
-        logger.info(f"Found {len(reports)} reports (showing {offset} to {offset + len(reports)} of {total_before_limit} total) with query {query}")
-
-        # Format reports
-        formatted_reports = []
-        logger.info("Starting report formatting loop")
-        for report in reports:
-            try:
-                formatted_report = _format_report(report, current_app.db)
-                formatted_reports.append(formatted_report)
-            except Exception as e:
-                logger.error(f"Error formatting report {report.get('_id')}: {str(e)}", exc_info=True)
-                # Continue with other reports instead of failing entirely
-                continue
+        # One indexed read (status/content_type/report_type, _id); _id order is creation order
+        total_count = None
+        if cursor:
+            query['_id'] = {'$lt': cursor}
+            offset = 0
+        else:
+            total_count = report_model.collection.count_documents(query)
+        reports = list(report_model.collection.find(query).sort([('_id', -1)]).skip(offset).limit(limit + 1))
+        has_more = len(reports) > limit
+        reports = reports[:limit]
+        logger.info(f"Fetched {len(reports)} reports from DB with query {query}")
 
-        total_count = report_model.collection.count_documents(query)
+        formatted_reports = _format_reports(reports, current_app.db)
 
-        return jsonify(_serialize_for_json({
+        return jsonify({
             'success': True,
             'data': formatted_reports,
             'pagination': {
                 'limit': limit,
                 'offset': offset,
                 'total': total_count,
-                'has_more': offset + limit < total_count
+                'has_more': has_more,
+                'next_cursor': str(reports[-1]['_id']) if has_more and reports else None
             }
-        })), 200
+        }), 200
 
     except Exception as e:
         logger.error(f"Get all reports error: {str(e)}", exc_info=True)
@@ -243,6 +256,7 @@ def take_action_on_report(report_id):
                     admin_id,
                     ban_duration_days
                 )
+                revoke_user_sessions(str(reported_user_id))
 
             action_taken = 'user_banned'
 
@@ -424,7 +438,7 @@ def get_all_tickets():
         
         logger.info(f"Ticket count: {total_count} with filters - status: {status_filter}, category: {category_filter}, priority: {priority_filter}")
 
-        return jsonify(_serialize_for_json({
+        return jsonify({
             'success': True,
             'data': tickets,
             'pagination': {
@@ -433,7 +447,7 @@ def get_all_tickets():
                 'total': total_count,
                 'has_more': offset + limit < total_count
             }
-        })), 200
+        }), 200
 
     except Exception as e:
         logger.error(f"Get all tickets error: {str(e)}", exc_info=True)
@@ -543,6 +557,8 @@ def ban_user(user_id):
         success = user_model.ban_user(user_id, reason, admin_id, duration_days)
 
         if success:
+            # Sign the user out everywhere
+            revoke_user_sessions(user_id)
             try:
                 current_app.config['CACHE_INVALIDATOR'].invalidate_admin_banned_users()
                 # Invalidate user entity cache
@@ -663,10 +679,10 @@ def get_banned_users():
         # Sort by banned_at descending (most recent first)
         banned_users.sort(key=lambda x: x['banned_at'] or '', reverse=True)
         
-        return jsonify(_serialize_for_json({
+        return jsonify({
             'success': True,
             'data': banned_users
-        })), 200
+        }), 200
 
     except Exception as e:
         logger.error(f"Get banned users error: {str(e)}", exc_info=True)
@@ -762,7 +778,7 @@ def get_deleted_messages():
         messages = message_model.get_deleted_messages(limit=limit, skip=offset)
         total_count = message_model.get_deleted_messages_count()
         
-        return jsonify(_serialize_for_json({
+        return jsonify({
             'success': True,
             'data': messages,
             'pagination': {
@@ -771,7 +787,7 @@ def get_deleted_messages():
                 'total': total_count,
                 'has_more': offset + limit < total_count
             }
-        })), 200
+        }), 200
 
     except Exception as e:
         logger.error(f"Get deleted messages error: {str(e)}", exc_info=True)
@@ -822,21 +838,74 @@ def cleanup_expired_messages():
         return jsonify({'success': False, 'errors': ['Failed to cleanup expired messages']}), 500
 
 
-def _serialize_for_json(obj):
-    """Recursively serialize ObjectIds and datetimes for JSON."""
-    from bson import ObjectId
-    from datetime import datetime
-    
-    if isinstance(obj, ObjectId):
-        return str(obj)
-    elif isinstance(obj, datetime):
-        return obj.isoformat()
-    elif isinstance(obj, dict):
-        return {k: _serialize_for_json(v) for k, v in obj.items()}
-    elif isinstance(obj, list):
-        return [_serialize_for_json(item) for item in obj]
-    else:
-        return obj
+@admin_bp.route('/scheduler/jobs', methods=['GET'])
+@require_auth()
+@require_admin()
+@log_requests
+def get_scheduler_jobs():
+    """List maintenance jobs with their last recorded runs (admin only)."""
+    scheduler = get_scheduler()
+    if not scheduler:
+        return jsonify({'success': False, 'errors': ['Scheduler is disabled']}), 404
+
+    return jsonify({
+        'success': True,
+        'data': {
+            'jobs': scheduler.job_history(),
+            'leader': scheduler.lease.holder(),
+            'this_process': scheduler.lease.owner
+        }
+    }), 200
+
+
+@admin_bp.route('/scheduler/jobs/<job_name>/run', methods=['POST'])
+@require_auth()
+@require_admin()
+@log_requests
+def run_scheduler_job(job_name):
+    """Run a maintenance job now on this replica (admin only)."""
+    scheduler = get_scheduler()
+    if not scheduler:
+        return jsonify({'success': False, 'errors': ['Scheduler is disabled']}), 404
+    if job_name not in scheduler.jobs:
+        return jsonify({'success': False, 'errors': ['Unknown job']}), 404
+
+    stats = scheduler.run_job(job_name)
+    if stats['last_error']:
+        return jsonify({'success': False, 'errors': [f"Job failed: {stats['last_error']}"]}), 500
+    return jsonify({'success': True, 'data': stats}), 200
+
+
+@admin_bp.route('/logging', methods=['GET'])
+@require_auth()
+@require_admin()
+def get_logging_settings():
+    """Event log categories with their level and sample rate, and writer queue stats (admin only)."""
+    return jsonify({'success': True, 'data': get_logging_state()}), 200
+
+
+@admin_bp.route('/logging', methods=['PUT'])
+@require_auth()
+@require_admin()
+@log_requests
+def update_logging_settings():
+    """
+    Change event log levels and sample rates at runtime (admin only).
+
+    Applies to the replica that serves the request; restarts reset to config.
+    Body: {"levels": {"socket.message": "DEBUG"}, "sample_rates": {"http.request": 1.0}}
+    """
+    data = request.get_json() or {}
+    try:
+        for category, level in (data.get('levels') or {}).items():
+            set_category_level(category, level)
+        for category, rate in (data.get('sample_rates') or {}).items():
+            set_sample_rate(category, rate)
+    except (TypeError, ValueError) as e:
+        return jsonify({'success': False, 'errors': [str(e)]}), 400
+
+    logger.warning(f"Logging settings changed: {data}")
+    return jsonify({'success': True, 'data': get_logging_state()}), 200
 
 
 @admin_bp.route('/pending-deletions', methods=['GET'])
@@ -858,19 +927,14 @@ def get_pending_deletions():
         pending_posts = post_model.get_pending_deletions()
         pending_chatrooms = chat_room_model.get_pending_deletions()
         
-        # Serialize all data to ensure no ObjectIds or datetimes remain
-        pending_topics = [_serialize_for_json(t) for t in pending_topics]
-        pending_posts = [_serialize_for_json(p) for p in pending_posts]
-        pending_chatrooms = [_serialize_for_json(c) for c in pending_chatrooms]
-        
-        return jsonify(_serialize_for_json({
+        return jsonify({
             'success': True,
             'data': {
                 'topics': pending_topics,
                 'posts': pending_posts,
                 'chatrooms': pending_chatrooms
             }
-        })), 200
+        }), 200
         
     except Exception as e:
         logger.error(f"Get pending deletions error: {str(e)}", exc_info=True)
@@ -1024,52 +1088,13 @@ def reject_chatroom_deletion(room_id):
 @require_admin()
 @log_requests
 def get_admin_stats():
-    """Get admin dashboard statistics (admin only)."""
+    """Get admin dashboard statistics (admin only), read from the stats rollups."""
     try:
-        report_model = Report(current_app.db)
-        ticket_model = Ticket(current_app.db)
-        user_model = User(current_app.db)
+        stats = get_dashboard_stats(current_app.db)
 
-        # Get report statistics
-        report_stats = report_model.get_report_statistics()
-
-        # Get ticket statistics
-        ticket_stats = ticket_model.get_ticket_statistics()
-
-        # Get user statistics
-        total_users = user_model.collection.count_documents({})
-        banned_users = user_model.collection.count_documents({'is_banned': True})
-        admin_users = user_model.collection.count_documents({'is_admin': True})
-
-        # Get recent activity counts
-        from datetime import datetime, timedelta
-        last_24h = datetime.utcnow() - timedelta(hours=24)
-        last_7d = datetime.utcnow() - timedelta(days=7)
-
-        new_reports_24h = report_model.collection.count_documents({
-            'created_at': {'$gte': last_24h}
-        })
-        new_tickets_24h = ticket_model.collection.count_documents({
-            'created_at': {'$gte': last_24h}
-        })
-        new_users_7d = user_model.collection.count_documents({
-            'created_at': {'$gte': last_7d}
-        })
-
-        stats = {
-            'reports': report_stats,
-            'tickets': ticket_stats,
-            'users': {
-                'total': total_users,
-                'banned': banned_users,
-                'admins': admin_users,
-                'new_last_7_days': new_users_7d
-            },
-            'recent_activity': {
-                'new_reports_24h': new_reports_24h,
-                'new_tickets_24h': new_tickets_24h
-            }
-        }
+        cache = current_app.config.get('CACHE')
+        if cache:
+            stats['cache'] = cache.stats()
 
         return jsonify({
             'success': True,
@@ -1081,330 +1106,204 @@ def get_admin_stats():
         return jsonify({'success': False, 'errors': ['Failed to get admin statistics']}), 500
 
 
+@admin_bp.route('/stats/series', methods=['GET'])
+@require_auth()
+@require_admin()
+@log_requests
+def get_admin_stats_series():
+    """Get created reports, tickets and users per hour or day (admin only)."""
+    try:
+        granularity = request.args.get('granularity', 'day')
+        if granularity not in ('hour', 'day'):
+            return jsonify({'success': False, 'errors': ['granularity must be hour or day']}), 400
+
+        default_periods = 48 if granularity == 'hour' else 30
+        periods = int(request.args.get('periods', default_periods))
+        if periods < 1 or periods > 366:
+            periods = default_periods
+
+        return jsonify({
+            'success': True,
+            'data': {
+                'granularity': granularity,
+                'series': get_series(current_app.db, granularity, periods)
+            }
+        }), 200
+
+    except Exception as e:
+        logger.error(f"Get admin stats series error: {str(e)}", exc_info=True)
+        return jsonify({'success': False, 'errors': ['Failed to get statistics series']}), 500
+
+
 # ============================================================================
 # HELPER FUNCTIONS
 # ============================================================================
 
-def _format_report(report: dict, db) -> dict:
-    """Format report for API response with enriched data based on content type."""
-    # Convert ObjectIds to strings
-    report['_id'] = str(report['_id'])
-    report['id'] = str(report['_id'])
-    if report.get('reported_by'):
-        report['reported_by'] = str(report['reported_by'])
-    else:
-        report['reported_by'] = None
+def _format_reports(reports: list, db) -> list:
+    """Format reports for API response, with one users query for the whole page."""
+    report_model = Report(db)
+    report_model.ensure_snapshots(reports)
+    users = report_model.get_report_users(reports)
+
+    formatted_reports = []
+    for report in reports:
+        try:
+            formatted_reports.append(_format_report(report, users))
+        except Exception as e:
+            logger.error(f"Error formatting report {report.get('_id')}: {str(e)}", exc_info=True)
+            # Continue with other reports instead of failing entirely
+            continue
+    return formatted_reports
 
-    if report.get('reported_content_id'):
-        report['reported_content_id'] = str(report['reported_content_id'])
-    if report.get('reported_user_id'):
-        report['reported_user_id'] = str(report['reported_user_id'])
-    if report.get('topic_id'):
-        report['topic_id'] = str(report['topic_id'])
-    if report.get('reviewed_by'):
-        report['reviewed_by'] = str(report['reviewed_by'])
-    
-    # Convert attached_messages specific list of ObjectIds
-    if report.get('attached_messages'):
-        report['attached_messages'] = [str(mid) for mid in report['attached_messages']]
 
-    # Convert datetimes
-    if isinstance(report.get('created_at'), datetime):
-        report['created_at'] = report['created_at'].isoformat()
-    if isinstance(report.get('reviewed_at'), datetime):
-        report['reviewed_at'] = report['reviewed_at'].isoformat()
+def _format_report(report: dict, users: dict) -> dict:
+    """Format report for API response with enriched data based on content type.
 
-    # Enrich with user details
-    user_model = User(db)
+    Content comes from the report's snapshot (see utils/moderation_queue);
+    users maps user ids to user documents.
+    """
+    snapshot = report.pop('snapshot', None) or {}
+    report.pop('history_request', None)
+
+    # Convert ObjectIds and datetimes to strings
+    report = to_jsonable(report)
+    report['id'] = report['_id']
+    report['reported_by'] = report.get('reported_by') or None
 
     # Get reporter
-    reporter_id = report.get('reported_by')
-    if isinstance(reporter_id, ObjectId):
-        reporter_id = str(reporter_id)
-    elif reporter_id:
-        reporter_id = str(reporter_id)
-    else:
-        reporter_id = None
-    
-    if reporter_id:
-        reporter = user_model.get_user_by_id(reporter_id)
-        if reporter:
-            report['reporter'] = {
-                'id': reporter.get('id'),
-                'username': reporter.get('username')
-            }
-            report['reporter_username'] = reporter.get('username', 'Unknown')
-        else:
-            report['reporter_username'] = 'Unknown'
-            report['reporter'] = None
+    reporter = users.get(report['reported_by'] or '')
+    if reporter:
+        report['reporter'] = {
+            'id': str(reporter['_id']),
+            'username': reporter.get('username')
+        }
+        report['reporter_username'] = reporter.get('username', 'Unknown')
     else:
         report['reporter_username'] = 'Unknown'
         report['reporter'] = None
 
     # Get reported user details if user report
     if report.get('reported_user_id'):
-        reported_user_id_str = str(report['reported_user_id']) if isinstance(report['reported_user_id'], ObjectId) else report['reported_user_id']
-        reported_user = user_model.get_user_by_id(reported_user_id_str)
+        reported_user = users.get(report['reported_user_id'])
         if reported_user:
-            report['reported_user'] = {
-                'id': reported_user.get('id'),
-                'username': reported_user.get('username'),
-                'is_banned': reported_user.get('is_banned', False)
-            }
+            report['reported_user'] = _format_reported_user(reported_user)
             report['reported_username'] = reported_user.get('username', 'Unknown')
         else:
             report['reported_username'] = 'Unknown'
-    
+
     # Get content-specific information based on content_type
     content_type = report.get('content_type', 'user')
     report['content_type'] = content_type
-    
+
     # Initialize content_data structure
     report['content_data'] = {}
-    
-    if report.get('reported_content_id'):
-        content_id = report.get('reported_content_id')
-        if isinstance(content_id, ObjectId):
-            content_id = str(content_id)
-        else:
-            content_id = str(content_id)
-        
+
+    content = snapshot.get('content')
+    if report.get('reported_content_id') and content:
+        # The author of messages, posts and comments is the reported user
+        author = users.get(snapshot.get('author_id') or '')
+        if author:
+            report['reported_user_id'] = snapshot['author_id']
+            original_username = author.get('username', 'Unknown')
+
+            # Format username: show anonymous name with original in parentheses for admins
+            anonymous_name = snapshot.get('anonymous_name') if content_type != 'private_message' else None
+            if anonymous_name:
+                report['reported_username'] = f"{anonymous_name} ({original_username})"
+                report['reported_username_display'] = anonymous_name
+            else:
+                report['reported_username'] = original_username
+                report['reported_username_display'] = original_username
+            report['reported_username_original'] = original_username
+            report['reported_user'] = _format_reported_user(author)
+
         if content_type == 'message':
-            message_model = Message(db)
-            content = message_model.get_message_by_id(content_id)
-            if content:
-                # Get user from message
-                user_id = content.get('user_id')
-                if isinstance(user_id, ObjectId):
-                    user_id = str(user_id)
-                else:
-                    user_id = str(user_id)
-                reported_user = user_model.get_user_by_id(user_id)
-                if reported_user:
-                    report['reported_user_id'] = user_id
-                    original_username = reported_user.get('username', 'Unknown')
-                    
-                    # Check if message is anonymous and get anonymous name
-                    anonymous_name = None
-                    if content.get('is_anonymous') or content.get('anonymous_identity'):
-                        anonymous_name = content.get('display_name') or content.get('sender_username') or content.get('anonymous_identity')
-                    
-                    # Format username: show anonymous name with original in parentheses for admins
-                    if anonymous_name:
-                        report['reported_username'] = f"{anonymous_name} ({original_username})"
-                        report['reported_username_display'] = anonymous_name
-                        report['reported_username_original'] = original_username
-                    else:
-                        report['reported_username'] = original_username
-                        report['reported_username_display'] = original_username
-                        report['reported_username_original'] = original_username
-                    
-                    report['reported_user'] = {
-                        'id': reported_user.get('id'),
-                        'username': original_username,
-                        'is_banned': reported_user.get('is_banned', False)
-                    }
-                
-                # Message-specific data
-                report['content_data'] = {
-                    'content': content.get('content', ''),
-                    'message_type': content.get('message_type', 'text'),
-                    'created_at': content.get('created_at').isoformat() if isinstance(content.get('created_at'), datetime) else content.get('created_at'),
-                    'attachments': content.get('attachments', []),
-                    'chat_room_id': str(content.get('chat_room_id')) if content.get('chat_room_id') else None,
-                    'topic_id': str(content.get('topic_id')) if content.get('topic_id') else None,
-                }
+            # Message-specific data
+            report['content_data'] = {
+                'content': content.get('content', ''),
+                'message_type': content.get('message_type', 'text'),
+                'created_at': content.get('created_at'),
+                'attachments': content.get('attachments', []),
+                'chat_room_id': content.get('chat_room_id'),
+                'topic_id': content.get('topic_id'),
+            }
         elif content_type == 'private_message':
-            pm_model = PrivateMessage(db)
-            content = pm_model.get_message_by_id(content_id)
-            if content:
-                # Get user from message (sender)
-                user_id = content.get('from_user_id')
-                if isinstance(user_id, ObjectId):
-                    user_id = str(user_id)
-                else:
-                    user_id = str(user_id)
-                reported_user = user_model.get_user_by_id(user_id)
-                if reported_user:
-                    report['reported_user_id'] = user_id
-                    original_username = reported_user.get('username', 'Unknown')
-                    
-                    report['reported_username'] = original_username
-                    report['reported_username_display'] = original_username
-                    report['reported_username_original'] = original_username
-                    
-                    report['reported_user'] = {
-                        'id': reported_user.get('id'),
-                        'username': original_username,
-                        'is_banned': reported_user.get('is_banned', False)
-                    }
-                
-                # Process attachments to ensure no ObjectIds remain
-                processed_attachments = []
-                for att in content.get('attachments', []):
-                    processed_att = att.copy()
-                    if processed_att.get('file_id') and isinstance(processed_att['file_id'], ObjectId):
-                        processed_att['file_id'] = str(processed_att['file_id'])
-                    processed_attachments.append(processed_att)
-
-                # Message-specific data
-                report['content_data'] = {
-                    'content': content.get('content', ''),
-                    'message_type': content.get('message_type', 'text'),
-                    'created_at': content.get('created_at').isoformat() if isinstance(content.get('created_at'), datetime) else content.get('created_at'),
-                    'attachments': processed_attachments,
-                    'to_user_id': str(content.get('to_user_id'))
-                }
+            report['content_data'] = {
+                'content': content.get('content', ''),
+                'message_type': content.get('message_type', 'text'),
+                'created_at': content.get('created_at'),
+                'attachments': content.get('attachments', []),
+                'to_user_id': content.get('to_user_id')
+            }
         elif content_type == 'post':
-            post_model = Post(db)
-            content = post_model.get_post_by_id(content_id)
-            if content:
-                # Get user from post
-                user_id = content.get('user_id')
-                if isinstance(user_id, ObjectId):
-                    user_id = str(user_id)
-                else:
-                    user_id = str(user_id)
-                reported_user = user_model.get_user_by_id(user_id)
-                if reported_user:
-                    report['reported_user_id'] = user_id
-                    original_username = reported_user.get('username', 'Unknown')
-                    
-                    # Check if post is anonymous and get anonymous name
-                    anonymous_name = None
-                    if content.get('is_anonymous') or content.get('anonymous_identity'):
-                        anonymous_name = content.get('display_name') or content.get('author_username') or content.get('anonymous_identity')
-                    
-                    # Format username: show anonymous name with original in parentheses for admins
-                    if anonymous_name:
-                        report['reported_username'] = f"{anonymous_name} ({original_username})"
-                        report['reported_username_display'] = anonymous_name
-                        report['reported_username_original'] = original_username
-                    else:
-                        report['reported_username'] = original_username
-                        report['reported_username_display'] = original_username
-                        report['reported_username_original'] = original_username
-                    
-                    report['reported_user'] = {
-                        'id': reported_user.get('id'),
-                        'username': original_username,
-                        'is_banned': reported_user.get('is_banned', False)
-                    }
-                
-                # Post-specific data
-                report['content_data'] = {
-                    'title': content.get('title', ''),
-                    'content': content.get('content', ''),
-                    'created_at': content.get('created_at').isoformat() if isinstance(content.get('created_at'), datetime) else content.get('created_at'),
-                    'upvote_count': content.get('upvote_count', 0),
-                    'comment_count': content.get('comment_count', 0),
-                    'topic_id': str(content.get('topic_id')) if content.get('topic_id') else None,
-                }
+            report['content_data'] = {
+                'title': content.get('title', ''),
+                'content': content.get('content', ''),
+                'created_at': content.get('created_at'),
+                'upvote_count': content.get('upvote_count', 0),
+                'comment_count': content.get('comment_count', 0),
+                'topic_id': content.get('topic_id'),
+            }
         elif content_type == 'comment':
-            comment_model = Comment(db)
-            content = comment_model.get_comment_by_id(content_id)
-            if content:
-                # Get user from comment
-                user_id = content.get('user_id')
-                if isinstance(user_id, ObjectId):
-                    user_id = str(user_id)
-                else:
-                    user_id = str(user_id)
-                reported_user = user_model.get_user_by_id(user_id)
-                if reported_user:
-                    report['reported_user_id'] = user_id
-                    original_username = reported_user.get('username', 'Unknown')
-                    
-                    # Check if comment is anonymous and get anonymous name
-                    anonymous_name = None
-                    if content.get('is_anonymous') or content.get('anonymous_identity'):
-                        anonymous_name = content.get('display_name') or content.get('author_username') or content.get('anonymous_identity')
-                    
-                    # Format username: show anonymous name with original in parentheses for admins
-                    if anonymous_name:
-                        report['reported_username'] = f"{anonymous_name} ({original_username})"
-                        report['reported_username_display'] = anonymous_name
-                        report['reported_username_original'] = original_username
-                    else:
-                        report['reported_username'] = original_username
-                        report['reported_username_display'] = original_username
-                        report['reported_username_original'] = original_username
-                    
-                    report['reported_user'] = {
-                        'id': reported_user.get('id'),
-                        'username': original_username,
-                        'is_banned': reported_user.get('is_banned', False)
-                    }
-                
-                # Comment-specific data
-                report['content_data'] = {
-                    'content': content.get('content', ''),
-                    'created_at': content.get('created_at').isoformat() if isinstance(content.get('created_at'), datetime) else content.get('created_at'),
-                    'upvote_count': content.get('upvote_count', 0),
-                    'post_id': str(content.get('post_id')) if content.get('post_id') else None,
-                    'parent_comment_id': str(content.get('parent_comment_id')) if content.get('parent_comment_id') else None,
-                }
+            report['content_data'] = {
+                'content': content.get('content', ''),
+                'created_at': content.get('created_at'),
+                'upvote_count': content.get('upvote_count', 0),
+                'post_id': content.get('post_id'),
+                'parent_comment_id': content.get('parent_comment_id'),
+            }
         elif content_type in ['chatroom', 'chatroom_background', 'chatroom_picture']:
-            from models.chat_room import ChatRoom
-            chat_room_model = ChatRoom(db)
-            content = chat_room_model.get_chat_room_by_id(content_id)
-            if content:
-                # Chatroom-specific data (not user-bound)
-                report['content_data'] = {
-                    'name': content.get('name', ''),
-                    'description': content.get('description', ''),
-                    'created_at': content.get('created_at').isoformat() if isinstance(content.get('created_at'), datetime) else content.get('created_at'),
-                    'topic_id': str(content.get('topic_id')) if content.get('topic_id') else None,
-                    'owner': content.get('owner', {}),
-                    'moderators': content.get('moderators', []),
-                }
-                # Include owner and moderators from report if available
-                if report.get('owner_id'):
-                    report['content_data']['owner_id'] = str(report['owner_id'])
-                if report.get('owner_username'):
-                    report['content_data']['owner_username'] = report['owner_username']
-                if report.get('moderators'):
-                    report['content_data']['moderators'] = report['moderators']
-    
+            # Chatroom-specific data (not user-bound)
+            owner = users.get(content.get('owner_id') or '')
+            report['content_data'] = {
+                'name': content.get('name', ''),
+                'description': content.get('description', ''),
+                'created_at': content.get('created_at'),
+                'topic_id': content.get('topic_id'),
+                'owner': {'id': str(owner['_id']), 'username': owner['username']} if owner else {},
+                'moderators': content.get('moderators', []),
+            }
+            # Include owner and moderators from report if available
+            if report.get('owner_id'):
+                report['content_data']['owner_id'] = report['owner_id']
+            if report.get('owner_username'):
+                report['content_data']['owner_username'] = report['owner_username']
+            if report.get('moderators'):
+                report['content_data']['moderators'] = report['moderators']
+
     # Include attached messages if available
     if report.get('attached_messages'):
         attached_messages = []
-        message_model = Message(db)
-        for msg_id in report.get('attached_messages', []):
-            if isinstance(msg_id, ObjectId):
-                msg_id = str(msg_id)
-            else:
-                msg_id = str(msg_id)
-            msg = message_model.get_message_by_id(msg_id)
-            if msg:
-                # Include GIF URL if present
-                attachments = msg.get('attachments', [])
-                if msg.get('gif_url'):
-                    # Add GIF as an attachment if not already in attachments
-                    gif_in_attachments = any(att.get('type') == 'gif' or att.get('gif_url') for att in attachments)
-                    if not gif_in_attachments:
-                        attachments.append({
-                            'type': 'gif',
-                            'url': msg.get('gif_url'),
-                            'gif_url': msg.get('gif_url'),
-                            'filename': 'GIF'
-                        })
-                
-                # Sanitize attachments (convert ObjectId to str)
-                sanitized_attachments = []
-                for att in attachments:
-                    sanitized_att = att.copy()
-                    if sanitized_att.get('file_id') and isinstance(sanitized_att['file_id'], ObjectId):
-                        sanitized_att['file_id'] = str(sanitized_att['file_id'])
-                    sanitized_attachments.append(sanitized_att)
-                
-                attached_messages.append({
-                    'id': str(msg.get('_id')),
-                    'content': msg.get('content', ''),
-                    'created_at': msg.get('created_at').isoformat() if isinstance(msg.get('created_at'), datetime) else msg.get('created_at'),
-                    'attachments': sanitized_attachments,
-                    'gif_url': msg.get('gif_url')  # Also include at message level for compatibility
-                })
+        for msg in snapshot.get('attached_messages', []):
+            # Include GIF URL if present
+            attachments = list(msg.get('attachments', []))
+            if msg.get('gif_url'):
+                # Add GIF as an attachment if not already in attachments
+                gif_in_attachments = any(att.get('type') == 'gif' or att.get('gif_url') for att in attachments)
+                if not gif_in_attachments:
+                    attachments.append({
+                        'type': 'gif',
+                        'url': msg.get('gif_url'),
+                        'gif_url': msg.get('gif_url'),
+                        'filename': 'GIF'
+                    })
+
+            attached_messages.append({
+                'id': msg.get('_id'),
+                'content': msg.get('content', ''),
+                'created_at': msg.get('created_at'),
+                'attachments': attachments,
+                'gif_url': msg.get('gif_url')  # Also include at message level for compatibility
+            })
         report['attached_messages_data'] = attached_messages
 
     return report
+
+
+def _format_reported_user(user: dict) -> dict:
+    """Reported user summary for admin report views."""
+    return {
+        'id': str(user['_id']),
+        'username': user.get('username'),
+        'is_banned': user.get('is_banned', False)
+    }
@@ -1,15 +1,17 @@
 """
 Attachments route for serving files with encryption key protection.
 """
-from flask import Blueprint, request, send_file, jsonify, current_app, abort, after_this_request
+from flask import Blueprint, request, send_file, jsonify, current_app, abort
 from services.auth_service import AuthService
-from services.file_storage import FileStorageService
+from services.file_storage import get_file_storage_service
 from utils.decorators import log_requests
 import os
 import logging
 from pathlib import Path
 import hashlib
 import hmac
+import io
+from werkzeug.exceptions import HTTPException
 
 logger = logging.getLogger(__name__)
 attachments_bp = Blueprint('attachments', __name__)
@@ -37,6 +39,29 @@ def _generate_encryption_key(file_id: str, secret_key: str) -> str:
     return hashlib.sha256(key_data).hexdigest()[:16]
 
 
+# Prefix of stored pictures (utils/image_refs): public, never deleted or moderated
+IMMUTABLE_FILE_PREFIX = 'img_'
+
+
+def _cacheable(response, file_id: str):
+    """
+    Cache headers for an attachment response.
+
+    Picture refs (`img_` IDs) never point at different content and the URL
+    carries its access key, so browsers and CDNs may keep them for a long
+    time. Other files (DM and chat attachments) can be deleted or moderated:
+    only the browser caches them, briefly.
+    """
+    if file_id.startswith(IMMUTABLE_FILE_PREFIX):
+        max_age = current_app.config.get('ATTACHMENT_CACHE_MAX_AGE', 31536000)
+        response.headers['Cache-Control'] = f"public, max-age={max_age}, immutable"
+    else:
+        max_age = current_app.config.get('ATTACHMENT_PRIVATE_CACHE_MAX_AGE', 300)
+        response.headers['Cache-Control'] = f"private, max-age={max_age}"
+    response.set_etag(file_id)
+    return response
+
+
 @attachments_bp.route('/<file_id>', methods=['GET'])
 @log_requests
 def get_attachment(file_id):
@@ -51,79 +76,49 @@ def get_attachment(file_id):
         if not encryption_key:
             abort(403, description="Encryption key required")
         
-        # Get file storage service
-        use_azure = current_app.config.get('USE_AZURE_STORAGE', False)
-        file_storage = FileStorageService(
-            uploads_dir=current_app.config.get('UPLOADS_DIR'),
-            use_azure=use_azure
-        )
-        
         # Validate encryption key
         secret_key = current_app.config.get('FILE_ENCRYPTION_KEY') or current_app.config.get('SECRET_KEY')
-        expected_key = _generate_encryption_key(file_id, secret_key)
-        
         if not _validate_encryption_key(file_id, encryption_key, secret_key):
             abort(403, description="Invalid encryption key")
-        
+
+        # Revalidation of a picture: its content never changes, skip storage entirely
+        # (other files are looked up first, they may have been deleted)
+        if file_id.startswith(IMMUTABLE_FILE_PREFIX) and request.if_none_match.contains(file_id):
+            return _cacheable(current_app.response_class(status=304), file_id)
+
+        use_azure = current_app.config.get('USE_AZURE_STORAGE', False)
+        file_storage = get_file_storage_service(
+            uploads_dir=current_app.config.get('UPLOADS_DIR'),
+            use_azure=use_azure
+        )
+
         # Get file path or URL
         if use_azure:
             # For Azure, we need to find the blob by file_id
             try:
-                from azure.storage.blob import BlobServiceClient
-                connection_string = current_app.config.get('AZURE_STORAGE_CONNECTION_STRING')
-                container_name = current_app.config.get('AZURE_STORAGE_CONTAINER', 'uploads')
+                container_client = file_storage.blob_service_client.get_container_client(
+                    file_storage.container_name
+                )
                 
-                blob_service = BlobServiceClient.from_connection_string(connection_string)
-                container_client = blob_service.get_container_client(container_name)
-                
-                # Search for blob with matching file_id in name or metadata
-                blob_name = None
-                # Search for blob with matching file_id prefix
-                # Efficiently find blob starting with file_id
+                # Blob names are file_id + extension
                 blobs = container_client.list_blobs(name_starts_with=file_id)
                 blob_name = next((b.name for b in blobs), None)
                 
                 if not blob_name:
                     abort(404, description="File not found")
                 
-                blob_client = container_client.get_blob_client(blob_name)
-                
-                # Download blob to temporary file
-                import tempfile
-                # Create a temporary file that will be deleted after the request is processed
-                tmp_file = tempfile.NamedTemporaryFile(delete=False)
-                try:
-                    blob_data = blob_client.download_blob()
-                    tmp_file.write(blob_data.readall())
-                    tmp_file.close()
-                    tmp_path = tmp_file.name
-
-                    # Schedule deletion after request
-                    @after_this_request
-                    def remove_temp_file(response):
-                        try:
-                            if os.path.exists(tmp_path):
-                                os.remove(tmp_path)
-                        except Exception as e:
-                            logger.error(f"Error removing temp file {tmp_path}: {e}")
-                        return response
-
-                    # Get content type from blob properties
-                    blob_props = blob_client.get_blob_properties()
-                    content_type = blob_props.content_settings.content_type
-
-                    return send_file(
-                        tmp_path,
-                        mimetype=content_type,
-                        as_attachment=False,
-                        download_name=blob_props.metadata.get('filename', file_id)
-                    )
-                except Exception as e:
-                    # Clean up if something goes wrong before response
-                    if os.path.exists(tmp_file.name):
-                        os.remove(tmp_file.name)
-                    raise e
-
+                # One download carries the content type and metadata too
+                downloader = container_client.get_blob_client(blob_name).download_blob()
+                blob_props = downloader.properties
+                response = send_file(
+                    io.BytesIO(downloader.readall()),
+                    mimetype=blob_props.content_settings.content_type,
+                    as_attachment=False,
+                    download_name=(blob_props.metadata or {}).get('filename', file_id)
+                )
+                return _cacheable(response, file_id)
+            except HTTPException:
+                raise
             except Exception as e:
                 logger.error(f"Failed to serve Azure blob: {e}")
                 abort(404, description="File not found")
@@ -135,17 +130,20 @@ def get_attachment(file_id):
                 abort(404, description="File not found")
             
             # Get file info from index
-            file_info = file_storage.file_index.get(file_id, {})
+            file_info = file_storage.get_file_info(file_id) or {}
             filename = file_info.get('filename', file_id)
             mime_type = file_info.get('mime_type', 'application/octet-stream')
             
-            return send_file(
+            response = send_file(
                 file_path,
                 mimetype=mime_type,
                 as_attachment=False,
                 download_name=filename
             )
+            return _cacheable(response, file_id)
     
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error serving attachment: {e}")
         abort(500, description="Failed to serve file")
@@ -162,7 +160,7 @@ def get_attachment_info(file_id):
             return jsonify({'success': False, 'errors': ['Authentication required']}), 401
         
         use_azure = current_app.config.get('USE_AZURE_STORAGE', False)
-        file_storage = FileStorageService(
+        file_storage = get_file_storage_service(
             uploads_dir=current_app.config.get('UPLOADS_DIR'),
             use_azure=use_azure
         )
@@ -209,11 +207,10 @@ def get_attachment_info(file_id):
                 return jsonify({'success': False, 'errors': ['File not found']}), 404
         else:
             # Get info from local index
-            if file_id not in file_storage.file_index:
+            file_info = file_storage.get_file_info(file_id)
+            if file_info is None:
                 return jsonify({'success': False, 'errors': ['File not found']}), 404
             
-            file_info = file_storage.file_index[file_id]
-            
             return jsonify({
                 'success': True,
                 'data': {
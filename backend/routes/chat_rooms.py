@@ -7,6 +7,10 @@ from models.conversation_settings import ConversationSettings
 from utils.validators import validate_message_content, validate_pagination_params
 from utils.decorators import require_auth, require_json, log_requests
 from utils.cache_decorator import cache_result
+from utils.metrics import observe_fanout
+from utils.response_envelope import list_response
+from utils.room_buffer import buffer_message
+from utils.id_paging import fetch_id_page, page_info
 from bson import ObjectId
 import hashlib
 import json
@@ -495,6 +499,7 @@ def get_chat_room_messages(room_id):
     try:
         limit = int(request.args.get('limit', 50))
         before_message_id = request.args.get('before_message_id')
+        after_message_id = request.args.get('after_message_id')
 
         # Validate pagination
         pagination_result = validate_pagination_params(limit, 0)
@@ -523,10 +528,7 @@ def get_chat_room_messages(room_id):
         if user_id and not room.get('is_public', True) and not chat_room_model.is_user_member(room_id, user_id):
             return jsonify({'success': False, 'errors': ['You are not a member of this chat room']}), 403
 
-        # Get messages
-        message_model = Message(current_app.db)
-        # We need to add a method to get messages by chat_room_id
-        # For now, query directly
+        # Get messages: one indexed range read on (chat_room_id, is_deleted, _id)
         from bson import ObjectId
         from datetime import datetime
         
@@ -535,20 +537,9 @@ def get_chat_room_messages(room_id):
             'is_deleted': False
         }
 
-        if before_message_id:
-            try:
-                before_message = current_app.db.messages.find_one({'_id': ObjectId(before_message_id)})
-                if before_message:
-                    query['created_at'] = {'$lt': before_message['created_at']}
-            except:
-                pass
-
-        messages = list(current_app.db.messages.find(query)
-                       .sort([('created_at', -1)])
-                       .limit(limit))
-
-        # Reverse to get chronological order and convert ObjectIds
-        messages.reverse()
+        messages, has_more = fetch_id_page(current_app.db.messages, query, limit,
+                                           before_message_id=before_message_id,
+                                           after_message_id=after_message_id)
 
         # Optimization: Batch fetch users
         user_ids = set()
@@ -647,10 +638,7 @@ def get_chat_room_messages(room_id):
                     if isinstance(message['reactions'][key], list):
                         message['reactions'][key] = [str(r) if isinstance(r, ObjectId) else r for r in message['reactions'][key]]
 
-        return jsonify({
-            'success': True,
-            'data': messages
-        }), 200
+        return list_response(messages, pagination=page_info(messages, has_more, after_message_id)), 200
 
     except Exception as e:
         logger.error(f"Get chat room messages error: {str(e)}", exc_info=True)
@@ -736,11 +724,11 @@ def create_chat_room_message(room_id):
         
         # Process attachments: convert base64 to files and store them
         if attachments:
-            from services.file_storage import FileStorageService
+            from services.file_storage import get_file_storage_service
             from utils.file_helpers import process_attachments
             
             use_azure = current_app.config.get('USE_AZURE_STORAGE', False)
-            file_storage = FileStorageService(
+            file_storage = get_file_storage_service(
                 uploads_dir=current_app.config.get('UPLOADS_DIR'),
                 use_azure=use_azure
             )
@@ -792,23 +780,7 @@ def create_chat_room_message(room_id):
         if not new_message:
             return jsonify({'success': False, 'errors': ['Failed to create message']}), 500
 
-        # get_message_by_id already converts ObjectIds, but we need to ensure ALL are converted
-        from bson import ObjectId
-        from datetime import datetime
-        
-        def convert_objectids(obj):
-            """Recursively convert ObjectId to string in nested structures."""
-            if isinstance(obj, ObjectId):
-                return str(obj)
-            elif isinstance(obj, dict):
-                return {k: convert_objectids(v) for k, v in obj.items()}
-            elif isinstance(obj, list):
-                return [convert_objectids(item) for item in obj]
-            elif isinstance(obj, datetime):
-                return obj.isoformat()
-            return obj
-        
-        # Add display info BEFORE final conversion
+        # Add display info
         if anonymous_identity:
             # For anonymous messages, explicitly set profile_picture to None
             new_message['profile_picture'] = None
@@ -824,10 +796,7 @@ def create_chat_room_message(room_id):
                 new_message['profile_picture'] = None
                 new_message['banner'] = None
         
-        # Now recursively convert ALL remaining ObjectIds and datetimes
-        new_message = convert_objectids(new_message)
-        
-        # Ensure can_delete is set (after conversion)
+        # Remaining ObjectIds/datetimes are encoded by the JSON provider (HTTP and Socket.IO)
         new_message['can_delete'] = str(new_message.get('user_id')) == user_id
 
         # Don't expose real user_id when anonymous
@@ -861,7 +830,8 @@ def create_chat_room_message(room_id):
             if socketio:
                 room_name = f"chat_room_{room_id}"
                 socketio.emit('new_chat_room_message', new_message, room=room_name)
-                logger.info(f"Emitted new_chat_room_message event to room {room_name} for message {message_id}")
+                observe_fanout(socketio, 'new_chat_room_message', room_name)
+                buffer_message(room_name, str(message_id), 'new_chat_room_message', new_message)
                 # Also emit to sender's personal room so the sender always sees the message (even if not joined)
                 # FIX: Removed - this causes double messages for the sender if they are already in the room
                 # try:
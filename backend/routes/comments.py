@@ -7,6 +7,7 @@ from models.anonymous_identity import AnonymousIdentity
 from utils.validators import validate_message_content
 from utils.decorators import require_auth, require_json, log_requests
 from utils.cache_decorator import cache_result
+from utils.response_envelope import list_response, response_format
 import logging
 
 logger = logging.getLogger(__name__)
@@ -18,7 +19,8 @@ def get_comments_key(func_name, args, kwargs):
     post_id = kwargs.get('post_id')
     params = [
         request.args.get('sort_by', 'top'),
-        request.args.get('limit', '100')
+        request.args.get('limit', '100'),
+        response_format()
     ]
     
     # User ID for personalization (upvoted status)
@@ -70,16 +72,116 @@ def get_post_comments(post_id):
             user_id=user_id
         )
 
-        return jsonify({
-            'success': True,
-            'data': comments
-        }), 200
+        return list_response(comments, children_key='replies'), 200
 
     except Exception as e:
         logger.error(f"Get post comments error: {str(e)}", exc_info=True)
         return jsonify({'success': False, 'errors': [f'Failed to get comments: {str(e)}']}), 500
 
 
+def get_comment_tree_key(func_name, args, kwargs):
+    """Generate cache key for a page of a post's top-level comments."""
+    post_id = kwargs.get('post_id')
+    params = [
+        request.args.get('sort_by', 'top'),
+        request.args.get('limit', '50'),
+        request.args.get('cursor', ''),
+        response_format()
+    ]
+
+    user_suffix = "anon"
+    try:
+        auth = AuthService(current_app.db)
+        if auth.is_authenticated():
+            res = auth.get_current_user()
+            if res.get('success'):
+                user_suffix = res['user']['id']
+    except:
+        pass
+
+    key_string = '_'.join(str(p) for p in params)
+    import hashlib
+    key_hash = hashlib.md5(key_string.encode()).hexdigest()
+    # Shares the comments:post:{post_id} prefix so existing invalidation covers it
+    return f"comments:post:{post_id}:tree:{user_suffix}:{key_hash}"
+
+
+def _get_optional_user_id():
+    """Current user ID if authenticated, else None."""
+    try:
+        auth_service = AuthService(current_app.db)
+        if auth_service.is_authenticated():
+            current_user_result = auth_service.get_current_user()
+            if current_user_result.get('success'):
+                return current_user_result['user']['id']
+    except:
+        pass
+    return None
+
+
+@comments_bp.route('/posts/<post_id>/comments/tree', methods=['GET'])
+@log_requests
+@cache_result(ttl=120, key_func=get_comment_tree_key)
+def get_post_comment_tree(post_id):
+    """Get a page of top-level comments with reply counts; replies load via /<comment_id>/replies."""
+    try:
+        sort_by = request.args.get('sort_by', 'top')  # 'top', 'new', 'old'
+        limit = int(request.args.get('limit', 50))
+        cursor = request.args.get('cursor')
+
+        if limit < 1 or limit > 200:
+            limit = 50
+
+        comment_model = Comment(current_app.db)
+        page = comment_model.get_comment_tree(
+            post_id=post_id,
+            sort_by=sort_by,
+            limit=limit,
+            cursor=cursor,
+            user_id=_get_optional_user_id()
+        )
+
+        return list_response(page['comments'], children_key='replies', pagination={
+            'next_cursor': page['next_cursor'],
+            'has_more': page['has_more']
+        }), 200
+
+    except Exception as e:
+        logger.error(f"Get comment tree error: {str(e)}", exc_info=True)
+        return jsonify({'success': False, 'errors': [f'Failed to get comments: {str(e)}']}), 500
+
+
+@comments_bp.route('/<comment_id>/replies', methods=['GET'])
+@log_requests
+def get_comment_replies(comment_id):
+    """Get a page of a comment's subtree (all depths, depth-first)."""
+    try:
+        limit = int(request.args.get('limit', 100))
+        cursor = request.args.get('cursor')
+
+        if limit < 1 or limit > 500:
+            limit = 100
+
+        comment_model = Comment(current_app.db)
+        page = comment_model.get_comment_subtree(
+            comment_id=comment_id,
+            limit=limit,
+            cursor=cursor,
+            user_id=_get_optional_user_id()
+        )
+        if page is None:
+            return jsonify({'success': False, 'errors': ['Comment not found']}), 404
+
+        return list_response(page['replies'], children_key='replies', pagination={
+            'next_cursor': page['next_cursor'],
+            'has_more': page['has_more']
+        }), 200
+
+    except Exception as e:
+        logger.error(f"Get comment replies error: {str(e)}", exc_info=True)
+        return jsonify({'success': False, 'errors': [f'Failed to get replies: {str(e)}']}), 500
+
+
 @comments_bp.route('/posts/<post_id>/comments', methods=['POST'])
 @require_json
 @require_auth()
@@ -414,39 +516,14 @@ def upvote_comment(comment_id):
         user_id = current_user_result['user']['id']
 
         comment_model = Comment(current_app.db)
-        success = comment_model.upvote_comment(comment_id, user_id)
-
-        if success:
-            # Get updated comment with user vote status
-            updated_comment = comment_model.get_comment_by_id(comment_id, user_id)
-            
-            # Emit socket event
-            try:
-                from app import socketio
-                if socketio and updated_comment:
-                    room_name = f"post_{updated_comment['post_id']}"
-                    socketio.emit('comment_upvoted', {
-                        'comment_id': comment_id,
-                        'user_id': user_id,
-                        'upvote_count': updated_comment.get('upvote_count', 0),
-                        'user_has_upvoted': updated_comment.get('user_has_upvoted', False)
-                    }, room=room_name)
-            except Exception as e:
-                logger.warning(f"Failed to emit socket event: {str(e)}")
-
-            # Invalidate post comments cache
-            try:
-                # We need post_id to invalidate. It's in updated_comment.
-                post_id = updated_comment.get('post_id')
-                if post_id:
-                    current_app.config['CACHE_INVALIDATOR'].invalidate_pattern(f"comments:post:{post_id}*")
-            except Exception as e:
-                logger.error(f"Cache invalidation failed: {e}")
+        result = comment_model.vote_comment(comment_id, user_id, 1)
 
+        if result:
+            # Score broadcasts and cache invalidation are coalesced per batch (utils/vote_buffer)
             return jsonify({
                 'success': True,
                 'message': 'Comment upvoted successfully',
-                'data': updated_comment
+                'data': result
             }), 200
         else:
             return jsonify({'success': False, 'errors': ['Failed to upvote comment']}), 400
@@ -471,6 +548,7 @@ def delete_comment(comment_id):
         mode = request.args.get('mode', 'soft')
 
         # Get comment first to retrieve post_id for invalidation
+        comment_model = Comment(current_app.db)
         comment = comment_model.get_comment_by_id(comment_id)
         post_id = comment.get('post_id') if comment else None
 
@@ -509,38 +587,14 @@ def downvote_comment(comment_id):
         user_id = current_user_result['user']['id']
 
         comment_model = Comment(current_app.db)
-        success = comment_model.downvote_comment(comment_id, user_id)
-
-        if success:
-            # Get updated comment with user vote status
-            updated_comment = comment_model.get_comment_by_id(comment_id, user_id)
-
-            # Emit socket event
-            try:
-                from app import socketio
-                if socketio and updated_comment:
-                    room_name = f"post_{updated_comment['post_id']}"
-                    socketio.emit('comment_downvoted', {
-                        'comment_id': comment_id,
-                        'user_id': user_id,
-                        'downvote_count': updated_comment.get('downvote_count', 0),
-                        'user_has_downvoted': updated_comment.get('user_has_downvoted', False)
-                    }, room=room_name)
-            except Exception as e:
-                logger.warning(f"Failed to emit socket event: {str(e)}")
-
-            # Invalidate post comments cache
-            try:
-                post_id = updated_comment.get('post_id')
-                if post_id:
-                    current_app.config['CACHE_INVALIDATOR'].invalidate_pattern(f"comments:post:{post_id}*")
-            except Exception as e:
-                logger.error(f"Cache invalidation failed: {e}")
+        result = comment_model.vote_comment(comment_id, user_id, -1)
 
+        if result:
+            # Score broadcasts and cache invalidation are coalesced per batch (utils/vote_buffer)
             return jsonify({
                 'success': True,
                 'message': 'Comment downvoted successfully',
-                'data': updated_comment
+                'data': result
             }), 200
         else:
             return jsonify({'success': False, 'errors': ['Failed to downvote comment']}), 400
@@ -2,7 +2,7 @@
 GIF API routes for Tenor integration
 """
 from flask import Blueprint, request, jsonify, current_app
-from services.tenor_service import TenorService
+from services.tenor_service import get_tenor_service
 from utils.decorators import require_auth, log_requests
 from utils.cache_decorator import cache_result
 import logging
@@ -27,7 +27,7 @@ def search_gifs():
                 'errors': ['Search query is required']
             }), 400
         
-        tenor_service = TenorService()
+        tenor_service = get_tenor_service()
         result = tenor_service.search_gifs(
             query=query,
             limit=limit
@@ -54,7 +54,7 @@ def search_gifs():
 
 @gifs_bp.route('/trending', methods=['GET'])
 @require_auth()
-@cache_result(ttl=3600, key_prefix='gifs:trending')
+@cache_result(ttl=3600, key_prefix='gifs:trending', stale_ttl=3600, refresh_lock=True)
 @log_requests
 def get_trending_gifs():
     """Get featured GIFs from Tenor API v2 (trending endpoint for backward compatibility)."""
@@ -62,7 +62,7 @@ def get_trending_gifs():
         limit = int(request.args.get('limit', 20))
         locale = request.args.get('locale', 'en_US')
         
-        tenor_service = TenorService()
+        tenor_service = get_tenor_service()
         
         # Check if API key is configured
         if not tenor_service.api_key:
@@ -109,7 +109,7 @@ def get_popular_gifs():
     try:
         limit = int(request.args.get('limit', 20))
         
-        tenor_service = TenorService()
+        tenor_service = get_tenor_service()
         
         # Check if API key is configured
         if not tenor_service.api_key:
@@ -153,7 +153,7 @@ def get_recent_gifs():
     try:
         limit = int(request.args.get('limit', 20))
         
-        tenor_service = TenorService()
+        tenor_service = get_tenor_service()
         
         # Check if API key is configured
         if not tenor_service.api_key:
@@ -197,7 +197,7 @@ def get_categories():
     try:
         locale = request.args.get('locale', 'en_US')
         
-        tenor_service = TenorService()
+        tenor_service = get_tenor_service()
         result = tenor_service.get_categories(locale=locale)
         
         if result['success']:
@@ -235,7 +235,7 @@ def register_share():
                 'errors': ['GIF ID is required']
             }), 400
         
-        tenor_service = TenorService()
+        tenor_service = get_tenor_service()
         success = tenor_service.register_share(gif_id=gif_id, query=query)
         
         if success:
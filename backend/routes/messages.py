@@ -6,6 +6,10 @@ from models.topic import Topic
 from utils.validators import validate_message_content, validate_pagination_params
 from utils.decorators import require_auth, require_json, log_requests
 from utils.cache_decorator import cache_result, user_cache_key
+from utils.metrics import observe_fanout
+from utils.response_envelope import list_response, response_format
+from utils.room_buffer import buffer_message
+from utils.id_paging import page_info
 import logging
 
 logger = logging.getLogger(__name__)
@@ -17,7 +21,9 @@ def get_topic_messages_key(func_name, args, kwargs):
     topic_id = kwargs.get('topic_id')
     params = [
         request.args.get('limit', '50'),
-        request.args.get('before_message_id', '')
+        request.args.get('before_message_id', ''),
+        request.args.get('after_message_id', ''),
+        response_format()
     ]
     
     # User ID for personalization (blocked users)
@@ -48,6 +54,7 @@ def get_topic_messages(topic_id):
         # Parse query parameters
         limit = int(request.args.get('limit', 50))
         before_message_id = request.args.get('before_message_id')
+        after_message_id = request.args.get('after_message_id')
 
         # Validate pagination
         pagination_result = validate_pagination_params(limit, 0)
@@ -70,17 +77,16 @@ def get_topic_messages(topic_id):
             pass  # Continue without user_id if auth check fails
 
         # Get messages
-        messages = message_model.get_messages(
+        page = message_model.get_message_page(
             topic_id=topic_id,
             limit=limit,
             before_message_id=before_message_id,
-            user_id=user_id
+            user_id=user_id,
+            after_message_id=after_message_id
         )
 
-        return jsonify({
-            'success': True,
-            'data': messages
-        }), 200
+        return list_response(page['messages'],
+                             pagination=page_info(page['messages'], page['has_more'], after_message_id)), 200
 
     except Exception as e:
         logger.error(f"Get topic messages error: {str(e)}")
@@ -139,11 +145,11 @@ def create_message(topic_id):
 
         # Process attachments: convert base64 to files and store them
         if attachments:
-            from services.file_storage import FileStorageService
+            from services.file_storage import get_file_storage_service
             from utils.file_helpers import process_attachments
             
             use_azure = current_app.config.get('USE_AZURE_STORAGE', False)
-            file_storage = FileStorageService(
+            file_storage = get_file_storage_service(
                 uploads_dir=current_app.config.get('UPLOADS_DIR'),
                 use_azure=use_azure
             )
@@ -226,7 +232,8 @@ def create_message(topic_id):
                 # Broadcast to topic room
                 room_name = f"topic_{topic_id}"
                 socketio.emit('new_message', broadcast_message, room=room_name)
-                logger.info(f"Emitted new_message event to room {room_name} for message {message_id}")
+                observe_fanout(socketio, 'new_message', room_name)
+                buffer_message(room_name, str(message_id), 'new_message', broadcast_message)
         except Exception as e:
             logger.warning(f"Failed to emit socket event for message {message_id}: {str(e)}")
             # Don't fail the request if socket emission fails
@@ -628,11 +635,11 @@ def send_private_message():
 
         # Process attachments: convert base64 to files and store them
         if attachments:
-            from services.file_storage import FileStorageService
+            from services.file_storage import get_file_storage_service
             from utils.file_helpers import process_attachments
             
             use_azure = current_app.config.get('USE_AZURE_STORAGE', False)
-            file_storage = FileStorageService(
+            file_storage = get_file_storage_service(
                 uploads_dir=current_app.config.get('UPLOADS_DIR'),
                 use_azure=use_azure
             )
@@ -750,6 +757,10 @@ def send_private_message():
         except Exception as e:
             logger.error(f"Cache invalidation failed: {e}")
 
+        from app import socketio
+        from socketio_handlers import emit_unread_counts
+        emit_unread_counts(socketio, to_user_id, user_id)
+
         return jsonify({
             'success': True,
             'message': 'Private message sent successfully',
@@ -940,10 +951,15 @@ def mark_private_message_read(message_id):
         from models.private_message import PrivateMessage
         pm_model = PrivateMessage(current_app.db)
 
-        # Mark as read
+        # Mark as read (moves the conversation's read mark up to this message)
         success = pm_model.mark_as_read(message_id, user_id)
 
         if success:
+            from app import socketio
+            from socketio_handlers import emit_unread_counts, invalidate_conversation_list
+            message = pm_model.get_message_by_id(message_id)
+            invalidate_conversation_list(user_id)
+            emit_unread_counts(socketio, user_id, message['from_user_id'])
             return jsonify({
                 'success': True,
                 'message': 'Message marked as read'
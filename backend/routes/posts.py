@@ -7,6 +7,7 @@ from utils.validators import validate_message_content, validate_pagination_param
 from utils.validators import validate_message_content, validate_pagination_params
 from utils.decorators import require_auth, require_json, log_requests
 from utils.cache_decorator import cache_result
+from utils.response_envelope import list_response, response_format
 import hashlib
 import json
 import logging
@@ -101,13 +102,77 @@ def get_recent_posts():
         return jsonify({'success': False, 'errors': [f'Failed to get recent posts: {str(e)}']}), 500
 
 
+def get_hot_posts_key(func_name, args, kwargs):
+    """Generate cache key for the global hot feed."""
+    params = [
+        request.args.get('limit', '20'),
+        request.args.get('offset', '0')
+    ]
+    user_suffix = "anon"
+    try:
+        auth = AuthService(current_app.db)
+        if auth.is_authenticated():
+            res = auth.get_current_user()
+            if res.get('success'):
+                user_suffix = res['user']['id']
+    except:
+        pass
+
+    key_string = '_'.join(str(p) for p in params)
+    return f"post:hot:{user_suffix}:{key_string}"
+
+@posts_bp.route('/hot', methods=['GET'])
+@log_requests
+@cache_result(ttl=60, key_func=get_hot_posts_key)
+def get_hot_posts():
+    """Get the hottest posts across all topics (time-decayed ranking)."""
+    try:
+        limit = int(request.args.get('limit', 20))
+        offset = int(request.args.get('offset', 0))
+
+        pagination_result = validate_pagination_params(limit, offset)
+        if not pagination_result['valid']:
+            return jsonify({'success': False, 'errors': pagination_result['errors']}), 400
+
+        limit = pagination_result['limit']
+        offset = pagination_result['offset']
+
+        # Get current user ID if authenticated
+        user_id = None
+        try:
+            auth_service = AuthService(current_app.db)
+            if auth_service.is_authenticated():
+                current_user_result = auth_service.get_current_user()
+                if current_user_result.get('success'):
+                    user_id = current_user_result['user']['id']
+        except:
+            pass
+
+        post_model = Post(current_app.db)
+        posts = post_model.get_hot_posts(
+            limit=limit,
+            offset=offset,
+            user_id=user_id
+        )
+
+        return jsonify({
+            'success': True,
+            'data': posts
+        }), 200
+
+    except Exception as e:
+        logger.error(f"Get hot posts error: {str(e)}", exc_info=True)
+        return jsonify({'success': False, 'errors': [f'Failed to get hot posts: {str(e)}']}), 500
+
+
 def get_topic_posts_key(func_name, args, kwargs):
     """Generate cache key for topic posts."""
     topic_id = kwargs.get('topic_id')
     params = [
         request.args.get('sort_by', 'new'),
         request.args.get('limit', '50'),
-        request.args.get('offset', '0')
+        request.args.get('offset', '0'),
+        response_format()
     ]
     
     # Get user_id for personalization
@@ -129,7 +194,7 @@ def get_topic_posts_key(func_name, args, kwargs):
 
 @posts_bp.route('/topics/<topic_id>/posts', methods=['GET'])
 @log_requests
-@cache_result(ttl=120, key_func=get_topic_posts_key)
+@cache_result(ttl=120, key_func=get_topic_posts_key, stale_ttl=120, early_refresh=1.0, refresh_lock=True)
 def get_topic_posts(topic_id):
     """Get posts for a topic with sorting and pagination."""
     try:
@@ -182,10 +247,7 @@ def get_topic_posts(topic_id):
             user_id=user_id
         )
 
-        return jsonify({
-            'success': True,
-            'data': posts
-        }), 200
+        return list_response(posts), 200
 
     except Exception as e:
         logger.error(f"Get topic posts error: {str(e)}", exc_info=True)
@@ -306,6 +368,7 @@ def create_post(topic_id):
 
         if current_app.config.get('CACHE_INVALIDATOR'):
             current_app.config['CACHE_INVALIDATOR'].invalidate_pattern('post:recent:*')
+            current_app.config['CACHE_INVALIDATOR'].invalidate_pattern('post:hot:*')
             current_app.config['CACHE_INVALIDATOR'].invalidate_pattern(f'post:list:topic_{topic_id}:*')
             current_app.config['CACHE_INVALIDATOR'].invalidate_entity('topic', topic_id)
 
@@ -386,47 +449,15 @@ def upvote_post(post_id):
         user_id = current_user_result['user']['id']
 
         post_model = Post(current_app.db)
-        success = post_model.upvote_post(post_id, user_id)
-
-        if success:
-            # Get updated post
-            updated_post = post_model.get_post_by_id(post_id)
-            
-            # Emit socket event
-            try:
-                from app import socketio
-                if socketio and updated_post:
-                    topic_id = updated_post.get('topic_id')
-                    if topic_id:
-                        room_name = f"topic_{topic_id}"
-                        socketio.emit('post_upvoted', {
-                            'post_id': post_id,
-                            'user_id': user_id,
-                            'upvote_count': updated_post.get('upvote_count', 0),
-                            'downvote_count': updated_post.get('downvote_count', 0),
-                            'score': updated_post.get('score', 0),
-                            'user_has_upvoted': updated_post.get('user_has_upvoted', False),
-                            'user_has_downvoted': updated_post.get('user_has_downvoted', False)
-                        }, room=room_name)
-            except Exception as e:
-                logger.warning(f"Failed to emit socket event: {str(e)}")
-
-            # Cache Invalidation
-            if current_app.config.get('CACHE_INVALIDATOR'):
-                current_app.config['CACHE_INVALIDATOR'].invalidate_pattern(f'post:{post_id}:*')
-                current_app.config['CACHE_INVALIDATOR'].invalidate_pattern('post:recent:*')
-                topic_id = updated_post.get('topic_id')
-                if topic_id:
-                     current_app.config['CACHE_INVALIDATOR'].invalidate_pattern(f'post:list:topic_{topic_id}:*')
+        result = post_model.vote_post(post_id, user_id, 1)
 
+        if result:
+            # Score broadcasts and cache invalidation are coalesced per batch (utils/vote_buffer)
             return jsonify({
                 'success': True,
                 'message': 'Post upvoted successfully',
-                'data': updated_post
+                'data': result
             }), 200
-            
-
-
         else:
             return jsonify({'success': False, 'errors': ['Failed to upvote post']}), 400
 
@@ -448,49 +479,15 @@ def downvote_post(post_id):
         user_id = current_user_result['user']['id']
 
         post_model = Post(current_app.db)
-        success = post_model.downvote_post(post_id, user_id)
-
-        if success:
-            # Get updated post
-            updated_post = post_model.get_post_by_id(post_id)
-            
-            # Emit socket event
-            try:
-                from app import socketio
-                if socketio and updated_post:
-                    topic_id = updated_post.get('topic_id')
-                    if topic_id:
-                        room_name = f"topic_{topic_id}"
-                        socketio.emit('post_downvoted', {
-                            'post_id': post_id,
-                            'user_id': user_id,
-                            'upvote_count': updated_post.get('upvote_count', 0),
-                            'downvote_count': updated_post.get('downvote_count', 0),
-                            'score': updated_post.get('score', 0),
-                            'user_has_upvoted': updated_post.get('user_has_upvoted', False),
-                            'user_has_downvoted': updated_post.get('user_has_downvoted', False)
-                        }, room=room_name)
-            except Exception as e:
-                logger.warning(f"Failed to emit socket event: {str(e)}")
-
-            # Cache Invalidation
-            if current_app.config.get('CACHE_INVALIDATOR'):
-                current_app.config['CACHE_INVALIDATOR'].invalidate_pattern(f'post:{post_id}:*')
-                current_app.config['CACHE_INVALIDATOR'].invalidate_pattern('post:recent:*')
-                topic_id = updated_post.get('topic_id')
-                if topic_id:
-                     current_app.config['CACHE_INVALIDATOR'].invalidate_pattern(f'post:list:topic_{topic_id}:*')
+        result = post_model.vote_post(post_id, user_id, -1)
 
+        if result:
+            # Score broadcasts and cache invalidation are coalesced per batch (utils/vote_buffer)
             return jsonify({
                 'success': True,
                 'message': 'Post downvoted successfully',
-                'data': updated_post
+                'data': result
             }), 200
-            
-            # Cache Invalidation logic for upvote/downvote
-            # Wait, I can't put it after return.
-            # I'll fix it in separate edit or modify this chunk logic to be correct syntax (before return).
-
         else:
             return jsonify({'success': False, 'errors': ['Failed to downvote post']}), 400
 
@@ -251,13 +251,11 @@ def get_reports():
             offset=offset
         ) if status == 'pending' else report_model.get_reports_by_status(
             status=status,
-            topic_id=topic_id
+            topic_id=topic_id,
+            limit=limit,
+            offset=offset
         )
 
-        # Apply pagination for non-pending reports
-        if status != 'pending':
-            reports = reports[offset:offset + limit]
-
         # Filter reports based on user permissions
         filtered_reports = []
         for report in reports:
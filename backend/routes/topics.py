@@ -41,7 +41,7 @@ def get_topics_cache_key(func_name, args, kwargs):
 
 @topics_bp.route('/', methods=['GET'])
 @log_requests
-@cache_result(ttl=300, key_func=get_topics_cache_key)
+@cache_result(ttl=300, key_func=get_topics_cache_key, stale_ttl=300, early_refresh=1.0, refresh_lock=True)
 def get_topics():
     """Get list of public topics with filtering and pagination."""
     try:
@@ -11,6 +11,7 @@ from models.friend import Friend
 from utils.decorators import require_auth, require_json, log_requests
 from utils.cache_decorator import cache_result, user_cache_key
 from utils.image_compression import compress_image_base64
+from utils.session_fallback import revoke_user_sessions
 import logging
 from utils.i18n import normalize_language
 
@@ -195,11 +196,9 @@ def request_deletion_code():
         
         if success:
             # Send email
-            # We need to use the EmailService. Since it's not injected yet, we instantiate it.
-            # Assuming EmailService is in services.email_service
             try:
-                from services.email_service import EmailService
-                email_service = EmailService()
+                from services.email_service import get_email_service
+                email_service = get_email_service()
                 
                 # Use current app config if needed, or environment variables are loaded
                 # The send_account_deletion_email method signature: (to_email, username, verification_code, lang='en')
@@ -266,8 +265,9 @@ def delete_account():
         success = user_model.delete_user_permanently(user_id)
         
         if success:
-            # Clear session
+            # Clear session and revoke any other sessions of the account
             session.clear()
+            revoke_user_sessions(user_id)
             return jsonify({
                 'success': True,
                 'message': 'Account deleted successfully'
@@ -394,20 +394,10 @@ def get_private_conversations():
         current_user_result = auth_service.get_current_user()
         user_id = current_user_result['user']['id']
 
+        # Summaries carry the mute flag, so no per-conversation settings lookup is needed
         pm_model = PrivateMessage(current_app.db)
         conversations = pm_model.get_conversations(user_id, limit)
 
-        # Get mute status for each conversation
-        from models.notification_settings import NotificationSettings
-        ns_model = NotificationSettings(current_app.db)
-        
-        for conv in conversations:
-            other_user_id = conv.get('other_user_id')
-            if other_user_id:
-                conv['is_muted'] = ns_model.is_private_message_muted(user_id, other_user_id)
-            else:
-                conv['is_muted'] = False
-
         return jsonify({
             'success': True,
             'data': conversations
@@ -426,6 +416,7 @@ def get_private_conversation(other_user_id):
     try:
         limit = int(request.args.get('limit', 50))
         before_message_id = request.args.get('before_message_id')
+        after_message_id = request.args.get('after_message_id')
 
         from flask import current_app
         auth_service = AuthService(current_app.db)
@@ -437,7 +428,8 @@ def get_private_conversation(other_user_id):
             user_id=user_id,
             other_user_id=other_user_id,
             limit=limit,
-            before_message_id=before_message_id
+            before_message_id=before_message_id,
+            after_message_id=after_message_id
         )
 
         return jsonify({
@@ -452,10 +444,9 @@ def get_private_conversation(other_user_id):
 
 @users_bp.route('/private-messages/unread-count', methods=['GET'])
 @require_auth()
-@cache_result(ttl=30, key_prefix='user:pm_unread', key_func=user_cache_key('user:pm_unread'))
 @log_requests
 def get_unread_message_count():
-    """Get unread private message count for current user."""
+    """Get unread private message count for current user (one read of the maintained total)."""
     try:
         from flask import current_app
         auth_service = AuthService(current_app.db)
@@ -490,6 +481,11 @@ def mark_conversation_read(other_user_id):
 
         pm_model = PrivateMessage(current_app.db)
         marked_count = pm_model.mark_conversation_as_read(user_id, other_user_id)
+        if marked_count:
+            from app import socketio
+            from socketio_handlers import emit_unread_counts, invalidate_conversation_list
+            invalidate_conversation_list(user_id)
+            emit_unread_counts(socketio, user_id, other_user_id)
 
         return jsonify({
             'success': True,
@@ -637,18 +633,13 @@ def delete_conversation(other_user_id):
         pm_model = PrivateMessage(current_app.db)
         
         # Delete all messages in the conversation
-        result = pm_model.collection.delete_many({
-            '$or': [
-                {'from_user_id': ObjectId(user_id), 'to_user_id': ObjectId(other_user_id)},
-                {'from_user_id': ObjectId(other_user_id), 'to_user_id': ObjectId(user_id)}
-            ]
-        })
+        deleted_count = pm_model.delete_conversation(user_id, other_user_id)
         
         return jsonify({
             'success': True,
-            'message': f'Deleted {result.deleted_count} messages',
+            'message': f'Deleted {deleted_count} messages',
             'data': {
-                'deleted_count': result.deleted_count
+                'deleted_count': deleted_count
             }
         }), 200
             
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Backfill script for the conversations (DM inbox summary) collection.
+
+This script:
+1. Connects to MongoDB using the same configuration as the app
+2. Finds every user that sent or received a private message
+3. Rebuilds that user's conversation summaries (last message, unread count,
+   mute/block flags) from their message history
+4. Ensures the conversations indexes
+
+Safe to re-run: summaries are recomputed, never incremented.
+
+Usage:
+    python backend/scripts/backfill_conversations.py [--dry-run]
+"""
+
+import os
+import sys
+from pymongo import MongoClient
+
+# Add parent directory to path to import config
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+# Import config
+import importlib.util
+config_path = os.path.join(os.path.dirname(__file__), '..', 'config.py')
+spec = importlib.util.spec_from_file_location("config_module", config_path)
+config_module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(config_module)
+config = config_module.config
+
+from models.conversation import Conversation
+
+
+def connect_to_database():
+    """Connect to MongoDB using app configuration."""
+    app_config = config['default']()
+
+    mongo_uri = app_config.MONGO_URI
+    db_name = app_config.MONGO_DB_NAME
+
+    print(f"Database: {db_name}")
+
+    mongo_options = {
+        'serverSelectionTimeoutMS': 5000,
+        'connectTimeoutMS': 30000,
+    }
+
+    if hasattr(app_config, 'COSMOS_SSL') and app_config.COSMOS_SSL:
+        mongo_options['ssl'] = True
+        mongo_options['retryWrites'] = False
+
+    client = MongoClient(mongo_uri, **mongo_options)
+    db = client[db_name]
+
+    try:
+        client.admin.command('ping')
+        print("✓ Successfully connected to MongoDB")
+    except Exception as e:
+        print(f"✗ Failed to connect to MongoDB: {e}")
+        sys.exit(1)
+
+    return db
+
+
+def get_participants(db):
+    """All user IDs that appear on either side of a private message."""
+    return set(db.private_messages.distinct('from_user_id')) | set(db.private_messages.distinct('to_user_id'))
+
+
+def main():
+    """Main backfill function."""
+    dry_run = '--dry-run' in sys.argv
+
+    print("=" * 60)
+    print("Conversations Backfill Script" + (" [DRY RUN]" if dry_run else ""))
+    print("=" * 60)
+
+    db = connect_to_database()
+
+    participants = get_participants(db)
+    print(f"\nUsers with private messages: {len(participants)}")
+
+    if dry_run or not participants:
+        return
+
+    try:
+        db.conversations.create_index([('user_id', 1), ('other_user_id', 1)], unique=True)
+        db.conversations.create_index([('user_id', 1), ('last_message_at', -1)])
+        print("✓ Conversations indexes ensured")
+    except Exception as e:
+        print(f"⚠ Could not create conversations indexes: {e}")
+
+    conversation_model = Conversation(db)
+    total = 0
+    for i, user_id in enumerate(participants, start=1):
+        total += conversation_model.rebuild_for_user(str(user_id))
+        if i % 100 == 0:
+            print(f"  ... {i}/{len(participants)} users, {total} conversations")
+
+    print(f"✓ Rebuilt {total} conversation summaries for {len(participants)} users")
+
+    print("\n" + "=" * 60)
+    print("Backfill completed!")
+    print("=" * 60)
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\n\n✗ Backfill cancelled by user")
+        sys.exit(1)
+    except Exception as e:
+        print(f"\n✗ Error during backfill: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
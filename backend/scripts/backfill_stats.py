@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Backfill script for the admin dashboard rollups (`stats` collection).
+
+This script:
+1. Connects to MongoDB using the same configuration as the app
+2. Recounts the totals document (reports, tickets, users)
+3. Recounts the hourly and daily buckets of created reports, tickets and
+   users for the requested window
+
+The `reconcile_admin_stats` scheduler job only recounts recent buckets;
+run this once after deploying the rollups to fill in older history.
+Safe to re-run: counters are recomputed, never incremented.
+
+Usage:
+    python backend/scripts/backfill_stats.py [--days 400] [--hours 336] [--dry-run]
+"""
+
+import argparse
+import os
+import sys
+from pymongo import MongoClient
+
+# Add parent directory to path to import config
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+# Import config
+import importlib.util
+config_path = os.path.join(os.path.dirname(__file__), '..', 'config.py')
+spec = importlib.util.spec_from_file_location("config_module", config_path)
+config_module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(config_module)
+config = config_module.config
+
+from utils.stats_rollup import compute_totals, reconcile_series, reconcile_totals
+
+
+def connect_to_database():
+    """Connect to MongoDB using app configuration."""
+    app_config = config['default']()
+
+    mongo_uri = app_config.MONGO_URI
+    db_name = app_config.MONGO_DB_NAME
+
+    print(f"Database: {db_name}")
+
+    mongo_options = {
+        'serverSelectionTimeoutMS': 5000,
+        'connectTimeoutMS': 30000,
+    }
+
+    if hasattr(app_config, 'COSMOS_SSL') and app_config.COSMOS_SSL:
+        mongo_options['ssl'] = True
+        mongo_options['retryWrites'] = False
+
+    client = MongoClient(mongo_uri, **mongo_options)
+    db = client[db_name]
+
+    try:
+        client.admin.command('ping')
+        print("✓ Successfully connected to MongoDB")
+    except Exception as e:
+        print(f"✗ Failed to connect to MongoDB: {e}")
+        sys.exit(1)
+
+    return db
+
+
+def main():
+    """Main backfill function."""
+    parser = argparse.ArgumentParser(description='Backfill admin dashboard rollups')
+    parser.add_argument('--days', type=int, default=400, help='daily buckets to rebuild')
+    parser.add_argument('--hours', type=int, default=14 * 24, help='hourly buckets to rebuild')
+    parser.add_argument('--dry-run', action='store_true')
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("Stats Rollup Backfill Script" + (" [DRY RUN]" if args.dry_run else ""))
+    print("=" * 60)
+
+    db = connect_to_database()
+
+    if args.dry_run:
+        totals = compute_totals(db)
+        print(f"\nUsers: {totals['users']}")
+        print(f"Report statuses: {totals['reports']['status']}")
+        print(f"Ticket statuses: {totals['tickets']['status']}")
+        return
+
+    reconcile_totals(db)
+    print("✓ Totals recounted")
+
+    written = reconcile_series(db, hours=args.hours, days=args.days)
+    print(f"✓ Rebuilt {written} buckets ({args.hours} hourly, {args.days} daily)")
+
+    print("\n" + "=" * 60)
+    print("Backfill completed!")
+    print("=" * 60)
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\n\n✗ Backfill cancelled by user")
+        sys.exit(1)
+    except Exception as e:
+        print(f"\n✗ Error during backfill: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
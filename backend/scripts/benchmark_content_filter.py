@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Content filter throughput benchmark.
+
+Runs `analyze_content_safety` and `contains_profanity` on chat-sized
+(~80 characters) and post-sized (~2 KB) inputs two ways:
+
+  legacy   the previous implementation: one regex pass per pattern and a
+           list scan of PROFANITY_WORDS for every word (copied below)
+  engine   utils/content_filter on the compiled engine: one combined regex
+           pass per issue category and one Aho-Corasick pass over word tokens
+
+and reports texts/s and MB/s per input size, plus how often the two agree
+on the reported issues (they differ where the legacy code missed multi-word
+phrases). It then checks texts whose findings overlap across categories
+and exits non-zero if any of them reports different issues.
+
+No database is needed.
+
+Usage:
+    python scripts/benchmark_content_filter.py
+    python scripts/benchmark_content_filter.py --texts 500 --iterations 20
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.content_filter import (PROFANITY_WORDS, URL_PATTERNS, DOMAIN_PATTERN, PHONE_PATTERNS,
+                                  HATE_SPEECH_PATTERNS, THREAT_PATTERNS, analyze_content_safety,
+                                  contains_profanity)
+
+LEGACY_URL_PATTERNS = URL_PATTERNS + [r'[-\w.]+@[-\w.]+\.[a-zA-Z]{2,}', DOMAIN_PATTERN]
+LEGACY_PII_PATTERNS = PHONE_PATTERNS + [
+    r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b',
+    r'\b\d{3}-?\d{2}-?\d{4}\b',
+    r'\b\d{4}[-\s]?\d{4}[-\s]?\d{4}[-\s]?\d{4}\b'
+]
+
+
+def legacy_contains_profanity(text):
+    for word in re.findall(r'\b\w+\b', text.lower()):
+        if word in PROFANITY_WORDS:
+            return True
+    return False
+
+
+def legacy_filter_content(text):
+    for pattern in LEGACY_URL_PATTERNS:
+        text = re.sub(pattern, '[Link removed]', text, flags=re.IGNORECASE)
+    tokens = re.findall(r'\w+|\W+', text)
+    for i, token in enumerate(tokens):
+        if re.match(r'\w+', token) and token.lower() in PROFANITY_WORDS:
+            tokens[i] = '***'
+    text = ''.join(tokens)
+    for pattern in LEGACY_PII_PATTERNS:
+        text = re.sub(pattern, '[Personal info removed]', text)
+    return text
+
+
+def legacy_analyze_content_safety(text):
+    issues = []
+    if any(re.search(pattern, text, re.IGNORECASE) for pattern in LEGACY_URL_PATTERNS):
+        issues.append('contains_links')
+    if legacy_contains_profanity(text):
+        issues.append('contains_profanity')
+    if any(re.search(pattern, text) for pattern in LEGACY_PII_PATTERNS):
+        issues.append('contains_personal_info')
+    if any(re.search(pattern, text, re.IGNORECASE) for pattern in HATE_SPEECH_PATTERNS):
+        issues.append('hate_speech')
+    if any(re.search(pattern, text, re.IGNORECASE) for pattern in THREAT_PATTERNS):
+        issues.append('threats')
+    return {'issues': issues, 'filtered_content': legacy_filter_content(text) if issues else text}
+
+
+VOCABULARY = (
+    'the deploy worked after I restarted the worker and cleared the cache but the socket '
+    'still drops sometimes when the room has many members so maybe we should look at the '
+    'reconnect logic again tomorrow morning before the release goes out to everyone'
+).split()
+
+SPICES = ['damn', 'see https://example.com/docs/page', 'www.example.org', 'mail a.b@example.com',
+          'call 555-123-4567', 'this is bullshit', 'filho da puta', 'i will find you']
+
+
+# Texts where findings of different categories overlap; every category the
+# legacy per-category checks reported must still be reported
+OVERLAP_CASES = [
+    'i will kill all jews',
+    'i will find you at www.example.org',
+    'dox them: see https://example.com/555-123-4567',
+    'write to 5551234567@example.com',
+    'call +1 555 123 4567 or 555-12-3456',
+]
+
+
+def build_texts(count, words, seed=7):
+    rng = random.Random(seed)
+    texts = []
+    for i in range(count):
+        parts = [rng.choice(VOCABULARY) for _ in range(words)]
+        # One text in five carries something the filter reports
+        if i % 5 == 0:
+            parts.insert(rng.randrange(len(parts)), rng.choice(SPICES))
+        texts.append(' '.join(parts).capitalize() + '.')
+    return texts
+
+
+def throughput(func, texts, iterations):
+    size = sum(len(text.encode('utf-8')) for text in texts)
+    started = time.perf_counter()
+    for _ in range(iterations):
+        for text in texts:
+            func(text)
+    elapsed = time.perf_counter() - started
+    return len(texts) * iterations / elapsed, size * iterations / elapsed / (1024 * 1024)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark content filter throughput')
+    parser.add_argument('--texts', type=int, default=300, help='texts per input size')
+    parser.add_argument('--iterations', type=int, default=10)
+    args = parser.parse_args()
+
+    inputs = {
+        'chat': build_texts(args.texts, 14),
+        'post': build_texts(max(args.texts // 10, 1), 380),
+    }
+
+    print(f"{'input':<6} {'check':<10} {'path':<8} {'texts/s':>12} {'MB/s':>8}")
+    for name, texts in inputs.items():
+        avg = sum(len(text) for text in texts) // len(texts)
+        checks = (
+            ('analyze', legacy_analyze_content_safety, analyze_content_safety),
+            ('profanity', legacy_contains_profanity, contains_profanity),
+        )
+        for check, legacy, engine in checks:
+            for path, func in (('legacy', legacy), ('engine', engine)):
+                texts_per_s, mb_per_s = throughput(func, texts, args.iterations)
+                print(f"{name:<6} {check:<10} {path:<8} {texts_per_s:>12,.0f} {mb_per_s:>8.2f}")
+
+        agree = sum(legacy_analyze_content_safety(text)['issues'] == analyze_content_safety(text)['issues']
+                    for text in texts)
+        print(f"{name:<6} ~{avg} chars/text, issues agree on {agree}/{len(texts)} texts")
+
+    mismatches = [
+        (text, legacy_analyze_content_safety(text)['issues'], analyze_content_safety(text)['issues'])
+        for text in OVERLAP_CASES
+        if legacy_analyze_content_safety(text)['issues'] != analyze_content_safety(text)['issues']
+    ]
+    print(f"overlap cases: issues agree on {len(OVERLAP_CASES) - len(mismatches)}/{len(OVERLAP_CASES)}")
+    for text, legacy, engine in mismatches:
+        print(f"  {text!r}: legacy {legacy}, engine {engine}")
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
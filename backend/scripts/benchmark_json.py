@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+JSON serialisation throughput benchmark.
+
+Encodes realistic topic, post and message pages (raw MongoDB documents with
+ObjectIds, datetimes and nested moderator/reaction data) three ways:
+
+  walk+flask      the old path: recursive convert_objectids copy, then
+                  Flask's default provider (stdlib json, sorted keys)
+  flask           Flask's default provider on pre-converted documents
+                  (its cost alone, without the walk)
+  fast            utils/json_provider.FastJSONProvider on the raw documents
+                  (orjson when installed, native ObjectId/datetime encoding)
+
+and reports documents/s and MB/s of JSON output per payload.
+
+No database is needed.
+
+Usage:
+    python scripts/benchmark_json.py
+    python scripts/benchmark_json.py --page 100 --iterations 500
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bson import ObjectId
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from utils.json_provider import ORJSON_AVAILABLE, FastJSONProvider
+
+
+def convert_objectids(obj):
+    """The per-model conversion walk the provider replaces."""
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    elif isinstance(obj, dict):
+        return {k: convert_objectids(v) for k, v in obj.items()}
+    elif isinstance(obj, list):
+        return [convert_objectids(item) for item in obj]
+    elif isinstance(obj, datetime):
+        return obj.isoformat()
+    return obj
+
+
+def build_payloads(page):
+    now = datetime.utcnow()
+    users = [ObjectId() for _ in range(8)]
+    topic_id = ObjectId()
+
+    topics = [{
+        '_id': ObjectId(),
+        'title': f"Topic {i} about something worth discussing",
+        'description': 'A longer description of the topic, ' * 4,
+        'tags': ['python', 'flask', 'mongodb'],
+        'owner_id': users[i % len(users)],
+        'moderators': [{'user_id': u, 'permissions': ['delete_messages', 'ban_users'],
+                        'added_at': now - timedelta(days=3)} for u in users[:3]],
+        'member_count': 120 + i,
+        'post_count': 40 + i,
+        'created_at': now - timedelta(days=i),
+        'last_activity': now - timedelta(minutes=i),
+        'is_public': True,
+    } for i in range(page)]
+
+    posts = [{
+        '_id': ObjectId(),
+        'topic_id': topic_id,
+        'user_id': users[i % len(users)],
+        'title': f"Post {i}: a question about deployment",
+        'content': 'Some markdown body text with a bit of detail. ' * 10,
+        'tags': ['help', 'deploy'],
+        'upvote_count': 12, 'downvote_count': 1, 'score': 11, 'hot_score': 1234.5,
+        'comment_count': 7,
+        'created_at': now - timedelta(hours=i),
+        'updated_at': now - timedelta(hours=i, minutes=-5),
+        'is_deleted': False,
+    } for i in range(page)]
+
+    messages = [{
+        '_id': ObjectId(),
+        'chat_room_id': ObjectId(),
+        'user_id': users[i % len(users)],
+        'content': f"message {i} with a few words in it",
+        'message_type': 'text',
+        'mentions': [users[(i + 1) % len(users)]],
+        'reactions': {'👍': [users[0], users[1]], '🎉': [users[2]]},
+        'attachments': [],
+        'created_at': now - timedelta(seconds=30 * i),
+        'is_deleted': False,
+    } for i in range(page)]
+
+    return {'topics': topics, 'posts': posts, 'messages': messages}
+
+
+def throughput(func, docs, iterations):
+    size = len(func())
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    elapsed = time.perf_counter() - started
+    return docs * iterations / elapsed, size * iterations / elapsed / (1024 * 1024)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark JSON serialisation throughput')
+    parser.add_argument('--page', type=int, default=50, help='documents per page')
+    parser.add_argument('--iterations', type=int, default=300)
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    default_provider = DefaultJSONProvider(app)
+    fast_provider = FastJSONProvider(app)
+
+    print(f"orjson: {'yes' if ORJSON_AVAILABLE else 'no (stdlib fallback)'}, {args.page} documents per page")
+    print(f"{'payload':<10} {'path':<12} {'docs/s':>12} {'MB/s':>10}")
+    for name, docs in build_payloads(args.page).items():
+        converted = convert_objectids(docs)
+        paths = (
+            ('walk+flask', lambda: default_provider.dumps({'success': True, 'data': convert_objectids(docs)})),
+            ('flask', lambda: default_provider.dumps({'success': True, 'data': converted})),
+            ('fast', lambda: fast_provider.dumps({'success': True, 'data': docs})),
+        )
+        for path, func in paths:
+            docs_per_s, mb_per_s = throughput(func, len(docs), args.iterations)
+            print(f"{name:<10} {path:<12} {docs_per_s:>12,.0f} {mb_per_s:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Hot-path logging benchmark.
+
+Checks that a disabled or unsampled event does no string formatting, and
+measures the per-call cost of:
+
+  fstring-disabled   logger.info(f"...") below the logger's level (the old style)
+  event-disabled     EventLogger.info(...) below the category's level
+  event-sampled      EventLogger.info(...) at a 10% sample rate, through the queue writer
+  sync-enabled       logger.info(...) written synchronously by a StreamHandler
+  queued-enabled     EventLogger.info(...) through the non-blocking queue writer
+
+plus the `@log_requests` decorator on a Flask view with the `http.request`
+category disabled and sampled.
+
+Output goes to /dev/null, so the numbers are the logging overhead only.
+
+Usage:
+    python scripts/benchmark_logging.py
+    python scripts/benchmark_logging.py --calls 200000
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.structured_logging import (
+    NonBlockingQueueHandler, StructuredFormatter, _NativeThreadListener, _native_threading,
+    get_event_logger, set_category_level, set_sample_rate
+)
+
+
+class CountingField:
+    """A log field that counts how often it is turned into a string."""
+
+    conversions = 0
+
+    def __str__(self):
+        CountingField.conversions += 1
+        return '65f0c0ffee0000000000beef'
+
+    __repr__ = __str__
+
+    def __format__(self, spec):
+        return self.__str__()
+
+
+def per_call_us(func, calls):
+    started = time.perf_counter()
+    for _ in range(calls):
+        func()
+    return (time.perf_counter() - started) / calls * 1e6
+
+
+def check_no_formatting(events, plain_logger, field):
+    """The disabled event logger must not stringify its fields; the f-string always does."""
+    set_category_level('bench', logging.WARNING)
+    plain_logger.setLevel(logging.WARNING)
+
+    CountingField.conversions = 0
+    for _ in range(100):
+        plain_logger.info(f"[MESSAGE_SEND] message_id: {field}")
+    fstring_conversions = CountingField.conversions
+
+    CountingField.conversions = 0
+    for _ in range(100):
+        events.info('message_sent', message_id=field)
+    event_conversions = CountingField.conversions
+
+    print(f"conversions per 100 disabled calls: f-string {fstring_conversions}, event {event_conversions}")
+    assert event_conversions == 0, 'disabled events must not format their fields'
+
+
+def bench_log_requests(calls):
+    from flask import Flask
+    from utils.decorators import log_requests
+
+    app = Flask(__name__)
+
+    @app.route('/ping')
+    @log_requests
+    def ping():
+        return 'pong'
+
+    records = []
+    factory = logging.getLogRecordFactory()
+
+    def counting_factory(*args, **kwargs):
+        record = factory(*args, **kwargs)
+        if record.name == 'events.http.request':
+            records.append(record)
+        return record
+
+    logging.setLogRecordFactory(counting_factory)
+    client = app.test_client()
+    try:
+        for label, level, rate in (('disabled', logging.WARNING, 1.0),
+                                   ('sampled-10%', logging.INFO, 0.1),
+                                   ('enabled', logging.INFO, 1.0)):
+            set_category_level('http.request', level)
+            set_sample_rate('http.request', rate)
+            records.clear()
+            us = per_call_us(lambda: client.get('/ping'), calls)
+            print(f"{'log_requests ' + label:<26} {us:>10.2f} us/request   records: {len(records)}")
+            if label == 'disabled':
+                assert not records, 'a disabled http.request category must not create records'
+    finally:
+        logging.setLogRecordFactory(factory)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark hot-path logging overhead')
+    parser.add_argument('--calls', type=int, default=100000, help='Log calls per scenario')
+    parser.add_argument('--requests', type=int, default=2000, help='Requests for the @log_requests scenarios')
+    args = parser.parse_args()
+
+    devnull = open(os.devnull, 'w')
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.setLevel(logging.DEBUG)
+
+    events = get_event_logger('bench')
+    plain_logger = logging.getLogger('bench.plain')
+    field = CountingField()
+    check_no_formatting(events, plain_logger, field)
+
+    queue_module, threading_module = _native_threading()
+    log_queue = queue_module.Queue(maxsize=100000)
+    queue_handler = NonBlockingQueueHandler(log_queue)
+    writer = logging.StreamHandler(devnull)
+    writer.setFormatter(StructuredFormatter('text'))
+    listener = _NativeThreadListener(log_queue, writer, threading_module=threading_module)
+
+    results = {}
+    results['fstring-disabled'] = per_call_us(
+        lambda: plain_logger.info(f"[MESSAGE_SEND] COMPLETE: message_id: {field} topic {field}"), args.calls)
+    results['event-disabled'] = per_call_us(
+        lambda: events.info('message_sent', message_id=field, topic_id=field), args.calls)
+
+    # Synchronous baseline: formatting and the write happen on the calling thread
+    sync_handler = logging.StreamHandler(devnull)
+    sync_handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s %(message)s'))
+    plain_logger.setLevel(logging.INFO)
+    plain_logger.addHandler(sync_handler)
+    plain_logger.propagate = False
+    results['sync-enabled'] = per_call_us(
+        lambda: plain_logger.info(f"[MESSAGE_SEND] COMPLETE: message_id: {field} topic {field}"), args.calls)
+
+    root.addHandler(queue_handler)
+    listener.start()
+    set_category_level('bench', logging.INFO)
+    set_sample_rate('bench', 0.1)
+    results['event-sampled'] = per_call_us(
+        lambda: events.info('message_sent', message_id=field, topic_id=field), args.calls)
+    set_sample_rate('bench', 1.0)
+    results['queued-enabled'] = per_call_us(
+        lambda: events.info('message_sent', message_id=field, topic_id=field), args.calls)
+
+    for name, us in results.items():
+        print(f"{name:<26} {us:>10.3f} us/call")
+    print(f"queue records dropped: {queue_handler.dropped}")
+
+    bench_log_requests(args.requests)
+    listener.stop()
+
+
+if __name__ == '__main__':
+    main()
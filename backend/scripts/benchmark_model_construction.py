@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Model construction benchmark.
+
+Compares the per-construction cost of `User(db)` before and after the TOTP
+key moved to a process-wide provider, and TOTP decryption with a new Fernet
+per call versus the shared instance:
+
+  key-resolve (env)    resolving the key from TOTP_ENCRYPTION_KEY (what every
+                       User(db) used to do when the env var is set)
+  key-resolve (file)   resolving it from the key file (local default)
+  User(db)             constructing the model now
+  get_model(User, db)  shared instance from the registry
+  decrypt (new Fernet) Fernet(key).decrypt per call (before)
+  decrypt (shared)     get_totp_fernet().decrypt (after)
+
+No database is needed: models only keep a reference to it.
+
+Usage:
+    python scripts/benchmark_model_construction.py
+    python scripts/benchmark_model_construction.py --iterations 20000
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cryptography.fernet import Fernet
+
+from models.user import User
+from utils.singletons import get_model
+from utils.totp_keys import get_totp_fernet, load_totp_encryption_key
+
+
+class StubDatabase:
+    """Stands in for a pymongo Database (models only read collection attributes)."""
+
+    users = None
+
+
+def per_call_us(func, iterations):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark model construction cost')
+    parser.add_argument('--iterations', type=int, default=10000)
+    args = parser.parse_args()
+
+    # The key resolution logs on every call, as the old constructor did; keep
+    # the handler cheap so the numbers show the resolution work itself
+    logging.basicConfig(level=logging.INFO, stream=open(os.devnull, 'w'))
+
+    key = Fernet.generate_key()
+    os.environ['TOTP_ENCRYPTION_KEY'] = key.decode()
+    db = StubDatabase()
+    token = Fernet(key).encrypt(b'JBSWY3DPEHPK3PXP').decode()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        key_file = os.path.join(tmp, 'totp_encryption.key')
+        with open(key_file, 'wb') as f:
+            f.write(key)
+
+        results = [('key-resolve (env)', per_call_us(lambda: load_totp_encryption_key(), args.iterations))]
+        del os.environ['TOTP_ENCRYPTION_KEY']
+        results.append(('key-resolve (file)', per_call_us(
+            lambda: load_totp_encryption_key(key_file=key_file), args.iterations)))
+        os.environ['TOTP_ENCRYPTION_KEY'] = key.decode()
+
+    results.append(('User(db)', per_call_us(lambda: User(db), args.iterations)))
+    results.append(('get_model(User, db)', per_call_us(lambda: get_model(User, db), args.iterations)))
+    results.append(('decrypt (new Fernet)', per_call_us(
+        lambda: Fernet(key).decrypt(token.encode()), args.iterations)))
+    results.append(('decrypt (shared)', per_call_us(
+        lambda: get_totp_fernet().decrypt(token.encode()), args.iterations)))
+
+    for name, us in results:
+        print(f"{name:<22} {us:>10.2f} us")
+
+
+if __name__ == '__main__':
+    main()
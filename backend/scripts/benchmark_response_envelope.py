@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Response envelope benchmark.
+
+Builds a chat history page (default 50 messages from a few authors with
+inline base64 avatars, as older accounts still have) and compares the full
+format with the compact format (utils/response_envelope):
+
+  bytes        JSON payload size
+  serialize    json.dumps of the full page vs compact_items + json.dumps
+
+No database is needed.
+
+Usage:
+    python scripts/benchmark_response_envelope.py
+    python scripts/benchmark_response_envelope.py --messages 100 --authors 1 --avatar-kb 8
+"""
+import argparse
+import base64
+import json
+import os
+import sys
+import time
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.response_envelope import compact_items
+
+
+def build_page(messages, authors, avatar_kb):
+    avatar = 'data:image/jpeg;base64,' + base64.b64encode(os.urandom(avatar_kb * 1024)).decode()
+    page = []
+    for i in range(messages):
+        author = f"65f0c0ffee00000000000{i % authors:03d}"
+        page.append({
+            '_id': f"65f0c0ffee0000000001{i:04d}",
+            'id': f"65f0c0ffee0000000001{i:04d}",
+            'chat_room_id': '65f0c0ffee0000000000beef',
+            'user_id': author,
+            'content': f"message {i} " * 8,
+            'message_type': 'text',
+            'created_at': '2026-01-01T12:00:00',
+            'display_name': f"user{i % authors}",
+            'sender_username': f"user{i % authors}",
+            'profile_picture': avatar,
+            'is_admin': False,
+            'is_owner': i % authors == 0,
+            'is_moderator': False,
+            'is_anonymous': False,
+            'can_delete': False,
+        })
+    return page
+
+
+def per_call_ms(func, iterations):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - started) / iterations * 1e3
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark full vs compact list responses')
+    parser.add_argument('--messages', type=int, default=50)
+    parser.add_argument('--authors', type=int, default=3)
+    parser.add_argument('--avatar-kb', type=int, default=20)
+    parser.add_argument('--iterations', type=int, default=200)
+    args = parser.parse_args()
+
+    page = build_page(args.messages, args.authors, args.avatar_kb)
+
+    def full():
+        return json.dumps({'success': True, 'data': page})
+
+    def compact():
+        return json.dumps({'success': True, 'format': 'compact', **compact_items(page)})
+
+    print(f"{args.messages} messages, {args.authors} authors, {args.avatar_kb} KB avatars")
+    print(f"{'format':<10} {'bytes':>12} {'serialize':>14}")
+    for name, func in (('full', full), ('compact', compact)):
+        print(f"{name:<10} {len(func()):>12,} {per_call_ms(func, args.iterations):>11.3f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Session overhead benchmark.
+
+Measures the time and the number of Redis commands the session layer adds to
+a request, for the session store in 'redis' and 'cookie' mode and (when
+Flask-Session is installed) Flask-Session's own Redis interface, which the
+app used before:
+
+  anonymous       request without a session cookie
+  authenticated   logged-in request that only reads the session
+  login           request that writes the login principal
+
+Uses an in-memory stand-in for Redis with a configurable simulated round
+trip by default; pass --redis-url to measure against a real Redis.
+
+Usage:
+    python scripts/benchmark_session_overhead.py
+    python scripts/benchmark_session_overhead.py --requests 5000 --rtt-ms 0.5
+    python scripts/benchmark_session_overhead.py --redis-url redis://localhost:6379/15
+"""
+import argparse
+import importlib.util
+import os
+import sys
+import threading
+import time
+import warnings
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask, session
+
+from utils.session_fallback import FallbackSessionInterface
+
+
+class InMemoryRedis:
+    """Subset of the Redis commands the session interfaces use, with a simulated round trip."""
+
+    def __init__(self, rtt):
+        self._data = {}
+        self._lock = threading.Lock()
+        self.rtt = rtt
+
+    def _wait(self):
+        if self.rtt:
+            time.sleep(self.rtt)
+
+    def get(self, key):
+        self._wait()
+        with self._lock:
+            return self._data.get(key)
+
+    def set(self, name, value, ex=None, px=None, nx=False):
+        self._wait()
+        with self._lock:
+            self._data[name] = value.encode() if isinstance(value, str) else value
+        return True
+
+    def setex(self, name, time, value):
+        return self.set(name, value)
+
+    def delete(self, *keys):
+        self._wait()
+        with self._lock:
+            return sum(1 for k in keys if self._data.pop(k, None) is not None)
+
+    def exists(self, key):
+        self._wait()
+        with self._lock:
+            return 1 if key in self._data else 0
+
+    def expire(self, key, ttl):
+        self._wait()
+        return 1
+
+    def pipeline(self, transaction=False):
+        return _Pipeline(self)
+
+
+class _Pipeline:
+    """Queues commands and runs them for a single round trip."""
+
+    def __init__(self, redis):
+        self.redis = redis
+        self.calls = []
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.calls.append((name, args, kwargs))
+            return self
+        return queue
+
+    def execute(self):
+        self.redis._wait()
+        rtt, self.redis.rtt = self.redis.rtt, 0
+        try:
+            return [getattr(self.redis, name)(*args, **kwargs) for name, args, kwargs in self.calls]
+        finally:
+            self.redis.rtt = rtt
+
+
+class CountingRedis:
+    """Counts round trips (a pipeline counts once) made through a Redis client."""
+
+    def __init__(self, client):
+        self._client = client
+        self.round_trips = 0
+
+    def pipeline(self, transaction=False):
+        self.round_trips += 1
+        return self._client.pipeline(transaction=transaction)
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if not callable(attr):
+            return attr
+
+        def counted(*args, **kwargs):
+            self.round_trips += 1
+            return attr(*args, **kwargs)
+        return counted
+
+
+def make_app(interface_name, redis_client):
+    app = Flask(__name__)
+    app.config.update(SECRET_KEY='benchmark-secret', SESSION_COOKIE_NAME='session')
+
+    if interface_name == 'flask-session':
+        from flask_session.redis import RedisSessionInterface
+        with warnings.catch_warnings():
+            # It only accepts a redis.Redis instance; swap the counting client in afterwards
+            warnings.simplefilter('ignore')
+            interface = RedisSessionInterface(app, key_prefix='session:')
+        interface.client = redis_client
+        app.session_interface = interface
+    else:
+        mode = interface_name.split(':', 1)[1]
+        app.session_interface = FallbackSessionInterface(redis_client, mode=mode)
+
+    @app.route('/login', methods=['POST'])
+    def login():
+        session['user_id'] = '65f0c0ffee0000000000beef'
+        session['username'] = 'benchmark'
+        session['authenticated'] = True
+        session['login_time'] = '2024-01-01T00:00:00'
+        return 'ok'
+
+    @app.route('/me')
+    def me():
+        return session.get('user_id') or 'anonymous'
+
+    return app
+
+
+def run(app, counter, path, method, cookie, requests):
+    client = app.test_client()
+    if cookie:
+        client.set_cookie('session', cookie)
+    counter.round_trips = 0
+    started = time.perf_counter()
+    for _ in range(requests):
+        client.open(path, method=method)
+    elapsed = time.perf_counter() - started
+    return elapsed / requests * 1e6, counter.round_trips / requests
+
+
+def login_cookie(app):
+    client = app.test_client()
+    response = client.post('/login')
+    for header in response.headers.getlist('Set-Cookie'):
+        if header.startswith('session='):
+            return header.split(';', 1)[0].split('=', 1)[1]
+    raise RuntimeError('login did not set a session cookie')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark per-request session overhead')
+    parser.add_argument('--requests', type=int, default=2000, help='Requests per scenario')
+    parser.add_argument('--rtt-ms', type=float, default=0.3, help='Simulated Redis round trip (in-memory only)')
+    parser.add_argument('--redis-url', help='Use a real Redis instead of the in-memory stand-in')
+    args = parser.parse_args()
+
+    if args.redis_url:
+        import redis
+        backend = redis.from_url(args.redis_url)
+    else:
+        backend = InMemoryRedis(args.rtt_ms / 1000.0)
+
+    interfaces = ['store:redis', 'store:cookie']
+    if importlib.util.find_spec('flask_session') is not None:
+        interfaces.insert(0, 'flask-session')
+    else:
+        print("Flask-Session not installed: skipping the baseline interface")
+
+    print(f"{'interface':<16} {'scenario':<14} {'us/request':>11} {'redis trips/request':>20}")
+    for name in interfaces:
+        counter = CountingRedis(backend)
+        app = make_app(name, counter)
+        cookie = login_cookie(app)
+        scenarios = [
+            ('anonymous', '/me', 'GET', None),
+            ('authenticated', '/me', 'GET', cookie),
+            ('login', '/login', 'POST', None),
+        ]
+        for scenario, path, method, scenario_cookie in scenarios:
+            us, trips = run(app, counter, path, method, scenario_cookie, args.requests)
+            print(f"{name:<16} {scenario:<14} {us:>11.1f} {trips:>20.2f}")
+
+
+if __name__ == '__main__':
+    main()
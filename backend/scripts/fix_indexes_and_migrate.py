@@ -29,9 +29,9 @@ def fix_indexes_and_migrate():
     except Exception as e:
         print(f"Error dropping notification_settings indexes: {e}")
 
-    # Now manually recreate them using the logic from app.py
-    from app import create_db_indexes
-    create_db_indexes(app)
+    # Now recreate them from the index manifest (a version check alone would skip them)
+    from utils.index_manifest import IndexReconciler
+    IndexReconciler(db).apply(owner='fix_indexes_and_migrate')
     print("Indexes recreated successfully.")
 
     # Now run migration
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Migration script to backfill materialised paths on comments.
+
+This script:
+1. Connects to MongoDB using the same configuration as the app
+2. Walks all comments in _id order (a parent is always older than its replies)
+3. Sets `path` = parent path + '/' + comment id on comments that don't have one
+4. Ensures the (post_id, path) index used for subtree range queries
+
+Safe to re-run: comments that already have a path are left untouched.
+
+Usage:
+    python backend/scripts/migrate_comment_paths.py [--dry-run]
+"""
+
+import os
+import sys
+from pymongo import MongoClient, UpdateOne
+
+# Add parent directory to path to import config
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+# Import config
+import importlib.util
+config_path = os.path.join(os.path.dirname(__file__), '..', 'config.py')
+spec = importlib.util.spec_from_file_location("config_module", config_path)
+config_module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(config_module)
+config = config_module.config
+
+BATCH_SIZE = 500
+PATH_SEPARATOR = '/'  # Must match Comment.PATH_SEPARATOR
+
+
+def connect_to_database():
+    """Connect to MongoDB using app configuration."""
+    app_config = config['default']()
+
+    mongo_uri = app_config.MONGO_URI
+    db_name = app_config.MONGO_DB_NAME
+
+    print(f"Database: {db_name}")
+
+    mongo_options = {
+        'serverSelectionTimeoutMS': 5000,
+        'connectTimeoutMS': 30000,
+    }
+
+    if hasattr(app_config, 'COSMOS_SSL') and app_config.COSMOS_SSL:
+        mongo_options['ssl'] = True
+        mongo_options['retryWrites'] = False
+
+    client = MongoClient(mongo_uri, **mongo_options)
+    db = client[db_name]
+
+    try:
+        client.admin.command('ping')
+        print("✓ Successfully connected to MongoDB")
+    except Exception as e:
+        print(f"✗ Failed to connect to MongoDB: {e}")
+        sys.exit(1)
+
+    return db
+
+
+def backfill_paths(db, dry_run=False):
+    """Compute and store missing comment paths."""
+    total = db.comments.count_documents({'path': {'$exists': False}})
+    print(f"\nComments without a path: {total}")
+
+    if dry_run or total == 0:
+        return 0, 0
+
+    paths = {}
+    ops = []
+    updated = 0
+    orphaned = 0
+
+    cursor = db.comments.find({}, {'parent_comment_id': 1, 'path': 1}).sort('_id', 1).batch_size(BATCH_SIZE)
+    for comment in cursor:
+        comment_id = str(comment['_id'])
+        if comment.get('path'):
+            paths[comment_id] = comment['path']
+            continue
+
+        parent_id = comment.get('parent_comment_id')
+        if parent_id:
+            parent_path = paths.get(str(parent_id))
+            if parent_path is None:
+                # Parent was hard-deleted: the reply becomes the root of its own subtree
+                orphaned += 1
+                path = comment_id
+            else:
+                path = PATH_SEPARATOR.join([parent_path, comment_id])
+        else:
+            path = comment_id
+
+        paths[comment_id] = path
+        ops.append(UpdateOne({'_id': comment['_id']}, {'$set': {'path': path}}))
+
+        if len(ops) >= BATCH_SIZE:
+            updated += db.comments.bulk_write(ops, ordered=False).modified_count
+            ops = []
+            print(f"  ... {updated}/{total}")
+
+    if ops:
+        updated += db.comments.bulk_write(ops, ordered=False).modified_count
+
+    return updated, orphaned
+
+
+def main():
+    """Main migration function."""
+    dry_run = '--dry-run' in sys.argv
+
+    print("=" * 60)
+    print("Comment Paths Migration Script" + (" [DRY RUN]" if dry_run else ""))
+    print("=" * 60)
+
+    db = connect_to_database()
+
+    updated, orphaned = backfill_paths(db, dry_run=dry_run)
+
+    if not dry_run:
+        print(f"✓ Backfilled {updated} comment paths")
+        if orphaned:
+            print(f"⚠ {orphaned} replies had a missing parent and were rooted at themselves")
+        try:
+            db.comments.create_index([('post_id', 1), ('path', 1)])
+            print("✓ (post_id, path) index ensured")
+        except Exception as e:
+            print(f"✗ Could not create (post_id, path) index: {e}")
+
+    print("\n" + "=" * 60)
+    print("Migration completed!")
+    print("=" * 60)
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\n\n✗ Migration cancelled by user")
+        sys.exit(1)
+    except Exception as e:
+        print(f"\n✗ Error during migration: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
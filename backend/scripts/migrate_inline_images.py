@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Migration script to move inline images out of user and chat room documents.
+
+This script:
+1. Connects to MongoDB using the same configuration as the app
+2. Finds users whose `profile_picture`/`banner` and chat rooms whose
+   `picture`/`background_picture` hold an inline `data:image/...;base64,` value
+3. Stores each image through the app's file storage (Azure Blob Storage when
+   USE_AZURE_STORAGE, else the local uploads directory) and replaces the value
+   with its signed `/api/attachments/<file_id>?p=...` URL
+4. Rewrites legacy `azure:<file_id>` references to the same URL form
+
+Safe to re-run: values that are already URLs are left untouched. Cached user
+and room entries keep the old values until they expire (or the cache is
+flushed).
+
+Usage:
+    python backend/scripts/migrate_inline_images.py [--dry-run]
+"""
+
+import os
+import sys
+from pymongo import MongoClient
+
+# Add parent directory to path to import config
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+# Import config
+import importlib.util
+config_path = os.path.join(os.path.dirname(__file__), '..', 'config.py')
+spec = importlib.util.spec_from_file_location("config_module", config_path)
+config_module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(config_module)
+config = config_module.config
+
+from flask import Flask
+
+from utils.image_refs import AZURE_REF_PREFIX, decode_data_url, resolve_image_ref, store_image
+
+BATCH_SIZE = 100
+# collection -> image fields
+IMAGE_FIELDS = {
+    'users': ('profile_picture', 'banner'),
+    'chat_rooms': ('picture', 'background_picture'),
+}
+
+
+def connect_to_database(app_config):
+    """Connect to MongoDB using app configuration."""
+    mongo_uri = app_config.MONGO_URI
+    db_name = app_config.MONGO_DB_NAME
+
+    print(f"Database: {db_name}")
+
+    mongo_options = {
+        'serverSelectionTimeoutMS': 5000,
+        'connectTimeoutMS': 30000,
+    }
+
+    if hasattr(app_config, 'COSMOS_SSL') and app_config.COSMOS_SSL:
+        mongo_options['ssl'] = True
+        mongo_options['retryWrites'] = False
+
+    client = MongoClient(mongo_uri, **mongo_options)
+    db = client[db_name]
+
+    try:
+        client.admin.command('ping')
+        print("✓ Successfully connected to MongoDB")
+    except Exception as e:
+        print(f"✗ Failed to connect to MongoDB: {e}")
+        sys.exit(1)
+
+    return db
+
+
+def migrate_collection(db, collection_name, fields, storage, dry_run=False):
+    """Replace inline images and azure: references in one collection. Returns (converted, failed, bytes)."""
+    collection = db[collection_name]
+    query = {'$or': [{field: {'$regex': f'^(data:|{AZURE_REF_PREFIX})'}} for field in fields]}
+    total = collection.count_documents(query)
+    print(f"\n{collection_name}: {total} documents with inline or azure: images")
+
+    converted, failed, inline_bytes = 0, 0, 0
+    cursor = collection.find(query, {field: 1 for field in fields}).batch_size(BATCH_SIZE)
+    for doc in cursor:
+        updates = {}
+        for field in fields:
+            value = doc.get(field)
+            if not isinstance(value, str):
+                continue
+            if value.startswith(AZURE_REF_PREFIX):
+                updates[field] = resolve_image_ref(value)
+            elif value.startswith('data:'):
+                inline_bytes += len(value)
+                if dry_run:
+                    updates[field] = None
+                    continue
+                file_data, mime_type = decode_data_url(value)
+                if file_data is None:
+                    print(f"  ✗ {collection_name} {doc['_id']}.{field}: not valid base64, left as is")
+                    failed += 1
+                    continue
+                updates[field] = store_image(file_data, mime_type, storage)
+
+        if updates:
+            converted += len(updates)
+            if not dry_run:
+                collection.update_one({'_id': doc['_id']}, {'$set': updates})
+        if converted and converted % BATCH_SIZE == 0:
+            print(f"  ... {converted} images")
+
+    return converted, failed, inline_bytes
+
+
+def main():
+    """Main migration function."""
+    dry_run = '--dry-run' in sys.argv
+
+    print("=" * 60)
+    print("Inline Images Migration Script" + (" [DRY RUN]" if dry_run else ""))
+    print("=" * 60)
+
+    app_config = config['default']()
+    db = connect_to_database(app_config)
+
+    # Attachment URLs are signed with the app's FILE_ENCRYPTION_KEY (and IMAGE_BASE_URL)
+    app = Flask(__name__)
+    app.config.from_object(config['default'])
+
+    storage = None
+    if not dry_run:
+        from services.file_storage import FileStorageService
+        use_azure = app.config.get('USE_AZURE_STORAGE', False)
+        storage = FileStorageService(uploads_dir=app.config.get('UPLOADS_DIR'), use_azure=use_azure)
+        print(f"Storing images in {'Azure Blob Storage' if use_azure else app.config.get('UPLOADS_DIR')}")
+        if not use_azure:
+            print("⚠ Local storage is per instance: every replica must share UPLOADS_DIR")
+
+    with app.app_context():
+        for collection_name, fields in IMAGE_FIELDS.items():
+            converted, failed, inline_bytes = migrate_collection(db, collection_name, fields, storage, dry_run)
+            verb = 'Would convert' if dry_run else '✓ Converted'
+            print(f"{verb} {converted} images in {collection_name} "
+                  f"({inline_bytes / (1024 * 1024):.1f} MB inline)")
+            if failed:
+                print(f"⚠ {failed} images could not be decoded")
+
+    print("\n" + "=" * 60)
+    print("Migration completed!")
+    print("=" * 60)
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\n\n✗ Migration cancelled by user")
+        sys.exit(1)
+    except Exception as e:
+        print(f"\n✗ Error during migration: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
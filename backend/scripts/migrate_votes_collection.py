@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Migration script to move post/comment voter arrays into the votes collection.
+
+This script:
+1. Connects to MongoDB using the same configuration as the app
+2. Ensures the unique (target_type, target_id, user_id) index on votes
+3. Copies every entry of posts/comments `upvotes`/`downvotes` arrays into votes
+   (idempotent upserts, safe to re-run)
+4. Re-derives upvote_count/downvote_count/score from the arrays and unsets them
+
+Usage:
+    python backend/scripts/migrate_votes_collection.py [--dry-run]
+"""
+
+import os
+import sys
+from datetime import datetime
+from pymongo import MongoClient, UpdateOne
+
+# Add parent directory to path to import config
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+# Import config
+import importlib.util
+config_path = os.path.join(os.path.dirname(__file__), '..', 'config.py')
+spec = importlib.util.spec_from_file_location("config_module", config_path)
+config_module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(config_module)
+config = config_module.config
+
+BATCH_SIZE = 500
+
+TARGETS = [
+    ('post', 'posts'),
+    ('comment', 'comments'),
+]
+
+
+def connect_to_database():
+    """Connect to MongoDB using app configuration."""
+    app_config = config['default']()
+
+    mongo_uri = app_config.MONGO_URI
+    db_name = app_config.MONGO_DB_NAME
+
+    print(f"Database: {db_name}")
+
+    mongo_options = {
+        'serverSelectionTimeoutMS': 5000,
+        'connectTimeoutMS': 30000,
+    }
+
+    if hasattr(app_config, 'COSMOS_SSL') and app_config.COSMOS_SSL:
+        mongo_options['ssl'] = True
+        mongo_options['retryWrites'] = False
+
+    client = MongoClient(mongo_uri, **mongo_options)
+    db = client[db_name]
+
+    try:
+        client.admin.command('ping')
+        print("✓ Successfully connected to MongoDB")
+    except Exception as e:
+        print(f"✗ Failed to connect to MongoDB: {e}")
+        sys.exit(1)
+
+    return db
+
+
+def migrate_target(db, target_type, collection_name, dry_run=False):
+    """Move voter arrays of one collection into the votes collection."""
+    collection = db[collection_name]
+    query = {'$or': [{'upvotes': {'$exists': True}}, {'downvotes': {'$exists': True}}]}
+    total = collection.count_documents(query)
+    print(f"\n{collection_name}: {total} documents with voter arrays")
+
+    if dry_run or total == 0:
+        return 0, 0
+
+    now = datetime.utcnow()
+    vote_ops = []
+    target_ops = []
+    migrated_docs = 0
+    migrated_votes = 0
+
+    def flush():
+        nonlocal vote_ops, target_ops, migrated_votes
+        if vote_ops:
+            result = db.votes.bulk_write(vote_ops, ordered=False)
+            migrated_votes += result.upserted_count
+            vote_ops = []
+        if target_ops:
+            collection.bulk_write(target_ops, ordered=False)
+            target_ops = []
+
+    cursor = collection.find(query, {'upvotes': 1, 'downvotes': 1}).batch_size(BATCH_SIZE)
+    for doc in cursor:
+        upvotes = set(doc.get('upvotes') or [])
+        # A user in both arrays (legacy race) keeps the upvote
+        downvotes = set(doc.get('downvotes') or []) - upvotes
+
+        for user_id, value in [(u, 1) for u in upvotes] + [(d, -1) for d in downvotes]:
+            key = {'target_type': target_type, 'target_id': doc['_id'], 'user_id': user_id}
+            vote_ops.append(UpdateOne(
+                key,
+                {'$setOnInsert': {**key, 'value': value, 'created_at': now, 'updated_at': now}},
+                upsert=True
+            ))
+
+        target_ops.append(UpdateOne(
+            {'_id': doc['_id']},
+            {
+                '$set': {
+                    'upvote_count': len(upvotes),
+                    'downvote_count': len(downvotes),
+                    'score': len(upvotes) - len(downvotes)
+                },
+                '$unset': {'upvotes': '', 'downvotes': ''}
+            }
+        ))
+        migrated_docs += 1
+
+        if len(target_ops) >= BATCH_SIZE or len(vote_ops) >= BATCH_SIZE * 10:
+            flush()
+            print(f"  ... {migrated_docs}/{total}")
+
+    flush()
+    return migrated_docs, migrated_votes
+
+
+def main():
+    """Main migration function."""
+    dry_run = '--dry-run' in sys.argv
+
+    print("=" * 60)
+    print("Votes Collection Migration Script" + (" [DRY RUN]" if dry_run else ""))
+    print("=" * 60)
+
+    db = connect_to_database()
+
+    if not dry_run:
+        try:
+            db.votes.create_index([('target_type', 1), ('target_id', 1), ('user_id', 1)], unique=True)
+            print("✓ Unique votes index ensured")
+        except Exception as e:
+            print(f"✗ Could not create unique votes index: {e}")
+            sys.exit(1)
+
+    for target_type, collection_name in TARGETS:
+        docs, votes = migrate_target(db, target_type, collection_name, dry_run=dry_run)
+        if not dry_run:
+            print(f"✓ {collection_name}: migrated {docs} documents, {votes} new votes")
+
+    # The multikey indexes on the voter arrays are now dead weight
+    if not dry_run:
+        for collection_name, index_name in [('posts', 'upvotes_1'), ('posts', 'downvotes_1'), ('comments', 'upvotes_1')]:
+            try:
+                db[collection_name].drop_index(index_name)
+                print(f"✓ Dropped {collection_name}.{index_name}")
+            except Exception:
+                pass
+
+    print("\n" + "=" * 60)
+    print("Migration completed!")
+    print("=" * 60)
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\n\n✗ Migration cancelled by user")
+        sys.exit(1)
+    except Exception as e:
+        print(f"\n✗ Error during migration: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
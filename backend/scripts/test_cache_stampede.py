@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Cache stampede test for cache_result.
+
+Fires 500 concurrent requests at a key that is missing or has just expired
+and asserts the wrapped function is recomputed exactly once:
+
+  1. cold miss in one worker (single-flight)
+  2. expired entry with stale-while-revalidate (stale served, one background refresh)
+  3. cold miss across two workers sharing Redis (distributed refresh lock)
+
+Uses an in-memory stand-in for the Redis server by default; pass --redis-url
+to run against a real Redis instead.
+
+Usage:
+    python scripts/test_cache_stampede.py
+    python scripts/test_cache_stampede.py --redis-url redis://localhost:6379/15
+"""
+import argparse
+import fnmatch
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+
+from utils.cache_decorator import cache_result
+from utils.redis_cache import RedisCache
+
+CONCURRENCY = 500
+COMPUTE_SECONDS = 0.3
+
+
+class InMemoryRedis:
+    """Thread-safe subset of the Redis commands RedisCache uses."""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def _live(self, key):
+        entry = self._data.get(key)
+        if entry and entry[1] is not None and entry[1] <= time.time():
+            del self._data[key]
+            return None
+        return entry
+
+    def get(self, key):
+        with self._lock:
+            entry = self._live(key)
+            return entry[0] if entry else None
+
+    def setex(self, key, ttl, value):
+        with self._lock:
+            self._data[key] = (value, time.time() + ttl)
+        return True
+
+    def set(self, key, value, nx=False, px=None):
+        with self._lock:
+            if nx and self._live(key):
+                return None
+            self._data[key] = (value.encode() if isinstance(value, str) else value,
+                               time.time() + px / 1000.0 if px else None)
+        return True
+
+    def eval(self, script, numkeys, key, token):
+        with self._lock:
+            entry = self._live(key)
+            if entry and entry[0] == token.encode():
+                del self._data[key]
+                return 1
+        return 0
+
+    def delete(self, *keys):
+        with self._lock:
+            return sum(1 for k in keys if self._data.pop(k, None) is not None)
+
+    def exists(self, key):
+        with self._lock:
+            return 1 if self._live(key) else 0
+
+    def scan(self, cursor, match='*', count=100):
+        with self._lock:
+            return 0, [k for k in list(self._data) if fnmatch.fnmatchcase(k, match)]
+
+    def flushdb(self):
+        with self._lock:
+            self._data.clear()
+        return True
+
+
+def make_worker(redis_client):
+    """A Flask app standing in for one gunicorn worker."""
+    app = Flask(__name__)
+    # L1 off: every worker must go through Redis like separate processes would
+    app.config['CACHE'] = RedisCache(redis_client=redis_client, available=True, l1_enabled=False)
+    return app
+
+
+def stampede(apps, fn):
+    """Call fn from CONCURRENCY threads at once (spread over apps); returns results and elapsed time."""
+    barrier = threading.Barrier(CONCURRENCY)
+
+    def call(i):
+        app = apps[i % len(apps)]
+        with app.app_context():
+            barrier.wait()
+            return fn()
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=CONCURRENCY) as pool:
+        results = list(pool.map(call, range(CONCURRENCY)))
+    return results, time.monotonic() - started
+
+
+def check(name, condition, detail):
+    print(f"{'✓' if condition else '✗'} {name}: {detail}")
+    return condition
+
+
+def test_cold_miss(redis_client):
+    calls = []
+
+    @cache_result(ttl=60, key_func=lambda f, a, k: 'stampede:cold', should_jsonify=False)
+    def expensive():
+        calls.append(1)
+        time.sleep(COMPUTE_SECONDS)
+        return {'value': len(calls)}
+
+    results, elapsed = stampede([make_worker(redis_client)], expensive)
+    ok = check("cold miss, one worker", len(calls) == 1, f"{len(calls)} recomputation(s) for {CONCURRENCY} requests")
+    ok &= check("cold miss, one worker", all(r == {'value': 1} for r in results), "all callers got the value")
+    return ok
+
+
+def test_stale_while_revalidate(redis_client):
+    calls = []
+
+    @cache_result(ttl=1, key_func=lambda f, a, k: 'stampede:swr', should_jsonify=False,
+                  stale_ttl=60, refresh_lock=True)
+    def expensive():
+        calls.append(1)
+        time.sleep(COMPUTE_SECONDS)
+        return {'value': len(calls)}
+
+    apps = [make_worker(redis_client), make_worker(redis_client)]
+    with apps[0].app_context():
+        expensive()
+    time.sleep(1.1)  # let the entry expire logically while it is still stored
+
+    results, elapsed = stampede(apps, expensive)
+    time.sleep(COMPUTE_SECONDS * 3)  # let the background refresh finish
+
+    ok = check("expired key, stale-while-revalidate", len(calls) == 2,
+               f"{len(calls) - 1} recomputation(s) for {CONCURRENCY} requests")
+    ok &= check("expired key, stale-while-revalidate", all(r == {'value': 1} for r in results),
+                f"stale value served to everyone in {elapsed:.2f}s")
+    with apps[0].app_context():
+        ok &= check("expired key, stale-while-revalidate", expensive() == {'value': 2}, "refreshed value cached")
+    return ok
+
+
+def test_distributed_lock(redis_client):
+    calls = []
+
+    @cache_result(ttl=60, key_func=lambda f, a, k: 'stampede:lock', should_jsonify=False, refresh_lock=True)
+    def expensive():
+        calls.append(1)
+        time.sleep(COMPUTE_SECONDS)
+        return {'value': len(calls)}
+
+    apps = [make_worker(redis_client) for _ in range(4)]
+    results, elapsed = stampede(apps, expensive)
+    ok = check("cold miss, four workers", len(calls) == 1, f"{len(calls)} recomputation(s) for {CONCURRENCY} requests")
+    ok &= check("cold miss, four workers", all(r == {'value': 1} for r in results), "all callers got the value")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Cache stampede test for cache_result')
+    parser.add_argument('--redis-url', help='Run against this Redis instead of the in-memory stand-in (database is flushed)')
+    args = parser.parse_args()
+
+    if args.redis_url:
+        import redis
+        redis_client = redis.from_url(args.redis_url)
+        redis_client.ping()
+    else:
+        redis_client = InMemoryRedis()
+
+    ok = True
+    for test in (test_cold_miss, test_stale_while_revalidate, test_distributed_lock):
+        redis_client.flushdb()
+        ok &= test(redis_client)
+
+    print("\nAll stampede tests passed." if ok else "\nStampede tests FAILED.")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -7,13 +7,11 @@ import string
 import base64
 import requests
 import logging
-import qrcode
 from io import BytesIO
 import time
 import hashlib
 from models.user import User
-from services.email_service import EmailService
-from services.passkey_service import PasskeyService
+from services.email_service import get_email_service
 from utils.validators import validate_username, validate_email
 from utils.content_filter import contains_profanity
 from utils.i18n import DEFAULT_LANGUAGE, normalize_language, normalize_language_optional
@@ -73,8 +71,17 @@ class AuthService:
     def __init__(self, db):
         self.db = db
         self.user_model = User(db)
-        self.email_service = EmailService()
-        self.passkey_service = PasskeyService(self.db)
+
+    # AuthService is built for every authenticated request; its helpers are shared
+    # per process and the passkey stack (webauthn) is only imported when needed.
+    @property
+    def email_service(self):
+        return get_email_service()
+
+    @property
+    def passkey_service(self):
+        from services.passkey_service import get_passkey_service
+        return get_passkey_service(self.db)
 
     def register_user(self, username: str, email: str, password: str,
                      phone: str = None, security_questions: list = None, lang: str = 'en') -> dict:
@@ -559,8 +566,7 @@ class AuthService:
                 # If TOTP is not enabled, allow re-registration (incomplete registration)
                 if not existing_user.get('totp_enabled', False):
                     # Delete the incomplete registration
-                    from bson import ObjectId
-                    self.db.users.delete_one({'_id': ObjectId(existing_user['_id'])})
+                    self.user_model.delete_user_permanently(str(existing_user['_id']))
                 else:
                     # Account is fully set up, don't allow re-registration
                     return {'success': False, 'errors': ['Email already registered. Please login or use account recovery.']}
@@ -1413,6 +1419,7 @@ class AuthService:
                 return {'success': False, 'error': 'Failed to generate QR code data'}
 
             # Generate QR code image
+            import qrcode
             qr = qrcode.QRCode(
                 version=1,
                 error_correction=qrcode.constants.ERROR_CORRECT_L,
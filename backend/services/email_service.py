@@ -1,12 +1,13 @@
 """Email service using Resend API for sending verification and recovery emails."""
 import os
-import json
 import requests
 from typing import Optional, Dict, Any
 import logging
-from pathlib import Path
 from datetime import datetime
 
+from utils.i18n import get_locale_bundles
+from utils.singletons import get_singleton
+
 logger = logging.getLogger(__name__)
 
 
@@ -22,24 +23,8 @@ class EmailService:
         self.locales = self._load_locales()
 
     def _load_locales(self) -> Dict[str, Any]:
-        """Load locale files from backend/locales directory."""
-        locales = {}
-        base_path = Path(__file__).parent.parent / 'locales'
-        
-        # Ensure directory exists (create if not, though we just created it via tool)
-        if not base_path.exists():
-            base_path.mkdir(parents=True, exist_ok=True)
-            
-        for lang in ['en', 'pt']:
-            file_path = base_path / f'{lang}.json'
-            if file_path.exists():
-                try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        locales[lang] = json.load(f)
-                except Exception as e:
-                    logger.error(f"Failed to load locale {lang}: {e}")
-                    locales[lang] = {}
-        return locales
+        """Locale bundles from backend/locales (loaded once per process and shared)."""
+        return get_locale_bundles()
 
     def get_text(self, key_path: str, lang: str = 'en', **kwargs) -> str:
         """Retrieve and format text from locale files."""
@@ -374,3 +359,8 @@ class EmailService:
         text_content = f"{title}\n\n{self.get_text('email.deleteAccount.greeting', lang, **data)}\n\n{self.get_text('email.deleteAccount.intro', lang, **data)}\n\n{verification_code}\n\n{self.get_text('email.deleteAccount.expiry', lang, **data)}\n\n{self.get_text('email.deleteAccount.warning', lang, **data)}\n\n{self.get_text('email.deleteAccount.ignore', lang, **data)}"
 
         return self.send_email(to_email, subject, html_content, text_content)
+
+
+def get_email_service() -> EmailService:
+    """Shared EmailService instance for this process."""
+    return get_singleton('email_service', EmailService)
@@ -12,6 +12,8 @@ from pathlib import Path
 from datetime import datetime
 import logging
 
+from utils.singletons import get_singleton
+
 logger = logging.getLogger(__name__)
 
 try:
@@ -79,6 +81,12 @@ class FileStorageService:
             logger.error(f"Failed to create Azure container: {e}")
             raise
     
+    def _index_mtime(self) -> Optional[int]:
+        try:
+            return self.index_file.stat().st_mtime_ns
+        except OSError:
+            return None
+
     def _load_index(self):
         """Load file index for deduplication."""
         if self.use_azure:
@@ -86,7 +94,8 @@ class FileStorageService:
             self.file_index = {}
             return
         
-        if self.index_file.exists():
+        self._loaded_mtime = self._index_mtime()
+        if self._loaded_mtime is not None:
             try:
                 with open(self.index_file, 'r') as f:
                     self.file_index = json.load(f)
@@ -95,17 +104,36 @@ class FileStorageService:
                 self.file_index = {}
         else:
             self.file_index = {}
+
+    def _refresh_index(self):
+        """
+        Re-read the index if another process (another worker, a migration
+        script) wrote it since it was loaded; one stat per call.
+        """
+        if not self.use_azure and self._index_mtime() != self._loaded_mtime:
+            self._load_index()
     
     def _save_index(self):
-        """Save file index to disk."""
+        """Save file index to disk (callers refresh it before changing it)."""
         if self.use_azure:
             return  # Azure uses blob metadata
         
         try:
-            with open(self.index_file, 'w') as f:
+            # Write a temporary file and swap it in, so readers never see half an index
+            tmp_file = self.index_file.with_suffix('.json.tmp')
+            with open(tmp_file, 'w') as f:
                 json.dump(self.file_index, f, indent=2)
+            os.replace(tmp_file, self.index_file)
+            self._loaded_mtime = self._index_mtime()
         except Exception as e:
             logger.error(f"Failed to save file index: {e}")
+
+    def get_file_info(self, file_id: str) -> Optional[Dict]:
+        """Index entry of a local file (None if unknown or on Azure)."""
+        if self.use_azure:
+            return None
+        self._refresh_index()
+        return self.file_index.get(file_id)
     
     def _calculate_file_hash(self, file_data: bytes) -> str:
         """Calculate SHA256 hash of file data."""
@@ -200,6 +228,8 @@ class FileStorageService:
             Tuple of (file_id, file_path_or_url)
         """
         metadata = self._get_file_metadata(filename, file_data, mime_type)
+        if not self.use_azure:
+            self._refresh_index()
         
         # Check for duplicate - only if no prefix is forced (duplicates with prefix are rare/handled by ID gen)
         # Actually, if we want to support prefixes, we should probably skip dedup or verify if existing ID has same prefix
@@ -330,6 +360,7 @@ class FileStorageService:
         if self.use_azure:
             return None
         
+        self._refresh_index()
         if file_id in self.file_index:
             file_info = self.file_index[file_id]
             stored_path = file_info.get('path')
@@ -391,6 +422,7 @@ class FileStorageService:
                 for blob in blobs:
                     container_client.delete_blob(blob.name)
             else:
+                self._refresh_index()
                 if file_id in self.file_index:
                     file_path = self.get_file_path(file_id)
                     if file_path and os.path.exists(file_path):
@@ -471,3 +503,17 @@ class FileStorageService:
             logger.error(f"Error during file cleanup: {e}")
 
         return count
+
+
+def get_file_storage_service(uploads_dir: str = None, use_azure: bool = False) -> FileStorageService:
+    """
+    Shared FileStorageService for a storage configuration.
+
+    Avoids re-creating the Azure client (and its container check) or re-reading
+    the local dedup index on every upload. The local index is still re-read
+    when another process has written it (a stat per lookup).
+    """
+    return get_singleton(
+        ('file_storage', uploads_dir, use_azure),
+        lambda: FileStorageService(uploads_dir=uploads_dir, use_azure=use_azure)
+    )
@@ -21,6 +21,8 @@ from webauthn.helpers.structs import (
 from webauthn.helpers.cose import COSEAlgorithmIdentifier
 import logging
 
+from utils.singletons import get_singleton
+
 logger = logging.getLogger(__name__)
 
 def _b64url_encode(data: bytes) -> str:
@@ -285,3 +287,8 @@ class PasskeyService:
 
 # Import datetime at the top (needed for credential_data)
 from datetime import datetime
+
+
+def get_passkey_service(db) -> PasskeyService:
+    """Shared PasskeyService instance for a database handle."""
+    return get_singleton(('passkey_service', id(db)), lambda: PasskeyService(db))
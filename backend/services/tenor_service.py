@@ -9,6 +9,8 @@ import json
 from typing import List, Dict, Optional, Any
 from flask import current_app, has_app_context
 
+from utils.singletons import get_singleton
+
 logger = logging.getLogger(__name__)
 
 class TenorService:
@@ -45,6 +47,9 @@ class TenorService:
         else:
             self.client_key = os.getenv('TENOR_CLIENT_KEY', 'topicsflow_app')
         
+        # Reuse HTTPS connections to the Tenor API across requests
+        self.session = requests.Session()
+
         if not self.api_key:
             logger.warning("Tenor API key not configured. GIF search will be disabled.")
         else:
@@ -74,7 +79,7 @@ class TenorService:
             ckey = client_key or self.client_key
             url = f"{self.BASE_URL_V2}/search?q={query}&key={self.api_key}&client_key={ckey}&limit={limit}"
             
-            r = requests.get(url, timeout=10)
+            r = self.session.get(url, timeout=10)
             
             if r.status_code == 200:
                 top_gifs = json.loads(r.content)
@@ -172,7 +177,7 @@ class TenorService:
             if locale != 'en_US':
                 url += f"&locale={locale}"
             
-            r = requests.get(url, timeout=10)
+            r = self.session.get(url, timeout=10)
             
             if r.status_code == 200:
                 featured_gifs = json.loads(r.content)
@@ -302,7 +307,7 @@ class TenorService:
             if locale != 'en_US':
                 url += f"&locale={locale}"
             
-            r = requests.get(url, timeout=10)
+            r = self.session.get(url, timeout=10)
             
             if r.status_code == 200:
                 categories = json.loads(r.content)
@@ -364,7 +369,7 @@ class TenorService:
             ckey = client_key or self.client_key
             url = f"{self.BASE_URL_V2}/autocomplete?key={self.api_key}&client_key={ckey}&q={query}&limit={limit}"
             
-            r = requests.get(url, timeout=10)
+            r = self.session.get(url, timeout=10)
             
             if r.status_code == 200:
                 autocomplete_data = json.loads(r.content)
@@ -419,7 +424,7 @@ class TenorService:
             ckey = client_key or self.client_key
             url = f"{self.BASE_URL_V2}/search_suggestions?key={self.api_key}&client_key={ckey}&q={query}&limit={limit}"
             
-            r = requests.get(url, timeout=10)
+            r = self.session.get(url, timeout=10)
             
             if r.status_code == 200:
                 suggestions_data = json.loads(r.content)
@@ -472,7 +477,7 @@ class TenorService:
             if query:
                 url += f"&q={query}"
             
-            response = requests.get(url, timeout=5)
+            response = self.session.get(url, timeout=5)
             
             if response.status_code == 200:
                 return True
@@ -483,3 +488,8 @@ class TenorService:
         except Exception as e:
             logger.warning(f"Failed to register GIF share: {str(e)}")
             return False
+
+
+def get_tenor_service() -> TenorService:
+    """Shared TenorService instance for this process (keys read from the app config on first use)."""
+    return get_singleton('tenor_service', TenorService)
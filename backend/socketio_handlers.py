@@ -1,4 +1,4 @@
-from flask_socketio import emit, join_room, leave_room, disconnect
+from flask_socketio import emit, join_room, leave_room, disconnect, rooms
 from flask import request, current_app
 from services.auth_service import AuthService
 from models.topic import Topic
@@ -7,12 +7,24 @@ from models.anonymous_identity import AnonymousIdentity
 from models.private_message import PrivateMessage
 from utils.validators import validate_message_content
 from utils.content_filter import analyze_content_safety
-from datetime import datetime
+from utils.decorators import rate_limit
+from utils.rate_limits import SOCKET_LIMITS
+from utils.metrics import observe_fanout
+from utils.room_buffer import buffer_message, get_room_buffer
+from datetime import datetime, timedelta
 from bson import ObjectId
 from bson.errors import InvalidId
 import logging
+import time
+
+from utils.structured_logging import get_event_logger
+from utils.singletons import get_model
 
 logger = logging.getLogger(__name__)
+connect_events = get_event_logger('socket.connect')
+message_events = get_event_logger('socket.message')
+room_events = get_event_logger('socket.room')
+private_message_events = get_event_logger('socket.private_message')
 
 # Store connected users (in production, use Redis)
 connected_users = {}
@@ -34,14 +46,9 @@ def register_socketio_handlers(socketio):
     def handle_connect():
         """Handle client connection."""
         try:
-            # Get session ID first (may not be available in all contexts)
             # Get session ID first (may not be available in all contexts)
             try:
                 sid = request.sid
-                logger.info(f"[SOCKET CONNECT] New connection attempt: SID={sid}")
-                
-                # Check cookies/headers
-                logger.info(f"[SOCKET CONNECT] Cookies: {request.cookies.keys()}")
             except (RuntimeError, AttributeError) as sid_error:
                 logger.error(f"Could not get session ID during connect: {sid_error}")
                 return False
@@ -49,19 +56,12 @@ def register_socketio_handlers(socketio):
             # Verify session
             try:
                 auth_service = AuthService(current_app.db)
-                is_auth = auth_service.is_authenticated()
-                logger.info(f"[SOCKET CONNECT] Auth Service check: {is_auth}")
-                
-                if not is_auth:
-                    logger.warning(f"Unauthenticated connection attempt from {sid}")
-                    # Log session usage for debugging
-                    from flask import session
-                    logger.info(f"[SOCKET CONNECT] Flask Session content keys: {list(session.keys()) if session else 'None'}")
+                if not auth_service.is_authenticated():
+                    connect_events.warning('rejected', sid=sid, reason='unauthenticated',
+                                           has_cookie=bool(request.cookies))
                     return False
 
                 current_user_result = auth_service.get_current_user()
-                logger.info(f"[SOCKET CONNECT] Get current user success: {current_user_result.get('success')}")
-                
                 if not current_user_result or not current_user_result.get('success'):
                     logger.warning(f"Invalid session for connection {sid}")
                     return False
@@ -72,8 +72,6 @@ def register_socketio_handlers(socketio):
                     return False
 
                 user_id = user.get('id')
-                logger.info(f"[SOCKET CONNECT] Authenticated User ID: {user_id}")
-                
                 if not user_id:
                     logger.warning(f"No user ID for connection {sid}")
                     return False
@@ -103,12 +101,11 @@ def register_socketio_handlers(socketio):
             try:
                 user_room = f"user_{user_id}"
                 join_room(user_room)
-                logger.info(f"User {username} ({user_id}) joined their personal room: {user_room}")
             except Exception as room_error:
                 logger.error(f"Error joining user room: {room_error}", exc_info=True)
                 # Don't fail connection if room join fails, but log it
 
-            logger.info(f"User {username} ({user_id}) connected successfully")
+            connect_events.info('connected', sid=sid, user_id=user_id)
 
             # Emit events - wrap each in try/except to prevent one failure from breaking others
             try:
@@ -173,7 +170,7 @@ def register_socketio_handlers(socketio):
                 # Store disconnect timestamp in database before removing from memory
                 try:
                     from models.user import User
-                    user_model = User(current_app.db)
+                    user_model = get_model(User, current_app.db)
                     user_model.update_last_online(user_id)
                     # Also keep in memory for quick access
                     user_last_disconnect[user_id] = datetime.utcnow()
@@ -238,7 +235,7 @@ def register_socketio_handlers(socketio):
                     except (KeyError, RuntimeError):
                         pass  # Already removed or server shutting down
 
-                logger.info(f"User {username} ({user_id}) disconnected")
+                connect_events.info('disconnected', user_id=user_id)
 
                 # Broadcast user offline status (only if server is still running)
                 try:
@@ -264,6 +261,7 @@ def register_socketio_handlers(socketio):
             logger.warning(f"Disconnect error: {str(e)}")
 
     @socketio.on('join_topic')
+    @rate_limit(SOCKET_LIMITS['join'])
     def handle_join_topic(data):
         """Handle user joining a topic."""
         try:
@@ -271,7 +269,7 @@ def register_socketio_handlers(socketio):
             use_anonymous = data.get('use_anonymous', False)
             custom_anonymous_name = data.get('custom_anonymous_name')
 
-            logger.info(f"Join topic request: topic_id={topic_id}, data={data}")
+            room_events.debug('join_requested', topic_id=topic_id)
 
             if not topic_id:
                 logger.error(f"Join topic error: topic_id is missing. Data received: {data}")
@@ -352,8 +350,6 @@ def register_socketio_handlers(socketio):
                 'tags': topic.get('tags', []),
                 'settings': topic.get('settings', {})
             })
-            
-            logger.info(f"Emitted topic_joined for topic_id: {topic_id_str} (type: {type(topic_id_str).__name__})")
 
             # Notify other users in topic
             display_name = anonymous_name if anonymous_name else user['username']
@@ -365,7 +361,7 @@ def register_socketio_handlers(socketio):
                 'topic_id': topic_id
             }, room=room_name, include_self=False)
 
-            logger.info(f"User {user['username']} joined topic {topic_id}")
+            room_events.info('joined', user_id=user['id'], topic_id=topic_id)
 
         except Exception as e:
             logger.error(f"Join topic error: {str(e)}")
@@ -416,15 +412,17 @@ def register_socketio_handlers(socketio):
 
             emit('topic_left', {'topic_id': topic_id})
 
-            logger.info(f"User {user['username']} left topic {topic_id}")
+            room_events.info('left', user_id=user['id'], topic_id=topic_id)
 
         except Exception as e:
             logger.error(f"Leave topic error: {str(e)}")
             emit('error', {'message': 'Failed to leave topic'})
 
     @socketio.on('send_message')
+    @rate_limit(SOCKET_LIMITS['send_message'])
     def handle_send_message(data):
         """Handle sending a message to a topic."""
+        started = time.perf_counter()
         try:
             topic_id = data.get('topic_id')
             content = data.get('content', '').strip()
@@ -432,7 +430,7 @@ def register_socketio_handlers(socketio):
             use_anonymous = data.get('use_anonymous', False)
             gif_url = data.get('gif_url')
 
-            logger.info(f"Send message request: topic_id={topic_id}, content_length={len(content) if content else 0}, data={data}")
+            message_events.debug('send_requested', topic_id=topic_id, content_length=len(content))
 
             if not topic_id:
                 logger.error(f"Send message error: topic_id is missing. Data received: {data}")
@@ -447,7 +445,6 @@ def register_socketio_handlers(socketio):
                 # Try to create ObjectId to validate format
                 validated_topic_id = ObjectId(topic_id)
                 topic_id = str(validated_topic_id)  # Use the validated version
-                logger.info(f"Validated topic_id: {topic_id}")
             except (InvalidId, ValueError, TypeError) as e:
                 logger.error(f"Invalid topic_id format: {topic_id}. Error: {str(e)}")
                 emit('error', {'message': f'Invalid topic ID format: {topic_id}'})
@@ -478,7 +475,7 @@ def register_socketio_handlers(socketio):
                     if user_id not in user_rooms:
                         user_rooms[user_id] = set()
                     user_rooms[user_id].add(topic_id)
-                    logger.info(f"Auto-joined user {user_id} to topic {topic_id}")
+                    message_events.info('topic_auto_joined', user_id=user_id, topic_id=topic_id)
                 except Exception as e:
                     logger.error(f"Failed to auto-join topic: {str(e)}")
                     emit('error', {'message': 'You must join the topic first'})
@@ -509,8 +506,6 @@ def register_socketio_handlers(socketio):
                 logger.error(f"Topic not found in database: {topic_id}")
                 emit('error', {'message': 'Topic not found'})
                 return
-            
-            logger.info(f"Topic found: {topic.get('title', 'Unknown')} (ID: {topic_id})")
 
             # Check if user is banned from topic
             if topic_model.is_user_banned_from_topic(topic_id, user_id):
@@ -524,20 +519,12 @@ def register_socketio_handlers(socketio):
                 anonymous_name = anon_model.get_anonymous_identity(user_id, topic_id)
                 # If identity doesn't exist, create it
                 if not anonymous_name:
-                    logger.info(f"[MESSAGE_SEND] Creating new anonymous identity for user {user_id} in topic {topic_id}")
                     anonymous_name = anon_model.create_anonymous_identity(user_id, topic_id)
-                    logger.info(f"[MESSAGE_SEND] Created anonymous identity: {anonymous_name}")
+                    message_events.debug('anonymous_identity_created', user_id=user_id, topic_id=topic_id)
 
             # Create message
             message_model = Message(current_app.db)
             try:
-                logger.info(f"[MESSAGE_SEND] Step 1: Creating message in database")
-                logger.info(f"[MESSAGE_SEND]   - topic_id: {topic_id} (type: {type(topic_id).__name__})")
-                logger.info(f"[MESSAGE_SEND]   - user_id: {user_id} (type: {type(user_id).__name__})")
-                logger.info(f"[MESSAGE_SEND]   - content_length: {len(content)}")
-                logger.info(f"[MESSAGE_SEND]   - message_type: {message_type}")
-                logger.info(f"[MESSAGE_SEND]   - use_anonymous: {use_anonymous}, anonymous_name: {anonymous_name}")
-                
                 message_id = message_model.create_message(
                     topic_id=topic_id,
                     user_id=user_id,
@@ -546,40 +533,20 @@ def register_socketio_handlers(socketio):
                     anonymous_identity=anonymous_name,
                     gif_url=gif_url
                 )
-                
-                logger.info(f"[MESSAGE_SEND] Step 2: Message created successfully")
-                logger.info(f"[MESSAGE_SEND]   - message_id: {message_id}")
-                
-                # Verify message exists in database
-                db_message = message_model.collection.find_one({'_id': ObjectId(message_id)})
-                if db_message:
-                    logger.info(f"[MESSAGE_SEND] Step 3: Database verification successful")
-                    logger.info(f"[MESSAGE_SEND]   - Message found in DB with content: {db_message.get('content', '')[:50]}...")
-                else:
-                    logger.error(f"[MESSAGE_SEND] Step 3: Database verification FAILED - message not found!")
-                    
             except Exception as e:
-                logger.error(f"[MESSAGE_SEND] FAILED to create message: {str(e)}", exc_info=True)
-                import traceback
-                logger.error(f"[MESSAGE_SEND] Traceback: {traceback.format_exc()}")
+                message_events.error('create_failed', exc_info=True, topic_id=topic_id, user_id=user_id,
+                                     error=str(e))
                 emit('error', {'message': f'Failed to create message: {str(e)}'})
                 return
 
             # Get the created message
-            logger.info(f"[MESSAGE_SEND] Step 4: Retrieving created message")
             new_message = message_model.get_message_by_id(message_id)
             if not new_message:
-                logger.error(f"[MESSAGE_SEND] Step 4 FAILED: Message created but could not be retrieved: {message_id}")
+                message_events.error('retrieve_failed', message_id=message_id)
                 emit('error', {'message': 'Failed to retrieve created message'})
                 return
-            
-            logger.info(f"[MESSAGE_SEND] Step 4: Message retrieved successfully")
-            logger.info(f"[MESSAGE_SEND]   - message_id: {new_message.get('_id')}")
-            logger.info(f"[MESSAGE_SEND]   - topic_id: {new_message.get('topic_id')}")
-            logger.info(f"[MESSAGE_SEND]   - content: {new_message.get('content', '')[:50]}...")
 
             # Process mentions
-            logger.info(f"[MESSAGE_SEND] Step 4.5: Processing mentions")
             from utils.helpers import extract_mentions
             from models.anonymous_identity import AnonymousIdentity
             from models.user import User
@@ -589,11 +556,11 @@ def register_socketio_handlers(socketio):
             mentioned_user_ids = []
             
             if mentioned_texts:
-                logger.info(f"[MESSAGE_SEND] Found {len(mentioned_texts)} mentions: {mentioned_texts}")
-                
+                message_events.debug('mentions_found', message_id=message_id, count=len(mentioned_texts))
+
                 # Get all topic members
                 topic_members = topic.get('members', [])
-                user_model = User(current_app.db)
+                user_model = get_model(User, current_app.db)
                 anon_model = AnonymousIdentity(current_app.db)
                 
                 # Get all anonymous identities in this topic
@@ -609,22 +576,20 @@ def register_socketio_handlers(socketio):
                         member = user_model.get_user_by_id(member_id)
                         if member and member.get('username', '').lower() == mention_lower:
                             found_user_id = member_id
-                            logger.info(f"[MESSAGE_SEND] Mention '{mention_text}' matched username: {member.get('username')}")
                             break
                     
                     # If not found, check anonymous identities (case-insensitive)
                     if not found_user_id and mention_lower in anonymous_map:
                         found_user_id = anonymous_map[mention_lower]
-                        logger.info(f"[MESSAGE_SEND] Mention '{mention_text}' matched anonymous name")
                     
                     if found_user_id:
                         mentioned_user_id_str = str(found_user_id)
                         
                         # Check if topic is muted for this user
                         from models.notification_settings import NotificationSettings
-                        notification_settings = NotificationSettings(current_app.db)
+                        notification_settings = get_model(NotificationSettings, current_app.db)
                         if notification_settings.is_topic_muted(mentioned_user_id_str, topic_id):
-                            logger.info(f"[MESSAGE_SEND] Skipping mention notification for user {mentioned_user_id_str} - topic {topic_id} is muted")
+                            message_events.debug('mention_muted', user_id=mentioned_user_id_str, topic_id=topic_id)
                             mentioned_user_ids.append(mentioned_user_id_str) # Still track the mention
                             continue
 
@@ -643,11 +608,8 @@ def register_socketio_handlers(socketio):
                         }
                         try:
                             emit('user_mentioned', mention_data, room=user_room)
-                            logger.info(f"[MESSAGE_SEND] Sent mention notification to user {found_user_id} in room {user_room}")
                         except Exception as e:
-                            logger.error(f"[MESSAGE_SEND] Failed to send mention notification: {str(e)}")
-                    else:
-                        logger.info(f"[MESSAGE_SEND] Mention '{mention_text}' did not match any user in topic")
+                            message_events.error('mention_notify_failed', user_id=found_user_id, error=str(e))
                 
                 # Update message with mentions
                 if mentioned_user_ids:
@@ -655,11 +617,8 @@ def register_socketio_handlers(socketio):
                         {'_id': ObjectId(message_id)},
                         {'$set': {'mentions': [ObjectId(uid) for uid in mentioned_user_ids]}}
                     )
-                    logger.info(f"[MESSAGE_SEND] Updated message with {len(mentioned_user_ids)} mentions")
 
             # Prepare message for broadcast - convert ObjectIds to strings
-            logger.info(f"[MESSAGE_SEND] Step 5: Preparing broadcast message")
-            
             # Ensure created_at is a string (should already be ISO format from get_message_by_id)
             created_at_str = new_message.get('created_at', '')
             if isinstance(created_at_str, datetime):
@@ -682,45 +641,37 @@ def register_socketio_handlers(socketio):
                 'can_delete': new_message.get('can_delete', False)
             }
 
-            logger.info(f"[MESSAGE_SEND] Step 5: Broadcast message prepared")
-            logger.info(f"[MESSAGE_SEND]   - message_id: {broadcast_message['id']}")
-            logger.info(f"[MESSAGE_SEND]   - topic_id: {broadcast_message['topic_id']}")
-            logger.info(f"[MESSAGE_SEND]   - display_name: {broadcast_message['display_name']}")
-
             # Broadcast to topic room
             room_name = f"topic_{topic_id}"
-            logger.info(f"[MESSAGE_SEND] Step 6: Broadcasting to room '{room_name}'")
-            logger.info(f"[MESSAGE_SEND]   - Room members: {len(user_rooms.get(user_id, set()))} topics for user")
-            
             try:
                 emit('new_message', broadcast_message, room=room_name)
-                logger.info(f"[MESSAGE_SEND] Step 6: Successfully emitted to room '{room_name}'")
+                observe_fanout(socketio, 'new_message', room_name)
+                buffer_message(room_name, message_id, 'new_message', broadcast_message)
             except Exception as e:
-                logger.error(f"[MESSAGE_SEND] Step 6 FAILED: Error emitting to room: {str(e)}")
+                message_events.error('broadcast_failed', room=room_name, message_id=message_id, error=str(e))
 
             # Also send to sender directly to ensure they see their message
-            logger.info(f"[MESSAGE_SEND] Step 7: Sending confirmation to sender")
             try:
                 emit('new_message', broadcast_message)
-                logger.info(f"[MESSAGE_SEND] Step 7: Successfully sent to sender")
             except Exception as e:
-                logger.error(f"[MESSAGE_SEND] Step 7 FAILED: Error sending to sender: {str(e)}")
+                message_events.error('echo_failed', message_id=message_id, error=str(e))
 
             # Confirm to sender
-            logger.info(f"[MESSAGE_SEND] Step 8: Sending message_sent confirmation")
             try:
                 emit('message_sent', {'message_id': message_id})
-                logger.info(f"[MESSAGE_SEND] Step 8: Successfully sent confirmation")
             except Exception as e:
-                logger.error(f"[MESSAGE_SEND] Step 8 FAILED: Error sending confirmation: {str(e)}")
+                message_events.error('confirm_failed', message_id=message_id, error=str(e))
 
-            logger.info(f"[MESSAGE_SEND] COMPLETE: Message sent in topic {topic_id} by {user['username']}, message_id: {message_id}")
+            message_events.info('message_sent', topic_id=topic_id, user_id=user_id, message_id=message_id,
+                                anonymous=is_anonymous, mentions=len(mentioned_user_ids),
+                                duration_ms=round((time.perf_counter() - started) * 1000, 1))
 
         except Exception as e:
             logger.error(f"Send message error: {str(e)}")
             emit('error', {'message': 'Failed to send message'})
 
     @socketio.on('typing_start')
+    @rate_limit(SOCKET_LIMITS['typing'], silent=True)
     def handle_typing_start(data):
         """Handle user starting to type."""
         try:
@@ -760,6 +711,7 @@ def register_socketio_handlers(socketio):
             logger.error(f"Typing start error: {str(e)}")
 
     @socketio.on('typing_stop')
+    @rate_limit(SOCKET_LIMITS['typing'], silent=True)
     def handle_typing_stop(data):
         """Handle user stopping typing."""
         try:
@@ -787,18 +739,20 @@ def register_socketio_handlers(socketio):
             logger.error(f"Typing stop error: {str(e)}")
 
     @socketio.on('send_private_message')
+    @rate_limit(SOCKET_LIMITS['send_private_message'])
     def handle_send_private_message(data):
         """Handle sending a private message."""
+        started = time.perf_counter()
         try:
             to_user_id = data.get('to_user_id')
             content = data.get('content', '').strip()
             message_type = data.get('message_type', 'text')
             gif_url = data.get('gif_url')
 
-            logger.info(f"[PRIVATE_MSG] Send request: to_user_id={to_user_id}, content_length={len(content) if content else 0}, message_type={message_type}")
+            private_message_events.debug('send_requested', to_user_id=to_user_id, content_length=len(content),
+                      message_type=message_type)
 
             if not to_user_id:
-                logger.error(f"[PRIVATE_MSG] Missing recipient")
                 emit('error', {'message': 'Recipient is required'})
                 return
 
@@ -810,7 +764,6 @@ def register_socketio_handlers(socketio):
             else:
                 # For non-GIF messages, content is required
                 if not content:
-                    logger.error(f"[PRIVATE_MSG] Missing content")
                     emit('error', {'message': 'Message content is required'})
                     return
 
@@ -818,30 +771,24 @@ def register_socketio_handlers(socketio):
             auth_service = AuthService(current_app.db)
             current_user_result = auth_service.get_current_user()
             if not current_user_result['success']:
-                logger.error(f"[PRIVATE_MSG] Authentication failed")
                 emit('error', {'message': 'Authentication required'})
                 return
 
             user = current_user_result['user']
             user_id = user['id']
-            
-            logger.info(f"[PRIVATE_MSG] User authenticated: {user['username']} ({user_id})")
 
             # Validate message content (skip validation for GIF messages with empty content)
             if message_type != 'gif' or content:
                 validation_result = validate_message_content(content)
                 if not validation_result['valid']:
-                    logger.error(f"[PRIVATE_MSG] Content validation failed: {validation_result['errors']}")
                     emit('error', {'message': ' '.join(validation_result['errors'])})
                     return
 
             # Check if this is a self-message
             is_self_message = (str(to_user_id) == str(user_id))
-            logger.info(f"[PRIVATE_MSG] Is self-message: {is_self_message}")
 
             # Create private message
             pm_model = PrivateMessage(current_app.db)
-            logger.info(f"[PRIVATE_MSG] Creating message in database")
             message_id = pm_model.send_message(
                 from_user_id=user_id,
                 to_user_id=to_user_id,
@@ -849,12 +796,11 @@ def register_socketio_handlers(socketio):
                 message_type=message_type,
                 gif_url=gif_url
             )
-            logger.info(f"[PRIVATE_MSG] Message created: {message_id}")
 
             # Get the created message
             new_message = pm_model.get_message_by_id(message_id)
             if not new_message:
-                logger.error(f"[PRIVATE_MSG] Message created but could not be retrieved: {message_id}")
+                private_message_events.error('retrieve_failed', message_id=message_id)
                 emit('error', {'message': 'Failed to send message'})
                 return
 
@@ -881,12 +827,10 @@ def register_socketio_handlers(socketio):
 
             # Send to sender (they should see their own message)
             sender_room = f"user_{user_id}"
-            logger.info(f"[PRIVATE_MSG] Sending confirmation to sender in room {sender_room}")
             try:
                 emit('private_message_sent', broadcast_message, room=sender_room)
-                logger.info(f"[PRIVATE_MSG] Successfully sent to sender")
             except Exception as e:
-                logger.error(f"[PRIVATE_MSG] Failed to send to sender: {str(e)}")
+                private_message_events.error('echo_failed', message_id=message_id, error=str(e))
 
             # Create notification for recipient (if not muted and not self-message)
             if not is_self_message:
@@ -939,22 +883,19 @@ def register_socketio_handlers(socketio):
                                     'sender_username': user['username'],
                                     'timestamp': created_at
                                 }, room=receiver_room)
-                                logger.info(f"[PRIVATE_MSG] Notification created and emitted for user {to_user_id}")
                             except Exception as e:
-                                logger.warning(f"[PRIVATE_MSG] Failed to emit notification socket event: {str(e)}")
+                                private_message_events.warning('notification_emit_failed', to_user_id=to_user_id, error=str(e))
                 except Exception as e:
-                    logger.warning(f"[PRIVATE_MSG] Failed to create notification: {str(e)}")
+                    private_message_events.warning('notification_failed', to_user_id=to_user_id, error=str(e))
 
             # Handle self-message: emit as received message too
             if is_self_message:
-                logger.info(f"[PRIVATE_MSG] Self-message detected, emitting as received message")
                 receiver_message = broadcast_message.copy()
                 receiver_message['is_from_me'] = False
                 try:
                     emit('new_private_message', receiver_message, room=sender_room)
-                    logger.info(f"[PRIVATE_MSG] Self-message sent as received message")
                 except Exception as e:
-                    logger.error(f"[PRIVATE_MSG] Failed to send self-message as received: {str(e)}")
+                    private_message_events.error('deliver_failed', message_id=message_id, target='self', error=str(e))
             else:
                 # Send to receiver - try SID first for reliable delivery, fallback to room
                 receiver_message = broadcast_message.copy()
@@ -967,36 +908,36 @@ def register_socketio_handlers(socketio):
                     receiver_sid = connected_users[to_user_id_str].get('sid')
                 
                 if receiver_sid:
-                    logger.info(f"[PRIVATE_MSG] Sending to receiver via SID: {receiver_sid}")
                     try:
                         socketio.emit('new_private_message', receiver_message, to=receiver_sid)
-                        logger.info(f"[PRIVATE_MSG] Successfully emitted to receiver SID")
                     except Exception as e:
-                        logger.error(f"[PRIVATE_MSG] Failed to send to receiver SID: {str(e)}")
+                        private_message_events.error('deliver_failed', message_id=message_id, target='sid', error=str(e))
                 else:
                     # Fallback to room emission
                     receiver_room = f"user_{to_user_id}"
-                    logger.info(f"[PRIVATE_MSG] Receiver not in connected_users, trying room: {receiver_room}")
                     try:
                         socketio.emit('new_private_message', receiver_message, room=receiver_room)
-                        logger.info(f"[PRIVATE_MSG] Successfully emitted to receiver room")
                     except Exception as e:
-                        logger.error(f"[PRIVATE_MSG] Failed to send to receiver room: {str(e)}")
+                        private_message_events.error('deliver_failed', message_id=message_id, target='room', error=str(e))
+
+            emit_unread_counts(socketio, to_user_id, user_id)
 
             # Confirm to sender
             try:
                 emit('private_message_confirmed', {'message_id': message_id})
-                logger.info(f"[PRIVATE_MSG] Confirmation sent")
             except Exception as e:
-                logger.error(f"[PRIVATE_MSG] Failed to send confirmation: {str(e)}")
+                private_message_events.error('confirm_failed', message_id=message_id, error=str(e))
 
-            logger.info(f"[PRIVATE_MSG] COMPLETE: Message sent from {user['username']} to user {to_user_id}")
+            private_message_events.info('message_sent', from_user_id=user_id, to_user_id=to_user_id, message_id=message_id,
+                     delivered_to=('self' if is_self_message else 'sid' if receiver_sid else 'room'),
+                     duration_ms=round((time.perf_counter() - started) * 1000, 1))
 
         except Exception as e:
-            logger.error(f"[PRIVATE_MSG] ERROR: {str(e)}", exc_info=True)
+            private_message_events.error('send_failed', exc_info=True, error=str(e))
             emit('error', {'message': 'Failed to send private message'})
 
     @socketio.on('mark_messages_read')
+    @rate_limit(SOCKET_LIMITS['mark_read'], silent=True)
     def handle_mark_messages_read(data):
         """Handle marking private messages as read."""
         try:
@@ -1014,16 +955,20 @@ def register_socketio_handlers(socketio):
             user = current_user_result['user']
             user_id = user['id']
 
-            # Mark conversation as read
+            # Mark conversation as read (moves the read mark; one update)
             pm_model = PrivateMessage(current_app.db)
-            pm_model.mark_conversation_as_read(user_id, from_user_id)
+            marked_count = pm_model.mark_conversation_as_read(user_id, from_user_id)
 
             emit('messages_marked_read', {'from_user_id': from_user_id})
+            if marked_count:
+                invalidate_conversation_list(user_id)
+                emit_unread_counts(socketio, user_id, from_user_id)
 
         except Exception as e:
             logger.error(f"Mark messages read error: {str(e)}")
 
     @socketio.on('update_anonymous_name')
+    @rate_limit(SOCKET_LIMITS['update_anonymous_name'])
     def handle_update_anonymous_name(data):
         """Handle updating anonymous name for a topic."""
         try:
@@ -1091,6 +1036,7 @@ def register_socketio_handlers(socketio):
     # ========== NEW HANDLERS FOR THEMES, POSTS, COMMENTS, CHAT ROOMS ==========
     
     @socketio.on('join_topic')
+    @rate_limit(SOCKET_LIMITS['join'])
     def handle_join_topic(data):
         """Handle user joining a topic room."""
         try:
@@ -1139,13 +1085,14 @@ def register_socketio_handlers(socketio):
                 'topic_title': topic['title']
             })
 
-            logger.info(f"User {user['username']} joined topic {topic_id}")
+            room_events.info('joined', user_id=user['id'], topic_id=topic_id)
 
         except Exception as e:
             logger.error(f"Join topic error: {str(e)}", exc_info=True)
             emit('error', {'message': 'Failed to join topic'})
     
     @socketio.on('join_chat_room')
+    @rate_limit(SOCKET_LIMITS['join'])
     def handle_join_chat_room(data):
         """Handle user joining a chat room."""
         try:
@@ -1190,7 +1137,7 @@ def register_socketio_handlers(socketio):
                 'room_name': room['name']
             })
             
-            logger.info(f"User {user['username']} joined chat room {room_id}")
+            room_events.info('joined', user_id=user['id'], chat_room_id=room_id)
             
         except Exception as e:
             logger.error(f"Join chat room error: {str(e)}", exc_info=True)
@@ -1222,11 +1169,57 @@ def register_socketio_handlers(socketio):
                     pass
 
             emit('chat_room_left', {'room_id': room_id})
-            logger.info(f"User {user.get('username', 'Unknown')} left chat room {room_id}")
+            room_events.info('left', user_id=user.get('id'), chat_room_id=room_id)
         except Exception as e:
             logger.error(f"Leave chat room error: {str(e)}", exc_info=True)
     
+    @socketio.on('sync_room')
+    @rate_limit(SOCKET_LIMITS['sync_room'])
+    def handle_sync_room(data):
+        """
+        Replay recent messages of a joined topic or chat room from the room buffer.
+
+        Without since_message_id (room open) the latest `limit` messages are sent;
+        with it (reconnect) the messages after it. When `complete` is false the
+        client loads history over HTTP instead.
+        """
+        try:
+            room_type = data.get('room_type')
+            room_id = str(data.get('room_id') or '')
+            since_message_id = data.get('since_message_id') or None
+            try:
+                limit = min(max(int(data.get('limit', 50)), 1), 100)
+            except (TypeError, ValueError):
+                limit = 50
+
+            if room_type not in ('topic', 'chat_room') or not room_id:
+                emit('error', {'message': 'room_type (topic or chat_room) and room_id are required'})
+                return
+
+            # Access was checked when the socket joined the room
+            room_name = f"{room_type}_{room_id}"
+            if room_name not in rooms():
+                emit('error', {'message': 'Join the room before syncing it'})
+                return
+
+            buffer = get_room_buffer()
+            result = buffer.sync(room_name, since_message_id, limit) if buffer else {
+                'messages': [], 'complete': False, 'has_more': False
+            }
+            emit('room_sync', {
+                'room_type': room_type,
+                'room_id': room_id,
+                'since_message_id': since_message_id,
+                **result
+            })
+            room_events.debug('synced', room=room_name, since=since_message_id,
+                              count=len(result['messages']), complete=result['complete'])
+        except Exception as e:
+            logger.error(f"Sync room error: {str(e)}", exc_info=True)
+            emit('error', {'message': 'Failed to sync room'})
+
     @socketio.on('join_post')
+    @rate_limit(SOCKET_LIMITS['join'])
     def handle_join_post(data):
         """Handle user joining a post room (for real-time comment updates)."""
         try:
@@ -1271,7 +1264,7 @@ def register_socketio_handlers(socketio):
                 'post_title': post.get('title', '')
             })
             
-            logger.info(f"User {user['username']} joined post {post_id}")
+            room_events.info('joined', user_id=user['id'], post_id=post_id)
             
         except Exception as e:
             logger.error(f"Join post error: {str(e)}", exc_info=True)
@@ -1332,6 +1325,7 @@ def register_socketio_handlers(socketio):
     # ==================== VOIP HANDLERS ====================
     
     @socketio.on('voip_create_call')
+    @rate_limit(SOCKET_LIMITS['voip_call'])
     def handle_voip_create_call(data):
         """Create a new VOIP call for a chat room or DM."""
         try:
@@ -1426,6 +1420,7 @@ def register_socketio_handlers(socketio):
             emit('voip_error', {'message': 'Failed to create call'})
 
     @socketio.on('voip_join_call')
+    @rate_limit(SOCKET_LIMITS['voip_call'])
     def handle_voip_join_call(data):
         """Join an existing VOIP call."""
         try:
@@ -1546,6 +1541,7 @@ def register_socketio_handlers(socketio):
             emit('voip_error', {'message': 'Failed to leave call'})
 
     @socketio.on('voip_ice_candidate')
+    @rate_limit(SOCKET_LIMITS['voip_signal'], silent=True)
     def handle_voip_ice_candidate(data):
         """Relay ICE candidate to a specific peer."""
         try:
@@ -1577,6 +1573,7 @@ def register_socketio_handlers(socketio):
             logger.error(f"[VOIP] ICE candidate error: {str(e)}")
 
     @socketio.on('voip_offer')
+    @rate_limit(SOCKET_LIMITS['voip_signal'], silent=True)
     def handle_voip_offer(data):
         """Relay SDP offer to a specific peer."""
         try:
@@ -1612,6 +1609,7 @@ def register_socketio_handlers(socketio):
             logger.error(f"[VOIP] Offer relay error: {str(e)}")
 
     @socketio.on('voip_answer')
+    @rate_limit(SOCKET_LIMITS['voip_signal'], silent=True)
     def handle_voip_answer(data):
         """Relay SDP answer to a specific peer."""
         try:
@@ -1645,6 +1643,7 @@ def register_socketio_handlers(socketio):
             logger.error(f"[VOIP] Answer relay error: {str(e)}")
 
     @socketio.on('voip_speaking')
+    @rate_limit(SOCKET_LIMITS['voip_signal'], silent=True)
     def handle_voip_speaking(data):
         """Broadcast speaking status to call participants."""
         try:
@@ -1675,6 +1674,7 @@ def register_socketio_handlers(socketio):
             logger.error(f"[VOIP] Speaking status error: {str(e)}")
 
     @socketio.on('voip_mute_toggle')
+    @rate_limit(SOCKET_LIMITS['voip_signal'], silent=True)
     def handle_voip_mute_toggle(data):
         """Toggle and broadcast mute status."""
         try:
@@ -1847,7 +1847,7 @@ def get_online_admin_count() -> int:
     from models.user import User
     
     try:
-        user_model = User(current_app.db)
+        user_model = get_model(User, current_app.db)
         count = 0
         for user_id in connected_users:
             user = user_model.get_user_by_id(user_id)
@@ -1864,24 +1864,60 @@ def get_user_room_count(user_id: str) -> int:
     return len(user_rooms.get(user_id, set()))
 
 
-def cleanup_disconnected_users():
-    """Clean up disconnected users from the tracking."""
-    global connected_users, user_rooms
-
-    # Remove users who have been disconnected for more than 5 minutes
-    current_time = datetime.utcnow()
-    disconnected_users = []
-    for user_id, user_data in connected_users.items():
-        connected_at = user_data.get('connected_at')
-        if connected_at:
-            time_diff = (current_time - connected_at).total_seconds()
-            if time_diff > 300:  # 5 minutes
-                disconnected_users.append(user_id)
-
-    for user_id in disconnected_users:
-        del connected_users[user_id]
-        if user_id in user_rooms:
-            del user_rooms[user_id]
+def cleanup_disconnected_users(socketio_instance=None, disconnect_retention_seconds: int = 3600) -> int:
+    """
+    Prune this worker's presence tracking.
+
+    Drops users whose socket is gone although no disconnect event was handled
+    (dropped transports, server-side errors) and forgets disconnect times older
+    than disconnect_retention_seconds (last_online is persisted on disconnect).
+    Returns the number of users removed.
+    """
+    manager = getattr(getattr(socketio_instance, 'server', None), 'manager', None)
+
+    stale_users = []
+    if manager is not None:
+        for user_id, user_data in list(connected_users.items()):
+            sid = user_data.get('sid')
+            if sid and not manager.is_connected(sid, '/'):
+                stale_users.append(user_id)
+
+    for user_id in stale_users:
+        connected_users.pop(user_id, None)
+        user_rooms.pop(user_id, None)
+
+    cutoff = datetime.utcnow() - timedelta(seconds=disconnect_retention_seconds)
+    for user_id, disconnected_at in list(user_last_disconnect.items()):
+        if disconnected_at < cutoff:
+            user_last_disconnect.pop(user_id, None)
+
+    return len(stale_users)
+
+
+def emit_unread_counts(socketio_instance, user_id: str, other_user_id: str) -> None:
+    """
+    Push a user's unread private message counts to their personal room.
+
+    Sent as `unread_counts` with from_user_id, conversation_unread and
+    unread_count (the total) after every send to and read by the user, so
+    clients keep their badges without polling the unread-count endpoint.
+    """
+    try:
+        counts = get_model(PrivateMessage, current_app.db).get_unread_counts(user_id, other_user_id)
+        socketio_instance.emit('unread_counts', {'from_user_id': str(other_user_id), **counts},
+                               room=f"user_{user_id}")
+    except Exception as e:
+        logger.warning(f"Failed to push unread counts to {user_id}: {e}")
+
+
+def invalidate_conversation_list(user_id: str) -> None:
+    """Drop a user's cached conversation list after its unread counts changed."""
+    invalidator = current_app.config.get('CACHE_INVALIDATOR')
+    if invalidator:
+        try:
+            invalidator.invalidate_pattern(f"user:pm_conversations:user:{user_id}*")
+        except Exception as e:
+            logger.error(f"Cache invalidation failed: {e}")
 
 
 def emit_admin_notification(socketio_instance, notification_type, data):
@@ -64,6 +64,10 @@ else
     exit 1
 fi
 
+# Reconcile database indexes once per deployment (workers then only check the version)
+echo "Reconciling database indexes..."
+python3 manage_indexes.py apply || echo "[WARNING] Index reconciliation failed; workers will retry on startup"
+
 echo "=========================================="
 echo "Starting gunicorn with eventlet worker..."
 echo "App module: $APP_MODULE"
@@ -2,6 +2,7 @@ from functools import wraps
 from flask import jsonify, current_app
 from services.auth_service import AuthService
 import logging
+from utils.singletons import get_model
 
 logger = logging.getLogger(__name__)
 
@@ -71,7 +72,7 @@ def check_admin_permission(user_id: str, db) -> bool:
     from models.user import User
 
     try:
-        user_model = User(db)
+        user_model = get_model(User, db)
         user = user_model.get_user_by_id(user_id)
 
         if not user:
@@ -0,0 +1,217 @@
+"""
+Binary codec for cached values.
+
+Every encoded value starts with a 4-byte header:
+
+    MAGIC (0xFC) | version | format | compression
+
+Version 2 headers are followed by two big-endian doubles, the entry's logical
+expiry (unix time) and the seconds it took to compute, used by the
+stale-while-revalidate and early-refresh modes of cache_result.
+
+`format` is JSON (encoded with orjson when installed) or msgpack, and
+`compression` is none, zstd, lz4 or zlib. Payloads are only compressed above a
+size threshold and only when it actually saves space. JSON payloads can be
+handed to a Response as-is, skipping the decode/re-encode round trip on cache
+hits. Values written before the header existed (plain JSON text) still decode.
+
+orjson, msgpack, zstandard and lz4 are optional; the codec falls back to the
+standard library (json, zlib) when they are missing.
+"""
+import json
+import logging
+import struct
+import zlib
+from typing import Any, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+try:
+    import lz4.frame
+    LZ4_AVAILABLE = True
+except ImportError:
+    LZ4_AVAILABLE = False
+
+# 0xFC never starts a UTF-8 JSON document, so headerless legacy values are unambiguous
+MAGIC = 0xFC
+VERSION = 1
+VERSION_META = 2
+HEADER_SIZE = 4
+META = struct.Struct('>dd')
+
+FORMAT_JSON = ord('j')
+FORMAT_MSGPACK = ord('m')
+
+COMPRESSION_NONE = ord('n')
+COMPRESSION_ZSTD = ord('s')
+COMPRESSION_LZ4 = ord('l')
+COMPRESSION_ZLIB = ord('z')
+
+
+def _resolve_compression(name: str) -> int:
+    """Map a configured compression name to an available algorithm."""
+    name = (name or 'none').lower()
+    if name == 'auto':
+        if ZSTD_AVAILABLE:
+            return COMPRESSION_ZSTD
+        if LZ4_AVAILABLE:
+            return COMPRESSION_LZ4
+        return COMPRESSION_ZLIB
+    if name == 'zstd' and ZSTD_AVAILABLE:
+        return COMPRESSION_ZSTD
+    if name == 'lz4' and LZ4_AVAILABLE:
+        return COMPRESSION_LZ4
+    if name in ('zstd', 'lz4', 'zlib'):
+        if name != 'zlib':
+            logger.warning(f"Cache compression '{name}' not installed; using zlib")
+        return COMPRESSION_ZLIB
+    return COMPRESSION_NONE
+
+
+class CacheCodec:
+    """Encodes cache values to compact, versioned bytes and back."""
+
+    def __init__(self, fmt: str = 'json', compression: str = 'auto', min_compress_bytes: int = 1024):
+        """
+        Args:
+            fmt: 'json' (default; allows raw passthrough on hits) or 'msgpack'
+            compression: 'auto', 'zstd', 'lz4', 'zlib' or 'none'
+            min_compress_bytes: Payloads smaller than this are stored uncompressed
+        """
+        if fmt == 'msgpack' and not MSGPACK_AVAILABLE:
+            logger.warning("msgpack not installed; cache codec uses JSON")
+            fmt = 'json'
+        self.format = FORMAT_MSGPACK if fmt == 'msgpack' else FORMAT_JSON
+        self.compression = _resolve_compression(compression)
+        self.min_compress_bytes = min_compress_bytes
+
+        self._zstd_compressor = zstandard.ZstdCompressor(level=3) if self.compression == COMPRESSION_ZSTD else None
+        self._zstd_decompressor = zstandard.ZstdDecompressor() if ZSTD_AVAILABLE else None
+
+    # ------------------------------------------------------------------ encode
+
+    def encode(self, value: Any, compress: bool = True, expires_at: Optional[float] = None,
+               delta: float = 0.0) -> bytes:
+        """
+        Serialize a value with the codec header.
+
+        Args:
+            value: JSON-compatible value
+            compress: Allow compression above the size threshold
+            expires_at: Logical expiry (unix time) to embed; None writes a plain header
+            delta: Recompute cost in seconds, embedded with expires_at
+
+        Raises:
+            TypeError/ValueError: If the value can't be serialized
+        """
+        payload = self._serialize(value)
+        compression = COMPRESSION_NONE
+        if compress and self.compression != COMPRESSION_NONE and len(payload) >= self.min_compress_bytes:
+            compressed = self._compress(payload)
+            if len(compressed) < len(payload):
+                payload = compressed
+                compression = self.compression
+        if expires_at is None:
+            return bytes((MAGIC, VERSION, self.format, compression)) + payload
+        return bytes((MAGIC, VERSION_META, self.format, compression)) + META.pack(expires_at, delta) + payload
+
+    def _serialize(self, value: Any) -> bytes:
+        if self.format == FORMAT_MSGPACK:
+            return msgpack.packb(value, default=str, use_bin_type=True)
+        if ORJSON_AVAILABLE:
+            try:
+                # Pass datetimes to default=str so cached values match the stdlib encoding
+                return orjson.dumps(
+                    value, default=str,
+                    option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+                )
+            except (TypeError, orjson.JSONEncodeError):
+                pass  # e.g. integers beyond 64 bits; the stdlib handles them
+        return json.dumps(value, default=str, separators=(',', ':')).encode('utf-8')
+
+    def _compress(self, payload: bytes) -> bytes:
+        if self.compression == COMPRESSION_ZSTD:
+            return self._zstd_compressor.compress(payload)
+        if self.compression == COMPRESSION_LZ4:
+            return lz4.frame.compress(payload)
+        return zlib.compress(payload, 1)
+
+    # ------------------------------------------------------------------ decode
+
+    def decode(self, data: bytes) -> Any:
+        """
+        Deserialize bytes produced by encode() (or legacy plain JSON).
+
+        Raises:
+            ValueError: If the payload is corrupt or uses an unknown header
+        """
+        fmt, payload = self._unwrap(data)[:2]
+        if fmt == FORMAT_MSGPACK:
+            if not MSGPACK_AVAILABLE:
+                raise ValueError("msgpack payload but msgpack is not installed")
+            return msgpack.unpackb(payload, raw=False)
+        if ORJSON_AVAILABLE:
+            return orjson.loads(payload)
+        return json.loads(payload)
+
+    def json_bytes(self, data: bytes) -> Optional[bytes]:
+        """Return the JSON document inside an encoded value, or None for non-JSON formats."""
+        fmt, payload = self._unwrap(data)[:2]
+        return payload if fmt == FORMAT_JSON else None
+
+    def read_meta(self, data: bytes) -> Optional[Tuple[float, float]]:
+        """Return the embedded (expires_at, delta) without decoding the value, or None."""
+        if isinstance(data, (bytes, bytearray)) and len(data) >= HEADER_SIZE + META.size \
+                and data[0] == MAGIC and data[1] == VERSION_META:
+            return META.unpack_from(data, HEADER_SIZE)
+        return None
+
+    def _unwrap(self, data: bytes):
+        """Strip the header and decompress. Returns (format, payload, meta)."""
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        if not data or data[0] != MAGIC:
+            # Legacy value written as plain JSON text
+            return FORMAT_JSON, data, None
+        if len(data) < HEADER_SIZE or data[1] not in (VERSION, VERSION_META):
+            raise ValueError(f"Unsupported cache payload header: {data[:HEADER_SIZE]!r}")
+
+        fmt, compression = data[2], data[3]
+        payload = data[HEADER_SIZE:]
+        meta = None
+        if data[1] == VERSION_META:
+            if len(payload) < META.size:
+                raise ValueError("Truncated cache payload metadata")
+            meta = META.unpack_from(payload)
+            payload = payload[META.size:]
+        if compression == COMPRESSION_ZSTD:
+            if not self._zstd_decompressor:
+                raise ValueError("zstd payload but zstandard is not installed")
+            payload = self._zstd_decompressor.decompress(payload)
+        elif compression == COMPRESSION_LZ4:
+            if not LZ4_AVAILABLE:
+                raise ValueError("lz4 payload but lz4 is not installed")
+            payload = lz4.frame.decompress(payload)
+        elif compression == COMPRESSION_ZLIB:
+            payload = zlib.decompress(payload)
+        elif compression != COMPRESSION_NONE:
+            raise ValueError(f"Unknown cache compression: {compression}")
+        return fmt, payload, meta
@@ -5,11 +5,22 @@ import functools
 import hashlib
 import json
 import logging
+import math
+import random
+import threading
+import time
 from typing import Any, Callable, Optional
-from flask import current_app, request
+from flask import current_app, request, has_request_context, copy_current_request_context
 
 logger = logging.getLogger(__name__)
 
+# Seconds between cache checks while another worker holds the refresh lock
+LOCK_POLL_INTERVAL = 0.05
+
+# Keys with a background refresh in flight in this process
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
 
 def _generate_cache_key(key_prefix: str, func_name: str, args: tuple, kwargs: dict) -> str:
     """
@@ -48,9 +59,88 @@ def _generate_cache_key(key_prefix: str, func_name: str, args: tuple, kwargs: di
     return f"{key_prefix}:{func_name}:{key_hash}"
 
 
-def cache_result(ttl: int = 300, key_prefix: str = 'cache', key_func: Optional[Callable] = None, should_jsonify: bool = True):
+def _prepare_cache_data(result: Any, cache_key: str):
+    """
+    Extract the cacheable payload from a function result.
+
+    Returns:
+        (should_cache, data)
+    """
+    cache_data = result
+
+    # Handle Flask (response, status_code) tuples
+    if isinstance(result, tuple):
+        # Extract the response object (usually the first element)
+        response_obj = result[0]
+        # Never cache error responses
+        status_code = result[1] if len(result) > 1 else 200
+        if status_code >= 400:
+            logger.debug(f"[CACHE] SKIP caching error response {status_code} for {cache_key}")
+            return False, None
+
+        if hasattr(response_obj, 'get_json') and callable(response_obj.get_json):
+            try:
+                json_data = response_obj.get_json()
+                if json_data is not None:
+                    cache_data = json_data
+            except Exception as e:
+                logger.debug(f"[CACHE] Failed to extract JSON from tuple response: {e}")
+
+    # Handle single Response object
+    elif hasattr(result, 'get_json') and callable(result.get_json):
+        try:
+            json_data = result.get_json()
+            if json_data is not None:
+                cache_data = json_data
+        except Exception:
+            pass
+
+    return True, cache_data
+
+
+def _run_in_background(fn: Callable[[], Any]) -> None:
+    """Run fn on a daemon thread inside a copy of the current request/app context."""
+    if has_request_context():
+        target = copy_current_request_context(fn)
+    else:
+        app = current_app._get_current_object()
+
+        def target():
+            with app.app_context():
+                fn()
+
+    threading.Thread(target=target, daemon=True).start()
+
+
+def _should_refresh_early(entry, beta: float, now: float) -> bool:
+    """
+    Probabilistic early expiration (XFetch): refresh before expiry with a probability
+    that grows as expiry approaches and with the cost of recomputing.
+    """
+    if not beta or entry.expires_at is None or not entry.delta:
+        return False
+    return now - entry.delta * beta * math.log(1.0 - random.random()) >= entry.expires_at
+
+
+def cache_result(ttl: int = 300, key_prefix: str = 'cache', key_func: Optional[Callable] = None,
+                 should_jsonify: bool = True, stale_ttl: int = 0, early_refresh: float = 0.0,
+                 refresh_lock: bool = False, lock_timeout: float = 10.0):
     """
     Decorator to cache function results.
+
+    Lookups go through the two-tier cache (in-process L1, then Redis), and
+    concurrent misses for the same key are coalesced so only one caller
+    executes the function; the others read the value it cached.
+    Route hits are answered with the cached JSON bytes directly (no decode
+    and re-encode).
+
+    Hot keys can avoid expiry stampedes with three opt-in modes:
+      - stale_ttl: keep values this many seconds past ttl and serve them stale
+        while one caller refreshes in the background (stale-while-revalidate)
+      - early_refresh: XFetch beta (1.0 is a good default); callers refresh in the
+        background ahead of expiry, earlier for values that are slow to compute
+      - refresh_lock: also elect a single recomputer across workers through a
+        Redis lock; the others wait for its value instead of hitting the database
     
     Args:
         ttl: Time to live in seconds (default: 5 minutes)
@@ -59,12 +149,23 @@ def cache_result(ttl: int = 300, key_prefix: str = 'cache', key_func: Optional[C
                   Should accept (func_name, args, kwargs) and return str.
         should_jsonify: If True (default), wraps dict/list results in jsonify() for Routes.
                        If False, returns raw data (use this for Model methods).
+        stale_ttl: Seconds an expired value may still be served while refreshing (0 = off)
+        early_refresh: XFetch beta for probabilistic early refresh (0 = off)
+        refresh_lock: Use a cross-worker lock for recomputation
+        lock_timeout: Lock lifetime, and how long other workers wait for the holder
     
     Usage:
         @cache_result(ttl=3600, key_prefix='user', should_jsonify=False)
         def get_user_by_id(user_id: str):
             ...
+
+        @cache_result(ttl=300, key_func=get_topics_cache_key, stale_ttl=600, early_refresh=1.0, refresh_lock=True)
+        def get_topics():
+            ...
     """
+    _MISS = object()
+    track_expiry = bool(stale_ttl or early_refresh)
+
     def decorator(func: Callable) -> Callable:
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
@@ -72,7 +173,7 @@ def cache_result(ttl: int = 300, key_prefix: str = 'cache', key_func: Optional[C
             try:
                 cache = current_app.config.get('CACHE')
                 if not cache or not cache.is_available():
-                    # Redis unavailable, execute function directly
+                    # Cache unavailable, execute function directly
                     return func(*args, **kwargs)
             except RuntimeError:
                 # Outside app context, execute function directly
@@ -83,77 +184,125 @@ def cache_result(ttl: int = 300, key_prefix: str = 'cache', key_func: Optional[C
                 cache_key = key_func(func.__name__, args, kwargs)
             else:
                 cache_key = _generate_cache_key(key_prefix, func.__name__, args, kwargs)
-            
-            # Try to get from cache
-            cached_value = cache.get(cache_key)
-            if cached_value is not None:
-                print(f"[CACHE DEBUG] HIT {cache_key}")
-                
+
+            def lookup():
+                """Returns (value, entry) or _MISS."""
+                entry = cache.get_entry(cache_key, as_json_bytes=should_jsonify)
+                if entry is None:
+                    return _MISS
+                cached_value = entry.value
+
+                if isinstance(cached_value, bytes):
+                    # Stored JSON document: serve it as-is instead of decoding and re-encoding
+                    if cached_value.lstrip()[:1] in (b'{', b'['):
+                        return current_app.response_class(cached_value, mimetype='application/json'), entry
+                    cached_value = json.loads(cached_value)
+
                 # Safeguard: If we expect raw data (should_jsonify=False) but got a Response object,
                 # treat it as a cache MISS to prevent "Response object has no attribute get" errors.
                 # This handles cases where cache contains old data stored with should_jsonify=True.
                 if not should_jsonify and hasattr(cached_value, 'status_code'):
-                    print(f"[CACHE DEBUG] INVALID HIT: Cached value is Response but raw data expected. Treating as MISS.")
+                    logger.debug(f"[CACHE] INVALID HIT {cache_key}: cached Response but raw data expected")
                     try:
                         cache.delete(cache_key)
-                    except:
+                    except Exception:
                         pass
-                    cached_value = None
-                
-                if cached_value is not None:
-                    # If cached value is dict/list, re-wrap in jsonify for consistent Response object ONLY if requested
-                    if should_jsonify and isinstance(cached_value, (dict, list)):
-                        from flask import jsonify
-                        return jsonify(cached_value)
-                    return cached_value
-            
-            # Cache miss, execute function
-            print(f"[CACHE DEBUG] MISS {cache_key}")
-            result = func(*args, **kwargs)
-            
-            # Store in cache (silently fail if Redis unavailable)
-            if result is not None:
+                    return _MISS
+
+                # If cached value is dict/list, re-wrap in jsonify for consistent Response object ONLY if requested
+                if should_jsonify and isinstance(cached_value, (dict, list)):
+                    from flask import jsonify
+                    return jsonify(cached_value), entry
+                return cached_value, entry
+
+            def compute():
+                started = time.monotonic()
+                result = func(*args, **kwargs)
+                # Store in cache (silently fail if Redis unavailable)
+                if result is not None:
+                    try:
+                        should_cache, cache_data = _prepare_cache_data(result, cache_key)
+                        if should_cache:
+                            if track_expiry:
+                                cache.set(cache_key, cache_data, ttl, stale_ttl=stale_ttl,
+                                          delta=time.monotonic() - started)
+                            else:
+                                cache.set(cache_key, cache_data, ttl)
+                    except Exception as e:
+                        logger.warning(f"Failed to cache result for {cache_key}: {e}")
+                return result
+
+            def compute_locked():
+                """compute() with one recomputer across workers; None if another worker holds the lock."""
+                if not refresh_lock:
+                    return compute(), True
+                token = cache.acquire_lock(cache_key, lock_timeout)
+                if token is None:
+                    return None, False
+                try:
+                    return compute(), True
+                finally:
+                    cache.release_lock(cache_key, token)
+
+            def refresh():
+                with _refreshing_lock:
+                    if cache_key in _refreshing:
+                        return
+                    _refreshing.add(cache_key)
+
+                def run():
+                    try:
+                        compute_locked()
+                    except Exception as e:
+                        logger.warning(f"[CACHE] Background refresh failed for {cache_key}: {e}")
+                    finally:
+                        with _refreshing_lock:
+                            _refreshing.discard(cache_key)
+
                 try:
-                    cache_data = result
-                    
-                    # Handle Flask (response, status_code) tuples
-                    if isinstance(result, tuple):
-                        # Extract the response object (usually the first element)
-                        response_obj = result[0]
-                        # We only cache successful responses (usually 200)?
-                        # Or we cache whatever. For now, let's just extract data.
-                        # If result[1] (status) is error (e.g. 400, 500), MAYBE NOT cache?
-                        # Let's inspect status code if possible.
-                        status_code = result[1] if len(result) > 1 else 200
-                        if status_code >= 400:
-                            print(f"[CACHE DEBUG] SKIP caching error response {status_code} for {cache_key}")
-                            return result
-
-                        if hasattr(response_obj, 'get_json') and callable(response_obj.get_json):
-                             try:
-                                json_data = response_obj.get_json()
-                                if json_data is not None:
-                                    print(f"[CACHE DEBUG] Extracted JSON for {cache_key}")
-                                    cache_data = json_data
-                             except Exception as e:
-                                print(f"[CACHE DEBUG] Failed to extract JSON from tuple response: {e}")
-                    
-                    # Handle single Response object
-                    elif hasattr(result, 'get_json') and callable(result.get_json):
-                        try:
-                            json_data = result.get_json()
-                            if json_data is not None:
-                                cache_data = json_data
-                        except Exception:
-                            pass 
-                    
-                    print(f"[CACHE DEBUG] SET {cache_key}")
-                    cache.set(cache_key, cache_data, ttl)
+                    _run_in_background(run)
                 except Exception as e:
-                    logger.warning(f"Failed to cache result for {cache_key}: {e}")
-                    print(f"[CACHE DEBUG] Failed to cache: {e}")
-            
-            return result
+                    with _refreshing_lock:
+                        _refreshing.discard(cache_key)
+                    logger.warning(f"[CACHE] Could not start background refresh for {cache_key}: {e}")
+
+            # Try to get from cache
+            cached = lookup()
+            if cached is not _MISS:
+                value, entry = cached
+                now = time.time()
+                if entry.is_stale(now):
+                    logger.debug(f"[CACHE] STALE {cache_key}, refreshing in background")
+                    refresh()
+                elif _should_refresh_early(entry, early_refresh, now):
+                    logger.debug(f"[CACHE] EARLY REFRESH {cache_key}")
+                    refresh()
+                return value
+
+            def compute_on_miss():
+                result, computed = compute_locked()
+                if computed:
+                    return result
+                # Another worker is recomputing: wait for its value rather than duplicating the work
+                deadline = time.monotonic() + lock_timeout
+                while time.monotonic() < deadline:
+                    time.sleep(LOCK_POLL_INTERVAL)
+                    cached = lookup()
+                    if cached is not _MISS:
+                        return cached[0]
+                return compute()
+
+            # Cache miss: only one concurrent caller per key executes the function
+            logger.debug(f"[CACHE] MISS {cache_key}")
+            result, leader = cache.single_flight(cache_key, compute_on_miss, timeout=lock_timeout + 1)
+            if leader:
+                return result
+
+            cached = lookup()
+            if cached is not _MISS:
+                return cached[0]
+            # The leader produced nothing cacheable (error response, None, failure)
+            return func(*args, **kwargs)
         
         return wrapper
     return decorator
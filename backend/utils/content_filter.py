@@ -1,5 +1,27 @@
+"""
+Content safety checks and filtering for messages, posts, comments and usernames.
+
+All checks run on one `ContentFilterEngine` (utils/filter_engine), compiled
+from PROFANITY_WORDS and the pattern bank below: a text is scanned once and
+the findings answer every question about it (`analyze_content_safety`
+reuses them to build `filtered_content`). Phrases in the word list match
+across whitespace and punctuation ('filho da puta', 'foda-se').
+
+The word list can be replaced at runtime: set CONTENT_FILTER_WORDS_FILE (one
+word or phrase per line, '#' comments) and the file is re-read when it
+changes, at most every CONTENT_FILTER_RELOAD_SECONDS; or call
+`reload_content_filter`.
+"""
+import logging
+import os
 import re
-from typing import List, Dict, Optional
+import threading
+import time
+from typing import List, Dict, Optional, Sequence
+
+from utils.filter_engine import ContentFilterEngine, Finding, PatternSpec
+
+logger = logging.getLogger(__name__)
 
 
 # Basic profanity word list - can be expanded or replaced with external service
@@ -21,13 +43,12 @@ PROFANITY_WORDS = [
     'cracker', 'honkey', 'redskin', 'terrorist'
 ]
 
-# URL patterns to block
+# URL patterns to block (e-mail addresses count as links too, see EMAIL_PATTERN)
 URL_PATTERNS = [
     r'https?://(?:[-\w.])+(?:[:\d]+)?(?:/(?:[\w/_.])*(?:\?(?:[\w&=%.])*)?(?:#(?:\w*))?)?',
-    r'www\.(?:[-\w.])+(?:[:\d]+)?(?:/(?:[\w/_.])*(?:\?(?:[\w&=%.])*)?(?:#(?:\w*))?)?',
-    r'[-\w.]+@[-\w.]+\.[a-zA-Z]{2,}',  # Email addresses
-    r'\b(?:[-\w.]+\.)+(?:com|org|net|gov|edu|mil|int|info|biz|co|io|ai|app|dev|tech|store|online|site)\b'
+    r'www\.(?:[-\w.])+(?:[:\d]+)?(?:/(?:[\w/_.])*(?:\?(?:[\w&=%.])*)?(?:#(?:\w*))?)?'
 ]
+DOMAIN_PATTERN = r'\b(?:[-\w.]+\.)+(?:com|org|net|gov|edu|mil|int|info|biz|co|io|ai|app|dev|tech|store|online|site)\b'
 
 # Phone number patterns to filter (optional)
 PHONE_PATTERNS = [
@@ -36,127 +57,199 @@ PHONE_PATTERNS = [
     r'\+\d{1,3}[-.\s]?\d{1,4}[-.\s]?\d{1,4}[-.\s]?\d{1,9}\b'  # International with country code
 ]
 
+EMAIL_PATTERN = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}\b'
+SSN_PATTERN = r'\b\d{3}-?\d{2}-?\d{4}\b'
+CREDIT_CARD_PATTERN = r'\b\d{4}[-\s]?\d{4}[-\s]?\d{4}[-\s]?\d{4}\b'
 
-def contains_profanity(text: str) -> bool:
-    """Check if text contains profanity."""
-    if not text:
-        return False
+HATE_SPEECH_PATTERNS = [
+    r'\b(?:kill|murder|die|death)\s+\w+\s+(?:jews|blacks|whites|asians|muslims|christians|gays|lesbians)\b',
+    r'\b(?:hate|destroy|eliminate)\s+\w+\s+(?:jews|blacks|whites|asians|muslims|christians|gays|lesbians)\b'
+]
 
-    # Convert to lowercase for comparison
-    text_lower = text.lower()
+THREAT_PATTERNS = [
+    r'\b(?:i\s+will|i\'ll)\s+(?:kill|hurt|harm|attack|find|dox)\s+\w+\b',
+    r'\b(?:going\s+to|will)\s+(?:kill|hurt|harm|attack)\s+\w+\b',
+    r'\b(?:doxx?|dox)\s+\w+\b'
+]
 
-    # Check for exact word matches to avoid false positives
-    words = re.findall(r'\b\w+\b', text_lower)
+DIGITS = tuple('0123456789')
+TLD_LITERALS = tuple('.' + tld for tld in ('com', 'org', 'net', 'gov', 'edu', 'mil', 'int', 'info', 'biz',
+                                           'co', 'io', 'ai', 'app', 'dev', 'tech', 'store', 'online', 'site'))
+HATE_TARGETS = ('jews', 'blacks', 'whites', 'asians', 'muslims', 'christians', 'gays', 'lesbians')
+
+# Regex bank of the engine, tried in this order where matches start at the same place.
+# The fourth field lists literals one of which every match contains; texts without
+# any of them skip the pattern. The last field is the scan pass: each issue category
+# gets its own, so a threat that is also hate speech reports both (as the
+# per-category checks did before the engine).
+PATTERN_BANK = [
+    PatternSpec('hate_speech', HATE_SPEECH_PATTERNS[0], ('hate_speech',), HATE_TARGETS, 'hate_speech'),
+    PatternSpec('hate_speech', HATE_SPEECH_PATTERNS[1], ('hate_speech',), HATE_TARGETS, 'hate_speech'),
+    PatternSpec('threat', THREAT_PATTERNS[0], ('threats',), ('will', "i'll"), 'threats'),
+    PatternSpec('threat', THREAT_PATTERNS[1], ('threats',), ('going', 'will'), 'threats'),
+    PatternSpec('threat', THREAT_PATTERNS[2], ('threats',), ('dox',), 'threats'),
+    PatternSpec('email', EMAIL_PATTERN, ('links', 'personal_info'), ('@',), 'links'),
+    PatternSpec('url', URL_PATTERNS[0], ('links',), ('http',), 'links'),
+    PatternSpec('url', URL_PATTERNS[1], ('links',), ('www.',), 'links'),
+    PatternSpec('credit_card', CREDIT_CARD_PATTERN, ('personal_info',), DIGITS, 'personal_info'),
+    PatternSpec('ssn', SSN_PATTERN, ('personal_info',), DIGITS, 'personal_info'),
+    PatternSpec('phone', PHONE_PATTERNS[0], ('personal_info',), DIGITS, 'personal_info'),
+    PatternSpec('phone', PHONE_PATTERNS[1], ('personal_info',), DIGITS, 'personal_info'),
+    PatternSpec('phone', PHONE_PATTERNS[2], ('personal_info',), ('+',), 'personal_info'),
+    PatternSpec('domain', DOMAIN_PATTERN, ('links',), TLD_LITERALS, 'links'),
+]
 
-    for word in words:
-        if word in PROFANITY_WORDS:
-            return True
+ISSUE_CATEGORIES = {
+    'links': 'contains_links',
+    'profanity': 'contains_profanity',
+    'personal_info': 'contains_personal_info',
+    'hate_speech': 'hate_speech',
+    'threats': 'threats'
+}
+
+
+class ContentFilter:
+    """Holds the current engine and rebuilds it when the word list file changes."""
+
+    def __init__(self, words_file: Optional[str] = None, reload_seconds: float = 30):
+        self.words_file = words_file
+        self.reload_seconds = reload_seconds
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._checked_at = 0.0
+        self.engine = ContentFilterEngine(self._load_words() or PROFANITY_WORDS, PATTERN_BANK)
 
-    return False
+    def _load_words(self) -> Optional[List[str]]:
+        """Terms of the word list file, or None when unset or unreadable."""
+        if not self.words_file:
+            return None
+        try:
+            self._mtime = os.path.getmtime(self.words_file)
+            with open(self.words_file, encoding='utf-8') as handle:
+                lines = [line.split('#', 1)[0].strip() for line in handle]
+            words = [line for line in lines if line]
+            logger.info(f"Loaded {len(words)} filter terms from {self.words_file}")
+            return words
+        except OSError as e:
+            logger.warning(f"Could not read content filter word list {self.words_file}: {e}")
+            return None
 
+    def get_engine(self) -> ContentFilterEngine:
+        """The current engine, rebuilt first if the word list file changed."""
+        if self.words_file and time.monotonic() - self._checked_at >= self.reload_seconds:
+            self._check_file()
+        return self.engine
 
-def filter_profanity(text: str, replacement: str = '***') -> str:
-    """Filter profanity from text by replacing with replacement characters."""
-    if not text:
-        return text
+    def _check_file(self) -> None:
+        with self._lock:
+            self._checked_at = time.monotonic()
+            try:
+                mtime = os.path.getmtime(self.words_file)
+            except OSError:
+                return
+            if mtime != self._mtime:
+                words = self._load_words()
+                if words is not None:
+                    self.reload(words)
 
-    # Split text into words and non-words (preserving punctuation)
-    tokens = re.findall(r'\w+|\W+', text)
+    def reload(self, words: Sequence[str]) -> ContentFilterEngine:
+        """Compile a new engine for a word list and swap it in."""
+        engine = ContentFilterEngine(words, PATTERN_BANK)
+        self.engine = engine
+        logger.info(f"Content filter reloaded ({engine.automaton.size} terms)")
+        return engine
 
-    for i, token in enumerate(tokens):
-        if re.match(r'\w+', token):  # If it's a word
-            if token.lower() in PROFANITY_WORDS:
-                # Replace with same number of characters
-                tokens[i] = replacement[:len(token)] if len(replacement) < len(token) else replacement
 
-    return ''.join(tokens)
+_content_filter = ContentFilter()
 
 
-def contains_links(text: str) -> bool:
-    """Check if text contains URLs or links."""
-    if not text:
-        return False
+def init_content_filter(app) -> ContentFilter:
+    """Configure the content filter's word list source from app config."""
+    global _content_filter
+    _content_filter = ContentFilter(
+        words_file=app.config.get('CONTENT_FILTER_WORDS_FILE'),
+        reload_seconds=app.config.get('CONTENT_FILTER_RELOAD_SECONDS', 30)
+    )
+    app.config['CONTENT_FILTER'] = _content_filter
+    return _content_filter
 
-    for pattern in URL_PATTERNS:
-        if re.search(pattern, text, re.IGNORECASE):
-            return True
 
-    return False
+def get_filter_engine() -> ContentFilterEngine:
+    """Return the engine every check below runs on."""
+    return _content_filter.get_engine()
 
 
-def filter_links(text: str, replacement: str = '[Link removed]') -> str:
-    """Filter links from text by replacing with replacement text."""
-    if not text:
-        return text
+def reload_content_filter(words: Optional[Sequence[str]] = None) -> ContentFilterEngine:
+    """
+    Recompile the filter.
 
-    filtered_text = text
+    Args:
+        words: New word/phrase list (None = re-read the configured file, or
+            fall back to PROFANITY_WORDS)
 
-    for pattern in URL_PATTERNS:
-        filtered_text = re.sub(pattern, replacement, filtered_text, flags=re.IGNORECASE)
+    Returns:
+        The new engine
+    """
+    if words is None:
+        words = _content_filter._load_words() or PROFANITY_WORDS
+    return _content_filter.reload(words)
 
-    return filtered_text
 
+def scan_content(text: str) -> List[Finding]:
+    """All findings (links, profanity, personal info, hate speech, threats) in a text."""
+    return get_filter_engine().scan(text)
 
-def contains_personal_info(text: str) -> bool:
-    """Check if text contains potential personal information."""
-    if not text:
-        return False
 
-    # Check for phone numbers
-    for pattern in PHONE_PATTERNS:
-        if re.search(pattern, text):
-            return True
+def _has_category(findings: List[Finding], category: str) -> bool:
+    return any(category in finding.categories for finding in findings)
+
 
-    # Check for email addresses
-    email_pattern = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'
-    if re.search(email_pattern, text):
-        return True
+def _scan_words(text: str) -> List[Finding]:
+    return get_filter_engine().scan(text, patterns=False)
 
-    # Check for potential Social Security Numbers or ID numbers
-    ssn_pattern = r'\b\d{3}-?\d{2}-?\d{4}\b'
-    if re.search(ssn_pattern, text):
-        return True
 
-    # Check for credit card patterns (basic)
-    cc_pattern = r'\b\d{4}[-\s]?\d{4}[-\s]?\d{4}[-\s]?\d{4}\b'
-    if re.search(cc_pattern, text):
-        return True
+def _scan_patterns(text: str) -> List[Finding]:
+    return get_filter_engine().scan(text, words=False)
 
-    return False
 
+def contains_profanity(text: str) -> bool:
+    """Check if text contains profanity."""
+    return bool(_scan_words(text))
 
-def filter_personal_info(text: str, replacement: str = '[Personal info removed]') -> str:
-    """Filter personal information from text."""
+
+def filter_profanity(text: str, replacement: str = '***') -> str:
+    """Filter profanity from text by replacing with replacement characters."""
     if not text:
         return text
+    return ContentFilterEngine.redact(text, _scan_words(text), {'profanity': replacement})
 
-    filtered_text = text
 
-    # Filter phone numbers
-    for pattern in PHONE_PATTERNS:
-        filtered_text = re.sub(pattern, replacement, filtered_text)
+def contains_links(text: str) -> bool:
+    """Check if text contains URLs or links."""
+    return _has_category(_scan_patterns(text), 'links')
 
-    # Filter email addresses
-    email_pattern = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'
-    filtered_text = re.sub(email_pattern, replacement, filtered_text)
 
-    # Filter SSN patterns
-    ssn_pattern = r'\b\d{3}-?\d{2}-?\d{4}\b'
-    filtered_text = re.sub(ssn_pattern, replacement, filtered_text)
+def filter_links(text: str, replacement: str = '[Link removed]') -> str:
+    """Filter links from text by replacing with replacement text."""
+    if not text:
+        return text
+    return ContentFilterEngine.redact(text, _scan_patterns(text), {'links': replacement})
 
-    # Filter credit card patterns
-    cc_pattern = r'\b\d{4}[-\s]?\d{4}[-\s]?\d{4}[-\s]?\d{4}\b'
-    filtered_text = re.sub(cc_pattern, replacement, filtered_text)
 
-    return filtered_text
+def contains_personal_info(text: str) -> bool:
+    """Check if text contains potential personal information."""
+    return _has_category(_scan_patterns(text), 'personal_info')
 
 
-def filter_content(text: str, filter_options: Optional[Dict] = None) -> str:
-    """Apply comprehensive content filtering."""
+def filter_personal_info(text: str, replacement: str = '[Personal info removed]') -> str:
+    """Filter personal information from text."""
     if not text:
         return text
+    return ContentFilterEngine.redact(text, _scan_patterns(text), {'personal_info': replacement})
 
-    # Default filter options
+
+def _filter_replacements(filter_options: Optional[Dict]) -> Dict[str, str]:
+    """Category -> replacement for filter_content options (links take precedence)."""
     options = {
         'remove_links': True,
         'filter_profanity': True,
@@ -165,24 +258,38 @@ def filter_content(text: str, filter_options: Optional[Dict] = None) -> str:
         'link_replacement': '[Link removed]',
         'personal_info_replacement': '[Personal info removed]'
     }
-
-    # Override with provided options
     if filter_options:
         options.update(filter_options)
 
-    filtered_text = text
-
-    # Apply filters
+    replacements = {}
     if options['remove_links']:
-        filtered_text = filter_links(filtered_text, options['link_replacement'])
-
+        replacements['links'] = options['link_replacement']
     if options['filter_profanity']:
-        filtered_text = filter_profanity(filtered_text, options['profanity_replacement'])
-
+        replacements['profanity'] = options['profanity_replacement']
     if options['remove_personal_info']:
-        filtered_text = filter_personal_info(filtered_text, options['personal_info_replacement'])
+        replacements['personal_info'] = options['personal_info_replacement']
+    return replacements
+
 
-    return filtered_text
+def filter_content(text: str, filter_options: Optional[Dict] = None,
+                   findings: Optional[List[Finding]] = None) -> str:
+    """
+    Apply comprehensive content filtering.
+
+    Args:
+        text: Text to filter
+        filter_options: remove_links / filter_profanity / remove_personal_info
+            and their *_replacement strings
+        findings: scan_content(text), when the caller already has it
+
+    Returns:
+        Filtered text
+    """
+    if not text:
+        return text
+    if findings is None:
+        findings = scan_content(text)
+    return ContentFilterEngine.redact(text, findings, _filter_replacements(filter_options))
 
 
 def analyze_content_safety(text: str) -> Dict:
@@ -194,54 +301,25 @@ def analyze_content_safety(text: str) -> Dict:
             'severity': 'none'
         }
 
-    issues = []
-    severity = 'none'
+    findings = scan_content(text)
+    found = {category for finding in findings for category in finding.categories}
+    issues = [issue for category, issue in ISSUE_CATEGORIES.items() if category in found]
 
-    # Check for links
-    if contains_links(text):
-        issues.append('contains_links')
+    severity = 'none'
+    if 'links' in found:
         severity = 'medium'
-
-    # Check for profanity
-    if contains_profanity(text):
-        issues.append('contains_profanity')
-        severity = 'high' if severity == 'none' else severity
-
-    # Check for personal information
-    if contains_personal_info(text):
-        issues.append('contains_personal_info')
-        severity = 'medium' if severity == 'none' else severity
-
-    # Check for hate speech (basic pattern matching)
-    hate_patterns = [
-        r'\b(kill|murder|die|death)\s+\w+\s+(jews|blacks|whites|asians|muslims|christians|gays|lesbians)\b',
-        r'\b(hate|destroy|eliminate)\s+\w+\s+(jews|blacks|whites|asians|muslims|christians|gays|lesbians)\b'
-    ]
-
-    for pattern in hate_patterns:
-        if re.search(pattern, text, re.IGNORECASE):
-            issues.append('hate_speech')
-            severity = 'critical'
-            break
-
-    # Check for threats
-    threat_patterns = [
-        r'\b(i\s+will|i\'ll)\s+(kill|hurt|harm|attack|find|dox)\s+\w+\b',
-        r'\b(going\s+to|will)\s+(kill|hurt|harm|attack)\s+\w+\b',
-        r'\b(doxx?|dox)\s+\w+\b'
-    ]
-
-    for pattern in threat_patterns:
-        if re.search(pattern, text, re.IGNORECASE):
-            issues.append('threats')
-            severity = 'critical'
-            break
+    if 'profanity' in found and severity == 'none':
+        severity = 'high'
+    if 'personal_info' in found and severity == 'none':
+        severity = 'medium'
+    if 'hate_speech' in found or 'threats' in found:
+        severity = 'critical'
 
     return {
         'is_safe': len(issues) == 0,
         'issues': issues,
         'severity': severity,
-        'filtered_content': filter_content(text) if issues else text
+        'filtered_content': filter_content(text, findings=findings) if issues else text
     }
 
 
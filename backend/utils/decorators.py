@@ -1,185 +1,104 @@
 from functools import wraps
-from flask import jsonify, request, current_app
+from flask import jsonify, request, after_this_request
 from datetime import datetime, timedelta
+from typing import Optional
 import time
-from collections import defaultdict
 import logging
 import os
 
+from utils.structured_logging import get_event_logger
+
 logger = logging.getLogger(__name__)
+request_events = get_event_logger('http.request')
+
+def _rate_limit_identity(scope: str) -> str:
+    """Caller identity for rate limiting: client IP, or the session user (IP when anonymous)."""
+    if scope == 'user':
+        from flask import session
+        user_id = session.get('user_id')
+        if user_id:
+            return f"user:{user_id}"
+    forwarded = request.environ.get('HTTP_X_FORWARDED_FOR')
+    client_ip = forwarded.split(',')[0].strip() if forwarded else request.environ.get('REMOTE_ADDR', 'unknown')
+    return f"ip:{client_ip}"
 
-# Simple in-memory rate limiting store (fallback)
-rate_limit_store = defaultdict(list)
 
+def _is_rate_limit_exempt(identity: str) -> bool:
+    from config import rate_limits as rate_limit_config
+    kind, _, value = identity.partition(':')
+    if kind == 'user':
+        return value in rate_limit_config.EXEMPT_USER_IDS
+    return value in rate_limit_config.EXEMPT_IP_ADDRESSES
 
-def rate_limit(limit: str):
-    """Rate limiting decorator.
 
-    Supports Redis for distributed rate limiting if REDIS_URL is configured.
-    Falls back to in-memory storage.
+def rate_limit(limit: str, scope: Optional[str] = None, silent: bool = False):
+    """Rate limiting decorator for Flask routes and Socket.IO event handlers.
+
+    Limits are enforced atomically in Redis when available (shared by all
+    workers), otherwise per process; see utils/rate_limiter.
 
     Args:
-        limit: Rate limit string in format "count/period" where period is minute, hour, etc.
+        limit: Rate limit string in format "count/period" where period is second, minute, hour or day.
+        scope: 'ip' or 'user' (the session user, IP when anonymous). Defaults to 'ip'
+               for routes and 'user' for socket events.
+        silent: Socket events only: drop limited events without emitting 'rate_limited'.
     """
     def decorator(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
-            # Parse limit string
-            try:
-                count, period = limit.split('/')
-                count = int(count)
-                period = period.lower()
-            except ValueError:
-                logger.error(f"Invalid rate limit format: {limit}")
-                return f(*args, **kwargs)  # Skip rate limiting if format is invalid
+            from config import rate_limits as rate_limit_config
+            from utils.rate_limiter import get_rate_limiter
 
-            # Get client identifier
-            client_id = request.environ.get('HTTP_X_FORWARDED_FOR', request.environ.get('REMOTE_ADDR', 'unknown'))
-            # Use request.endpoint if available, otherwise fallback to function name
-            endpoint = request.endpoint or f.__name__
-
-            # Key prefix for rate limiting
-            key = f"ratelimit:{client_id}:{endpoint}"
-
-            # Calculate time window in seconds
-            if period == 'minute':
-                window = 60
-            elif period == 'hour':
-                window = 3600
-            elif period == 'day':
-                window = 86400
-            else:
-                window = 60
-
-            # Check if Redis is available (Azure only)
-            redis_client = None
-            try:
-                is_azure = bool(current_app.config.get('IS_AZURE'))
-                redis_url = current_app.config.get('REDIS_URL')
-                if is_azure and redis_url:
-                    # Try to get redis client from app config if already initialized
-                    if current_app.config.get('REDIS_CLIENT'):
-                        redis_client = current_app.config.get('REDIS_CLIENT')
-                    else:
-                        # Lazy import to avoid circular dependencies
-                        import redis
-                        
-                        # Parse Azure Redis connection string format (same logic as app.py)
-                        def _parse_azure_redis_connection(value: str) -> dict:
-                            """Parse Azure Redis connection string format: host:port,password=...,ssl=True"""
-                            if not value:
-                                return None
-                            if '://' in value:
-                                # Already a URL format, return None to use from_url
-                                return None
-                            
-                            # Parse StackExchange format
-                            parts = [p.strip() for p in value.split(',') if p.strip()]
-                            host_port = parts[0]
-                            password = None
-                            username = None
-                            ssl = True
-                            
-                            for p in parts[1:]:
-                                if p.lower().startswith('password='):
-                                    password = p.split('=', 1)[1]
-                                elif p.lower().startswith('username='):
-                                    username = p.split('=', 1)[1]
-                                elif p.lower().startswith('ssl='):
-                                    ssl_val = p.split('=', 1)[1].strip().lower()
-                                    ssl = ssl_val in ('true', '1', 'yes')
-                            
-                            # Parse host:port
-                            if ':' in host_port:
-                                host, port = host_port.rsplit(':', 1)
-                                port = int(port)
-                            else:
-                                host = host_port
-                                port = 6380 if ssl else 6379
-                            
-                            return {
-                                'host': host,
-                                'port': port,
-                                'password': password,
-                                'ssl': ssl,
-                                'username': username
-                            }
-                        
-                        # Parse Azure format or use URL format
-                        redis_params = _parse_azure_redis_connection(redis_url)
-                        if redis_params:
-                            redis_client = redis.Redis(
-                                host=redis_params['host'],
-                                port=redis_params['port'],
-                                password=redis_params['password'],
-                                ssl=redis_params['ssl'],
-                                username=redis_params.get('username'),
-                                socket_connect_timeout=2,
-                                socket_timeout=2,
-                                decode_responses=False
-                            )
-                        else:
-                            redis_client = redis.from_url(redis_url, socket_connect_timeout=2, socket_timeout=2)
-            except Exception as e:
-                logger.warning(f"Redis not available for rate limiting: {e}")
-                redis_client = None
-
-            if redis_client:
-                # Use Redis for rate limiting (Distributed)
-                try:
-                    # Uses a sliding window log or simple counter with expiration
-                    # Simple counter implementation:
-                    current = redis_client.get(key)
-
-                    if current and int(current) >= count:
-                         return jsonify({
-                            'success': False,
-                            'errors': [f'Rate limit exceeded. Maximum {count} requests per {period}.']
-                        }), 429
-
-                    # Increment counter
-                    pipe = redis_client.pipeline()
-                    pipe.incr(key)
-                    if not current:
-                        # Set expiration on first request
-                        pipe.expire(key, window)
-                    pipe.execute()
-
-                except Exception as e:
-                    logger.warning(f"Redis rate limit error (using in-memory fallback): {e}")
-                    # Fallback to in-memory if Redis fails
-                    memory_response = _check_in_memory_limit(key, count, window)
-                    if memory_response:
-                        return memory_response
-            else:
-                # Fallback to in-memory
-                memory_response = _check_in_memory_limit(key, count, window)
-                if memory_response:
-                    return memory_response
-
-            return f(*args, **kwargs)
-        return decorated_function
-    return decorator
+            if not rate_limit_config.RATE_LIMITING_ENABLED:
+                return f(*args, **kwargs)
 
+            # Socket.IO handlers run with a request context that carries the socket id
+            is_socket = getattr(request, 'sid', None) is not None and not request.endpoint
+            if is_socket:
+                event = getattr(request, 'event', None)
+                action = f"socket.{event['message'] if event else f.__name__}"
+            else:
+                # Use request.endpoint if available, otherwise fallback to function name
+                action = request.endpoint or f.__name__
 
-def _check_in_memory_limit(key, count, window):
-    """Check rate limit using in-memory store."""
-    now = int(time.time())
-    window_start = now - window
+            identity = _rate_limit_identity(scope or ('user' if is_socket else 'ip'))
+            if _is_rate_limit_exempt(identity):
+                return f(*args, **kwargs)
 
-    # Clean old entries
-    rate_limit_store[key] = [timestamp for timestamp in rate_limit_store[key] if timestamp > window_start]
+            limiter = get_rate_limiter()
+            result = limiter.hit(f"{identity}:{action}", limit) if limiter else None
+            if result is None:
+                return f(*args, **kwargs)  # Skip rate limiting if format is invalid
 
-    # Check if limit exceeded
-    if len(rate_limit_store[key]) >= count:
-        return jsonify({
-            'success': False,
-            'errors': [f'Rate limit exceeded.']
-        }), 429
+            retry_after = max(1, int(result.retry_after + 0.999))
+            if not result.allowed:
+                logger.info(f"Rate limit exceeded for {identity} on {action} ({limit})")
+                if is_socket:
+                    if not silent:
+                        from flask_socketio import emit
+                        emit('rate_limited', {'event': action[len('socket.'):], 'retry_after': retry_after})
+                    return None
+                response = jsonify({
+                    'success': False,
+                    'errors': [rate_limit_config.RATE_LIMIT_EXCEEDED_MESSAGE]
+                })
+                response.status_code = rate_limit_config.RATE_LIMIT_EXCEEDED_STATUS_CODE
+                response.headers['Retry-After'] = str(retry_after)
+                if rate_limit_config.INCLUDE_RATE_LIMIT_HEADERS:
+                    response.headers['X-RateLimit-Limit'] = str(result.limit)
+                    response.headers['X-RateLimit-Remaining'] = '0'
+                return response
+
+            if not is_socket and rate_limit_config.INCLUDE_RATE_LIMIT_HEADERS:
+                @after_this_request
+                def add_rate_limit_headers(response):
+                    response.headers['X-RateLimit-Limit'] = str(result.limit)
+                    response.headers['X-RateLimit-Remaining'] = str(result.remaining)
+                    return response
 
-    # Add current request
-    rate_limit_store[key].append(now)
-    return None # Indicates not blocked
+            return f(*args, **kwargs)
+        return decorated_function
+    return decorator
 
 
 def require_json(f):
@@ -357,45 +276,34 @@ def cors_headers(f):
 
 
 def log_requests(f):
-    """Decorator to log requests."""
+    """Decorator to log requests (one sampled `http.request` event per request)."""
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        start_time = time.time()
-
-        client_ip = request.environ.get('HTTP_X_FORWARDED_FOR', request.environ.get('REMOTE_ADDR', 'unknown'))
-        method = request.method
-        endpoint = request.endpoint
-        user_agent = request.headers.get('User-Agent', 'unknown')
-
-        logger.info(f"Request: {method} {endpoint} from {client_ip} - {user_agent}")
-
+        start_time = time.perf_counter()
         try:
             response = f(*args, **kwargs)
-
-            # Calculate response time
-            response_time = time.time() - start_time
-
-            # Extract status code safely - handle both tuple and Response objects
-            try:
-                if isinstance(response, tuple):
-                    status_code = response[1] if len(response) > 1 else 200
-                elif hasattr(response, 'status_code'):
-                    status_code = response.status_code
-                else:
-                    status_code = 200
-                logger.info(f"Response: {status_code} in {response_time:.3f}s for {method} {endpoint}")
-            except Exception as log_error:
-                # Don't fail the request if logging fails
-                logger.warning(f"Could not extract response status for logging: {str(log_error)}")
-
-            return response
-
         except Exception as e:
-            response_time = time.time() - start_time
-            logger.error(f"Error in {method} {endpoint} after {response_time:.3f}s: {str(e)}", exc_info=True)
+            request_events.error('request_failed', exc_info=True, method=request.method,
+                                 endpoint=request.endpoint, error=str(e),
+                                 duration_ms=round((time.perf_counter() - start_time) * 1000, 1))
             # Re-raise to let Flask handle the error properly
             raise
 
+        if request_events.enabled():
+            # Handle both tuple and Response returns
+            if isinstance(response, tuple):
+                status_code = response[1] if len(response) > 1 and isinstance(response[1], int) else 200
+            else:
+                status_code = getattr(response, 'status_code', 200)
+            request_events.emit(logging.INFO, 'request', {
+                'method': request.method,
+                'endpoint': request.endpoint,
+                'status': status_code,
+                'duration_ms': round((time.perf_counter() - start_time) * 1000, 1),
+                'ip': _rate_limit_identity('ip')[3:]
+            })
+        return response
+
     return decorated_function
 
 
@@ -438,16 +346,3 @@ def cache_response(timeout: int = 300):
 
 # Initialize cache store
 cache_response.cache_store = {}
-
-
-def cleanup_rate_limit_store():
-    """Clean up old entries from rate limit store."""
-    global rate_limit_store
-
-    now = int(time.time())
-    cutoff_time = now - 86400  # Remove entries older than 24 hours
-
-    for key in list(rate_limit_store.keys()):
-        rate_limit_store[key] = [timestamp for timestamp in rate_limit_store[key] if timestamp > cutoff_time]
-        if not rate_limit_store[key]:
-            del rate_limit_store[key]
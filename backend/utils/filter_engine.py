@@ -0,0 +1,261 @@
+"""
+Multi-pattern content scanning engine used by utils/content_filter.
+
+A `ContentFilterEngine` is compiled once from a word/phrase list and a bank
+of regex patterns, and scans text in two linear passes:
+
+  - patterns: the patterns of the bank (links, e-mail addresses, phone
+    numbers, ID numbers, threats, ...) joined into one regex per pass with
+    a named group per pattern, so a single `finditer` per pass reports all
+    of them. Matches within a pass do not overlap; patterns whose matches
+    may overlap and must all be reported (a threat that is also hate
+    speech) go in different passes. A pattern can list literals of which
+    one must occur in the text ('@' for e-mail addresses, a digit for phone
+    numbers); patterns whose literals are all absent are left out of that
+    text's regexes, which are compiled once per combination and cached
+  - words: the text is split into word tokens and run through an
+    Aho-Corasick automaton over tokens, so any number of words and
+    multi-word phrases ('son of a bitch', 'foda-se') is matched in one walk
+    regardless of the list size, on word boundaries only
+
+Both passes return `Finding`s with character offsets; `redact` replaces a
+chosen set of them in one copy of the text. Engines are immutable, so a
+reloaded list is swapped in by building a new engine (see
+utils/content_filter.reload_content_filter).
+"""
+import logging
+import re
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# What counts as one word, for both the word list and the scanned text
+TOKEN_PATTERN = re.compile(r'\w+')
+
+
+class Finding(NamedTuple):
+    """One match: categories it counts for, the pattern or phrase, and its span in the text."""
+    categories: Tuple[str, ...]
+    kind: str
+    start: int
+    end: int
+    text: str
+
+
+class PatternSpec(NamedTuple):
+    """
+    An entry of the regex bank: a name, the pattern and the categories a match counts for.
+
+    required lists lower-case literals of which at least one occurs in every
+    match (empty = always try the pattern). Patterns of the same scan_pass
+    share one regex, so their matches exclude each other; matches of
+    different passes may overlap.
+    """
+    name: str
+    pattern: str
+    categories: Tuple[str, ...]
+    required: Tuple[str, ...] = ()
+    scan_pass: str = 'default'
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-cased word tokens of a term, as matched by the automaton."""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class TokenAutomaton:
+    """Aho-Corasick automaton whose alphabet is word tokens."""
+
+    def __init__(self, phrases: Iterable[str]):
+        """
+        Build the automaton.
+
+        Args:
+            phrases: Words or phrases; each is matched as its token sequence
+        """
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        # Per state: (phrase, phrase length in tokens) ending there, including via fail links
+        self._output: List[Tuple[Tuple[str, int], ...]] = [()]
+        self.size = 0
+
+        seen = set()
+        for phrase in phrases:
+            tokens = tokenize(phrase)
+            key = tuple(tokens)
+            if not tokens or key in seen:
+                continue
+            seen.add(key)
+            self._add(tokens, ' '.join(tokens))
+        self._link()
+
+    def _add(self, tokens: List[str], phrase: str) -> None:
+        state = 0
+        for token in tokens:
+            next_state = self._goto[state].get(token)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(())
+                self._goto[state][token] = next_state
+            state = next_state
+        self._output[state] += ((phrase, len(tokens)),)
+        self.size += 1
+
+    def _link(self) -> None:
+        """Breadth-first fail links; outputs are merged along them."""
+        queue = list(self._goto[0].values())
+        for state in queue:
+            for token, child in self._goto[state].items():
+                queue.append(child)
+                fallback = self._fail[state]
+                while fallback and token not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(token, 0)
+                self._fail[child] = target if target != child else 0
+                self._output[child] += self._output[self._fail[child]]
+
+    def search(self, tokens: Sequence[str]) -> List[Tuple[int, int, str]]:
+        """
+        All phrase occurrences in a token sequence.
+
+        Returns:
+            (first token index, last token index, phrase) per occurrence
+        """
+        goto, fail, output = self._goto, self._fail, self._output
+        matches = []
+        state = 0
+        for index, token in enumerate(tokens):
+            while state and token not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(token, 0)
+            if state and output[state]:
+                for phrase, length in output[state]:
+                    matches.append((index - length + 1, index, phrase))
+        return matches
+
+
+class ContentFilterEngine:
+    """Compiled word list and regex bank (see module docstring)."""
+
+    def __init__(self, words: Iterable[str], patterns: Sequence[PatternSpec],
+                 word_category: str = 'profanity'):
+        """
+        Compile an engine.
+
+        Args:
+            words: Words and phrases reported under word_category
+            patterns: Regex bank; patterns are tried in order at each position
+            word_category: Category of word list matches
+        """
+        self.word_category = word_category
+        self.automaton = TokenAutomaton(words)
+        self.patterns = list(patterns)
+        self._categories = {f'p{i}': spec for i, spec in enumerate(self.patterns)}
+        self._regexes: Dict[Tuple[int, ...], List[re.Pattern]] = {}
+
+    def _regexes_for(self, lowered: str) -> List[re.Pattern]:
+        """One combined regex per pass, of the patterns whose required literals occur in the text."""
+        active = tuple(
+            i for i, spec in enumerate(self.patterns)
+            if not spec.required or any(literal in lowered for literal in spec.required)
+        )
+        if not active:
+            return []
+        regexes = self._regexes.get(active)
+        if regexes is None:
+            passes: Dict[str, List[int]] = {}
+            for i in active:
+                passes.setdefault(self.patterns[i].scan_pass, []).append(i)
+            regexes = [
+                re.compile('|'.join(f'(?P<p{i}>{self.patterns[i].pattern})' for i in indexes), re.IGNORECASE)
+                for indexes in passes.values()
+            ]
+            self._regexes[active] = regexes
+        return regexes
+
+    def scan(self, text: str, words: bool = True, patterns: bool = True) -> List[Finding]:
+        """
+        Every finding in a text, ordered by position.
+
+        Pattern matches of one pass do not overlap each other (the leftmost,
+        then first listed, pattern wins); matches of different passes and
+        word matches may overlap.
+
+        Args:
+            text: Text to scan
+            words: Run the word list pass
+            patterns: Run the regex bank pass
+        """
+        if not text:
+            return []
+
+        findings = []
+        lowered = text.lower()
+        for regex in (self._regexes_for(lowered) if patterns else ()):
+            for match in regex.finditer(text):
+                spec = self._categories[match.lastgroup]
+                findings.append(Finding(spec.categories, spec.name, match.start(), match.end(), match.group()))
+
+        if words and self.automaton.size:
+            # Lower-casing can change lengths (e.g. 'İ'); tokenize the original text then
+            same_length = len(lowered) == len(text)
+            source = lowered if same_length else text
+            tokens = TOKEN_PATTERN.findall(source)
+            if not same_length:
+                tokens = [token.lower() for token in tokens]
+
+            matches = self.automaton.search(tokens)
+            if matches:
+                # Offsets are only needed for the (rare) texts with a match
+                spans = [match.span() for match in TOKEN_PATTERN.finditer(source)]
+                categories = (self.word_category,)
+                for first, last, phrase in matches:
+                    start, end = spans[first][0], spans[last][1]
+                    findings.append(Finding(categories, phrase, start, end, text[start:end]))
+
+        if len(findings) > 1:
+            findings.sort(key=lambda finding: (finding.start, -finding.end))
+        return findings
+
+    @staticmethod
+    def redact(text: str, findings: Sequence[Finding], replacements: Dict[str, str]) -> str:
+        """
+        Replace findings in one pass.
+
+        Args:
+            text: Scanned text
+            findings: Findings of scan(text), ordered by position
+            replacements: Category -> replacement; a finding is replaced with
+                the first of its categories listed here, others are kept
+
+        Returns:
+            The text with overlapping findings replaced once (the earliest,
+            longest one wins)
+        """
+        if not findings or not replacements:
+            return text
+
+        parts = []
+        cursor = 0
+        for finding in findings:
+            if finding.start < cursor:
+                continue
+            replacement = _replacement_for(finding, replacements)
+            if replacement is None:
+                continue
+            parts.append(text[cursor:finding.start])
+            parts.append(replacement)
+            cursor = finding.end
+        if not parts:
+            return text
+        parts.append(text[cursor:])
+        return ''.join(parts)
+
+
+def _replacement_for(finding: Finding, replacements: Dict[str, str]) -> Optional[str]:
+    for category in finding.categories:
+        if category in replacements:
+            return replacements[category]
+    return None
@@ -1,4 +1,5 @@
 import json
+import time
 import secrets
 import hashlib
 import base64
@@ -359,4 +360,36 @@ def generate_uuid() -> str:
 def deep_copy(obj: Any) -> Any:
     """Create a deep copy of an object."""
     import copy
-    return copy.deepcopy(obj)
\ No newline at end of file
+    return copy.deepcopy(obj)
+
+
+def delete_in_batches(collection, query: Dict[str, Any], batch_size: int = 500,
+                      max_batches: Optional[int] = None, pause: float = 0.0) -> int:
+    """
+    Delete documents matching query in batches of _id.
+
+    Small batches keep each delete short (and under Cosmos DB request unit
+    limits) and let other greenlets run in between.
+
+    Args:
+        collection: Collection to delete from
+        query: Filter of documents to delete
+        batch_size: Documents per delete_many
+        max_batches: Stop after this many batches (None for no limit)
+        pause: Seconds to sleep between batches
+
+    Returns:
+        Number of documents deleted
+    """
+    deleted = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        ids = [doc['_id'] for doc in collection.find(query, {'_id': 1}).limit(batch_size)]
+        if not ids:
+            break
+        deleted += collection.delete_many({'_id': {'$in': ids}}).deleted_count
+        batches += 1
+        if len(ids) < batch_size:
+            break
+        time.sleep(pause)
+    return deleted
@@ -0,0 +1,178 @@
+"""
+Hot ranking for posts.
+
+Posts carry a precomputed, time-decayed `hot_score` (HN-style gravity over the
+vote score plus a small comment bonus). The score is refreshed incrementally on
+vote and comment events and a periodic re-rank (a leader-only scheduler job)
+applies decay to recent posts, so hot feeds are a single indexed range scan on
+`(topic_id, hot_score)` / `(is_deleted, hot_score)` instead of an in-app sort.
+"""
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+# Ranking parameters
+HOT_GRAVITY = 1.8            # Higher gravity = faster decay
+HOT_AGE_OFFSET_HOURS = 2     # Keeps brand new posts from dividing by ~0
+HOT_COMMENT_WEIGHT = 0.5     # Each comment counts as half a vote
+
+# Posts older than this are no longer re-ranked; their hot_score is frozen at
+# HOT_SCORE_FROZEN, below any live score (live scores of down-voted posts are
+# negative, so 0 would rank old posts above them)
+HOT_RERANK_WINDOW_DAYS = 7
+HOT_SCORE_FROZEN = -1e12
+HOT_RERANK_BATCH_SIZE = 500
+
+# Projection needed to compute a hot score
+HOT_SCORE_FIELDS = {'score': 1, 'upvote_count': 1, 'downvote_count': 1, 'comment_count': 1, 'created_at': 1}
+
+def compute_hot_score(score: int, comment_count: int, created_at: Optional[datetime],
+                      now: Optional[datetime] = None) -> float:
+    """
+    Compute the time-decayed hot score for a post.
+
+    Args:
+        score: Vote score (upvotes - downvotes)
+        comment_count: Number of comments on the post
+        created_at: Post creation time (UTC)
+        now: Reference time (defaults to utcnow)
+
+    Returns:
+        Hot score (higher is hotter)
+    """
+    now = now or datetime.utcnow()
+    if not isinstance(created_at, datetime):
+        created_at = now
+    age_hours = max((now - created_at).total_seconds() / 3600.0, 0.0)
+    points = (score or 0) + HOT_COMMENT_WEIGHT * (comment_count or 0)
+    return round(points / pow(age_hours + HOT_AGE_OFFSET_HOURS, HOT_GRAVITY), 8)
+
+
+def hot_score_increment(post_id: Any, points_delta: float, now: Optional[datetime] = None) -> float:
+    """
+    Compute the `$inc` to apply to a post's hot score for a change in points.
+
+    The post age is taken from the ObjectId timestamp, so vote and comment
+    updates can adjust the hot score in the same write that changes the
+    counters. Drift against the exact value is corrected by the re-ranker.
+
+    Args:
+        post_id: Post ObjectId (or its string form)
+        points_delta: Change in vote score (comments weigh HOT_COMMENT_WEIGHT)
+        now: Reference time (defaults to utcnow)
+
+    Returns:
+        Hot score increment
+    """
+    if not points_delta:
+        return 0.0
+    now = now or datetime.utcnow()
+    try:
+        oid = post_id if isinstance(post_id, ObjectId) else ObjectId(str(post_id))
+        created_at = oid.generation_time.replace(tzinfo=None)
+    except Exception:
+        created_at = now
+    age_hours = max((now - created_at).total_seconds() / 3600.0, 0.0)
+    return round(points_delta / pow(age_hours + HOT_AGE_OFFSET_HOURS, HOT_GRAVITY), 8)
+
+
+def hot_score_for_post(post: Dict[str, Any], now: Optional[datetime] = None) -> float:
+    """Compute the hot score from a post document (raw or processed)."""
+    score = post.get('score')
+    if score is None:
+        score = post.get('upvote_count', 0) - post.get('downvote_count', 0)
+    return compute_hot_score(score, post.get('comment_count', 0), post.get('created_at'), now)
+
+
+class HotRanker:
+    """Maintains the precomputed `hot_score` field on posts."""
+
+    def __init__(self, db):
+        self.db = db
+        self.collection = db.posts
+
+    def refresh_post(self, post_id: str) -> Optional[float]:
+        """
+        Recompute and store the hot score of a single post.
+
+        Used for backfills and manual repairs; vote and comment events adjust the
+        score in-place via hot_score_increment. Costs one projected read and one write.
+
+        Returns:
+            The new hot score, or None if the post does not exist
+        """
+        try:
+            post = self.collection.find_one({'_id': ObjectId(post_id)}, HOT_SCORE_FIELDS)
+            if not post:
+                return None
+            hot_score = hot_score_for_post(post)
+            self.collection.update_one({'_id': post['_id']}, {'$set': {'hot_score': hot_score}})
+            return hot_score
+        except Exception as e:
+            logger.warning(f"Failed to refresh hot score for post {post_id}: {e}")
+            return None
+
+    def rerank(self, window_days: int = HOT_RERANK_WINDOW_DAYS,
+               batch_size: int = HOT_RERANK_BATCH_SIZE) -> int:
+        """
+        Re-apply time decay to every post inside the ranking window.
+
+        Posts that left the window are frozen at HOT_SCORE_FROZEN so a formerly
+        viral post can't outrank fresh content forever, and an old post can't
+        outrank a recent down-voted one either.
+
+        Returns:
+            Number of posts updated
+        """
+        now = datetime.utcnow()
+        cutoff = now - timedelta(days=window_days)
+        updated = 0
+
+        cursor = self.collection.find(
+            {'is_deleted': False, 'created_at': {'$gte': cutoff}},
+            HOT_SCORE_FIELDS
+        ).batch_size(batch_size)
+
+        ops = []
+        for post in cursor:
+            ops.append(UpdateOne({'_id': post['_id']}, {'$set': {'hot_score': hot_score_for_post(post, now)}}))
+            if len(ops) >= batch_size:
+                updated += self.collection.bulk_write(ops, ordered=False).modified_count
+                ops = []
+        if ops:
+            updated += self.collection.bulk_write(ops, ordered=False).modified_count
+
+        # Freeze posts that aged out of the window
+        frozen = self.collection.update_many(
+            {'created_at': {'$lt': cutoff}, 'hot_score': {'$ne': HOT_SCORE_FROZEN}},
+            {'$set': {'hot_score': HOT_SCORE_FROZEN}}
+        )
+        updated += frozen.modified_count
+
+        return updated
+
+
+def refresh_hot_score(db, post_id: str) -> Optional[float]:
+    """Convenience wrapper used by models after vote/comment events."""
+    return HotRanker(db).refresh_post(post_id)
+
+
+def rerank_hot_posts(db, cache_invalidator=None) -> int:
+    """
+    Re-apply decay to recent posts and drop cached hot feeds if anything changed.
+
+    Run as the leader-only `rerank_hot_posts` scheduler job (utils/maintenance_jobs),
+    so one replica re-ranks per HOT_RERANK_INTERVAL_SECONDS for the whole cluster.
+
+    Returns:
+        Number of posts updated
+    """
+    updated = HotRanker(db).rerank()
+    if cache_invalidator and updated:
+        cache_invalidator.invalidate_pattern('post:hot:*')
+    return updated
@@ -7,12 +7,23 @@ used by backend locale files (e.g. 'en', 'pt').
 
 from __future__ import annotations
 
-from typing import Optional, Set
+import json
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional, Set
+
+logger = logging.getLogger(__name__)
 
 
 SUPPORTED_LANGUAGES: Set[str] = {"en", "pt"}
 DEFAULT_LANGUAGE = "en"
 
+LOCALES_DIR = Path(__file__).resolve().parent.parent / "locales"
+
+_locale_bundles: Optional[Dict[str, Dict[str, Any]]] = None
+_locale_lock = threading.Lock()
+
 
 def normalize_language(raw: Optional[str]) -> str:
     """
@@ -56,3 +67,34 @@ def normalize_language_optional(raw: Optional[str]) -> Optional[str]:
     return normalize_language(value)
 
 
+def get_locale_bundles() -> Dict[str, Dict[str, Any]]:
+    """
+    Backend locale files (locales/<lang>.json), loaded once per process.
+
+    The returned dicts are shared by every caller and must be treated as
+    read-only. Each worker loads them in the post-start warm-up task
+    (app.warm_up -> warm_locale_bundles), or on the first request that needs
+    them if that comes first.
+    """
+    global _locale_bundles
+    if _locale_bundles is None:
+        with _locale_lock:
+            if _locale_bundles is None:
+                bundles: Dict[str, Dict[str, Any]] = {}
+                for lang in sorted(SUPPORTED_LANGUAGES):
+                    file_path = LOCALES_DIR / f"{lang}.json"
+                    if not file_path.exists():
+                        continue
+                    try:
+                        with open(file_path, "r", encoding="utf-8") as f:
+                            bundles[lang] = json.load(f)
+                    except Exception as e:
+                        logger.error(f"Failed to load locale {lang}: {e}")
+                        bundles[lang] = {}
+                _locale_bundles = bundles
+    return _locale_bundles
+
+
+def warm_locale_bundles() -> int:
+    """Load the locale bundles now. Returns the number of languages loaded."""
+    return len(get_locale_bundles())
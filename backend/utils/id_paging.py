@@ -0,0 +1,87 @@
+"""
+ObjectId cursor paging for message histories.
+
+Messages are paged on `_id`: an ObjectId starts with its creation time, so
+`_id` order is creation order with ties broken deterministically, and the
+cursor is the id of the last message the client has. A page is one range read
+on a `(scope, is_deleted, _id)` index. The referenced message is never looked
+up, unlike paging on its `created_at`.
+
+    before_message_id: older messages (scrolling back)
+    after_message_id:  newer messages (forward from a jumped-to message)
+
+Pages are returned oldest first either way.
+"""
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+logger = logging.getLogger(__name__)
+
+
+def parse_cursor(message_id: Optional[str]) -> Optional[ObjectId]:
+    """ObjectId of a cursor, or None when absent or malformed (treated as no cursor)."""
+    if not message_id:
+        return None
+    try:
+        return ObjectId(message_id)
+    except (InvalidId, TypeError):
+        logger.debug(f"Ignoring invalid message cursor: {message_id}")
+        return None
+
+
+def fetch_id_page(collection, query: Dict[str, Any], limit: int,
+                  before_message_id: Optional[str] = None, after_message_id: Optional[str] = None,
+                  projection: Optional[Dict[str, Any]] = None) -> Tuple[List[Dict[str, Any]], bool]:
+    """
+    Read one page of documents ordered by _id.
+
+    Args:
+        collection: Collection to read
+        query: Scope filter (e.g. chat_room_id and is_deleted); not modified
+        limit: Page size
+        before_message_id: Return documents older than this id
+        after_message_id: Return documents newer than this id (wins over before)
+        projection: Optional projection
+
+    Returns:
+        (documents oldest first, whether more exist in the paging direction)
+    """
+    query = dict(query)
+    after = parse_cursor(after_message_id)
+    before = None if after else parse_cursor(before_message_id)
+
+    if after:
+        query['_id'] = {'$gt': after}
+        sort = [('_id', 1)]
+    else:
+        if before:
+            query['_id'] = {'$lt': before}
+        sort = [('_id', -1)]
+
+    docs = list(collection.find(query, projection).sort(sort).limit(limit + 1))
+    has_more = len(docs) > limit
+    docs = docs[:limit]
+    if not after:
+        docs.reverse()
+    return docs, has_more
+
+
+def page_info(docs: List[Dict[str, Any]], has_more: bool, after_message_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Pagination block for a page from fetch_id_page.
+
+    next_cursor is the id to pass back as the same parameter (before_message_id,
+    or after_message_id when paging forward) for the following page.
+    """
+    next_cursor = None
+    if has_more and docs:
+        edge = docs[-1] if parse_cursor(after_message_id) else docs[0]
+        next_cursor = str(edge.get('id') or edge['_id'])
+    return {
+        'direction': 'after' if parse_cursor(after_message_id) else 'before',
+        'has_more': has_more,
+        'next_cursor': next_cursor
+    }
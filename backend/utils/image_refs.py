@@ -0,0 +1,103 @@
+"""
+Image references and their delivery URLs.
+
+Pictures (user avatars and banners, chat room pictures and backgrounds) are
+stored as files and delivered by URL through `/api/attachments/<file_id>`,
+with the same `?p=` access key as message attachments. The attachment route
+sends long-lived cache headers, so browsers and a CDN (IMAGE_BASE_URL) keep
+them.
+
+Stored values can be:
+  - an http(s) or `/api/attachments/...` URL: used as is
+  - `azure:<file_id>` (older uploads): turned into an attachment URL with no
+    storage access
+  - an inline `data:image/...;base64,` string (oldest uploads): returned
+    unchanged; `scripts/migrate_inline_images.py` moves these into storage
+"""
+import base64
+import binascii
+import logging
+import re
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+AZURE_REF_PREFIX = 'azure:'
+ATTACHMENT_PATH = '/api/attachments/'
+_DATA_URL_RE = re.compile(r'^data:(?P<mime>[-\w.+]+/[-\w.+]+);base64,')
+
+
+def _config(key: str, default=None):
+    try:
+        from flask import current_app
+        return current_app.config.get(key, default)
+    except RuntimeError:
+        return default
+
+
+def attachment_url(file_id: str) -> str:
+    """
+    Signed attachment URL for a stored file.
+
+    Relative (`/api/attachments/<id>?p=<key>`) unless IMAGE_BASE_URL (e.g. a
+    CDN in front of the app) is configured.
+    """
+    from utils.file_helpers import _generate_encryption_key
+
+    secret_key = _config('FILE_ENCRYPTION_KEY') or _config('SECRET_KEY')
+    url = f"{ATTACHMENT_PATH}{file_id}?p={_generate_encryption_key(file_id, secret_key)}"
+    base_url = _config('IMAGE_BASE_URL')
+    return f"{base_url.rstrip('/')}{url}" if base_url else url
+
+
+def is_inline_image(value) -> bool:
+    """Whether a stored image value is an inline base64 data URL."""
+    return isinstance(value, str) and value.startswith('data:')
+
+
+def resolve_image_ref(value: Optional[str]) -> Optional[str]:
+    """
+    URL for a stored image value (see module docstring). Never touches storage.
+
+    Args:
+        value: Stored picture/banner value
+
+    Returns:
+        A URL, or the value unchanged when it already is one (or is inline data)
+    """
+    if value and isinstance(value, str) and value.startswith(AZURE_REF_PREFIX):
+        return attachment_url(value[len(AZURE_REF_PREFIX):])
+    return value
+
+
+def decode_data_url(value: str):
+    """
+    Split an inline image into (bytes, mime type).
+
+    Returns:
+        (bytes, mime_type), or (None, None) when the value is not valid base64
+    """
+    match = _DATA_URL_RE.match(value)
+    mime_type = match.group('mime') if match else 'image/jpeg'
+    data = value[match.end():] if match else value.split(',', 1)[-1]
+    try:
+        return base64.b64decode(data), mime_type
+    except (binascii.Error, ValueError):
+        return None, None
+
+
+def store_image(file_data: bytes, mime_type: str, storage) -> str:
+    """
+    Store image bytes and return their attachment URL.
+
+    Args:
+        file_data: Image content
+        mime_type: Image MIME type
+        storage: FileStorageService to store into (the one the attachment route serves from)
+
+    Returns:
+        Attachment URL of the stored file
+    """
+    ext = mime_type.split('/')[-1] if '/' in mime_type else 'jpg'
+    file_id, _ = storage.store_file(file_data, f"image.{ext}", mime_type=mime_type, file_id_prefix='img_')
+    return attachment_url(file_id)
@@ -124,24 +124,15 @@ def should_use_imgbb(base64_image: str) -> bool:
         return os.getenv('USE_IMGBB', 'false').lower() in ('true', '1', 'yes')
 
 
-def _extract_mime_type(base64_image: str) -> str:
-    """Extract mime type from base64 string."""
-    import re
-    if base64_image.startswith('data:'):
-        match = re.match(r'^data:(?P<mime>[-\w.]+/[-\w.]+);base64,', base64_image)
-        if match:
-            return match.group('mime')
-    return 'image/jpeg'  # Default
-
 def process_image_for_storage(base64_image: str) -> dict:
     """
-    Process an image for storage - upload to imgbb if available, otherwise Azure.
+    Process an image for storage - upload to imgbb if available, otherwise file storage.
     
     Args:
         base64_image: Base64 encoded image string
     
     Returns:
-        dict with 'success' (bool), 'url' (str - either http URL or azure:ID or base64)
+        dict with 'success' (bool), 'url' (str - imgbb URL, attachment URL or base64)
     """
     if not base64_image:
         return {
@@ -165,45 +156,28 @@ def process_image_for_storage(base64_image: str) -> dict:
              # Proceed to Azure fallback? User said "if the env variable is set... use imgbb".
              # If it fails, fallback is reasonable.
     
-    # 2. Use Azure Storage
+    # 2. Store it as a file served by /api/attachments: Azure Blob Storage when the app
+    # uses it, local disk only when allowed (IMAGE_OFFLOAD_LOCAL; not shared between replicas)
     try:
-        from services.file_storage import FileStorageService
-        # Check if we assume Azure is configured. The user said "if not [imgbb] use azure".
-        # We'll use FileStorageService with use_azure=True if configured in env, 
-        # but the prompt implies enforcing Azure if ImgBB is missing.
-        # We'll rely on FileStorageService defaults/env.
-        
-        # We need to distinguish if we want to FORCE Azure or just use configured storage.
-        # User specified "azure storage container path".
-        # We'll check if AZURE is configured.
-        if os.getenv('AZURE_STORAGE_CONNECTION_STRING'):
-             storage = FileStorageService(use_azure=True)
-             
-             # Parse base64
-             mime_type = _extract_mime_type(base64_image)
-             if ',' in base64_image:
-                 data_str = base64_image.split(',', 1)[1]
-             else:
-                 data_str = base64_image
-             
-             import base64 as b64
-             file_data = b64.b64decode(data_str)
-             
-             # Generate a generic filename
-             ext = mime_type.split('/')[-1] if '/' in mime_type else 'jpg'
-             filename = f"image.{ext}"
-             
-             file_id, _ = storage.store_file(file_data, filename, mime_type=mime_type, file_id_prefix='img_')
-             
-             # Return formatted azure path
-             azure_path = f"azure:{file_id}" 
-             return {
-                 'success': True,
-                 'url': azure_path,
-                 'source': 'azure'
-             }
+        from flask import current_app
+        use_azure = current_app.config.get('USE_AZURE_STORAGE', False)
+        if use_azure or current_app.config.get('IMAGE_OFFLOAD_LOCAL', False):
+            from services.file_storage import get_file_storage_service
+            from utils.image_refs import decode_data_url, store_image
+
+            file_data, mime_type = decode_data_url(base64_image)
+            if file_data is not None:
+                storage = get_file_storage_service(
+                    uploads_dir=current_app.config.get('UPLOADS_DIR'),
+                    use_azure=use_azure
+                )
+                return {
+                    'success': True,
+                    'url': store_image(file_data, mime_type, storage),
+                    'source': 'azure' if use_azure else 'local'
+                }
     except Exception as e:
-        logger.error(f"Azure upload failed: {e}")
+        logger.error(f"Image storage upload failed: {e}")
 
     # 3. Fallback to base64 if everything fails or no storage configured
     return {
@@ -215,32 +189,9 @@ def process_image_for_storage(base64_image: str) -> dict:
 def resolve_image_content(image_str: str) -> str:
     """
     Resolve an image string (URL, base64, or azure:ID) to content useable by frontend.
-    If it's an Azure ID, fetches content and returns base64.
-    """
-    if not image_str:
-        return image_str
-        
-    if image_str.startswith('azure:'):
-        try:
-            file_id = image_str.split(':', 1)[1]
-            from services.file_storage import FileStorageService
-            # Assume env vars are set for Azure
-            if os.getenv('AZURE_STORAGE_CONNECTION_STRING'):
-                storage = FileStorageService(use_azure=True)
-                content = storage.get_file_content(file_id)
-                if content:
-                    import base64 as b64
-                    # We don't know the original mime type easily unless we stored it in DB or 
-                    # we can guess from bytes/signature.
-                    # Or we just return base64 without prefix? Frontend might need prefix.
-                    # Let's try to detect mime or default to png/jpg.
-                    # Or simpler: The backend just sends base64 string.
-                    b64_str = b64.b64encode(content).decode('utf-8')
-                    # HACK: Guess mime or use generic.
-                    return f"data:image/jpeg;base64,{b64_str}" 
-        except Exception as e:
-            logger.error(f"Failed to resolve azure image {image_str}: {e}")
-            return image_str # Fail safe
-            
-    return image_str
 
+    `azure:ID` references become signed attachment URLs (no blob download);
+    see utils.image_refs.
+    """
+    from utils.image_refs import resolve_image_ref
+    return resolve_image_ref(image_str)
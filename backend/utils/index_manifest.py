@@ -0,0 +1,584 @@
+"""
+Declarative database index manifest and reconciliation.
+
+INDEX_MANIFEST lists every index the application relies on. Reconciliation
+(creating missing indexes, reporting drift) runs once per deployment through
+`python manage_indexes.py apply` under a MongoDB lease, and records the
+manifest's version and hash in `schema_versions`. Workers only compare that
+document with the manifest on startup; they reconcile themselves (under the
+same lease) only when the database is behind, e.g. in local development.
+
+Bump INDEX_SCHEMA_VERSION whenever the manifest changes. The hash is checked
+as well, so a forgotten bump is still detected. Indexes removed from the
+manifest go in RETIRED_INDEXES, which every reconciliation drops (other
+indexes outside the manifest are only dropped with --prune).
+"""
+import hashlib
+import json
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo import ASCENDING
+
+from utils.mongo_lease import MongoLease
+
+logger = logging.getLogger(__name__)
+
+INDEX_SCHEMA_VERSION = 6
+
+SCHEMA_DOC_ID = 'indexes'
+LEASE_NAME = 'index_reconcile'
+LEASE_TTL_SECONDS = 600
+
+
+def index(keys, unique: bool = False, **options) -> Dict[str, Any]:
+    """
+    Declare an index.
+
+    Args:
+        keys: Field name, or list of (field, direction) tuples
+        unique: Unique index (falls back to non-unique where Cosmos DB refuses it)
+        options: Extra create_index options (partialFilterExpression, expireAfterSeconds, ...)
+    """
+    if isinstance(keys, str):
+        keys = [(keys, ASCENDING)]
+    return {'keys': [(field, int(direction)) for field, direction in keys], 'unique': unique, 'options': options}
+
+
+INDEX_MANIFEST: Dict[str, List[Dict[str, Any]]] = {
+    'users': [
+        index('username', unique=True),
+        index('email', unique=True),
+        index('ip_addresses'),
+        index('blocked_users'),
+        index('is_admin'),
+        index('is_banned'),
+        index('banned_at'),
+        index('created_at'),
+        # Expired-code clean-up (utils/maintenance_jobs); only users with a pending code are indexed
+        index('email_verification_expires',
+              partialFilterExpression={'email_verification_expires': {'$type': 'date'}}),
+        index('login_email_code_expires',
+              partialFilterExpression={'login_email_code_expires': {'$type': 'date'}}),
+        index('recovery_expires', partialFilterExpression={'recovery_expires': {'$type': 'date'}}),
+        index('deletion_expires', partialFilterExpression={'deletion_expires': {'$type': 'date'}}),
+    ],
+    'topics': [
+        index('created_at'),
+        index([('member_count', -1)]),
+        index([('last_activity', -1)]),
+        index([('post_count', -1)]),
+        index([('conversation_count', -1)]),
+        index('tags'),
+        index('owner_id'),
+        index('members'),
+        index('banned_users'),
+        # get_topics filtering and sorting
+        index([('is_public', 1), ('is_deleted', 1), ('last_activity', -1)]),
+        index([('is_public', 1), ('is_deleted', 1), ('member_count', -1)]),
+        index([('is_public', 1), ('is_deleted', 1), ('created_at', -1)]),
+        index([('is_public', 1), ('is_deleted', 1), ('tags', 1)]),
+        # Pending deletions
+        index([('is_deleted', 1), ('deletion_status', 1), ('deleted_at', -1)]),
+    ],
+    'posts': [
+        index([('topic_id', 1), ('created_at', -1)]),
+        index([('topic_id', 1), ('score', -1)]),
+        index([('topic_id', 1), ('score', -1), ('created_at', -1)]),
+        index([('topic_id', 1), ('hot_score', -1)]),
+        index([('is_deleted', 1), ('hot_score', -1)]),
+        index('user_id'),
+        index('created_at'),
+        index([('score', -1)]),
+        index([('upvote_count', -1)]),
+        index('is_deleted'),
+        index([('is_deleted', 1), ('deletion_status', 1), ('deleted_at', -1)]),
+    ],
+    'comments': [
+        index([('post_id', 1), ('created_at', -1)]),
+        index([('post_id', 1), ('upvote_count', -1)]),
+        index('parent_comment_id'),
+        index('user_id'),
+        index('created_at'),
+        index([('upvote_count', -1)]),
+        index('depth'),
+        index('is_deleted'),
+        # Comment tree: top-level page per post, and subtree range scans on the materialised path
+        index([('post_id', 1), ('parent_comment_id', 1), ('upvote_count', -1), ('_id', -1)]),
+        index([('post_id', 1), ('path', 1)]),
+        # Order-by composites required by Cosmos DB
+        index([('post_id', 1), ('upvote_count', -1), ('created_at', -1)]),
+        index([('post_id', 1), ('created_at', -1), ('upvote_count', -1)]),
+    ],
+    'votes': [
+        # One document per (target, user) makes votes idempotent
+        index([('target_type', 1), ('target_id', 1), ('user_id', 1)], unique=True),
+    ],
+    'chat_rooms': [
+        index('topic_id'),
+        index([('topic_id', 1), ('last_activity', -1)]),
+        index([('topic_id', 1), ('tags', 1)]),
+        index('owner_id'),
+        index('moderators'),
+        index('members'),
+        index('banned_users'),
+        index('tags'),
+        index('is_public'),
+        index('created_at'),
+        index([('is_deleted', 1), ('deletion_status', 1), ('deleted_at', -1)]),
+    ],
+    'messages': [
+        index([('topic_id', 1), ('created_at', -1)]),
+        index([('chat_room_id', 1), ('created_at', -1)]),
+        index([('post_id', 1), ('created_at', -1)]),
+        index([('comment_id', 1), ('created_at', -1)]),
+        # History paging on _id (utils/id_paging): one range read per page in each scope
+        index([('chat_room_id', 1), ('is_deleted', 1), ('_id', -1)]),
+        index([('topic_id', 1), ('is_deleted', 1), ('_id', -1)]),
+        index('user_id'),
+        index('created_at'),
+        index('mentions'),
+        index('is_deleted'),
+        index([('is_deleted', 1), ('deleted_at', -1)]),
+        index([('deleted_at', -1)]),
+        # Soft-deleted messages expire at permanent_delete_at (unset on live messages)
+        index('permanent_delete_at', expireAfterSeconds=0),
+    ],
+    'reports': [
+        index([('reported_content_id', 1), ('content_type', 1)]),
+        index('content_type'),
+        index('report_type'),
+        index('reported_user_id'),
+        index('reported_by'),
+        index('created_at'),
+        index('status'),
+        index([('topic_id', 1), ('status', 1)]),
+        index([('status', 1), ('created_at', -1)]),
+        # Admin listing: filters, newest first by _id (cursor paging)
+        index([('status', 1), ('_id', -1)]),
+        index([('status', 1), ('content_type', 1), ('_id', -1)]),
+        index([('status', 1), ('report_type', 1), ('_id', -1)]),
+        # Reports waiting for their snapshot (utils/moderation_queue)
+        index([('snapshot_pending', 1), ('created_at', 1)],
+              partialFilterExpression={'snapshot_pending': True}),
+    ],
+    'tickets': [
+        index('user_id'),
+        index('status'),
+        index('category'),
+        index('priority'),
+        index('created_at'),
+        index('reviewed_by'),
+        index([('priority', -1), ('created_at', -1)]),
+        index([('status', 1), ('priority', -1), ('created_at', -1)]),
+        index([('category', 1), ('priority', -1), ('created_at', -1)]),
+        index([('status', 1), ('category', 1), ('priority', -1), ('created_at', -1)]),
+    ],
+    'conversation_settings': [
+        index([('user_id', 1), ('other_user_id', 1)], unique=True,
+              partialFilterExpression={'other_user_id': {'$exists': True}}),
+        index([('user_id', 1), ('topic_id', 1), ('type', 1)], unique=True,
+              partialFilterExpression={'topic_id': {'$exists': True}}),
+        index([('user_id', 1), ('chat_room_id', 1), ('type', 1)], unique=True,
+              partialFilterExpression={'chat_room_id': {'$exists': True}}),
+        index('type'),
+    ],
+    'user_content_settings': [
+        index([('user_id', 1), ('topic_id', 1)], unique=True),
+        index('hidden'),
+    ],
+    'notification_settings': [
+        index([('user_id', 1), ('post_id', 1), ('type', 1)], unique=True,
+              partialFilterExpression={'type': 'post'}),
+        index([('user_id', 1), ('chat_room_id', 1), ('type', 1)], unique=True,
+              partialFilterExpression={'type': 'chat_room'}),
+        index([('user_id', 1), ('topic_id', 1), ('type', 1)], unique=True,
+              partialFilterExpression={'type': 'topic'}),
+        index([('user_id', 1), ('other_user_id', 1), ('type', 1)], unique=True,
+              partialFilterExpression={'type': 'private_message'}),
+        index('type'),
+    ],
+    'private_messages': [
+        index([('from_user_id', 1), ('to_user_id', 1)]),
+        index([('to_user_id', 1), ('created_at', -1)]),
+        index('created_at'),
+        index([('from_user_id', 1), ('to_user_id', 1), ('created_at', -1)]),
+        index([('from_user_id', 1), ('to_user_id', 1), ('_id', -1)]),
+    ],
+    'conversations': [
+        # DM inbox summaries: one per (user, partner), listed by recency
+        index([('user_id', 1), ('other_user_id', 1)], unique=True),
+        index([('user_id', 1), ('last_message_at', -1)]),
+    ],
+    'anonymous_identities': [
+        index([('user_id', 1), ('topic_id', 1)], unique=True),
+        index('last_used'),
+    ],
+    'friends': [
+        index([('from_user_id', 1), ('status', 1), ('updated_at', -1)]),
+        index([('to_user_id', 1), ('status', 1), ('updated_at', -1)]),
+        index([('from_user_id', 1), ('status', 1)]),
+        index([('to_user_id', 1), ('status', 1)]),
+    ],
+    'short_links': [
+        index('code', unique=True),
+        index('created_at'),
+    ],
+    'voip_calls': [
+        index([('status', 1), ('created_at', 1)]),
+    ],
+    'session_backups': [
+        index('expireAt', expireAfterSeconds=0),
+    ],
+    'locks': [
+        # Abandoned leases; live ones are renewed long before this
+        index('expires_at', expireAfterSeconds=86400),
+    ],
+    'stats': [
+        # Admin dashboard series (utils/stats_rollup)
+        index([('granularity', 1), ('start', 1)]),
+        index('expires_at', expireAfterSeconds=0),
+    ],
+}
+
+
+# Indexes the application no longer reads, dropped by every reconciliation: {collection: [keys, ...]}
+RETIRED_INDEXES: Dict[str, List[List[Tuple[str, int]]]] = {
+    'messages': [
+        # History is never paged by post or comment; these only cost writes on messages
+        [('post_id', 1), ('is_deleted', 1), ('_id', -1)],
+        [('comment_id', 1), ('is_deleted', 1), ('_id', -1)],
+    ],
+}
+
+
+def manifest_hash(manifest: Optional[Dict[str, List[Dict[str, Any]]]] = None) -> str:
+    """Stable hash of the manifest contents."""
+    manifest = manifest or INDEX_MANIFEST
+    canonical = json.dumps(manifest, sort_keys=True, default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()[:16]
+
+
+def _normalize_key(key) -> Tuple[Tuple[str, Any], ...]:
+    """index_information() keys as a comparable tuple (directions as ints where numeric)."""
+    normalized = []
+    for field, direction in key:
+        if isinstance(direction, float) and direction.is_integer():
+            direction = int(direction)
+        normalized.append((field, direction))
+    return tuple(normalized)
+
+
+def _is_cosmos_unique_error(error: Exception) -> bool:
+    return getattr(error, 'code', None) == 13 or 'The unique index cannot be modified' in str(error)
+
+
+class IndexReconciler:
+    """Compares the manifest with the database and applies the difference."""
+
+    def __init__(self, db, manifest: Optional[Dict[str, List[Dict[str, Any]]]] = None,
+                 version: int = INDEX_SCHEMA_VERSION,
+                 retired: Optional[Dict[str, List[List[Tuple[str, int]]]]] = None):
+        self.db = db
+        self.manifest = manifest or INDEX_MANIFEST
+        self.version = version
+        self.retired = RETIRED_INDEXES if retired is None else retired
+        self.hash = manifest_hash(self.manifest)
+
+    # ------------------------------------------------------------ version doc
+
+    def applied(self) -> Optional[Dict[str, Any]]:
+        """The schema-version document of the last reconciliation, if any."""
+        return self.db.schema_versions.find_one({'_id': SCHEMA_DOC_ID})
+
+    def status(self) -> str:
+        """
+        Returns:
+            'current' (database matches this manifest), 'newer' (a later manifest
+            was applied, e.g. during a rolling deploy) or 'outdated'
+        """
+        doc = self.applied()
+        if not doc:
+            return 'outdated'
+        if doc.get('version', 0) > self.version:
+            return 'newer'
+        if doc.get('version') == self.version and doc.get('manifest_hash') == self.hash:
+            return 'current'
+        return 'outdated'
+
+    def _record(self, summary: Dict[str, Any], owner: str) -> None:
+        self.db.schema_versions.update_one(
+            {'_id': SCHEMA_DOC_ID},
+            {'$set': {
+                'version': self.version,
+                'manifest_hash': self.hash,
+                'applied_at': datetime.utcnow(),
+                'applied_by': owner,
+                'summary': summary
+            }},
+            upsert=True
+        )
+
+    # ------------------------------------------------------------ planning
+
+    def plan(self) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Diff the manifest against the database.
+
+        Returns:
+            {'create': [...], 'mismatch': [...], 'retire': [...], 'extra': [...]};
+            entries carry 'collection' plus the spec (create/mismatch) or index
+            'name' (retire/extra)
+        """
+        result = {'create': [], 'mismatch': [], 'retire': [], 'extra': []}
+        for collection_name, specs in self.manifest.items():
+            try:
+                existing = self.db[collection_name].index_information()
+            except Exception:
+                existing = {}  # Collection doesn't exist yet
+            by_key = {_normalize_key(info['key']): (name, info) for name, info in existing.items()}
+            wanted = set()
+            retired = {_normalize_key(keys) for keys in self.retired.get(collection_name, [])}
+
+            for spec in specs:
+                key = _normalize_key(spec['keys'])
+                wanted.add(key)
+                if key not in by_key:
+                    result['create'].append({'collection': collection_name, **spec})
+                    continue
+                name, info = by_key[key]
+                differences = self._option_differences(spec, info)
+                if differences:
+                    result['mismatch'].append({'collection': collection_name, 'name': name,
+                                               'differences': differences, **spec})
+
+            for key, (name, info) in by_key.items():
+                if name != '_id_' and key not in wanted:
+                    bucket = 'retire' if key in retired else 'extra'
+                    result[bucket].append({'collection': collection_name, 'name': name, 'keys': list(key)})
+        return result
+
+    @staticmethod
+    def _option_differences(spec: Dict[str, Any], info: Dict[str, Any]) -> List[str]:
+        differences = []
+        if bool(info.get('unique')) != spec['unique']:
+            differences.append(f"unique: {bool(info.get('unique'))} -> {spec['unique']}")
+        for option, value in spec['options'].items():
+            if info.get(option) != value:
+                differences.append(f"{option}: {info.get(option)} -> {value}")
+        return differences
+
+    # ------------------------------------------------------------ applying
+
+    def apply(self, prune: bool = False, fix_options: bool = False, dry_run: bool = False,
+              owner: str = 'manual') -> Dict[str, Any]:
+        """
+        Create missing indexes, drop retired ones (and optionally rebuild
+        mismatched / drop unmanaged ones), then record the manifest version if
+        every operation succeeded.
+        After a failure the database stays 'outdated', so the next worker
+        startup (or deployment) retries.
+
+        Args:
+            prune: Drop indexes that are not in the manifest
+            fix_options: Drop and recreate indexes whose options differ from the manifest
+                         (Cosmos DB can't change uniqueness; those are reported instead)
+            dry_run: Only compute the plan
+
+        Returns:
+            Summary with the plan, per-action counts and whether the version was recorded
+        """
+        plan = self.plan()
+        summary = {'created': 0, 'created_non_unique': 0, 'created_without_ttl': 0, 'recreated': 0, 'retired': 0,
+                   'dropped': 0, 'failed': 0,
+                   'mismatched': len(plan['mismatch']), 'unmanaged': len(plan['extra'])}
+        if dry_run:
+            return {'plan': plan, 'summary': summary, 'recorded': False}
+
+        for spec in plan['create']:
+            self._create(spec, summary)
+
+        for retired in plan['retire']:
+            try:
+                self.db[retired['collection']].drop_index(retired['name'])
+                summary['retired'] += 1
+            except Exception as e:
+                logger.warning(f"Failed to drop retired index {retired['name']} on {retired['collection']}: {e}")
+                summary['failed'] += 1
+
+        if fix_options:
+            for spec in plan['mismatch']:
+                collection = self.db[spec['collection']]
+                try:
+                    collection.drop_index(spec['name'])
+                    summary['recreated'] += 1
+                except Exception as e:
+                    logger.warning(f"Failed to drop index {spec['name']} on {spec['collection']}: {e}")
+                    summary['failed'] += 1
+                    continue
+                self._create(spec, summary, count_as=None)
+
+        if prune:
+            for extra in plan['extra']:
+                try:
+                    self.db[extra['collection']].drop_index(extra['name'])
+                    summary['dropped'] += 1
+                except Exception as e:
+                    logger.warning(f"Failed to drop index {extra['name']} on {extra['collection']}: {e}")
+                    summary['failed'] += 1
+
+        if summary['failed']:
+            logger.warning(f"{summary['failed']} index operations failed; manifest v{self.version} not recorded")
+            return {'plan': plan, 'summary': summary, 'recorded': False}
+
+        self._record(summary, owner)
+        return {'plan': plan, 'summary': summary, 'recorded': True}
+
+    def _create(self, spec: Dict[str, Any], summary: Dict[str, int], count_as: Optional[str] = 'created') -> None:
+        collection = self.db[spec['collection']]
+        try:
+            collection.create_index(spec['keys'], unique=spec['unique'], **spec['options'])
+            if count_as:
+                summary[count_as] += 1
+            return
+        except Exception as e:
+            if 'expireAfterSeconds' in spec['options']:
+                self._create_without_ttl(spec, summary, e)
+                return
+            if not (spec['unique'] and _is_cosmos_unique_error(e)):
+                logger.warning(f"Failed to create index {spec['keys']} on {collection.name}: {e}")
+                summary['failed'] += 1
+                return
+
+        # Cosmos DB can only add unique indexes to empty collections; uniqueness is
+        # also enforced at the model level, so a plain index is acceptable
+        logger.warning(f"Cosmos DB refused unique index {spec['keys']} on {collection.name}; creating non-unique")
+        try:
+            collection.create_index(spec['keys'], unique=False, **spec['options'])
+            summary['created_non_unique'] += 1
+        except Exception as e:
+            logger.warning(f"Failed to create fallback index on {collection.name}: {e}")
+            summary['failed'] += 1
+
+    def _create_without_ttl(self, spec: Dict[str, Any], summary: Dict[str, int], error: Exception) -> None:
+        # Cosmos DB only supports TTL on _ts; the scheduler's clean-up jobs (utils/maintenance_jobs)
+        # do the expiry instead, and still need the plain index for their queries
+        collection = self.db[spec['collection']]
+        logger.warning(f"TTL index {spec['keys']} on {collection.name} not supported ({error}); creating without TTL")
+        options = {k: v for k, v in spec['options'].items() if k != 'expireAfterSeconds'}
+        try:
+            collection.create_index(spec['keys'], unique=spec['unique'], **options)
+            summary['created_without_ttl'] += 1
+        except Exception as e:
+            logger.warning(f"Failed to create fallback index on {collection.name}: {e}")
+            summary['failed'] += 1
+
+    # ------------------------------------------------------------ usage
+
+    def usage_report(self, collections: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """
+        Index usage from $indexStats plus a redundancy check.
+
+        An index is flagged 'unused' when it has served no operations since the
+        server started tracking it, and 'redundant' when its key is a prefix of
+        another index's key on the same collection (and it isn't unique, partial
+        or TTL, which a longer index can't stand in for).
+
+        Returns:
+            One row per index: collection, name, keys, ops (None where $indexStats
+            is unsupported, e.g. Cosmos DB), since, flags
+        """
+        rows = []
+        for collection_name in collections or sorted(self.manifest):
+            collection = self.db[collection_name]
+            try:
+                existing = collection.index_information()
+            except Exception:
+                continue
+
+            stats = {}
+            try:
+                for stat in collection.aggregate([{'$indexStats': {}}]):
+                    stats[stat['name']] = stat.get('accesses', {})
+            except Exception as e:
+                logger.debug(f"$indexStats unavailable on {collection_name}: {e}")
+
+            keys = {name: _normalize_key(info['key']) for name, info in existing.items()}
+            for name, info in existing.items():
+                if name == '_id_':
+                    continue
+                accesses = stats.get(name)
+                flags = []
+                if accesses is not None and int(accesses.get('ops', 0)) == 0:
+                    flags.append('unused')
+                special = info.get('unique') or info.get('partialFilterExpression') or 'expireAfterSeconds' in info
+                if not special:
+                    covering = [other for other, other_key in keys.items()
+                                if other != name and len(other_key) > len(keys[name])
+                                and other_key[:len(keys[name])] == keys[name]]
+                    if covering:
+                        flags.append(f"redundant (prefix of {covering[0]})")
+                rows.append({
+                    'collection': collection_name,
+                    'name': name,
+                    'keys': list(keys[name]),
+                    'ops': int(accesses['ops']) if accesses is not None and 'ops' in accesses else None,
+                    'since': accesses.get('since') if accesses is not None else None,
+                    'flags': flags
+                })
+        return rows
+
+
+def reconcile_with_lease(db, owner_label: str, **apply_kwargs) -> Optional[Dict[str, Any]]:
+    """
+    Apply the manifest under the reconciliation lease.
+
+    Returns:
+        apply() result, or None if another process holds the lease
+    """
+    lease = MongoLease(db, LEASE_NAME, ttl=LEASE_TTL_SECONDS)
+    if not lease.acquire():
+        return None
+    try:
+        return IndexReconciler(db).apply(owner=f"{owner_label}:{lease.owner}", **apply_kwargs)
+    finally:
+        lease.release()
+
+
+def check_indexes_on_startup(app) -> str:
+    """
+    Startup hook: a single version read, reconciling only if the database is behind.
+
+    Returns:
+        The index status seen at startup
+    """
+    db = app.db
+    reconciler = IndexReconciler(db)
+    try:
+        status = reconciler.status()
+    except Exception as e:
+        logger.warning(f"Could not read index schema version: {e}")
+        return 'unknown'
+
+    if status != 'outdated':
+        logger.info(f"Database indexes {status} (manifest v{INDEX_SCHEMA_VERSION})")
+        return status
+
+    if not app.config.get('INDEX_AUTO_RECONCILE', True):
+        logger.warning(
+            f"Database indexes are behind manifest v{INDEX_SCHEMA_VERSION}; "
+            "run `python manage_indexes.py apply` as part of the deployment"
+        )
+        return status
+
+    try:
+        result = reconcile_with_lease(db, 'startup')
+    except Exception as e:
+        logger.warning(f"Index reconciliation failed: {e}. Continuing startup...")
+        return status
+    if result is None:
+        logger.info("Index reconciliation already running in another worker")
+    else:
+        logger.info(f"Database indexes reconciled: {result['summary']}")
+    return status
@@ -0,0 +1,142 @@
+"""
+Fast JSON encoding for HTTP responses and Socket.IO packets.
+
+`FastJSONProvider` replaces Flask's JSON provider and this module doubles as
+the `json` module of the Socket.IO server (it has `dumps`/`loads`). Both
+encode with orjson when installed and natively handle the types MongoDB
+documents carry, so route and socket payloads can hold raw documents:
+
+  - ObjectId -> hex string
+  - datetime -> ISO 8601 in UTC with a 'Z' suffix (naive datetimes, as
+    stored by the models, are UTC), date -> ISO 8601
+  - Decimal / Decimal128, UUID -> string
+  - bytes / Binary -> base64
+  - set / frozenset -> list
+
+orjson is optional; without it the standard library encoder is used with the
+same conversions. Unknown types still raise TypeError.
+
+Model methods whose results are used by other code (and cached) convert
+documents with `to_jsonable`, a single shared walk, instead of each keeping
+its own recursive ObjectId/datetime conversion.
+"""
+import base64
+import dataclasses
+import decimal
+import json
+import logging
+import uuid
+from datetime import date, datetime
+from typing import Any
+
+from bson import ObjectId
+from bson.decimal128 import Decimal128
+from flask.json.provider import DefaultJSONProvider
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+    # Naive datetimes are UTC: write them with a 'Z' so clients don't read them as local time
+    ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_NAIVE_UTC | orjson.OPT_UTC_Z
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+
+def json_default(obj: Any) -> Any:
+    """Encode the non-JSON types found in MongoDB documents (see module docstring)."""
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, datetime):
+        # Same output as orjson with OPT_NAIVE_UTC | OPT_UTC_Z
+        if obj.tzinfo is None:
+            return obj.isoformat() + 'Z'
+        text = obj.isoformat()
+        return text[:-6] + 'Z' if text.endswith('+00:00') else text
+    if isinstance(obj, date):
+        return obj.isoformat()
+    if isinstance(obj, Decimal128):
+        return str(obj.to_decimal())
+    if isinstance(obj, (decimal.Decimal, uuid.UUID)):
+        return str(obj)
+    if isinstance(obj, (bytes, bytearray)):
+        return base64.b64encode(obj).decode('ascii')
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        return dataclasses.asdict(obj)
+    if hasattr(obj, '__html__'):
+        return str(obj.__html__())
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps_bytes(obj: Any) -> bytes:
+    """Encode to compact UTF-8 JSON bytes."""
+    if ORJSON_AVAILABLE:
+        try:
+            return orjson.dumps(obj, default=json_default, option=ORJSON_OPTIONS)
+        except (TypeError, orjson.JSONEncodeError):
+            pass  # e.g. integers beyond 64 bits or exotic keys; the stdlib handles them
+    return json.dumps(obj, default=json_default, separators=(',', ':'),
+                      ensure_ascii=False).encode('utf-8')
+
+
+def dumps(obj: Any, **kwargs) -> str:
+    """json.dumps-compatible encoder (formatting kwargs such as separators are ignored)."""
+    return dumps_bytes(obj).decode('utf-8')
+
+
+def loads(s, **kwargs) -> Any:
+    """json.loads-compatible decoder."""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(s)
+    return json.loads(s)
+
+
+def to_jsonable(obj: Any) -> Any:
+    """
+    Copy a document with ObjectIds and datetimes converted to strings.
+
+    For results that other code reads or caches; values handed straight to
+    jsonify or emit need no conversion. Other values are kept as they are.
+
+    Args:
+        obj: Document, list or scalar
+
+    Returns:
+        The converted copy
+    """
+    cls = obj.__class__
+    if cls is dict:
+        return {key: to_jsonable(value) for key, value in obj.items()}
+    if cls is list:
+        return [to_jsonable(item) for item in obj]
+    if cls is str or cls is int or cls is bool or obj is None or cls is float:
+        return obj
+    if cls is ObjectId:
+        return str(obj)
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    if isinstance(obj, dict):
+        return {key: to_jsonable(value) for key, value in obj.items()}
+    if isinstance(obj, list):
+        return [to_jsonable(item) for item in obj]
+    return obj
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by dumps_bytes/loads (see module docstring)."""
+
+    # Key order is kept as built; sorting every response costs CPU and nothing reads it
+    sort_keys = False
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        return dumps(obj)
+
+    def loads(self, s, **kwargs: Any) -> Any:
+        return loads(s)
+
+    def response(self, *args: Any, **kwargs: Any):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps_bytes(obj) + b'\n', mimetype=self.mimetype)
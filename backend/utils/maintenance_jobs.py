@@ -0,0 +1,123 @@
+"""
+Periodic clean-up of expiring data, run by the scheduler (utils/scheduler).
+
+Where a MongoDB TTL index can express the expiry (session backups, soft-deleted
+messages, expired leases; see utils/index_manifest) the server deletes
+documents itself. The jobs below still run: they make the clean-up work on
+servers without TTL support (Cosmos DB only honours TTL on `_ts`), cover
+expiry that a TTL index cannot express, and report what they removed. Deletes
+go in small batches.
+
+Intervals come from config (`*_INTERVAL_SECONDS`; 0 disables a job).
+"""
+import logging
+import time
+from datetime import datetime, timedelta
+
+from utils.helpers import delete_in_batches
+
+logger = logging.getLogger(__name__)
+
+
+def purge_expired_messages(db, batch_size: int) -> int:
+    """Permanently delete soft-deleted messages past their permanent_delete_at."""
+    from models.message import Message
+    return Message(db).permanently_delete_expired_messages(batch_size=batch_size)
+
+
+def purge_session_backups(db, batch_size: int) -> int:
+    """Delete expired passkey-challenge session backups."""
+    return delete_in_batches(db.session_backups, {'expires_at': {'$lte': int(time.time())}},
+                             batch_size=batch_size)
+
+
+def purge_expired_leases(db, batch_size: int) -> int:
+    """Delete leases that expired more than a day ago (abandoned lock names)."""
+    cutoff = datetime.utcnow() - timedelta(days=1)
+    return delete_in_batches(db.locks, {'expires_at': {'$lt': cutoff}}, batch_size=batch_size)
+
+
+def clear_expired_user_codes(db) -> int:
+    """Clear expired email verification, login, recovery and deletion codes."""
+    from models.user import User
+    return User(db).clear_expired_codes()
+
+
+def cleanup_anonymous_identities(db, days_threshold: int, batch_size: int) -> int:
+    """Delete anonymous identities unused for days_threshold days."""
+    from models.anonymous_identity import AnonymousIdentity
+    return AnonymousIdentity(db).cleanup_unused_identities(days_threshold=days_threshold,
+                                                           batch_size=batch_size)
+
+
+def end_stale_calls(db) -> int:
+    """End voice calls left active past the stale-call timeout."""
+    from models.voip import VoipCall
+    return VoipCall(db).cleanup_stale_calls()
+
+
+def enrich_pending_reports(db) -> int:
+    """Build the snapshots of reports no worker's moderation queue enriched."""
+    from utils.moderation_queue import enrich_pending_reports as enrich
+    return enrich(db)
+
+
+def reconcile_admin_stats(db, hours: int, days: int, batch_size: int) -> int:
+    """Recount the admin dashboard rollups and their recent hourly/daily buckets."""
+    from utils.stats_rollup import reconcile_stats
+    return reconcile_stats(db, hours=hours, days=days, batch_size=batch_size)
+
+
+def recount_unread_totals(db, batch_size: int) -> int:
+    """Correct per-user unread DM totals that drifted from their conversation summaries."""
+    from models.conversation import Conversation
+    return Conversation(db).recount_unread_totals(batch_size=batch_size)
+
+
+def register_maintenance_jobs(scheduler, app, socketio) -> None:
+    """Register the clean-up jobs with their configured intervals."""
+    config = app.config
+    batch_size = config.get('CLEANUP_BATCH_SIZE', 500)
+
+    def with_db(func, *args, **kwargs):
+        # Resolve app.db at run time: it is set up (or replaced) after registration
+        return lambda: func(app.db, *args, **kwargs)
+
+    scheduler.register('purge_expired_messages', with_db(purge_expired_messages, batch_size),
+                       config.get('CLEANUP_DELETED_MESSAGES_INTERVAL_SECONDS', 3600))
+    scheduler.register('purge_session_backups', with_db(purge_session_backups, batch_size),
+                       config.get('CLEANUP_SESSION_BACKUPS_INTERVAL_SECONDS', 900))
+    scheduler.register('purge_expired_leases', with_db(purge_expired_leases, batch_size),
+                       config.get('CLEANUP_LEASES_INTERVAL_SECONDS', 86400))
+    scheduler.register('clear_expired_user_codes', with_db(clear_expired_user_codes),
+                       config.get('CLEANUP_USER_CODES_INTERVAL_SECONDS', 3600))
+    scheduler.register('cleanup_anonymous_identities',
+                       with_db(cleanup_anonymous_identities,
+                               config.get('ANONYMOUS_IDENTITY_RETENTION_DAYS', 30), batch_size),
+                       config.get('CLEANUP_ANONYMOUS_IDENTITIES_INTERVAL_SECONDS', 86400))
+    scheduler.register('end_stale_calls', with_db(end_stale_calls),
+                       config.get('CLEANUP_STALE_CALLS_INTERVAL_SECONDS', 600))
+    scheduler.register('enrich_pending_reports', with_db(enrich_pending_reports),
+                       config.get('MODERATION_SWEEP_INTERVAL_SECONDS', 300))
+    scheduler.register('reconcile_admin_stats',
+                       with_db(reconcile_admin_stats, config.get('STATS_RECONCILE_HOURS', 168),
+                               config.get('STATS_RECONCILE_DAYS', 7), batch_size),
+                       config.get('STATS_RECONCILE_INTERVAL_SECONDS', 900))
+    scheduler.register('recount_unread_totals', with_db(recount_unread_totals, batch_size),
+                       config.get('UNREAD_RECOUNT_INTERVAL_SECONDS', 3600))
+
+    # Hot-score decay is cluster-wide: the leader re-ranks for every replica
+    def rerank_hot():
+        from utils.hot_ranking import rerank_hot_posts
+        return rerank_hot_posts(app.db, config.get('CACHE_INVALIDATOR'))
+
+    scheduler.register('rerank_hot_posts', rerank_hot,
+                       config.get('HOT_RERANK_INTERVAL_SECONDS', 300) if config.get('HOT_RERANK_ENABLED', True) else 0)
+
+    # Presence tracking is per process: every worker prunes its own
+    def prune_presence():
+        from socketio_handlers import cleanup_disconnected_users
+        return cleanup_disconnected_users(socketio)
+
+    scheduler.register('prune_presence', prune_presence,
+                       config.get('CLEANUP_PRESENCE_INTERVAL_SECONDS', 300), leader_only=False)
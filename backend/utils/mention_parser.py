@@ -2,6 +2,7 @@ import re
 from typing import List, Set, Optional
 from bson import ObjectId
 import logging
+from utils.singletons import get_model
 
 logger = logging.getLogger(__name__)
 
@@ -43,7 +44,7 @@ def get_user_ids_from_mentions(db, usernames: List[str]) -> List[ObjectId]:
         return []
     
     from models.user import User
-    user_model = User(db)
+    user_model = get_model(User, db)
     mentioned_user_ids = []
     
     for username in usernames:
@@ -117,7 +118,7 @@ def notify_mentioned_users(db, content_id: str, content_type: str,
         from flask import current_app
         
         notification_model = Notification(db)
-        user_model = User(db)
+        user_model = get_model(User, db)
         
         # Get sender username
         sender = user_model.get_user_by_id(sender_id)
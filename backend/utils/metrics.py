@@ -0,0 +1,381 @@
+"""
+In-process latency and throughput metrics in the Prometheus text format.
+
+Collected per process and served on the admin-only `/metrics` endpoint:
+
+- `http_request_duration_seconds{method,endpoint,status}`: Flask requests
+- `socketio_event_duration_seconds{event}`: Socket.IO event handlers
+- `mongodb_command_duration_seconds{collection,command}`: every MongoDB
+  command, via a pymongo CommandListener
+- `socketio_fanout_recipients{event}`: recipients of room broadcasts on this
+  replica
+- `eventlet_loop_lag_seconds`: how late a periodic sleep wakes up, plus the
+  hub's timer and listener counts
+- cache, rate limiter, vote buffer, scheduler and log queue counters, read
+  from those components' own stats when scraped
+
+Observing a value is a dict lookup, a bisect and three additions, so the
+instrumentation stays on in production. Updates are not locked: under
+eventlet they cannot interleave, and with OS threads an occasionally lost
+increment is acceptable for metrics.
+
+Each replica is scraped on its own; nothing is shared through Redis.
+"""
+import bisect
+import logging
+import time
+from functools import wraps
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+FANOUT_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+# Commands issued by the driver itself (handshakes, auth, monitoring)
+_IGNORED_COMMANDS = frozenset({'hello', 'ismaster', 'isMaster', 'ping', 'saslStart', 'saslContinue',
+                               'buildInfo', 'endSessions'})
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence, extra: str = '') -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def _format_value(value) -> str:
+    if isinstance(value, float):
+        if value == float('inf'):
+            return '+Inf'
+        return repr(round(value, 6))
+    return str(value)
+
+
+class Counter:
+    """A monotonically increasing count per label set."""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+                for labels, value in sorted(self._values.items())]
+
+
+class Histogram:
+    """Bucketed observations (with sum and count) per label set."""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per-bucket counts (last one is +Inf), sum, count]
+        self._series: Dict[Tuple, list] = {}
+
+    def observe(self, value: float, *labels) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series.setdefault(labels, [[0] * (len(self.buckets) + 1), 0.0, 0])
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = []
+        for labels, (counts, total, count) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = 'le="+Inf"' if bound == float('inf') else f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+# A collector returns (name, kind, help, [(labels dict, value), ...]) families at scrape time
+Collector = Callable[[], Iterable[Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]]]
+
+
+class MetricsRegistry:
+    """Process-wide set of metrics plus collectors that read other components' stats."""
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._collectors: List[Collector] = []
+
+    def counter(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._metrics.setdefault(name, Counter(name, help_text, labelnames))
+
+    def histogram(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._metrics.setdefault(name, Histogram(name, help_text, labelnames, buckets))
+
+    def register_collector(self, collector: Collector) -> None:
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            try:
+                families = list(collector())
+            except Exception as e:
+                logger.warning(f"Metrics collector {getattr(collector, '__name__', collector)} failed: {e}")
+                continue
+            for name, kind, help_text, samples in families:
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(list(labels), list(labels.values()))} "
+                                 f"{_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+http_request_duration = registry.histogram(
+    'http_request_duration_seconds', 'Flask request latency', ('method', 'endpoint', 'status'))
+socketio_event_duration = registry.histogram(
+    'socketio_event_duration_seconds', 'Socket.IO event handler latency', ('event',))
+mongodb_command_duration = registry.histogram(
+    'mongodb_command_duration_seconds', 'MongoDB command latency', ('collection', 'command'))
+mongodb_command_failures = registry.counter(
+    'mongodb_command_failures_total', 'MongoDB commands that failed', ('collection', 'command'))
+socketio_fanout = registry.histogram(
+    'socketio_fanout_recipients', 'Local recipients of a Socket.IO room broadcast', ('event',),
+    buckets=FANOUT_BUCKETS)
+loop_lag = registry.histogram(
+    'eventlet_loop_lag_seconds', 'Delay of a periodic sleep past its deadline (event loop saturation)')
+
+
+# ---------------------------------------------------------------- MongoDB
+
+try:
+    from pymongo import monitoring
+
+    class MongoCommandMetrics(monitoring.CommandListener):
+        """Times MongoDB commands per collection and command name."""
+
+        def __init__(self):
+            # request_id -> collection; command events only carry the collection on start
+            self._collections: Dict[int, str] = {}
+
+        def started(self, event) -> None:
+            if event.command_name in _IGNORED_COMMANDS:
+                return
+            target = event.command.get(event.command_name)
+            if event.command_name == 'getMore':
+                target = event.command.get('collection')
+            self._collections[event.request_id] = target if isinstance(target, str) else '-'
+
+        def succeeded(self, event) -> None:
+            collection = self._collections.pop(event.request_id, None)
+            if collection is not None:
+                mongodb_command_duration.observe(event.duration_micros / 1e6, collection, event.command_name)
+
+        def failed(self, event) -> None:
+            collection = self._collections.pop(event.request_id, None)
+            if collection is not None:
+                mongodb_command_duration.observe(event.duration_micros / 1e6, collection, event.command_name)
+                mongodb_command_failures.inc(collection, event.command_name)
+except ImportError:
+    MongoCommandMetrics = None
+
+
+def mongo_event_listeners(app) -> list:
+    """Event listeners to pass to MongoClient (empty when metrics are disabled)."""
+    if not app.config.get('METRICS_ENABLED', True) or MongoCommandMetrics is None:
+        return []
+    return [MongoCommandMetrics()]
+
+
+# ---------------------------------------------------------------- Flask and Socket.IO
+
+
+def _instrument_flask(app) -> None:
+    from flask import g, request
+
+    @app.before_request
+    def _start_request_timer():
+        g._metrics_started = time.perf_counter()
+
+    @app.after_request
+    def _observe_request(response):
+        started = g.get('_metrics_started')
+        if started is not None:
+            http_request_duration.observe(time.perf_counter() - started, request.method,
+                                          request.endpoint or 'unmatched', response.status_code)
+        return response
+
+
+def instrument_socketio(socketio) -> None:
+    """
+    Time every registered Socket.IO event handler.
+
+    Call after the handlers are registered (and after `socketio.init_app`).
+    """
+    server = getattr(socketio, 'server', None)
+    if server is None or getattr(server, '_metrics_instrumented', False):
+        return
+    for namespace_handlers in server.handlers.values():
+        for event, handler in list(namespace_handlers.items()):
+            namespace_handlers[event] = _timed_handler(event, handler)
+    server._metrics_instrumented = True
+
+
+def _timed_handler(event: str, handler):
+    @wraps(handler)
+    def timed(*args):
+        started = time.perf_counter()
+        try:
+            return handler(*args)
+        finally:
+            socketio_event_duration.observe(time.perf_counter() - started, event)
+    return timed
+
+
+def observe_fanout(socketio, event: str, room: str, namespace: str = '/') -> None:
+    """Record how many of this replica's clients a room broadcast reaches (no-op when metrics are off)."""
+    if get_metrics() is None:
+        return
+    try:
+        recipients = sum(1 for _ in socketio.server.manager.get_participants(namespace, room))
+    except Exception:
+        return
+    socketio_fanout.observe(recipients, event)
+
+
+# ---------------------------------------------------------------- event loop
+
+
+def _hub_collector():
+    from eventlet import hubs
+    from eventlet.hubs.hub import READ, WRITE
+
+    hub = hubs.get_hub()
+    timers = len(getattr(hub, 'timers', ())) + len(getattr(hub, 'next_timers', ()))
+    listeners = getattr(hub, 'listeners', {})
+    return [
+        ('eventlet_hub_timers', 'gauge', 'Timers scheduled on the eventlet hub (sleeping greenlets)',
+         [({}, timers)]),
+        ('eventlet_hub_listeners', 'gauge', 'File descriptors the eventlet hub is waiting on',
+         [({'mode': 'read'}, len(listeners.get(READ, ()))), ({'mode': 'write'}, len(listeners.get(WRITE, ())))]),
+    ]
+
+
+def _start_lag_monitor(socketio, interval: float) -> None:
+    def monitor():
+        while True:
+            started = time.monotonic()
+            socketio.sleep(interval)
+            loop_lag.observe(max(0.0, time.monotonic() - started - interval))
+
+    socketio.start_background_task(monitor)
+
+
+# ---------------------------------------------------------------- component stats
+
+
+def _component_collector(app) -> Collector:
+    def collect():
+        families = []
+        cache = app.config.get('CACHE')
+        if cache is not None and hasattr(cache, 'stats'):
+            stats = cache.stats()
+            families.append(('cache_lookups_total', 'counter', 'Cache lookups by result', [
+                ({'result': 'l1_hit'}, stats['l1_hits']),
+                ({'result': 'l2_hit'}, stats['l2_hits']),
+                ({'result': 'miss'}, stats['misses']),
+            ]))
+            families.append(('cache_hit_ratio', 'gauge', 'Cache hits over lookups since start',
+                             [({}, stats['hit_ratio'])]))
+            families.append(('cache_errors_total', 'counter', 'Redis cache errors', [({}, stats['errors'])]))
+
+        limiter = app.config.get('RATE_LIMITER')
+        if limiter is not None and hasattr(limiter, 'stats'):
+            families.append(('rate_limit_decisions_total', 'counter', 'Rate limiter decisions', [
+                ({'result': key}, value) for key, value in limiter.stats.items()
+            ]))
+
+        vote_buffer = app.config.get('VOTE_BUFFER')
+        if vote_buffer is not None and hasattr(vote_buffer, 'stats'):
+            families.append(('vote_buffer_events_total', 'counter', 'Vote buffer activity', [
+                ({'kind': key}, value) for key, value in vote_buffer.stats.items()
+            ]))
+
+        room_buffer = app.config.get('ROOM_BUFFER')
+        if room_buffer is not None:
+            families.append(('room_buffer_events_total', 'counter', 'Room message buffer activity', [
+                ({'kind': key}, value) for key, value in room_buffer.stats.items()
+            ]))
+
+        scheduler = app.config.get('SCHEDULER')
+        if scheduler is not None:
+            runs, failures, durations = [], [], []
+            for name, stats in scheduler.stats.items():
+                runs.append(({'job': name}, stats['runs']))
+                failures.append(({'job': name}, stats['failures']))
+                if stats['last_duration_ms'] is not None:
+                    durations.append(({'job': name}, stats['last_duration_ms'] / 1000))
+            families.append(('scheduler_job_runs_total', 'counter', 'Scheduled job runs on this process', runs))
+            families.append(('scheduler_job_failures_total', 'counter', 'Scheduled job failures', failures))
+            families.append(('scheduler_job_last_duration_seconds', 'gauge', 'Duration of the last run',
+                             durations))
+            families.append(('scheduler_is_leader', 'gauge', 'Whether this process runs cluster-wide jobs',
+                             [({}, 1 if scheduler.is_leader else 0)]))
+
+        from utils.structured_logging import get_logging_state
+        queue = get_logging_state().get('queue')
+        if queue:
+            families.append(('log_queue_size', 'gauge', 'Log records waiting for the writer',
+                             [({}, queue['size'])]))
+            families.append(('log_records_dropped_total', 'counter', 'Log records dropped on a full queue',
+                             [({}, queue['dropped'])]))
+        return families
+    return collect
+
+
+def init_metrics(app, socketio) -> Optional[MetricsRegistry]:
+    """Instrument Flask requests, start the loop lag monitor and register the stats collectors."""
+    if not app.config.get('METRICS_ENABLED', True):
+        return None
+
+    _instrument_flask(app)
+    registry.register_collector(_component_collector(app))
+    server = getattr(socketio, 'server', None)
+    if server is not None and server.async_mode == 'eventlet':
+        registry.register_collector(_hub_collector)
+        _start_lag_monitor(socketio, app.config.get('METRICS_LOOP_LAG_INTERVAL_SECONDS', 1.0))
+    app.config['METRICS'] = registry
+    return registry
+
+
+def get_metrics() -> Optional[MetricsRegistry]:
+    """Get the current app's metrics registry (None outside app context or when disabled)."""
+    try:
+        from flask import current_app
+        return current_app.config.get('METRICS')
+    except RuntimeError:
+        return None
@@ -0,0 +1,323 @@
+"""
+Moderation queue: asynchronous enrichment of reports into snapshots.
+
+`Report.create_report` only inserts the report (flagged `snapshot_pending`)
+and enqueues its id. A background loop drains the queue in batches and
+stores on each report a denormalised `snapshot` of its evidence:
+
+  - content: the reported message, private message, post, comment or chat
+    room as it was when reported (kept even if the original is deleted)
+  - author_id / anonymous_name: who wrote the content, under which alias
+  - attached_messages: the attached messages, including the message
+    history between reporter and reported user when it was requested (that
+    query moved here from the request path)
+
+A batch costs one query per content collection plus one for all attached
+messages, whatever the number of reports. Listings then read reports with
+one indexed query and hydrate only user names and ban flags, which change
+after the report, with one batched `users` query (`Report.hydrate_reports`).
+
+The queue is per process: reports enqueued by a worker that stops before
+its next batch, and reports from before snapshots existed, are picked up by
+the `enrich_pending_reports` scheduler job and by listings, which build
+missing snapshots for the page they return.
+"""
+import atexit
+import logging
+import threading
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from utils.json_provider import to_jsonable
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_VERSION = 1
+
+# content_type -> collection holding the reported content
+CONTENT_COLLECTIONS = {
+    'message': 'messages',
+    'private_message': 'private_messages',
+    'post': 'posts',
+    'comment': 'comments',
+    'chatroom': 'chat_rooms',
+    'chatroom_background': 'chat_rooms',
+    'chatroom_picture': 'chat_rooms',
+}
+
+# Fields that hold the author of each kind of content
+AUTHOR_FIELDS = {
+    'messages': 'user_id',
+    'private_messages': 'from_user_id',
+    'posts': 'user_id',
+    'comments': 'user_id',
+}
+
+# Image payloads are not evidence and would bloat every report
+CHAT_ROOM_PROJECTION = {'background_picture': 0, 'picture': 0}
+
+
+def build_snapshots(db, reports: Iterable[Dict[str, Any]]) -> Dict[ObjectId, Dict[str, Any]]:
+    """
+    Build snapshots for a batch of raw report documents.
+
+    Args:
+        db: Database handle
+        reports: Report documents (ObjectId fields, as stored)
+
+    Returns:
+        {report _id: {'snapshot': ..., 'attached_messages': [ObjectId, ...]}}
+    """
+    from models.report import Report
+
+    reports = list(reports)
+    report_model = Report(db)
+
+    # Resolve requested message histories first: they add attached messages
+    attached: Dict[ObjectId, List[ObjectId]] = {}
+    for report in reports:
+        ids = [ObjectId(str(message_id)) for message_id in report.get('attached_messages') or []]
+        history = report.get('history_request')
+        if history and report.get('reported_user_id'):
+            ids.extend(ObjectId(message_id) for message_id in report_model._get_message_history(
+                str(report['reported_by']), str(report['reported_user_id']), history.get('chat_room_id')))
+        attached[report['_id']] = list(dict.fromkeys(ids))
+
+    # One query per content collection
+    wanted: Dict[str, set] = {}
+    for report in reports:
+        collection = CONTENT_COLLECTIONS.get(report.get('content_type'))
+        if collection and report.get('reported_content_id'):
+            wanted.setdefault(collection, set()).add(ObjectId(str(report['reported_content_id'])))
+    contents: Dict[str, Dict[ObjectId, Dict[str, Any]]] = {}
+    for collection, ids in wanted.items():
+        projection = CHAT_ROOM_PROJECTION if collection == 'chat_rooms' else None
+        contents[collection] = {doc['_id']: doc for doc in db[collection].find({'_id': {'$in': list(ids)}}, projection)}
+
+    # One query for every attached message of the batch
+    message_ids = {message_id for ids in attached.values() for message_id in ids}
+    messages = {doc['_id']: doc for doc in db.messages.find({'_id': {'$in': list(message_ids)}})} if message_ids else {}
+
+    now = datetime.utcnow()
+    results = {}
+    for report in reports:
+        collection = CONTENT_COLLECTIONS.get(report.get('content_type'))
+        content = None
+        if collection and report.get('reported_content_id'):
+            content = contents.get(collection, {}).get(ObjectId(str(report['reported_content_id'])))
+
+        author_id = content.get(AUTHOR_FIELDS[collection]) if content and collection in AUTHOR_FIELDS else None
+        anonymous_name = None
+        if content and (content.get('is_anonymous') or content.get('anonymous_identity')):
+            anonymous_name = content.get('display_name') or content.get('anonymous_identity')
+
+        attached_docs = [messages[message_id] for message_id in attached[report['_id']] if message_id in messages]
+        attached_docs.sort(key=lambda doc: doc['_id'])
+
+        results[report['_id']] = {
+            'snapshot': {
+                'version': SNAPSHOT_VERSION,
+                'built_at': now,
+                'content': to_jsonable(content) if content else None,
+                'content_missing': bool(report.get('reported_content_id')) and content is None,
+                'author_id': str(author_id) if author_id else None,
+                'anonymous_name': anonymous_name,
+                'attached_messages': to_jsonable(attached_docs),
+            },
+            'attached_messages': attached[report['_id']],
+        }
+    return results
+
+
+def store_snapshots(db, built: Dict[ObjectId, Dict[str, Any]]) -> int:
+    """
+    Store snapshots from build_snapshots in one bulk write.
+
+    Returns:
+        Number of reports updated
+    """
+    if not built:
+        return 0
+    operations = [
+        UpdateOne(
+            {'_id': report_id},
+            {
+                '$set': {
+                    'snapshot': result['snapshot'],
+                    'attached_messages': result['attached_messages'],
+                    'snapshot_pending': False
+                },
+                '$unset': {'history_request': ''}
+            }
+        )
+        for report_id, result in built.items()
+    ]
+    db.reports.bulk_write(operations, ordered=False)
+    return len(operations)
+
+
+def enrich_reports(db, report_ids: Iterable[Any]) -> int:
+    """
+    Build and store snapshots for reports (idempotent).
+
+    Args:
+        db: Database handle
+        report_ids: Report IDs (strings or ObjectIds)
+
+    Returns:
+        Number of reports updated
+    """
+    ids = [ObjectId(str(report_id)) for report_id in report_ids]
+    if not ids:
+        return 0
+    reports = list(db.reports.find({'_id': {'$in': ids}}))
+    return store_snapshots(db, build_snapshots(db, reports))
+
+
+def enrich_pending_reports(db, batch_size: int = 100, grace_seconds: int = 30) -> int:
+    """
+    Enrich reports still flagged snapshot_pending (scheduler job).
+
+    Reports younger than grace_seconds are left to the queue of the worker
+    that created them.
+
+    Returns:
+        Number of reports enriched
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=grace_seconds)
+    total = 0
+    while True:
+        ids = [doc['_id'] for doc in db.reports.find(
+            {'snapshot_pending': True, 'created_at': {'$lt': cutoff}}, {'_id': 1}
+        ).limit(batch_size)]
+        if not ids:
+            return total
+        total += enrich_reports(db, ids)
+        if len(ids) < batch_size:
+            return total
+
+
+class ModerationQueue:
+    """In-process queue of reports to enrich, drained by a background loop."""
+
+    def __init__(self, app, socketio=None, cache_invalidator=None, batch_size: int = 50,
+                 interval: float = 1.0):
+        """
+        Initialize the queue.
+
+        Args:
+            app: Flask app (its db is resolved at run time)
+            socketio: Socket.IO server providing the background task
+            cache_invalidator: CacheInvalidator, to drop cached report lists after a batch
+            batch_size: Most reports enriched per batch
+            interval: Seconds between batches
+        """
+        self.app = app
+        self.socketio = socketio
+        self.cache_invalidator = cache_invalidator
+        self.batch_size = batch_size
+        self.interval = interval
+
+        self._pending: deque = deque()
+        self._lock = threading.Lock()
+        self._running = False
+        self.stats = {'enqueued': 0, 'enriched': 0, 'batches': 0, 'errors': 0}
+
+    def enqueue(self, report_id: str) -> None:
+        """Queue a new report for enrichment."""
+        with self._lock:
+            self._pending.append(report_id)
+        self.stats['enqueued'] += 1
+
+    def process(self) -> int:
+        """Enrich everything queued, in batches; returns the number of reports enriched."""
+        enriched = 0
+        while True:
+            with self._lock:
+                batch = [self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))]
+            if not batch:
+                break
+            try:
+                enriched += enrich_reports(self.app.db, batch)
+                self.stats['batches'] += 1
+            except Exception as e:
+                # The reports stay snapshot_pending; the scheduler job retries them
+                self.stats['errors'] += 1
+                logger.error(f"Report enrichment failed for {len(batch)} reports: {e}")
+
+        if enriched:
+            self.stats['enriched'] += enriched
+            if self.cache_invalidator:
+                try:
+                    self.cache_invalidator.invalidate_admin_reports()
+                except Exception as e:
+                    logger.error(f"Cache invalidation failed: {e}")
+        return enriched
+
+    def start(self) -> None:
+        """Start the background loop and register the shutdown drain."""
+        if self._running:
+            return
+        self._running = True
+
+        def _run():
+            while self._running:
+                self.socketio.sleep(self.interval)
+                try:
+                    self.process()
+                except Exception as e:
+                    logger.error(f"Moderation queue loop error: {e}")
+
+        self.socketio.start_background_task(_run)
+        atexit.register(self.stop)
+        logger.info(f"Moderation queue started (batch: {self.batch_size}, interval: {self.interval}s)")
+
+    def stop(self) -> None:
+        """Stop the loop and enrich what is still queued."""
+        self._running = False
+        try:
+            self.process()
+        except Exception as e:
+            logger.error(f"Moderation queue final drain failed: {e}")
+
+
+def init_moderation_queue(app, socketio) -> Optional[ModerationQueue]:
+    """Create and start the app's moderation queue according to config."""
+    if not app.config.get('MODERATION_QUEUE_ENABLED', True):
+        return None
+
+    queue = ModerationQueue(
+        app,
+        socketio=socketio,
+        cache_invalidator=app.config.get('CACHE_INVALIDATOR'),
+        batch_size=app.config.get('MODERATION_QUEUE_BATCH_SIZE', 50),
+        interval=app.config.get('MODERATION_QUEUE_INTERVAL_MS', 1000) / 1000.0
+    )
+    queue.start()
+    app.config['MODERATION_QUEUE'] = queue
+    return queue
+
+
+def get_moderation_queue() -> Optional[ModerationQueue]:
+    """Get the current app's moderation queue (None outside app context or when disabled)."""
+    try:
+        from flask import current_app
+        return current_app.config.get('MODERATION_QUEUE')
+    except RuntimeError:
+        return None
+
+
+def enqueue_report(db, report_id: str) -> None:
+    """Queue a report for enrichment, or enrich it right away without a queue."""
+    queue = get_moderation_queue()
+    if queue:
+        queue.enqueue(report_id)
+        return
+    try:
+        enrich_reports(db, [report_id])
+    except Exception as e:
+        logger.error(f"Report enrichment failed for {report_id}: {e}")
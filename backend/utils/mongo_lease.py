@@ -0,0 +1,75 @@
+"""
+Lease-based distributed lock stored in MongoDB.
+
+A lease is one document in the `locks` collection holding its owner and an
+expiry. Acquiring is a single conditional upsert: it matches when the lease
+is free, expired, or already ours; otherwise the upsert collides on `_id`
+and fails with DuplicateKeyError. A holder that dies simply lets the lease
+expire. Works on MongoDB and Cosmos DB alike and needs no Redis.
+"""
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional
+
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+
+class MongoLease:
+    """A named, expiring lock held by one process at a time."""
+
+    def __init__(self, db, name: str, ttl: int = 60, owner: Optional[str] = None):
+        """
+        Args:
+            db: Database handle
+            name: Lease name (document _id)
+            ttl: Seconds the lease stays valid without renewal
+            owner: Owner identity (defaults to host:pid:random)
+        """
+        self.collection = db.locks
+        self.name = name
+        self.ttl = ttl
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+    def acquire(self) -> bool:
+        """Take (or renew) the lease. Returns True if this process now holds it."""
+        now = datetime.utcnow()
+        try:
+            self.collection.update_one(
+                {
+                    '_id': self.name,
+                    '$or': [{'expires_at': {'$lt': now}}, {'owner': self.owner}]
+                },
+                {
+                    '$set': {
+                        'owner': self.owner,
+                        'expires_at': now + timedelta(seconds=self.ttl),
+                        'renewed_at': now
+                    }
+                },
+                upsert=True
+            )
+            return True
+        except DuplicateKeyError:
+            # Held by someone else and not expired
+            return False
+
+    def renew(self) -> bool:
+        """Extend a lease we hold. Returns False if it was lost meanwhile."""
+        return self.acquire()
+
+    def release(self) -> None:
+        """Give the lease up (no-op if it already expired and was taken over)."""
+        try:
+            self.collection.delete_one({'_id': self.name, 'owner': self.owner})
+        except Exception as e:
+            logger.warning(f"Failed to release lease {self.name}: {e}")
+
+    def holder(self) -> Optional[str]:
+        """Current owner of a valid lease, or None."""
+        doc = self.collection.find_one({'_id': self.name, 'expires_at': {'$gte': datetime.utcnow()}})
+        return doc.get('owner') if doc else None
@@ -0,0 +1,195 @@
+"""
+Rate limiting for HTTP routes and Socket.IO events.
+
+Limits are enforced with GCRA (generic cell rate algorithm), a smooth
+sliding-window equivalent that needs a single timestamp per key. With Redis
+the check-and-update runs as one Lua script, so concurrent requests from any
+worker can't race past the limit, and the clock is Redis' own (TIME) so
+worker clock skew doesn't matter. Redis calls use the app's shared client
+(one connection pool per process) behind a circuit breaker.
+
+Without Redis, or while the breaker is open, a bounded in-process token
+bucket store (LRU over keys) takes over.
+
+Limits and exemptions come from config/rate_limits.py.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional, Tuple
+
+from utils.redis_cache import CircuitBreaker
+
+logger = logging.getLogger(__name__)
+
+PERIODS = {
+    'second': 1,
+    'minute': 60,
+    'hour': 3600,
+    'day': 86400,
+}
+
+KEY_PREFIX = 'ratelimit:'
+
+# KEYS[1] = key; ARGV[1] = emission interval (ms), ARGV[2] = burst (the limit count)
+# Returns {allowed, remaining, retry_after_ms}
+GCRA_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local interval = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+
+local tat = tonumber(redis.call('GET', KEYS[1]) or now)
+if tat < now then
+    tat = now
+end
+
+local allow_at = tat - (burst - 1) * interval
+if now < allow_at then
+    return {0, 0, allow_at - now}
+end
+
+local new_tat = tat + interval
+redis.call('SET', KEYS[1], new_tat, 'PX', math.ceil(new_tat - now))
+return {1, math.floor((now - (new_tat - burst * interval)) / interval), 0}
+"""
+
+
+class RateLimitResult(NamedTuple):
+    allowed: bool
+    limit: int
+    remaining: int
+    retry_after: float  # seconds
+
+
+def parse_limit(limit: str) -> Optional[Tuple[int, int]]:
+    """
+    Parse a 'count/period' limit string.
+
+    Returns:
+        (count, window_seconds), or None if the format is invalid
+    """
+    try:
+        count, period = limit.split('/')
+        count = int(count)
+        period = period.strip().lower().rstrip('s')
+    except (ValueError, AttributeError):
+        return None
+    if count <= 0 or period not in PERIODS:
+        return None
+    return count, PERIODS[period]
+
+
+class TokenBucketStore:
+    """Bounded in-process token buckets (least recently used keys are evicted)."""
+
+    def __init__(self, max_keys: int = 10000):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, key: str, count: int, window: int) -> RateLimitResult:
+        rate = count / window  # tokens per second
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (float(count), now))
+            tokens = min(float(count), tokens + (now - updated) * rate)
+            allowed = tokens >= 1.0
+            if allowed:
+                tokens -= 1.0
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+
+        retry_after = 0.0 if allowed else (1.0 - tokens) / rate
+        return RateLimitResult(allowed, count, int(tokens), retry_after)
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class RateLimiter:
+    """Atomic GCRA limiter on Redis with an in-process token bucket fallback."""
+
+    def __init__(self, redis_client=None, max_local_keys: int = 10000,
+                 breaker_threshold: int = 3, breaker_max_backoff: float = 30.0):
+        """
+        Initialize the limiter.
+
+        Args:
+            redis_client: Shared Redis client (None = in-process limiting only)
+            max_local_keys: Capacity of the in-process fallback store
+            breaker_threshold: Consecutive Redis failures before falling back
+            breaker_max_backoff: Cap on the fallback interval in seconds
+        """
+        self.redis = redis_client
+        self.local = TokenBucketStore(max_local_keys)
+        self.breaker = CircuitBreaker(breaker_threshold, 1.0, breaker_max_backoff)
+        self._script = redis_client.register_script(GCRA_SCRIPT) if redis_client else None
+        self.stats = {'allowed': 0, 'limited': 0, 'redis_errors': 0, 'local_checks': 0}
+
+    @property
+    def backend(self) -> str:
+        return 'redis' if self.redis else 'memory'
+
+    def hit(self, key: str, limit: str) -> Optional[RateLimitResult]:
+        """
+        Count one request against a limit.
+
+        Args:
+            key: Identity of the caller and action (e.g. 'ip:1.2.3.4:auth.login')
+            limit: Limit string such as '5/minute'
+
+        Returns:
+            RateLimitResult, or None if the limit string is invalid (not enforced)
+        """
+        parsed = parse_limit(limit)
+        if not parsed:
+            logger.error(f"Invalid rate limit format: {limit}")
+            return None
+        count, window = parsed
+
+        result = None
+        if self._script and self.breaker.allow():
+            try:
+                interval_ms = max(1, int(window * 1000 / count))
+                allowed, remaining, retry_ms = self._script(keys=[KEY_PREFIX + key], args=[interval_ms, count])
+                result = RateLimitResult(bool(allowed), count, int(remaining), int(retry_ms) / 1000.0)
+                self.breaker.record_success()
+            except Exception as e:
+                self.stats['redis_errors'] += 1
+                if self.breaker.record_failure():
+                    logger.warning(f"Redis rate limiting unavailable, using in-process limits: {e}")
+
+        if result is None:
+            self.stats['local_checks'] += 1
+            result = self.local.hit(key, count, window)
+
+        self.stats['limited' if not result.allowed else 'allowed'] += 1
+        return result
+
+
+def init_rate_limiter(app) -> RateLimiter:
+    """Create the app's rate limiter on the shared Redis client (if available)."""
+    redis_client = app.config.get('REDIS_CLIENT') if app.config.get('REDIS_AVAILABLE') else None
+    limiter = RateLimiter(
+        redis_client=redis_client,
+        max_local_keys=app.config.get('RATE_LIMIT_MAX_LOCAL_KEYS', 10000)
+    )
+    app.config['RATE_LIMITER'] = limiter
+    logger.info(f"Rate limiter initialized (backend: {limiter.backend})")
+    return limiter
+
+
+def get_rate_limiter() -> Optional[RateLimiter]:
+    """Get the current app's rate limiter, creating an in-process one if init was skipped."""
+    try:
+        from flask import current_app
+        limiter = current_app.config.get('RATE_LIMITER')
+        if limiter is None:
+            limiter = init_rate_limiter(current_app)
+        return limiter
+    except RuntimeError:
+        return None
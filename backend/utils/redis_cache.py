@@ -1,172 +1,513 @@
 """
-Redis cache utility with automatic fallback to database queries when Redis is unavailable.
+Two-tier cache: a bounded in-process LRU/TTL tier (L1) in front of Redis (L2).
+
+Redis calls go through a circuit breaker: after repeated failures the breaker
+opens and the cache serves from L1 only; once a jittered backoff elapses a
+single half-open probe decides whether Redis is back. Invalidations issued
+while the breaker is open are replayed against Redis when it closes, so no
+stale L2 entries survive an outage.
+
+Concurrent misses for the same key are coalesced (single-flight) so only one
+caller recomputes the value; across workers, a short-lived Redis lock
+(acquire_lock/release_lock) plays the same role. Entries can carry a logical
+expiry earlier than their physical TTL so callers may serve them stale while
+one of them refreshes (see cache_result). Both tiers hold values in the binary format of
+utils.cache_codec.
 """
-import json
+import fnmatch
 import logging
-import hashlib
-from typing import Any, Optional
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Dict, NamedTuple, Optional, Tuple
 import redis
 
+from utils.cache_codec import CacheCodec
+
 logger = logging.getLogger(__name__)
 
+# Delete a lock only if it still holds our token (it may have expired and been re-acquired)
+RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+LOCK_PREFIX = 'lock:'
+
+
+class CacheEntry(NamedTuple):
+    """A cached value with its logical expiry (None = no metadata stored)."""
+    value: Any
+    expires_at: Optional[float] = None
+    delta: float = 0.0
+
+    def is_stale(self, now: Optional[float] = None) -> bool:
+        return self.expires_at is not None and (now or time.time()) >= self.expires_at
+
+
+class LocalCache:
+    """Bounded, thread-safe LRU cache with per-entry TTL (stores encoded values)."""
+
+    def __init__(self, max_entries: int = 2000, max_ttl: int = 5):
+        """
+        Args:
+            max_entries: Maximum number of entries before the least recently used is evicted
+            max_ttl: Upper bound on an entry's lifetime in seconds; keeps other workers'
+                     invalidations from being missed for longer than this
+        """
+        self.max_entries = max_entries
+        self.max_ttl = max_ttl
+        self._data: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes, ttl: int) -> None:
+        ttl = min(ttl, self.max_ttl)
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key: str) -> bool:
+        with self._lock:
+            return self._data.pop(key, None) is not None
+
+    def delete_pattern(self, pattern: str) -> int:
+        with self._lock:
+            keys = [k for k in self._data if fnmatch.fnmatchcase(k, pattern)]
+            for k in keys:
+                del self._data[k]
+            return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class CircuitBreaker:
+    """Closed -> open after consecutive failures -> half-open probe after a jittered backoff."""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = 3, base_backoff: float = 1.0, max_backoff: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.state = self.CLOSED
+        self.opens = 0
+        self._failures = 0
+        self._trips = 0
+        self._open_until = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Whether a Redis call may be attempted now (admits one probe when half-open)."""
+        if self.state == self.CLOSED:
+            return True
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() >= self._open_until:
+                self.state = self.HALF_OPEN
+                return True
+            return False
+
+    def record_success(self) -> bool:
+        """Record a successful call. Returns True if this closed the breaker."""
+        if self.state == self.CLOSED and self._failures == 0:
+            return False
+        with self._lock:
+            recovered = self.state != self.CLOSED
+            self.state = self.CLOSED
+            self._failures = 0
+            self._trips = 0
+            return recovered
+
+    def record_failure(self) -> bool:
+        """Record a failed call. Returns True if this opened the breaker."""
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._trip()
+                return True
+            return False
+
+    def force_open(self) -> None:
+        with self._lock:
+            self._trip()
+
+    def _trip(self) -> None:
+        backoff = min(self.base_backoff * (2 ** self._trips), self.max_backoff)
+        # Jitter so workers don't probe a recovering Redis in lockstep
+        self._open_until = time.monotonic() + backoff * random.uniform(0.5, 1.5)
+        self._trips += 1
+        self.opens += 1
+        self.state = self.OPEN
+
+
+class SingleFlight:
+    """Coalesces concurrent computations of the same key into one call."""
+
+    def __init__(self):
+        self._calls: Dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: str, fn: Callable[[], Any], timeout: float = 10.0) -> Tuple[Any, bool]:
+        """
+        Run fn unless another caller is already running it for this key.
+
+        Returns:
+            (result, True) for the caller that ran fn, (None, False) for callers that
+            waited; those should re-read the cache the leader just filled
+        """
+        with self._lock:
+            event = self._calls.get(key)
+            leader = event is None
+            if leader:
+                event = threading.Event()
+                self._calls[key] = event
+
+        if not leader:
+            event.wait(timeout)
+            return None, False
+
+        try:
+            return fn(), True
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            event.set()
+
 
 class RedisCache:
-    """Redis cache wrapper with graceful fallback when Redis is unavailable."""
-    
-    def __init__(self, redis_client: Optional[redis.Redis] = None, available: bool = False):
+    """Two-tier cache wrapper with graceful fallback when Redis is unavailable."""
+
+    # Invalidations remembered while Redis is down, replayed on recovery
+    MAX_PENDING_INVALIDATIONS = 1000
+
+    def __init__(self, redis_client: Optional[redis.Redis] = None, available: bool = False,
+                 l1_enabled: bool = True, l1_max_entries: int = 2000, l1_ttl: int = 5,
+                 breaker_threshold: int = 3, breaker_base_backoff: float = 1.0,
+                 breaker_max_backoff: float = 30.0, codec: Optional[CacheCodec] = None):
         """
-        Initialize Redis cache.
-        
+        Initialize the cache.
+
         Args:
             redis_client: Redis client instance (None if Redis unavailable)
             available: Whether Redis is currently available
+            l1_enabled: Keep a small in-process tier in front of Redis
+            l1_max_entries: L1 capacity
+            l1_ttl: Maximum L1 entry lifetime in seconds
+            breaker_threshold: Consecutive Redis failures before the breaker opens
+            breaker_base_backoff: First open interval in seconds (doubles per trip)
+            breaker_max_backoff: Cap on the open interval in seconds
+            codec: Value serializer (defaults to JSON with automatic compression)
         """
         self.client = redis_client
-        self._available = available
+        self.codec = codec or CacheCodec()
+        self.local = LocalCache(l1_max_entries, l1_ttl) if l1_enabled else None
+        self.breaker = CircuitBreaker(breaker_threshold, breaker_base_backoff, breaker_max_backoff)
+        self.single_flight_group = SingleFlight()
         self._last_error = None
-    
+        self._pending_invalidations: "OrderedDict[Tuple[str, str], None]" = OrderedDict()
+        self._pending_lock = threading.Lock()
+        self._recoveries = 0
+        self._counters = {
+            'l1_hits': 0, 'l2_hits': 0, 'misses': 0, 'sets': 0, 'errors': 0,
+            'coalesced': 0, 'l2_calls': 0, 'l2_time_ms': 0.0, 'l2_max_ms': 0.0,
+            'bytes_written': 0, 'bytes_read': 0,
+        }
+        if not available:
+            self.breaker.force_open()
+
     def is_available(self) -> bool:
-        """Check if Redis is currently available."""
-        if not self.client:
-            return False
-            
-        # Trust the available flag - do not ping on every check
-        # This prevents overwhelming the connection
-        return self._available
-    
+        """Check if the cache can be used at all (L1 is always usable when enabled)."""
+        return self.local is not None or self.redis_available()
+
+    def redis_available(self) -> bool:
+        """Check if Redis (L2) may be called right now, without pinging it."""
+        return self.client is not None and self.breaker.allow()
+
+    def _call(self, operation: str, fn: Callable[[], Any]) -> Tuple[bool, Any]:
+        """Run a Redis call through the breaker, recording latency. Returns (ok, result)."""
+        if not self.redis_available():
+            return False, None
+        start = time.perf_counter()
+        try:
+            result = fn()
+        except Exception as e:
+            self._handle_error(operation, e)
+            return False, None
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            self._counters['l2_calls'] += 1
+            self._counters['l2_time_ms'] += elapsed_ms
+            if elapsed_ms > self._counters['l2_max_ms']:
+                self._counters['l2_max_ms'] = elapsed_ms
+        if self.breaker.record_success():
+            logger.info("Redis connection restored. Resuming cache operations.")
+            self._recoveries += 1
+            self._replay_invalidations()
+        return True, result
+
     def _handle_error(self, operation: str, error: Exception):
         """Handle Redis errors gracefully."""
-        self._available = False
         self._last_error = error
-        logger.error(f"Redis cache {operation} failed. Querying database directly. Error: {error}")
-    
-    def get(self, key: str) -> Optional[Any]:
+        self._counters['errors'] += 1
+        if self.breaker.record_failure():
+            logger.error(f"Redis cache {operation} failed; serving from local cache until Redis recovers. Error: {error}")
+        else:
+            logger.warning(f"Redis cache {operation} failed: {error}")
+
+    def get(self, key: str, as_json_bytes: bool = False) -> Optional[Any]:
+        """
+        Get cached value (L1 first, then Redis).
+
+        Args:
+            key: Cache key
+            as_json_bytes: Return the stored JSON document as bytes instead of decoding
+                           it (only for JSON-format payloads; others are decoded as usual)
+        """
+        entry = self.get_entry(key, as_json_bytes)
+        return entry.value if entry else None
+
+    def get_entry(self, key: str, as_json_bytes: bool = False) -> Optional[CacheEntry]:
         """
-        Get cached value.
+        Get cached value together with its logical expiry (see set(stale_ttl=...)).
+
+        Returns:
+            CacheEntry, or None on a miss
         """
-        if not self.is_available():
-            print(f"[REDIS DEBUG] SKIP GET {key} (Redis unavailable)")
+        data = self._get_encoded(key)
+        if data is None:
             return None
-        
         try:
-            print(f"[REDIS DEBUG] GET {key}")
-            value = self.client.get(key)
+            meta = self.codec.read_meta(data)
+            value = None
+            if as_json_bytes:
+                value = self.codec.json_bytes(data)
             if value is None:
-                print(f"[REDIS DEBUG] GET {key} -> MISS")
-                return None
-            
-            # Deserialize JSON
-            if isinstance(value, bytes):
-                value = value.decode('utf-8')
-            
-            print(f"[REDIS DEBUG] GET {key} -> HIT")
-            return json.loads(value)
-        except json.JSONDecodeError as e:
+                value = self.codec.decode(data)
+        except Exception as e:
             logger.warning(f"Failed to deserialize cache value for key {key}: {e}")
             return None
-        except Exception as e:
-            self._handle_error("get", e)
+        if meta:
+            return CacheEntry(value, meta[0], meta[1])
+        return CacheEntry(value)
+
+    def _get_encoded(self, key: str) -> Optional[bytes]:
+        """Encoded value from L1 or Redis (filling L1 on a Redis hit)."""
+        if self.local is not None:
+            value = self.local.get(key)
+            if value is not None:
+                self._counters['l1_hits'] += 1
+                return value
+
+        recoveries = self._recoveries
+        ok, value = self._call('get', lambda: self.client.get(key))
+        if ok and recoveries != self._recoveries:
+            # This call was the recovery probe: invalidations missed during the outage
+            # were just replayed, so the value read before them may be stale
+            ok, value = self._call('get', lambda: self.client.get(key))
+        if not ok or value is None:
+            self._counters['misses'] += 1
             return None
-    
-    def set(self, key: str, value: Any, ttl: int = 300) -> bool:
+
+        self._counters['l2_hits'] += 1
+        self._counters['bytes_read'] += len(value)
+        if self.local is not None:
+            # Remaining Redis TTL is unknown here; L1's own cap bounds staleness
+            self.local.set(key, value, self.local.max_ttl)
+        return value
+
+    def set(self, key: str, value: Any, ttl: int = 300, stale_ttl: int = 0,
+            delta: Optional[float] = None) -> bool:
         """
-        Set cached value with TTL.
+        Set cached value with TTL in both tiers.
+
+        Args:
+            key: Cache key
+            value: JSON-compatible value
+            ttl: Seconds until the value is considered expired
+            stale_ttl: Extra seconds the expired value is kept so it can be served stale
+            delta: Seconds it took to compute the value (stored for early refresh)
         """
-        if not self.is_available():
-            print(f"[REDIS DEBUG] SKIP SET {key} (Redis unavailable)")
-            return False
-        
         try:
-            print(f"[REDIS DEBUG] SET {key} TTL={ttl}")
-            # Serialize to JSON
-            serialized = json.dumps(value, default=str)  # default=str handles datetime, ObjectId, etc.
-            self.client.setex(key, ttl, serialized)
-            return True
+            if stale_ttl or delta is not None:
+                encoded = self.codec.encode(value, expires_at=time.time() + ttl, delta=delta or 0.0)
+                ttl += stale_ttl
+            else:
+                encoded = self.codec.encode(value)
         except (TypeError, ValueError) as e:
             logger.warning(f"Failed to serialize cache value for key {key}: {e}")
             return False
-        except Exception as e:
-            self._handle_error("set", e)
-            return False
-    
+
+        self._counters['sets'] += 1
+        self._counters['bytes_written'] += len(encoded)
+        if self.local is not None:
+            self.local.set(key, encoded, ttl)
+        ok, _ = self._call('set', lambda: self.client.setex(key, ttl, encoded))
+        return ok or self.local is not None
+
     def delete(self, key: str) -> bool:
         """
         Delete single cache key.
         """
-        if not self.is_available():
-            return False
-        
-        try:
-            print(f"[REDIS DEBUG] DELETE {key}")
-            self.client.delete(key)
-            return True
-        except Exception as e:
-            self._handle_error("delete", e)
-            return False
-    
+        deleted = self.local.delete(key) if self.local is not None else False
+        ok, _ = self._call('delete', lambda: self.client.delete(key))
+        if not ok:
+            self._remember_invalidation('key', key)
+        return ok or deleted
+
     def delete_pattern(self, pattern: str) -> int:
         """
         Delete all keys matching pattern.
         """
-        if not self.is_available():
-            return 0
-        
-        try:
-            print(f"[REDIS DEBUG] DELETE_PATTERN {pattern}")
+        deleted = self.local.delete_pattern(pattern) if self.local is not None else 0
+
+        def _scan_delete():
             # Use SCAN to find all matching keys (more efficient than KEYS)
-            deleted = 0
+            count = 0
             cursor = 0
             while True:
                 cursor, keys = self.client.scan(cursor, match=pattern, count=100)
                 if keys:
-                    deleted += self.client.delete(*keys)
+                    count += self.client.delete(*keys)
                 if cursor == 0:
                     break
-            print(f"[REDIS DEBUG] DELETE_PATTERN {pattern} -> Deleted {deleted} keys")
+            return count
+
+        ok, redis_deleted = self._call('delete_pattern', _scan_delete)
+        if not ok:
+            self._remember_invalidation('pattern', pattern)
             return deleted
-        except Exception as e:
-            self._handle_error("delete_pattern", e)
-            return 0
-    
+        logger.debug(f"DELETE_PATTERN {pattern} -> deleted {redis_deleted} keys")
+        return max(deleted, redis_deleted or 0)
+
     def exists(self, key: str) -> bool:
         """
         Check if key exists in cache.
         """
-        if not self.is_available():
-            return False
-        
-        try:
-            print(f"[REDIS DEBUG] EXISTS {key}")
-            return bool(self.client.exists(key))
-        except Exception as e:
-            self._handle_error("exists", e)
-            return False
-    
+        if self.local is not None and self.local.get(key) is not None:
+            return True
+        ok, result = self._call('exists', lambda: self.client.exists(key))
+        return bool(ok and result)
+
+    def single_flight(self, key: str, fn: Callable[[], Any], timeout: float = 10.0) -> Tuple[Any, bool]:
+        """
+        Coalesce concurrent recomputations of one key.
+
+        Returns:
+            (result, True) for the caller that ran fn; (None, False) for callers that
+            waited for it and should read the freshly cached value
+        """
+        result, leader = self.single_flight_group.do(key, fn, timeout)
+        if not leader:
+            self._counters['coalesced'] += 1
+        return result, leader
+
+    def acquire_lock(self, name: str, ttl: float = 10.0) -> Optional[str]:
+        """
+        Take a cross-worker lock (SET NX PX) used to elect a single recomputer.
+
+        Without Redis every worker is on its own, so the lock is granted locally;
+        SingleFlight still serializes callers within the process.
+
+        Returns:
+            Lock token to pass to release_lock, or None if another worker holds it
+        """
+        token = uuid.uuid4().hex
+        ok, acquired = self._call(
+            'lock', lambda: self.client.set(LOCK_PREFIX + name, token, nx=True, px=max(1, int(ttl * 1000)))
+        )
+        if not ok:
+            return token
+        return token if acquired else None
+
+    def release_lock(self, name: str, token: str) -> None:
+        """Release a lock taken with acquire_lock (no-op if it expired or was taken over)."""
+        self._call('unlock', lambda: self.client.eval(RELEASE_LOCK_SCRIPT, 1, LOCK_PREFIX + name, token))
+
     def clear(self) -> bool:
         """
         Clear all cache (admin/debug only).
-        
+
         Returns:
             True if successful, False otherwise
         """
-        if not self.is_available():
-            logger.warning("Cannot clear cache: Redis unavailable")
-            return False
-        
-        try:
-            self.client.flushdb()
+        if self.local is not None:
+            self.local.clear()
+        ok, _ = self._call('clear', lambda: self.client.flushdb())
+        if ok:
             logger.warning("Cache cleared (all keys deleted)")
-            return True
-        except Exception as e:
-            self._handle_error("clear", e)
-            return False
-    
+        else:
+            logger.warning("Cannot clear Redis cache: Redis unavailable")
+        return ok
+
     def update_availability(self, available: bool):
         """Update Redis availability status (called when connection status changes)."""
-        if available != self._available:
-            if available:
-                logger.info("Redis connection restored. Resuming cache operations.")
-            else:
-                logger.error("Redis connection lost. Falling back to direct database queries.")
-            self._available = available
+        if available and self.breaker.state != CircuitBreaker.CLOSED:
+            self.breaker.record_success()
+            self._recoveries += 1
+            logger.info("Redis connection restored. Resuming cache operations.")
+            self._replay_invalidations()
+        elif not available and self.breaker.state == CircuitBreaker.CLOSED:
+            self.breaker.force_open()
+            logger.error("Redis connection lost. Serving from local cache until Redis recovers.")
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss/latency counters and breaker state."""
+        counters = dict(self._counters)
+        lookups = counters['l1_hits'] + counters['l2_hits'] + counters['misses']
+        counters['hit_ratio'] = round((counters['l1_hits'] + counters['l2_hits']) / lookups, 4) if lookups else 0.0
+        counters['l2_avg_ms'] = round(counters['l2_time_ms'] / counters['l2_calls'], 3) if counters['l2_calls'] else 0.0
+        counters['l2_time_ms'] = round(counters['l2_time_ms'], 3)
+        counters['l2_max_ms'] = round(counters['l2_max_ms'], 3)
+        counters['l1_entries'] = len(self.local) if self.local is not None else 0
+        counters['breaker_state'] = self.breaker.state if self.client else 'disabled'
+        counters['breaker_opens'] = self.breaker.opens
+        counters['pending_invalidations'] = len(self._pending_invalidations)
+        return counters
 
+    def _remember_invalidation(self, kind: str, value: str) -> None:
+        if not self.client:
+            return
+        with self._pending_lock:
+            self._pending_invalidations[(kind, value)] = None
+            self._pending_invalidations.move_to_end((kind, value))
+            if len(self._pending_invalidations) > self.MAX_PENDING_INVALIDATIONS:
+                self._pending_invalidations.popitem(last=False)
+                logger.warning("Too many invalidations pending while Redis is down; oldest dropped")
+
+    def _replay_invalidations(self) -> None:
+        with self._pending_lock:
+            pending = list(self._pending_invalidations)
+            self._pending_invalidations.clear()
+        if not pending:
+            return
+        logger.info(f"Replaying {len(pending)} cache invalidations missed while Redis was unavailable")
+        for kind, value in pending:
+            if kind == 'key':
+                self.delete(value)
+            else:
+                self.delete_pattern(value)
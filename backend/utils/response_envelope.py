@@ -0,0 +1,120 @@
+"""
+Compact list response envelopes.
+
+List endpoints (chat room and topic messages, topic posts, post comments)
+return items that each embed their author: display name, profile picture and
+admin/owner/moderator flags. A page from one active user repeats the same
+author data on every item.
+
+Clients opt in to the compact format with `?format=compact` or the
+`X-Response-Format: compact` header. Items then carry `author_id` instead of
+the author fields, and the response holds each author once:
+
+    {
+        "success": true,
+        "format": "compact",
+        "data": [{"id": "...", "author_id": "u1", "content": "...", ...}],
+        "users": {"u1": {"username": "...", "profile_picture": "...", "is_admin": false}},
+        "roles": {"owners": ["u1"], "moderators": []}
+    }
+
+`roles` applies to the list's container (the chat room or topic). Anonymous
+items keep `display_name` and `is_anonymous` inline, with `author_id` null.
+Without the opt-in, responses are unchanged.
+"""
+import logging
+from typing import Any, Dict, List, Optional
+
+from flask import jsonify, request
+
+logger = logging.getLogger(__name__)
+
+COMPACT = 'compact'
+FORMAT_HEADER = 'X-Response-Format'
+
+# Per-item author fields replaced by author_id + the users/roles sidecar
+AUTHOR_FIELDS = ('display_name', 'sender_username', 'author_username', 'profile_picture',
+                 'is_admin', 'is_owner', 'is_moderator')
+# Duplicated per item (`id` is kept)
+REDUNDANT_FIELDS = ('_id', 'user_id')
+
+
+def response_format() -> str:
+    """Requested list format for the current request: 'compact' or 'full'."""
+    value = request.args.get('format') or request.headers.get(FORMAT_HEADER, '')
+    return COMPACT if value.lower() == COMPACT else 'full'
+
+
+def wants_compact() -> bool:
+    """Whether the current request opted in to compact list responses."""
+    return response_format() == COMPACT
+
+
+def compact_items(items: List[Dict[str, Any]], children_key: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Move author data out of serialized list items.
+
+    Items are copied, not modified, so cached model results can be passed in.
+
+    Args:
+        items: Serialized items with the per-item author fields
+        children_key: Key of nested items to compact as well (comment `replies`)
+
+    Returns:
+        Dict with data (compacted items), users and roles
+    """
+    users: Dict[str, Dict[str, Any]] = {}
+    owners, moderators = set(), set()
+
+    def compact(item: Dict[str, Any]) -> Dict[str, Any]:
+        out = {key: value for key, value in item.items()
+               if key not in AUTHOR_FIELDS and key not in REDUNDANT_FIELDS}
+        if 'id' not in out and '_id' in item:
+            out['id'] = item['_id']
+
+        if item.get('is_anonymous'):
+            out['author_id'] = None
+            out['display_name'] = item.get('display_name')
+        else:
+            author_id = item.get('user_id')
+            out['author_id'] = author_id
+            if author_id and author_id not in users:
+                users[author_id] = {
+                    'username': item.get('sender_username') or item.get('author_username')
+                                or item.get('display_name'),
+                    'profile_picture': item.get('profile_picture'),
+                    'is_admin': item.get('is_admin', False)
+                }
+            if item.get('is_owner'):
+                owners.add(author_id)
+            if item.get('is_moderator'):
+                moderators.add(author_id)
+
+        if children_key and isinstance(item.get(children_key), list):
+            out[children_key] = [compact(child) for child in item[children_key]]
+        return out
+
+    data = [compact(item) for item in items]
+    return {
+        'data': data,
+        'users': users,
+        'roles': {'owners': sorted(owners), 'moderators': sorted(moderators)}
+    }
+
+
+def list_response(items: List[Dict[str, Any]], children_key: Optional[str] = None, **extra):
+    """
+    jsonify a list endpoint's success response in the requested format.
+
+    Args:
+        items: Serialized items (full format)
+        children_key: Nested items key, for trees (see compact_items)
+        **extra: Other top-level response keys (e.g. pagination)
+
+    Returns:
+        Flask JSON response
+    """
+    if wants_compact():
+        body = compact_items(items, children_key)
+        return jsonify({'success': True, 'format': COMPACT, **body, **extra})
+    return jsonify({'success': True, 'data': items, **extra})
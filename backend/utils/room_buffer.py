@@ -0,0 +1,282 @@
+"""
+Recent-message ring buffer per chat room / topic.
+
+The send paths append every broadcast message payload (`new_message`,
+`new_chat_room_message`) to a bounded per-room buffer, and deletions remove
+it again. The `sync_room` socket event replays from it:
+
+  - room open (no `since_message_id`): the latest messages, `complete` when
+    the buffer holds at least the requested number
+  - reconnect (`since_message_id`): every message after the last one the
+    client saw, `complete` when the buffer covers the whole gap
+
+Clients fall back to the history endpoints when a reply is not complete, so
+the buffer never has to be authoritative: it is only a fast path that skips
+MongoDB in the common case.
+
+A gap is covered when `since_message_id` is still in the buffer, or when the
+buffer has not dropped anything yet and already existed when that message was
+sent (so every later message went through it).
+
+Backends:
+    memory: per-process deques, holding the most recently active rooms.
+            Other workers' sends are not seen, so a reply from it could claim
+            a gap is complete while missing messages; it is only used with
+            ROOM_BUFFER_SINGLE_WORKER (development). Otherwise, without Redis,
+            there is no buffer and every sync falls back to history.
+    redis:  one capped Redis stream per room (XADD MAXLEN), shared by all
+            workers and replicas (default whenever Redis is available).
+            Streams expire after ROOM_BUFFER_TTL_SECONDS of inactivity.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+from utils.json_provider import dumps_bytes, loads
+
+logger = logging.getLogger(__name__)
+
+REDIS_KEY_PREFIX = 'room_buffer:'
+
+
+def _generation_time(message_id: str) -> Optional[float]:
+    try:
+        return ObjectId(message_id).generation_time.timestamp()
+    except (InvalidId, TypeError):
+        return None
+
+
+class _Ring:
+    """One room's buffer in the memory backend."""
+
+    __slots__ = ('items', 'started_at', 'evicted')
+
+    def __init__(self, size: int):
+        self.items: deque = deque(maxlen=size)
+        self.started_at = time.time()
+        self.evicted = False
+
+
+class RoomMessageBuffer:
+    """Keeps the last N broadcast payloads of each room (see module docstring)."""
+
+    def __init__(self, size: int = 100, max_rooms: int = 2000, redis_client=None, ttl: int = 86400):
+        """
+        Initialize the buffer.
+
+        Args:
+            size: Messages kept per room
+            max_rooms: Rooms kept by the memory backend (least recently active dropped first)
+            redis_client: Redis client for the shared backend (None = in-process)
+            ttl: Seconds a Redis stream lives after its last message
+        """
+        self.size = size
+        self.max_rooms = max_rooms
+        self.redis = redis_client
+        self.ttl = ttl
+
+        self._rooms: 'OrderedDict[str, _Ring]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'appends': 0, 'removes': 0, 'syncs': 0, 'hits': 0, 'misses': 0, 'errors': 0}
+
+    @property
+    def backend(self) -> str:
+        return 'redis' if self.redis else 'memory'
+
+    # ------------------------------------------------------------------ writes
+
+    def append(self, room: str, message_id: str, event: str, payload: Dict[str, Any]) -> None:
+        """
+        Add a broadcast message to a room's buffer.
+
+        Args:
+            room: Socket.IO room name (topic_<id> / chat_room_<id>)
+            message_id: Message ID (ObjectId string)
+            event: Event the payload was broadcast as
+            payload: The broadcast payload (not modified)
+        """
+        self.stats['appends'] += 1
+        if self.redis:
+            try:
+                self._redis_append(room, message_id, event, payload)
+                return
+            except Exception as e:
+                self.stats['errors'] += 1
+                logger.warning(f"Room buffer Redis append failed for {room}: {e}")
+                return
+
+        with self._lock:
+            ring = self._rooms.get(room)
+            if ring is None:
+                ring = self._rooms[room] = _Ring(self.size)
+                while len(self._rooms) > self.max_rooms:
+                    self._rooms.popitem(last=False)
+            else:
+                self._rooms.move_to_end(room)
+            if len(ring.items) == ring.items.maxlen:
+                ring.evicted = True
+            ring.items.append((message_id, event, payload))
+
+    def remove(self, room: str, message_id: str) -> None:
+        """Drop a deleted message from a room's buffer."""
+        self.stats['removes'] += 1
+        if self.redis:
+            try:
+                key = REDIS_KEY_PREFIX + room
+                for entry_id, fields in self.redis.xrange(key):
+                    if self._field(fields, 'id') == message_id:
+                        self.redis.xdel(key, entry_id)
+            except Exception as e:
+                self.stats['errors'] += 1
+                logger.warning(f"Room buffer Redis remove failed for {room}: {e}")
+            return
+
+        with self._lock:
+            ring = self._rooms.get(room)
+            if ring:
+                kept = [item for item in ring.items if item[0] != message_id]
+                if len(kept) != len(ring.items):
+                    ring.items.clear()
+                    ring.items.extend(kept)
+
+    def _redis_append(self, room: str, message_id: str, event: str, payload: Dict[str, Any]) -> None:
+        key = REDIS_KEY_PREFIX + room
+        meta_key = key + ':meta'
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.hsetnx(meta_key, 'started_at', time.time())
+        pipe.hincrby(meta_key, 'added', 1)
+        pipe.xadd(key, {'id': message_id, 'event': event, 'payload': dumps_bytes(payload)},
+                  maxlen=self.size, approximate=False)
+        pipe.expire(key, self.ttl)
+        pipe.expire(meta_key, self.ttl)
+        pipe.execute()
+
+    # ------------------------------------------------------------------- reads
+
+    def _snapshot(self, room: str) -> Tuple[List[Tuple[str, str, Any]], Optional[float], bool]:
+        """(items oldest first, started_at, evicted) for a room."""
+        if self.redis:
+            key = REDIS_KEY_PREFIX + room
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.xrange(key)
+            pipe.hmget(key + ':meta', 'started_at', 'added')
+            entries, (started_at, added) = pipe.execute()
+            items = [(self._field(fields, 'id'), self._field(fields, 'event'), fields)
+                     for _, fields in entries]
+            evicted = int(added or 0) > len(items)
+            return items, float(started_at) if started_at else None, evicted
+
+        with self._lock:
+            ring = self._rooms.get(room)
+            if ring is None:
+                return [], None, False
+            return list(ring.items), ring.started_at, ring.evicted
+
+    def _payload(self, item: Tuple[str, str, Any]) -> Dict[str, Any]:
+        message_id, event, payload = item
+        if self.redis:
+            payload = loads(self._field(payload, 'payload'))
+        return {'event': event, 'message': payload}
+
+    @staticmethod
+    def _field(fields: Dict, name: str):
+        value = fields.get(name, fields.get(name.encode()))
+        return value.decode() if isinstance(value, bytes) and name != 'payload' else value
+
+    def sync(self, room: str, since_message_id: Optional[str] = None, limit: int = 50) -> Dict[str, Any]:
+        """
+        Messages to replay for a room (see module docstring).
+
+        Args:
+            room: Socket.IO room name
+            since_message_id: Last message the client has (None = room open)
+            limit: Most messages returned
+
+        Returns:
+            Dict with messages ([{event, message}], oldest first), complete and has_more
+        """
+        self.stats['syncs'] += 1
+        try:
+            items, started_at, evicted = self._snapshot(room)
+        except Exception as e:
+            self.stats['errors'] += 1
+            logger.warning(f"Room buffer read failed for {room}: {e}")
+            items, started_at, evicted = [], None, True
+
+        if since_message_id is None:
+            selected = items[-limit:]
+            complete = len(selected) >= limit
+            has_more = False
+        else:
+            ids = [item[0] for item in items]
+            if since_message_id in ids:
+                after = items[ids.index(since_message_id) + 1:]
+                complete = True
+            else:
+                sent_at = _generation_time(since_message_id)
+                complete = (not evicted and started_at is not None and sent_at is not None
+                            and sent_at >= started_at)
+                after = [item for item in items if item[0] > since_message_id] if complete else []
+            selected = after[:limit]
+            has_more = len(after) > limit
+
+        self.stats['hits' if complete else 'misses'] += 1
+        return {
+            'messages': [self._payload(item) for item in selected] if complete else [],
+            'complete': complete,
+            'has_more': has_more
+        }
+
+
+def init_room_buffer(app) -> Optional[RoomMessageBuffer]:
+    """Create the app's room message buffer according to config."""
+    if not app.config.get('ROOM_BUFFER_ENABLED', True):
+        return None
+
+    redis_client = None
+    if app.config.get('ROOM_BUFFER_BACKEND', 'auto') in ('auto', 'redis') and app.config.get('REDIS_AVAILABLE'):
+        redis_client = app.config.get('REDIS_CLIENT')
+
+    if redis_client is None and not app.config.get('ROOM_BUFFER_SINGLE_WORKER', False):
+        # Replicas would each see only their own sends and report incomplete gaps as complete
+        logger.warning("Room message buffer disabled: no Redis and ROOM_BUFFER_SINGLE_WORKER is off; "
+                       "sync_room falls back to history")
+        return None
+
+    buffer = RoomMessageBuffer(
+        size=app.config.get('ROOM_BUFFER_SIZE', 100),
+        max_rooms=app.config.get('ROOM_BUFFER_MAX_ROOMS', 2000),
+        redis_client=redis_client,
+        ttl=app.config.get('ROOM_BUFFER_TTL_SECONDS', 86400)
+    )
+    app.config['ROOM_BUFFER'] = buffer
+    logger.info(f"Room message buffer ready (backend: {buffer.backend}, size: {buffer.size})")
+    return buffer
+
+
+def get_room_buffer() -> Optional[RoomMessageBuffer]:
+    """Return the app's room buffer, if enabled."""
+    try:
+        from flask import current_app
+        return current_app.config.get('ROOM_BUFFER')
+    except RuntimeError:
+        return None
+
+
+def buffer_message(room: str, message_id: str, event: str, payload: Dict[str, Any]) -> None:
+    """Append a broadcast message to the app's room buffer (no-op when disabled)."""
+    buffer = get_room_buffer()
+    if buffer:
+        buffer.append(room, message_id, event, payload)
+
+
+def unbuffer_message(room: str, message_id: str) -> None:
+    """Remove a deleted message from the app's room buffer (no-op when disabled)."""
+    buffer = get_room_buffer()
+    if buffer:
+        buffer.remove(room, message_id)
@@ -0,0 +1,229 @@
+"""
+In-process job scheduler for periodic maintenance.
+
+Every worker runs one scheduler loop as a Socket.IO background task. Jobs are
+either cluster-wide (the default: run by one replica at a time, the holder of
+the `scheduler_leader` MongoDB lease) or local (run by every process, for
+per-process state such as socket presence tracking).
+
+Cluster-wide job runs are recorded in the `scheduler_jobs` collection (last
+run, duration, result, error, run and failure counts), so a new leader picks
+up the schedule where the old one left off and admins can inspect it. Every
+process also keeps its own per-job counters in memory (`JobScheduler.stats`).
+"""
+import atexit
+import logging
+import random
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from utils.mongo_lease import MongoLease
+
+logger = logging.getLogger(__name__)
+
+LEASE_NAME = 'scheduler_leader'
+
+
+class ScheduledJob:
+    """A named function run every `interval` seconds."""
+
+    def __init__(self, name: str, func: Callable[[], Any], interval: int, leader_only: bool = True):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.leader_only = leader_only
+        # Spread the first run so replicas and jobs don't all start at once
+        self.next_run = time.monotonic() + random.uniform(0, min(interval, 60))
+
+
+class JobScheduler:
+    """Runs registered jobs on one background loop per process."""
+
+    def __init__(self, app, socketio, lease_ttl: int = 60, tick: float = 5.0):
+        """
+        Args:
+            app: Flask application (jobs run inside its app context)
+            socketio: Socket.IO server used to start and sleep the loop
+            lease_ttl: Seconds the leader lease stays valid without renewal
+            tick: Seconds between scheduler loop iterations
+        """
+        self.app = app
+        self.socketio = socketio
+        self.tick = tick
+        self.jobs: Dict[str, ScheduledJob] = {}
+        self.stats: Dict[str, Dict[str, Any]] = {}
+        self.lease = MongoLease(app.db, LEASE_NAME, ttl=lease_ttl)
+        self.is_leader = False
+        self._lease_checked_at = 0.0
+        self._started = False
+        self._lock = threading.Lock()
+
+    def register(self, name: str, func: Callable[[], Any], interval: int, leader_only: bool = True) -> None:
+        """
+        Add a job.
+
+        Args:
+            name: Unique job name
+            func: Called with no arguments inside the app context; its return
+                  value (e.g. a deleted count) is recorded as the result
+            interval: Seconds between runs
+            leader_only: Run on one replica only (False: on every process)
+        """
+        if interval <= 0:
+            logger.info(f"Scheduled job {name} disabled (interval {interval})")
+            return
+        self.jobs[name] = ScheduledJob(name, func, interval, leader_only)
+        self.stats[name] = {'runs': 0, 'failures': 0, 'last_run_at': None, 'last_duration_ms': None,
+                            'last_result': None, 'last_error': None, 'interval': interval,
+                            'leader_only': leader_only}
+
+    def start(self) -> None:
+        """Start the loop (once per process)."""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        # Hand leadership over promptly on a clean shutdown (no-op unless we hold it)
+        atexit.register(self.lease.release)
+        self.socketio.start_background_task(self._loop)
+        logger.info(f"Scheduler started with {len(self.jobs)} jobs: {', '.join(self.jobs)}")
+
+    def _loop(self) -> None:
+        while True:
+            self.socketio.sleep(self.tick)
+            try:
+                with self.app.app_context():
+                    self.run_pending()
+            except Exception as e:
+                logger.warning(f"Scheduler iteration failed: {e}")
+
+    def _check_leadership(self) -> bool:
+        now = time.monotonic()
+        # Renew well before the lease runs out
+        if now - self._lease_checked_at >= self.lease.ttl / 3:
+            self._lease_checked_at = now
+            try:
+                leader = self.lease.acquire()
+            except Exception as e:
+                logger.warning(f"Scheduler lease check failed: {e}")
+                leader = False
+            if leader != self.is_leader:
+                logger.info(f"Scheduler leadership {'acquired' if leader else 'lost'} ({self.lease.owner})")
+                if leader:
+                    self._resume_schedule()
+            self.is_leader = leader
+        return self.is_leader
+
+    def _resume_schedule(self) -> None:
+        """On becoming leader, schedule cluster-wide jobs from their last recorded runs."""
+        try:
+            records = {doc['_id']: doc for doc in self.app.db.scheduler_jobs.find({}, {'last_run_at': 1})}
+        except Exception as e:
+            logger.warning(f"Failed to load job history: {e}")
+            return
+        now = time.monotonic()
+        wall_now = datetime.utcnow()
+        for job in self.jobs.values():
+            last_run_at = records.get(job.name, {}).get('last_run_at')
+            if job.leader_only and last_run_at:
+                elapsed = (wall_now - last_run_at).total_seconds()
+                job.next_run = now + max(0.0, job.interval - elapsed)
+
+    def run_pending(self) -> None:
+        """Run every job that is due (and that this process may run)."""
+        # Checked every tick (renewal is throttled) so the lease never lapses between runs
+        leader = self._check_leadership() if any(job.leader_only for job in self.jobs.values()) else False
+        now = time.monotonic()
+        for job in [job for job in self.jobs.values() if job.next_run <= now]:
+            if job.leader_only and not leader:
+                # Another replica runs it; look again after one interval
+                job.next_run = now + job.interval
+                continue
+            self.run_job(job.name)
+
+    def run_job(self, name: str) -> Dict[str, Any]:
+        """Run one job now and record the outcome. Returns its stats."""
+        job = self.jobs[name]
+        started = time.monotonic()
+        result, error = None, None
+        try:
+            result = job.func()
+        except Exception as e:
+            error = str(e)
+            logger.error(f"Scheduled job {name} failed: {e}", exc_info=True)
+        duration_ms = round((time.monotonic() - started) * 1000, 1)
+        job.next_run = time.monotonic() + job.interval
+
+        stats = self.stats[name]
+        stats['runs'] += 1
+        stats['failures'] += 1 if error else 0
+        stats['last_run_at'] = datetime.utcnow()
+        stats['last_duration_ms'] = duration_ms
+        stats['last_result'] = result
+        stats['last_error'] = error
+        if error is None:
+            logger.info(f"Scheduled job {name} finished in {duration_ms}ms (result: {result})")
+
+        if job.leader_only:
+            try:
+                self.app.db.scheduler_jobs.update_one(
+                    {'_id': name},
+                    {
+                        '$set': {
+                            'last_run_at': stats['last_run_at'],
+                            'last_duration_ms': duration_ms,
+                            'last_result': result,
+                            'last_error': error,
+                            'last_owner': self.lease.owner
+                        },
+                        '$inc': {'runs': 1, 'failures': 1 if error else 0}
+                    },
+                    upsert=True
+                )
+            except Exception as e:
+                logger.warning(f"Failed to record run of job {name}: {e}")
+        return stats
+
+    def job_history(self) -> List[Dict[str, Any]]:
+        """Recorded cluster-wide runs merged with this process's view of every job."""
+        try:
+            records = {doc['_id']: doc for doc in self.app.db.scheduler_jobs.find()}
+        except Exception:
+            records = {}
+        history = []
+        for name, job in self.jobs.items():
+            entry = dict(records.get(name, {})) if job.leader_only else dict(self.stats[name])
+            entry.pop('_id', None)
+            entry.update({'name': name, 'interval': job.interval, 'leader_only': job.leader_only})
+            history.append(entry)
+        return history
+
+
+def init_scheduler(app, socketio) -> Optional[JobScheduler]:
+    """Create the app's scheduler, register the maintenance jobs and start it."""
+    if not app.config.get('SCHEDULER_ENABLED', True):
+        return None
+
+    from utils.maintenance_jobs import register_maintenance_jobs
+
+    scheduler = JobScheduler(
+        app,
+        socketio,
+        lease_ttl=app.config.get('SCHEDULER_LEASE_TTL_SECONDS', 60),
+        tick=app.config.get('SCHEDULER_TICK_SECONDS', 5)
+    )
+    register_maintenance_jobs(scheduler, app, socketio)
+    scheduler.start()
+    app.config['SCHEDULER'] = scheduler
+    return scheduler
+
+
+def get_scheduler() -> Optional[JobScheduler]:
+    """Get the current app's scheduler (None outside app context or when disabled)."""
+    try:
+        from flask import current_app
+        return current_app.config.get('SCHEDULER')
+    except RuntimeError:
+        return None
@@ -24,15 +24,15 @@ def save_session_backup(session_id: str, data: Dict[str, Any], ttl_seconds: int
         expires_at = now + ttl_seconds
 
         # Use DB upsert
-        # We store 'expireAt' as a datetime object for potential future TTL index support
-        # We store 'expires_at' as timestamp for consistent manual checking in load_session_backup
+        # 'expireAt' (UTC datetime) drives the TTL index; the scheduler's purge job covers
+        # servers without TTL support. 'expires_at' (timestamp) is checked in load_session_backup
         current_app.db.session_backups.update_one(
             {'_id': str(session_id)},
             {'$set': {
                 'data': data,
                 'updated_at': now,
                 'expires_at': expires_at,
-                'expireAt': datetime.fromtimestamp(expires_at)
+                'expireAt': datetime.utcfromtimestamp(expires_at)
             }},
             upsert=True
         )
@@ -1,78 +1,430 @@
 """
-Custom Flask-Session interface with automatic fallback from Redis to filesystem.
-This ensures that if Redis fails during runtime, the app continues to work with filesystem sessions.
+Redis-backed Flask session interface with a signed-cookie fallback.
+
+Two storage modes (SESSION_STORE_MODE):
+
+  redis   The cookie holds a random session id; the session lives in Redis.
+  cookie  The small login principal (authenticated, user_id, username,
+          login_time, auth_method) travels in a signed, compact cookie and
+          needs no Redis read. Anything else (e.g. passkey challenges) is kept
+          in Redis under the session id, only while it exists.
+
+Per request the interface does no I/O when it can avoid it: requests without
+a cookie never touch Redis, unchanged sessions are not written back, and TTL
+refreshes of unchanged sessions are throttled and flushed in one pipeline.
+If Redis fails, the session is written to the signed cookie instead, which
+(unlike the old filesystem fallback) every replica can read.
+
+Sessions written by the previous interface (Flask-Session's msgpack
+payloads under the same key prefix) are still read, and rewritten in the
+current format on their first request, so a deploy does not log users out.
+
+Logging out revokes the session id and `revoke_user_sessions` revokes every
+session of a user issued before now. Revocations are kept in Redis with the
+session lifetime as TTL and checked at most every
+SESSION_REVOCATION_CHECK_SECONDS per session; the revoking worker applies
+them immediately.
 """
+import hashlib
 import logging
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Tuple
+
+from flask import current_app
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SecureCookieSession, SessionInterface
+from itsdangerous import BadSignature, URLSafeTimedSerializer
 
 logger = logging.getLogger(__name__)
 
-# Try to import Flask-Session interfaces with fallback
 try:
-    # Flask-Session 0.4.0+ exposes interfaces directly
-    from flask_session import RedisSessionInterface, FileSystemSessionInterface
+    # Installed with Flask-Session, whose Redis sessions were msgpack-encoded
+    import msgspec
+    _LEGACY_DECODER = msgspec.msgpack.Decoder()
 except ImportError:
-    try:
-        # Older versions might have them in .sessions
-        from flask_session.sessions import RedisSessionInterface, FileSystemSessionInterface
-    except ImportError:
-        logger.error("Flask-Session interfaces not available. Fallback session interface disabled.")
-        RedisSessionInterface = None
-        FileSystemSessionInterface = None
-
-
-# Only define the class if interfaces are available
-if RedisSessionInterface and FileSystemSessionInterface:
-    class FallbackSessionInterface(RedisSessionInterface):
-        """Session interface that falls back to filesystem if Redis fails."""
-        
-        def __init__(self, redis_client, key_prefix, use_signer, permanent, 
-                     session_file_dir, **kwargs):
-            # Initialize Redis interface
-            super().__init__(redis_client, key_prefix, use_signer, permanent)
-            # Store filesystem interface as fallback
-            # FileSystemSessionInterface needs: cache_dir, threshold, mode, key_prefix, use_signer, permanent
-            import os
-            cache_dir = session_file_dir or os.path.join(os.path.dirname(os.path.dirname(__file__)), 'flask_session')
-            self.filesystem_interface = FileSystemSessionInterface(
-                cache_dir=cache_dir,
-                threshold=500,  # Default threshold
-                mode=384,  # Default mode (0o600 in octal)
-                key_prefix=key_prefix,
-                use_signer=use_signer,
-                permanent=permanent
+    _LEGACY_DECODER = None
+
+# Session keys carried in the signed cookie, with their compact names
+PRINCIPAL_KEYS = {
+    'authenticated': 'a',
+    'user_id': 'u',
+    'username': 'n',
+    'login_time': 't',
+    'auth_method': 'm',
+}
+_COMPACT_KEYS = {short: key for key, short in PRINCIPAL_KEYS.items()}
+
+# Where the decoded session is kept for the rest of the request
+_ENVIRON_KEY = 'topicsflow.session'
+
+
+class StoredSession(SecureCookieSession):
+    """Session dict plus the id and issue time it is stored under."""
+
+    def __init__(self, initial=None, sid: Optional[str] = None, issued_at: Optional[float] = None,
+                 has_server_data: bool = False, signed_at: Optional[float] = None):
+        super().__init__(initial)
+        self.new = sid is None
+        self.sid = sid or _new_sid()
+        self.issued_at = issued_at or time.time()
+        self.has_server_data = has_server_data
+        # Read from a Flask-Session payload: saved in the current format on this request
+        self.legacy = False
+        # Set when the session came from a signed cookie
+        self.signed_at = signed_at
+        # user_id the session was opened with (a change means login: rotate the id)
+        self.opened_user_id = (initial or {}).get('user_id')
+
+
+def _new_sid() -> str:
+    # urlsafe base64 never contains '.', which tells an id apart from a signed cookie
+    return secrets.token_urlsafe(32)
+
+
+class SessionRevocations:
+    """Revoked session ids and per-user revocation times, cached per worker."""
+
+    def __init__(self, redis_client, key_prefix: str, lifetime: int, check_interval: int = 30,
+                 max_entries: int = 10000):
+        self.redis = redis_client
+        self.key_prefix = key_prefix
+        self.lifetime = lifetime
+        self.check_interval = check_interval
+        self.max_entries = max_entries
+        # (sid, user_id) -> (revoked, checked_at)
+        self._checked: "OrderedDict[Tuple[str, Optional[str]], Tuple[bool, float]]" = OrderedDict()
+        self._local_sids: Dict[str, float] = {}
+        self._local_users: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def _sid_key(self, sid: str) -> str:
+        return f"{self.key_prefix}revoked:{sid}"
+
+    def _user_key(self, user_id: str) -> str:
+        return f"{self.key_prefix}revoked_user:{user_id}"
+
+    def revoke_session(self, sid: str) -> None:
+        with self._lock:
+            self._local_sids[sid] = time.time()
+        try:
+            self.redis.setex(self._sid_key(sid), self.lifetime, 1)
+        except Exception as e:
+            logger.warning(f"Failed to record session revocation: {e}")
+
+    def revoke_user(self, user_id: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._local_users[user_id] = now
+            self._checked.clear()
+        try:
+            self.redis.setex(self._user_key(user_id), self.lifetime, repr(now))
+        except Exception as e:
+            logger.warning(f"Failed to record user session revocation: {e}")
+
+    def is_revoked(self, sid: str, user_id: Optional[str], issued_at: float) -> bool:
+        now = time.time()
+        with self._lock:
+            if sid in self._local_sids:
+                return True
+            if user_id and self._local_users.get(user_id, 0) > issued_at:
+                return True
+            cached = self._checked.get((sid, user_id))
+            if cached and now - cached[1] < self.check_interval:
+                return cached[0]
+
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.exists(self._sid_key(sid))
+            if user_id:
+                pipe.get(self._user_key(user_id))
+            results = pipe.execute()
+        except Exception as e:
+            # Fail open: a Redis outage must not log everyone out
+            logger.debug(f"Revocation check failed: {e}")
+            return cached[0] if cached else False
+
+        revoked = bool(results[0])
+        if not revoked and user_id and results[1] is not None:
+            revoked = float(results[1]) > issued_at
+
+        with self._lock:
+            self._checked[(sid, user_id)] = (revoked, now)
+            self._checked.move_to_end((sid, user_id))
+            while len(self._checked) > self.max_entries:
+                self._checked.popitem(last=False)
+            # Local entries are only needed until Redis reflects them
+            for table in (self._local_sids, self._local_users):
+                if len(table) > self.max_entries:
+                    cutoff = now - self.lifetime
+                    for key in [k for k, t in table.items() if t < cutoff]:
+                        del table[key]
+        return revoked
+
+
+class FallbackSessionInterface(SessionInterface):
+    """Session interface storing sessions in Redis, or in a signed cookie when Redis fails."""
+
+    session_class = StoredSession
+    serializer = TaggedJSONSerializer()
+
+    def __init__(self, redis_client, key_prefix: str = 'session:', permanent: bool = False,
+                 mode: str = 'redis', refresh_interval: int = 300, revocation_check_interval: int = 30,
+                 touch_flush_interval: int = 5):
+        """
+        Args:
+            redis_client: Shared Redis client
+            key_prefix: Prefix of session keys in Redis
+            permanent: Mark new sessions permanent (cookie expiry instead of browser session)
+            mode: 'redis' (session id cookie) or 'cookie' (signed principal cookie)
+            refresh_interval: Minimum seconds between TTL refreshes of an unchanged session
+            revocation_check_interval: Seconds a revocation check result is reused per session
+            touch_flush_interval: Seconds between pipelined flushes of pending TTL refreshes
+        """
+        if mode not in ('redis', 'cookie'):
+            raise ValueError(f"Unknown session store mode: {mode}")
+        self.redis = redis_client
+        self.key_prefix = key_prefix
+        self.permanent = permanent
+        self.mode = mode
+        self.refresh_interval = refresh_interval
+        self.revocation_check_interval = revocation_check_interval
+        self.touch_flush_interval = touch_flush_interval
+        self.revocations: Optional[SessionRevocations] = None
+
+        self._touched: Dict[str, float] = {}
+        self._pending_touch: Dict[str, int] = {}
+        self._last_flush = time.monotonic()
+        self._touch_lock = threading.Lock()
+
+    # -- helpers -----------------------------------------------------------
+
+    def _lifetime(self, app) -> int:
+        return int(app.permanent_session_lifetime.total_seconds())
+
+    def _revocations(self, app) -> SessionRevocations:
+        if self.revocations is None:
+            self.revocations = SessionRevocations(
+                self.redis, self.key_prefix, self._lifetime(app), self.revocation_check_interval
             )
-            self._redis_available = True
-            self._redis_client = redis_client
-        
-        def open_session(self, app, request):
-            """Open session with Redis, fallback to filesystem if Redis fails."""
-            try:
-                # Try Redis first (without explicit ping to save RTT)
-                session = super().open_session(app, request)
-                if session is not None:
-                    # Success
-                    import sys
-                    print(f"[SESSION DEBUG] Redis open_session success for {request.path}", file=sys.stderr)
-                    return session
-            except Exception as e:
-                import sys
-                print(f"[SESSION DEBUG] Redis open_session failed: {e}", file=sys.stderr)
-                logger.warning(f"Redis session open failed, using filesystem fallback: {e}")
-            
-            # Fallback
-            print(f"[SESSION DEBUG] Using Filesystem fallback for open_session", file=sys.stderr)
-            return self.filesystem_interface.open_session(app, request)
-        
-        def save_session(self, app, session, response):
-            """Save session with Redis, fallback to filesystem if Redis fails."""
+        return self.revocations
+
+    def _signer(self, app) -> URLSafeTimedSerializer:
+        return URLSafeTimedSerializer(
+            app.secret_key,
+            salt='topicsflow-session',
+            serializer=self.serializer,
+            signer_kwargs={'key_derivation': 'hmac', 'digest_method': hashlib.sha256}
+        )
+
+    def _redis_key(self, sid: str) -> str:
+        return f"{self.key_prefix}{sid}"
+
+    def _load_server_data(self, sid: str) -> Optional[Dict[str, Any]]:
+        raw = self.redis.get(self._redis_key(sid))
+        if raw is None:
+            return None
+        try:
+            return self.serializer.loads(raw.decode('utf-8') if isinstance(raw, bytes) else raw)
+        except ValueError:
+            legacy = self._decode_legacy(raw)
+            if legacy is None:
+                raise
+            return {'d': legacy, 'legacy': True}
+
+    @staticmethod
+    def _decode_legacy(raw) -> Optional[Dict[str, Any]]:
+        """Session dict of a Flask-Session (msgpack) payload, or None if it is not one."""
+        if _LEGACY_DECODER is None or not isinstance(raw, bytes):
+            return None
+        try:
+            data = _LEGACY_DECODER.decode(raw)
+        except msgspec.DecodeError:
+            return None
+        if not isinstance(data, dict):
+            return None
+        data.pop('_permanent', None)
+        return data
+
+    def _store_server_data(self, sid: str, payload: Dict[str, Any], ttl: int) -> None:
+        self.redis.setex(self._redis_key(sid), ttl, self.serializer.dumps(payload))
+        with self._touch_lock:
+            self._touched[sid] = time.monotonic()
+            self._pending_touch.pop(sid, None)
+
+    def _touch(self, sid: str, ttl: int) -> None:
+        """Queue a TTL refresh (at most once per refresh_interval per session) and flush in batches."""
+        now = time.monotonic()
+        with self._touch_lock:
+            if now - self._touched.get(sid, 0) >= self.refresh_interval:
+                self._touched[sid] = now
+                self._pending_touch[sid] = ttl
+            if not self._pending_touch or now - self._last_flush < self.touch_flush_interval:
+                return
+            pending, self._pending_touch = self._pending_touch, {}
+            self._last_flush = now
+            if len(self._touched) > 50000:
+                cutoff = now - self.refresh_interval
+                self._touched = {k: t for k, t in self._touched.items() if t >= cutoff}
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            for pending_sid, pending_ttl in pending.items():
+                pipe.expire(self._redis_key(pending_sid), pending_ttl)
+            pipe.execute()
+        except Exception as e:
+            logger.debug(f"Session TTL refresh failed: {e}")
+
+    def _decode_cookie(self, app, value: str) -> Optional[StoredSession]:
+        try:
+            payload, signed_at = self._signer(app).loads(value, max_age=self._lifetime(app),
+                                                         return_timestamp=True)
+        except BadSignature:
+            return None
+
+        data = {_COMPACT_KEYS.get(k, k): v for k, v in payload.get('d', {}).items()}
+        session = self.session_class(data, sid=payload['s'], issued_at=payload['i'],
+                                     has_server_data=bool(payload.get('x')),
+                                     signed_at=signed_at.timestamp())
+        if session.has_server_data:
             try:
-                # Try Redis first
-                return super().save_session(app, session, response)
+                extra = self._load_server_data(session.sid)
+                if extra:
+                    session.update(extra.get('d', {}))
+                    session.modified = False
             except Exception as e:
-                import sys
-                print(f"[SESSION DEBUG] Redis save_session failed: {e}", file=sys.stderr)
-                logger.warning(f"Redis session save failed, using filesystem fallback: {e}")
-                return self.filesystem_interface.save_session(app, session, response)
-else:
-    # FallbackSessionInterface not available if Flask-Session interfaces can't be imported
-    FallbackSessionInterface = None
+                logger.warning(f"Failed to load server-side session data: {e}")
+        return session
+
+    def _encode_cookie(self, app, session: StoredSession, extra_in_redis: bool) -> str:
+        if extra_in_redis:
+            data = {PRINCIPAL_KEYS[k]: v for k, v in session.items() if k in PRINCIPAL_KEYS}
+        else:
+            data = {PRINCIPAL_KEYS.get(k, k): v for k, v in session.items()}
+        payload = {'d': data, 's': session.sid, 'i': session.issued_at}
+        if extra_in_redis:
+            payload['x'] = 1
+        return self._signer(app).dumps(payload)
+
+    # -- SessionInterface --------------------------------------------------
+
+    def get_expiration_time(self, app, session):
+        # Decided here rather than through session.permanent, which would mark every session modified
+        if self.permanent:
+            return datetime.now(timezone.utc) + app.permanent_session_lifetime
+        return None
+
+    def open_session(self, app, request):
+        cached = request.environ.get(_ENVIRON_KEY)
+        if cached is not None:
+            return cached
+
+        session = None
+        value = request.cookies.get(self.get_cookie_name(app))
+        if value:
+            if '.' in value:
+                # Signed cookie: cookie mode, or written while Redis was failing
+                session = self._decode_cookie(app, value)
+            else:
+                try:
+                    stored = self._load_server_data(value)
+                    if stored is not None:
+                        session = self.session_class(stored.get('d', {}), sid=value, issued_at=stored.get('i'))
+                        if stored.get('legacy'):
+                            session.legacy = True
+                            session.modified = True
+                except Exception as e:
+                    logger.warning(f"Redis session load failed: {e}")
+
+            if session is not None and session.get('user_id') and self._revocations(app).is_revoked(
+                    session.sid, session.get('user_id'), session.issued_at):
+                session = None
+
+        if session is None:
+            session = self.session_class()
+        request.environ[_ENVIRON_KEY] = session
+        return session
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        ttl = self._lifetime(app)
+        if not session.modified:
+            # Unchanged: nothing to write, at most a throttled TTL refresh
+            if session.new or not session:
+                return
+            if session.signed_at is None or session.has_server_data:
+                self._touch(session.sid, ttl)
+            if session.signed_at is None or time.time() - session.signed_at < ttl / 2:
+                return
+            # Signed cookie past half its lifetime: re-sign it (sliding expiry)
+
+        if session.modified and not session:
+            # Cleared (logout): drop server data, revoke the id, expire the cookie
+            if not session.new:
+                try:
+                    self.redis.delete(self._redis_key(session.sid))
+                except Exception as e:
+                    logger.warning(f"Failed to delete session: {e}")
+                self._revocations(app).revoke_session(session.sid)
+                response.delete_cookie(name, domain=domain, path=path,
+                                       secure=self.get_cookie_secure(app),
+                                       samesite=self.get_cookie_samesite(app))
+            return
+
+        if session.get('user_id') != session.opened_user_id:
+            # Logged in as someone new: fresh id and issue time (no session fixation)
+            if not session.new:
+                old_sid = session.sid
+                try:
+                    self.redis.delete(self._redis_key(old_sid))
+                except Exception:
+                    pass
+            session.sid = _new_sid()
+            session.issued_at = time.time()
+            session.new = True
+
+        value = None
+        try:
+            if self.mode == 'cookie':
+                extra = {k: v for k, v in session.items() if k not in PRINCIPAL_KEYS}
+                if extra:
+                    self._store_server_data(session.sid, {'d': extra}, ttl)
+                elif session.has_server_data or session.legacy:
+                    self.redis.delete(self._redis_key(session.sid))
+                value = self._encode_cookie(app, session, extra_in_redis=bool(extra))
+            else:
+                self._store_server_data(session.sid, {'d': dict(session), 'i': session.issued_at}, ttl)
+                if session.new or session.signed_at is not None:
+                    value = session.sid
+        except Exception as e:
+            logger.warning(f"Redis session save failed, storing session in signed cookie: {e}")
+            value = self._encode_cookie(app, session, extra_in_redis=False)
+
+        if value is not None:
+            response.set_cookie(
+                name, value,
+                expires=self.get_expiration_time(app, session),
+                httponly=self.get_cookie_httponly(app),
+                domain=domain,
+                path=path,
+                secure=self.get_cookie_secure(app),
+                samesite=self.get_cookie_samesite(app)
+            )
+
+
+def revoke_user_sessions(user_id: str) -> bool:
+    """
+    Revoke every session of a user issued before now (ban, account deletion).
+
+    Returns False when the app does not use this session interface.
+    """
+    interface = current_app.session_interface
+    if not isinstance(interface, FallbackSessionInterface):
+        return False
+    interface._revocations(current_app).revoke_user(user_id)
+    return True
@@ -0,0 +1,63 @@
+"""
+Process-wide service singletons.
+
+Services that are expensive to construct (API clients, storage clients,
+locale-backed renderers) are created once per process on first use and
+shared by all requests and socket handlers.
+
+Models keep no per-request state (only `db` and their collections), so
+`get_model(User, db)` hands out one shared instance per model class and
+database instead of constructing one per call or per loop iteration.
+"""
+import logging
+import threading
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+logger = logging.getLogger(__name__)
+
+_instances: Dict[Hashable, Any] = {}
+_models: Dict[Tuple[Any, int], Any] = {}
+_lock = threading.Lock()
+
+
+def get_singleton(key: Hashable, factory: Callable[[], Any]) -> Any:
+    """
+    Return the instance stored under key, creating it with factory on first use.
+
+    A factory that raises stores nothing, so the next call retries.
+    """
+    instance = _instances.get(key)
+    if instance is None:
+        with _lock:
+            instance = _instances.get(key)
+            if instance is None:
+                instance = factory()
+                _instances[key] = instance
+    return instance
+
+
+def get_model(model_class: Callable[[Any], Any], db) -> Any:
+    """
+    Shared instance of a model class bound to db.
+
+    Args:
+        model_class: Model class taking the database (e.g. models.user.User)
+        db: pymongo Database the model works on
+
+    Returns:
+        The process-wide model instance for this class and database
+    """
+    # Keyed by id(db): the cached instance holds db, so the id cannot be reused
+    key = (model_class, id(db))
+    instance = _models.get(key)
+    if instance is None:
+        # Models are cheap and stateless: a racing duplicate is harmless, no lock needed
+        instance = _models.setdefault(key, model_class(db))
+    return instance
+
+
+def reset_singletons() -> None:
+    """Drop all instances (tests, config reloads)."""
+    with _lock:
+        _instances.clear()
+        _models.clear()
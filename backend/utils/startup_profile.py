@@ -0,0 +1,175 @@
+"""
+Startup profiling.
+
+Set STARTUP_PROFILE=true to time worker start-up: every module import
+(self time, excluding its own imports) and each phase of create_app. The
+report is logged once the app is built and, with STARTUP_PROFILE_OUTPUT set,
+also written there as JSON.
+
+Only the standard library is imported here: the import timer must be
+installed before Flask and the rest of the app are imported.
+"""
+import importlib.abc
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class _TimedLoader(importlib.abc.Loader):
+    """Wraps a module loader to time exec_module."""
+
+    def __init__(self, loader, timer: "ImportTimer"):
+        self._loader = loader
+        self._timer = timer
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        self._timer.begin()
+        try:
+            self._loader.exec_module(module)
+        finally:
+            self._timer.end(module.__name__)
+
+    def __getattr__(self, name):
+        return getattr(self._loader, name)
+
+
+class ImportTimer(importlib.abc.MetaPathFinder):
+    """Meta path finder recording per-module import time (total and self)."""
+
+    def __init__(self):
+        self.modules: Dict[str, Dict[str, float]] = {}
+        self._local = threading.local()
+        self._finding = threading.local()
+
+    def find_spec(self, fullname, path, target=None):
+        if getattr(self._finding, 'active', False):
+            return None
+        self._finding.active = True
+        try:
+            for finder in sys.meta_path:
+                if finder is self or not hasattr(finder, 'find_spec'):
+                    continue
+                spec = finder.find_spec(fullname, path, target)
+                if spec is not None:
+                    if spec.loader is not None and hasattr(spec.loader, 'exec_module'):
+                        spec.loader = _TimedLoader(spec.loader, self)
+                    return spec
+            return None
+        finally:
+            self._finding.active = False
+
+    def begin(self) -> None:
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        # [start, time spent in nested imports]
+        stack.append([time.perf_counter(), 0.0])
+
+    def end(self, name: str) -> None:
+        stack = self._local.stack
+        start, children = stack.pop()
+        total = time.perf_counter() - start
+        if stack:
+            stack[-1][1] += total
+        self.modules[name] = {'total_ms': total * 1000, 'self_ms': (total - children) * 1000}
+
+    def install(self) -> None:
+        if self not in sys.meta_path:
+            sys.meta_path.insert(0, self)
+
+    def uninstall(self) -> None:
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
+
+
+class StartupProfiler:
+    """Collects start-up phase timings and (optionally) import timings."""
+
+    def __init__(self, enabled: bool = False, output_path: Optional[str] = None):
+        self.enabled = enabled
+        self.output_path = output_path
+        self.started = time.perf_counter()
+        self.phases: List[Dict[str, Any]] = []
+        self.import_timer = ImportTimer() if enabled else None
+        self.reported = False
+        if self.import_timer:
+            self.import_timer.install()
+
+    @classmethod
+    def from_env(cls) -> "StartupProfiler":
+        enabled = os.getenv('STARTUP_PROFILE', 'false').lower() == 'true'
+        return cls(enabled=enabled, output_path=os.getenv('STARTUP_PROFILE_OUTPUT'))
+
+    @contextmanager
+    def phase(self, name: str):
+        """Time a block of start-up work (no-op when profiling is disabled)."""
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append({'phase': name, 'ms': round((time.perf_counter() - start) * 1000, 2)})
+
+    def mark(self, name: str) -> None:
+        """Record the time since the previous mark (or profiler creation) as a phase."""
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        last = getattr(self, '_last_mark', self.started)
+        self.phases.append({'phase': name, 'ms': round((now - last) * 1000, 2)})
+        self._last_mark = now
+
+    def report(self, top: int = 25) -> Optional[Dict[str, Any]]:
+        """Log (and optionally write) the profile once. Returns it, or None when disabled."""
+        if not self.enabled or self.reported:
+            return None
+        self.reported = True
+        if self.import_timer:
+            self.import_timer.uninstall()
+
+        modules = self.import_timer.modules if self.import_timer else {}
+        slowest = sorted(modules.items(), key=lambda item: item[1]['self_ms'], reverse=True)[:top]
+        profile = {
+            'total_ms': round((time.perf_counter() - self.started) * 1000, 2),
+            'phases': self.phases,
+            'imports': {
+                'count': len(modules),
+                'total_self_ms': round(sum(m['self_ms'] for m in modules.values()), 2),
+                'slowest': [
+                    {'module': name, 'self_ms': round(t['self_ms'], 2), 'total_ms': round(t['total_ms'], 2)}
+                    for name, t in slowest
+                ]
+            }
+        }
+
+        logger.info(f"Startup profile: {profile['total_ms']}ms total, "
+                    f"{profile['imports']['count']} modules imported ({profile['imports']['total_self_ms']}ms)")
+        for phase in self.phases:
+            logger.info(f"  phase {phase['phase']:<28} {phase['ms']:>9.2f}ms")
+        for entry in profile['imports']['slowest']:
+            logger.info(f"  import {entry['module']:<40} {entry['self_ms']:>9.2f}ms self "
+                        f"({entry['total_ms']:.2f}ms incl. children)")
+
+        if self.output_path:
+            try:
+                with open(self.output_path, 'w') as f:
+                    json.dump(profile, f, indent=2)
+            except OSError as e:
+                logger.warning(f"Failed to write startup profile to {self.output_path}: {e}")
+        return profile
+
+
+# Created at import so the import timer sees everything imported after it
+profiler = StartupProfiler.from_env()
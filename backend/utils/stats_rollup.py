@@ -0,0 +1,351 @@
+"""
+Admin dashboard rollups, kept in the `stats` collection.
+
+The dashboard used to count users, reports and tickets with a dozen
+aggregations and `count_documents` calls per load. It now reads two small
+documents' worth of data:
+
+  - `_id: 'totals'`: current counters, e.g. `reports.status.pending`,
+    `tickets.category.bug`, `users.banned`
+  - time buckets: `_id: 'hour:2026-01-31T14'` / `'day:2026-01-31'` with
+    `granularity`, `start` and `counts.<event>` for the events in EVENTS.
+    Hourly buckets expire after STATS_HOURLY_RETENTION_DAYS and daily ones
+    after STATS_DAILY_RETENTION_DAYS (`expires_at`, TTL index)
+
+Model writes keep them current: `Report`, `Ticket` and `User` call
+`record_change` with the counters their write moved and the event it
+counts as. A failed update never fails the write; drift from it, from
+writes outside the models, or from concurrent updates is corrected by the
+`reconcile_admin_stats` scheduler job, which recomputes the totals and the
+recent buckets from the collections. `python scripts/backfill_stats.py`
+rebuilds older buckets.
+"""
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from pymongo import UpdateOne
+
+from utils.helpers import delete_in_batches
+
+logger = logging.getLogger(__name__)
+
+TOTALS_ID = 'totals'
+
+# Bucketed event -> (collection, timestamp field) it is recounted from
+EVENTS = {
+    'reports_created': ('reports', 'created_at'),
+    'tickets_created': ('tickets', 'created_at'),
+    'users_created': ('users', 'created_at'),
+}
+
+# Totals section -> (collection, {counter group: grouped field})
+GROUPED_TOTALS = {
+    'reports': ('reports', {'status': 'status', 'actions': 'action_taken'}),
+    'tickets': ('tickets', {'status': 'status', 'category': 'category', 'priority': 'priority'}),
+}
+
+GRANULARITIES = ('hour', 'day')
+
+DEFAULT_HOURLY_RETENTION_DAYS = 14
+DEFAULT_DAILY_RETENTION_DAYS = 400
+
+
+def _config(name: str, default: Any) -> Any:
+    """Config value of the current app, or default outside an app context."""
+    try:
+        from flask import current_app
+        return current_app.config.get(name, default)
+    except RuntimeError:
+        return default
+
+
+def bucket_start(at: datetime, granularity: str) -> datetime:
+    """Start of the hour or day bucket holding a time."""
+    if granularity == 'hour':
+        return at.replace(minute=0, second=0, microsecond=0)
+    return at.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def bucket_id(start: datetime, granularity: str) -> str:
+    """Document id of a bucket, e.g. 'hour:2026-01-31T14' or 'day:2026-01-31'."""
+    if granularity == 'hour':
+        return f"hour:{start.strftime('%Y-%m-%dT%H')}"
+    return f"day:{start.strftime('%Y-%m-%d')}"
+
+
+def _bucket_fields(start: datetime, granularity: str) -> Dict[str, Any]:
+    """Fields a bucket is created with."""
+    if granularity == 'hour':
+        retention = _config('STATS_HOURLY_RETENTION_DAYS', DEFAULT_HOURLY_RETENTION_DAYS)
+    else:
+        retention = _config('STATS_DAILY_RETENTION_DAYS', DEFAULT_DAILY_RETENTION_DAYS)
+    return {'granularity': granularity, 'start': start, 'expires_at': start + timedelta(days=retention)}
+
+
+def _counter_key(value: Any) -> Optional[str]:
+    """A value usable as a counter name in a field path, or None."""
+    if value is None:
+        return None
+    key = str(value)
+    if not key or '.' in key or key.startswith('$'):
+        return None
+    return key
+
+
+def transition(group: str, before: Any, after: Any) -> Dict[str, int]:
+    """
+    Counter changes for a field that changed value.
+
+    Args:
+        group: Counter group path, e.g. 'reports.status'
+        before: Old value (None when the document is new)
+        after: New value (None when the document is removed)
+
+    Returns:
+        {'<group>.<before>': -1, '<group>.<after>': 1}, without unchanged or unusable values
+    """
+    changes: Dict[str, int] = {}
+    if before == after:
+        return changes
+    before_key, after_key = _counter_key(before), _counter_key(after)
+    if before_key:
+        changes[f'{group}.{before_key}'] = -1
+    if after_key:
+        changes[f'{group}.{after_key}'] = 1
+    return changes
+
+
+def record_change(db, changes: Optional[Dict[str, int]] = None, event: Optional[str] = None,
+                  at: Optional[datetime] = None, amount: int = 1) -> None:
+    """
+    Apply a model write to the rollups (never raises).
+
+    Args:
+        db: Database handle
+        changes: Counter path -> delta for the totals document
+        event: Event of EVENTS the write counts as, added to its hour and day buckets
+        at: Time of the event (now by default)
+        amount: Event count
+    """
+    try:
+        if changes:
+            changes = {path: delta for path, delta in changes.items() if delta}
+        if changes:
+            # No upsert: until the first reconciliation there are no totals to adjust
+            db.stats.update_one(
+                {'_id': TOTALS_ID},
+                {'$inc': changes, '$set': {'updated_at': datetime.utcnow()}}
+            )
+        if event:
+            at = at or datetime.utcnow()
+            operations = []
+            for granularity in GRANULARITIES:
+                start = bucket_start(at, granularity)
+                operations.append(UpdateOne(
+                    {'_id': bucket_id(start, granularity)},
+                    {'$inc': {f'counts.{event}': amount}, '$setOnInsert': _bucket_fields(start, granularity)},
+                    upsert=True
+                ))
+            db.stats.bulk_write(operations, ordered=False)
+    except Exception as e:
+        logger.warning(f"Stats rollup update failed ({event or 'totals'}): {e}")
+
+
+def _group_counts(collection, field: str) -> Dict[str, int]:
+    """Documents per value of a field, with unusable values left out."""
+    counts = {}
+    for row in collection.aggregate([{'$group': {'_id': f'${field}', 'count': {'$sum': 1}}}]):
+        key = _counter_key(row['_id'])
+        if key:
+            counts[key] = row['count']
+    return counts
+
+
+def compute_totals(db) -> Dict[str, Any]:
+    """Recount every counter of the totals document from the collections."""
+    totals: Dict[str, Any] = {}
+    for section, (collection, groups) in GROUPED_TOTALS.items():
+        totals[section] = {group: _group_counts(db[collection], field) for group, field in groups.items()}
+    totals['users'] = {
+        'total': db.users.count_documents({}),
+        'banned': db.users.count_documents({'is_banned': True}),
+        'admins': db.users.count_documents({'is_admin': True}),
+    }
+    return totals
+
+
+def reconcile_totals(db) -> Dict[str, Any]:
+    """Replace the totals document with a fresh count; returns it."""
+    now = datetime.utcnow()
+    totals = {'_id': TOTALS_ID, **compute_totals(db), 'reconciled_at': now, 'updated_at': now}
+    db.stats.replace_one({'_id': TOTALS_ID}, totals, upsert=True)
+    return totals
+
+
+def reconcile_series(db, hours: int = 168, days: int = 7, now: Optional[datetime] = None) -> int:
+    """
+    Recount the event buckets of a recent window from the collections.
+
+    Every bucket of the window is written, so over-counted buckets are
+    corrected as well as missing ones.
+
+    Args:
+        db: Database handle
+        hours: Hourly buckets to recount, up to the current one
+        days: Daily buckets to recount, up to the current one
+
+    Returns:
+        Number of buckets written
+    """
+    now = now or datetime.utcnow()
+    windows = {
+        'hour': bucket_start(now, 'hour') - timedelta(hours=max(hours, 1) - 1),
+        'day': bucket_start(now, 'day') - timedelta(days=max(days, 1) - 1),
+    }
+    since = min(windows.values())
+
+    counts: Dict[Tuple[str, datetime], Dict[str, int]] = {}
+    for granularity, first in windows.items():
+        step = timedelta(hours=1) if granularity == 'hour' else timedelta(days=1)
+        start = first
+        while start <= now:
+            counts[(granularity, start)] = {event: 0 for event in EVENTS}
+            start += step
+
+    for event, (collection, field) in EVENTS.items():
+        for doc in db[collection].find({field: {'$gte': since}}, {field: 1, '_id': 0}):
+            at = doc.get(field)
+            if not isinstance(at, datetime):
+                continue
+            for granularity, first in windows.items():
+                start = bucket_start(at, granularity)
+                if start >= first and (granularity, start) in counts:
+                    counts[(granularity, start)][event] += 1
+
+    operations = [
+        UpdateOne(
+            {'_id': bucket_id(start, granularity)},
+            {
+                '$set': {f'counts.{event}': count for event, count in bucket_counts.items()},
+                '$setOnInsert': _bucket_fields(start, granularity)
+            },
+            upsert=True
+        )
+        for (granularity, start), bucket_counts in counts.items()
+    ]
+    for offset in range(0, len(operations), 500):
+        db.stats.bulk_write(operations[offset:offset + 500], ordered=False)
+    return len(operations)
+
+
+def reconcile_stats(db, hours: int = 168, days: int = 7, batch_size: int = 500) -> int:
+    """
+    Scheduler job: recount the totals and recent buckets, and drop expired buckets.
+
+    The TTL index on expires_at does the expiry on MongoDB; the delete
+    covers servers without TTL support.
+
+    Returns:
+        Number of buckets written
+    """
+    reconcile_totals(db)
+    written = reconcile_series(db, hours=hours, days=days)
+    delete_in_batches(db.stats, {'expires_at': {'$lt': datetime.utcnow()}}, batch_size=batch_size)
+    return written
+
+
+def get_totals(db) -> Dict[str, Any]:
+    """The totals document, counted on the spot the first time."""
+    totals = db.stats.find_one({'_id': TOTALS_ID})
+    if totals is None:
+        totals = reconcile_totals(db)
+    return totals
+
+
+def get_series(db, granularity: str = 'day', periods: int = 30,
+               now: Optional[datetime] = None) -> List[Dict[str, Any]]:
+    """
+    Event counts of the last periods buckets, oldest first.
+
+    Args:
+        db: Database handle
+        granularity: 'hour' or 'day'
+        periods: Number of buckets, ending with the current one
+
+    Returns:
+        [{'start': datetime, '<event>': count, ...}] with a row for every bucket
+    """
+    now = now or datetime.utcnow()
+    step = timedelta(hours=1) if granularity == 'hour' else timedelta(days=1)
+    last = bucket_start(now, granularity)
+    first = last - step * (periods - 1)
+
+    stored = {
+        doc['start']: doc.get('counts', {})
+        for doc in db.stats.find({'granularity': granularity, 'start': {'$gte': first, '$lte': last}},
+                                 {'start': 1, 'counts': 1})
+    }
+
+    series = []
+    start = first
+    while start <= last:
+        counts = stored.get(start, {})
+        series.append({'start': start, **{event: counts.get(event, 0) for event in EVENTS}})
+        start += step
+    return series
+
+
+def _sum_recent(series: Iterable[Dict[str, Any]], event: str, since: datetime) -> int:
+    return sum(row[event] for row in series if row['start'] >= bucket_start(since, 'hour'))
+
+
+def _nonzero(counts: Dict[str, int]) -> Dict[str, int]:
+    """Counters without the values decremented to zero."""
+    return {key: count for key, count in counts.items() if count}
+
+
+def get_dashboard_stats(db) -> Dict[str, Any]:
+    """
+    Admin dashboard statistics from the rollups (two reads).
+
+    Recent activity is summed from hourly buckets, so windows start on the hour.
+    """
+    totals = get_totals(db)
+    now = datetime.utcnow()
+    hourly = get_series(db, 'hour', 7 * 24 + 1, now=now)
+
+    reports = totals.get('reports', {})
+    report_status = reports.get('status', {})
+    report_stats = {'total': sum(report_status.values())}
+    for status in ('pending', 'reviewed', 'resolved', 'dismissed'):
+        report_stats[status] = report_status.get(status, 0)
+    report_stats['actions'] = _nonzero(reports.get('actions', {}))
+
+    tickets = totals.get('tickets', {})
+    ticket_status = tickets.get('status', {})
+    ticket_stats = {'total': sum(ticket_status.values())}
+    for status in ('pending', 'in_progress', 'resolved', 'closed'):
+        ticket_stats[status] = ticket_status.get(status, 0)
+    ticket_stats['categories'] = _nonzero(tickets.get('category', {}))
+    ticket_stats['priorities'] = _nonzero(tickets.get('priority', {}))
+
+    users = totals.get('users', {})
+    return {
+        'reports': report_stats,
+        'tickets': ticket_stats,
+        'users': {
+            'total': users.get('total', 0),
+            'banned': users.get('banned', 0),
+            'admins': users.get('admins', 0),
+            'new_last_7_days': _sum_recent(hourly, 'users_created', now - timedelta(days=7))
+        },
+        'recent_activity': {
+            'new_reports_24h': _sum_recent(hourly, 'reports_created', now - timedelta(hours=24)),
+            'new_tickets_24h': _sum_recent(hourly, 'tickets_created', now - timedelta(hours=24))
+        },
+        'rollups': {
+            'updated_at': totals.get('updated_at'),
+            'reconciled_at': totals.get('reconciled_at')
+        }
+    }
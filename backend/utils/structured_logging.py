@@ -0,0 +1,308 @@
+"""
+Structured, sampled logging for hot paths.
+
+Hot paths (socket events, request logging, message writes) log through an
+EventLogger instead of f-string `logger.info` calls:
+
+    events = get_event_logger('socket.message')
+    events.info('message_sent', topic_id=topic_id, message_id=message_id)
+
+An event is a name plus fields. Nothing is formatted at the call site: when
+the category's level is disabled, or the event is not sampled, the call
+returns after a level check and (for debug/info) one random draw. Enabled
+events are rendered by the formatter on the writer thread, as `key=value`
+text or JSON (LOG_FORMAT).
+
+Categories are the `events.<category>` loggers, so their level is ordinary
+logging configuration; `set_category_level` and `set_sample_rate` change it
+at runtime (per process). Warnings and errors are never sampled.
+
+`configure_logging` routes all records through a QueueHandler into a
+bounded queue drained by a real OS thread, so a slow stdout never blocks
+the eventlet hub; when the queue is full, records are dropped and counted
+rather than waited on. Every record carries a correlation id: the request's
+X-Request-ID (or a generated one), also set on socket event contexts and
+echoed in the response.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import random
+import sys
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+EVENT_LOGGER_PREFIX = 'events'
+CORRELATION_HEADER = 'X-Request-ID'
+
+# category -> probability of emitting a debug/info event
+_sample_rates: Dict[str, float] = {}
+_event_loggers: Dict[str, "EventLogger"] = {}
+_queue_handler: Optional["NonBlockingQueueHandler"] = None
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class EventLogger:
+    """Logs named events with fields for one category, sampled and lazily formatted."""
+
+    def __init__(self, category: str):
+        self.category = category
+        self.logger = logging.getLogger(f"{EVENT_LOGGER_PREFIX}.{category}")
+
+    def enabled(self, level: int = logging.INFO) -> bool:
+        """
+        Whether an event at this level would be emitted (level check plus sampling).
+
+        Use to guard fields that are themselves expensive to compute.
+        """
+        if not self.logger.isEnabledFor(level):
+            return False
+        if level >= logging.WARNING:
+            return True
+        rate = _sample_rates.get(self.category, 1.0)
+        return rate >= 1.0 or random.random() < rate
+
+    def log(self, level: int, event: str, fields: Dict[str, Any], exc_info=None) -> None:
+        if self.enabled(level):
+            self.emit(level, event, fields, exc_info)
+
+    def emit(self, level: int, event: str, fields: Dict[str, Any], exc_info=None) -> None:
+        """Log without the level/sampling check (for callers that already passed `enabled`)."""
+        # Args are left unformatted; StructuredFormatter renders them on the writer thread
+        self.logger.log(level, '%s', event, exc_info=exc_info,
+                        extra={'event': event, 'category': self.category, 'fields': fields})
+
+    def debug(self, event: str, **fields) -> None:
+        self.log(logging.DEBUG, event, fields)
+
+    def info(self, event: str, **fields) -> None:
+        self.log(logging.INFO, event, fields)
+
+    def warning(self, event: str, **fields) -> None:
+        self.log(logging.WARNING, event, fields)
+
+    def error(self, event: str, exc_info=None, **fields) -> None:
+        self.log(logging.ERROR, event, fields, exc_info=exc_info)
+
+
+def get_event_logger(category: str) -> EventLogger:
+    """Get the (shared) event logger for a category."""
+    event_logger = _event_loggers.get(category)
+    if event_logger is None:
+        event_logger = _event_loggers.setdefault(category, EventLogger(category))
+    return event_logger
+
+
+def set_sample_rate(category: str, rate: float) -> None:
+    """Emit this fraction (0..1) of a category's debug/info events."""
+    _sample_rates[category] = max(0.0, min(1.0, float(rate)))
+
+
+def set_category_level(category: str, level) -> None:
+    """Set a category's level ('DEBUG', 'INFO', ... or a logging constant)."""
+    if isinstance(level, str):
+        level = logging.getLevelName(level.upper())
+        if not isinstance(level, int):
+            raise ValueError(f"Unknown log level: {level}")
+    logging.getLogger(f"{EVENT_LOGGER_PREFIX}.{category}").setLevel(level)
+
+
+def get_logging_state() -> Dict[str, Any]:
+    """Categories with their effective level and sample rate, plus writer queue stats."""
+    categories = {}
+    for name in sorted(set(_event_loggers) | set(_sample_rates)):
+        category_logger = logging.getLogger(f"{EVENT_LOGGER_PREFIX}.{name}")
+        categories[name] = {
+            'level': logging.getLevelName(category_logger.getEffectiveLevel()),
+            'sample_rate': _sample_rates.get(name, 1.0)
+        }
+    state = {'categories': categories}
+    if _queue_handler is not None:
+        state['queue'] = {'size': _queue_handler.queue.qsize(), 'dropped': _queue_handler.dropped}
+    return state
+
+
+# ---------------------------------------------------------------- correlation
+
+
+def get_correlation_id() -> Optional[str]:
+    """The current request's / socket event's correlation id (created on first use)."""
+    try:
+        from flask import g, has_app_context
+    except ImportError:
+        return None
+    if not has_app_context():
+        return None
+    correlation_id = g.get('correlation_id')
+    if correlation_id is None:
+        correlation_id = g.correlation_id = uuid.uuid4().hex[:16]
+    return correlation_id
+
+
+class CorrelationFilter(logging.Filter):
+    """Stamps records with the correlation id of the context they were logged in."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not hasattr(record, 'correlation_id'):
+            record.correlation_id = get_correlation_id() or '-'
+        return True
+
+
+def init_request_correlation(app) -> None:
+    """Take the correlation id from X-Request-ID (or generate it) and echo it on responses."""
+    from flask import g, request
+
+    @app.before_request
+    def _assign_correlation_id():
+        incoming = request.headers.get(CORRELATION_HEADER)
+        if incoming and len(incoming) <= 64:
+            g.correlation_id = incoming
+
+    @app.after_request
+    def _echo_correlation_id(response):
+        response.headers[CORRELATION_HEADER] = get_correlation_id()
+        return response
+
+
+# ---------------------------------------------------------------- formatting
+
+
+def _render_value(value: Any) -> str:
+    text = str(value)
+    if not text or any(c in text for c in ' ="'):
+        return json.dumps(text)
+    return text
+
+
+class StructuredFormatter(logging.Formatter):
+    """
+    Text (`event key=value ...`) or JSON lines.
+
+    Plain records are formatted as usual; event records render their fields here,
+    which runs on the writer thread when configure_logging is used.
+    """
+
+    def __init__(self, fmt: str = 'text'):
+        super().__init__('%(asctime)s %(levelname)s %(name)s [%(correlation_id)s] %(message)s')
+        self.json = fmt == 'json'
+
+    def format(self, record: logging.LogRecord) -> str:
+        if not hasattr(record, 'correlation_id'):
+            record.correlation_id = '-'
+        fields = getattr(record, 'fields', None)
+
+        if self.json:
+            payload = {
+                'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+                'level': record.levelname,
+                'logger': record.name,
+                'correlation_id': record.correlation_id,
+            }
+            if fields is not None:
+                payload['event'] = record.event
+                payload.update(fields)
+            else:
+                payload['message'] = record.getMessage()
+            if record.exc_info:
+                payload['exc'] = self.formatException(record.exc_info)
+            return json.dumps(payload, default=str)
+
+        if fields is not None:
+            rendered = ' '.join(f"{key}={_render_value(value)}" for key, value in fields.items())
+            record.msg, record.args = (f"{record.event} {rendered}" if rendered else record.event), None
+        return super().format(record)
+
+
+# ---------------------------------------------------------------- writer
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that never blocks the caller and defers all formatting to the listener."""
+
+    def __init__(self, queue):
+        super().__init__(queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The listener runs in this process, so the record (args, exc_info) can be
+        # passed as is; formatting happens on the writer thread
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except Exception:
+            self.dropped += 1
+
+
+def _native_threading():
+    """The real (unpatched) queue and threading modules when eventlet has monkey patched them."""
+    try:
+        from eventlet import patcher
+        if patcher.is_monkey_patched('thread'):
+            return patcher.original('queue'), patcher.original('threading')
+    except ImportError:
+        pass
+    import queue
+    import threading
+    return queue, threading
+
+
+class _NativeThreadListener(logging.handlers.QueueListener):
+    """QueueListener whose writer is an OS thread even under eventlet."""
+
+    def __init__(self, queue, *handlers, threading_module=None):
+        super().__init__(queue, *handlers, respect_handler_level=True)
+        self._threading = threading_module
+
+    def start(self):
+        self._thread = self._threading.Thread(target=self._monitor, name='log-writer', daemon=True)
+        self._thread.start()
+
+
+def configure_logging(app) -> None:
+    """
+    Route all logging through the non-blocking queue writer and apply the
+    configured format, levels and sample rates.
+
+    Config:
+        LOG_LEVEL: Root level (default INFO)
+        LOG_FORMAT: 'text' or 'json'
+        LOG_QUEUE_SIZE: Records buffered before new ones are dropped
+        LOG_CATEGORY_LEVELS: {'socket.message': 'WARNING', ...}
+        LOG_SAMPLE_RATES: {'http.request': 0.1, ...}
+    """
+    global _queue_handler, _listener
+
+    for category, level in (app.config.get('LOG_CATEGORY_LEVELS') or {}).items():
+        set_category_level(category, level)
+    for category, rate in (app.config.get('LOG_SAMPLE_RATES') or {}).items():
+        set_sample_rate(category, rate)
+
+    root = logging.getLogger()
+    root.setLevel(app.config.get('LOG_LEVEL', 'INFO'))
+    if _queue_handler is not None or not app.config.get('LOG_ASYNC', True):
+        return
+
+    queue_module, threading_module = _native_threading()
+    log_queue = queue_module.Queue(maxsize=app.config.get('LOG_QUEUE_SIZE', 10000))
+
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(StructuredFormatter(app.config.get('LOG_FORMAT', 'text')))
+
+    _queue_handler = NonBlockingQueueHandler(log_queue)
+    _queue_handler.addFilter(CorrelationFilter())
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_queue_handler)
+
+    _listener = _NativeThreadListener(log_queue, stream, threading_module=threading_module)
+    _listener.start()
+    # Flush what is still queued on a clean shutdown
+    atexit.register(_listener.stop)
+    logger.info("Logging through the queue writer "
+                f"(format: {app.config.get('LOG_FORMAT', 'text')}, queue: {log_queue.maxsize})")
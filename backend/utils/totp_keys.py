@@ -0,0 +1,129 @@
+"""
+TOTP secret encryption key.
+
+The key is resolved once per process (environment, then Redis, then the
+local key file, else generated and persisted) and a single Fernet instance is
+shared by every TOTP encrypt/decrypt call. Resolving it used to happen in
+every `User(db)` construction.
+"""
+import logging
+import os
+from typing import Optional
+
+from cryptography.fernet import Fernet
+
+from utils.singletons import get_singleton
+
+logger = logging.getLogger(__name__)
+
+ENV_KEY_NAMES = ('TOTP_ENCRYPTION_KEY', 'TOTP_SECRET', 'ENCRYPTION_KEY')
+REDIS_KEY = 'totp_encryption_key'
+# Key file lives in the backend root directory
+DEFAULT_KEY_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                'totp_encryption.key')
+
+
+def _redis_client():
+    try:
+        from flask import current_app
+        return current_app.config.get('REDIS_CLIENT')
+    except RuntimeError:
+        return None
+
+
+def load_totp_encryption_key(redis_client=None, key_file: Optional[str] = None) -> bytes:
+    """
+    Resolve the TOTP encryption key (uncached).
+
+    Prioritizes environment variables, then Redis, then the local key file;
+    generates and persists a new key if none is found.
+
+    Args:
+        redis_client: Redis client to read/persist the key (default: the app's)
+        key_file: Local key file path (default: backend/totp_encryption.key)
+
+    Returns:
+        The Fernet key
+    """
+    # 1. Environment variables (Azure and production)
+    for var_name in ENV_KEY_NAMES:
+        env_key = os.environ.get(var_name)
+        if not env_key:
+            continue
+        try:
+            # Ensure it's a valid Fernet key
+            Fernet(env_key.encode())
+            logger.info(f"Using encryption key from environment variable: {var_name}")
+            return env_key.encode()
+        except Exception as e:
+            logger.error(f"Invalid encryption key in environment variable {var_name}: {str(e)}")
+            # Fall through to other methods if env key is invalid
+            break
+
+    # 2. Redis (persistence between deploys without env vars)
+    if redis_client is None:
+        redis_client = _redis_client()
+    if redis_client:
+        try:
+            stored_key = redis_client.get(REDIS_KEY)
+            if stored_key:
+                if isinstance(stored_key, bytes):
+                    stored_key = stored_key.decode('utf-8')
+                Fernet(stored_key.encode())
+                logger.info("Using encryption key from Redis")
+                return stored_key.encode()
+        except Exception as e:
+            logger.error(f"Invalid encryption key in Redis: {e}")
+
+    # 3. Local file (legacy/fallback)
+    key_file = key_file or DEFAULT_KEY_FILE
+    final_key = None
+    if os.path.exists(key_file):
+        with open(key_file, 'rb') as f:
+            key = f.read()
+        # Validate key to ensure it's not corrupt
+        try:
+            Fernet(key)
+            final_key = key
+            logger.info(f"Using encryption key from local file: {key_file}")
+        except Exception as e:
+            logger.error(f"Invalid encryption key in {key_file}: {e}")
+
+    # 4. Generate a new key if nothing was found
+    if not final_key:
+        final_key = Fernet.generate_key()
+        logger.info("Generated NEW encryption key")
+        try:
+            with open(key_file, 'wb') as f:
+                f.write(final_key)
+            logger.info(f"Saved new encryption key to {key_file}")
+        except Exception as e:
+            logger.error(f"Failed to write encryption key to {key_file}: {e}")
+
+    # 5. Persist to Redis if available (to prevent future loss)
+    if redis_client:
+        try:
+            redis_client.set(REDIS_KEY, final_key.decode('utf-8'))
+            logger.info("Persisted encryption key to Redis for future deployments")
+        except Exception as e:
+            logger.error(f"Failed to persist encryption key to Redis: {e}")
+
+    # 6. Log the key so it can be moved to the environment (once per process)
+    logger.warning("=" * 60)
+    logger.warning("TOTP ENCRYPTION KEY (SAVE THIS TO AZURE ENV VAR 'TOTP_ENCRYPTION_KEY'):")
+    logger.warning(final_key.decode('utf-8'))
+    logger.warning("=" * 60)
+
+    return final_key
+
+
+def get_totp_encryption_key() -> bytes:
+    """The process-wide TOTP encryption key (resolved on first use)."""
+    return get_singleton('totp_encryption_key', load_totp_encryption_key)
+
+
+def get_totp_fernet() -> Fernet:
+    """The shared Fernet instance for TOTP secrets."""
+    # Resolve the key first: get_singleton's lock is not re-entrant
+    key = get_totp_encryption_key()
+    return get_singleton('totp_fernet', lambda: Fernet(key))
@@ -0,0 +1,336 @@
+"""
+Write-behind buffer for post/comment vote counters.
+
+Vote documents are still written synchronously (they decide toggle semantics),
+but the counter increments on the voted post or comment are aggregated here and
+applied in micro-batches with one `bulk_write` per collection. Each flush
+coalesces socket broadcasts into one `post_score_update` / `comment_score_update`
+per item and one cache invalidation per item, instead of one per vote.
+
+Backends:
+    memory: per-process dict (default). Pending increments are flushed on
+            shutdown via atexit; a hard kill can lose at most one interval.
+    redis:  increments accumulate in a shared Redis hash, so a crashed worker's
+            pending votes are applied by the next flush of any worker.
+"""
+import atexit
+import logging
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+TARGET_COLLECTIONS = {
+    'post': 'posts',
+    'comment': 'comments',
+}
+
+INTEGER_FIELDS = ('upvote_count', 'downvote_count', 'score')
+
+REDIS_PENDING_KEY = 'vote_buffer:pending'
+REDIS_FLUSHING_PREFIX = 'vote_buffer:flushing:'
+# A flushing key older than this belongs to a worker that died mid-flush
+REDIS_ORPHAN_AGE_SECONDS = 60
+
+
+def publish_score_updates(db, socketio, cache_invalidator, target_ids: Dict[str, set]) -> None:
+    """
+    Broadcast current counters and invalidate caches for the given items, once each.
+
+    Args:
+        db: Database handle
+        socketio: Socket.IO server (None to skip broadcasting)
+        cache_invalidator: CacheInvalidator (None to skip invalidation)
+        target_ids: {'post': {ids...}, 'comment': {ids...}}
+    """
+    projection = {'upvote_count': 1, 'downvote_count': 1, 'score': 1, 'topic_id': 1, 'post_id': 1}
+    touched_topics = set()
+
+    for target_type, ids in target_ids.items():
+        if not ids:
+            continue
+        oids = [ObjectId(i) for i in ids]
+        docs = db[TARGET_COLLECTIONS[target_type]].find({'_id': {'$in': oids}}, projection)
+
+        for doc in docs:
+            item_id = str(doc['_id'])
+            payload = {
+                'upvote_count': doc.get('upvote_count', 0),
+                'downvote_count': doc.get('downvote_count', 0),
+                'score': doc.get('score', 0),
+            }
+
+            if target_type == 'post':
+                topic_id = str(doc['topic_id']) if doc.get('topic_id') else None
+                if socketio and topic_id:
+                    socketio.emit('post_score_update', {'post_id': item_id, **payload}, room=f"topic_{topic_id}")
+                if cache_invalidator:
+                    cache_invalidator.invalidate_pattern(f'post:{item_id}:*')
+                    if topic_id and topic_id not in touched_topics:
+                        cache_invalidator.invalidate_pattern(f'post:list:topic_{topic_id}:*')
+                if topic_id:
+                    touched_topics.add(topic_id)
+            else:
+                post_id = str(doc['post_id']) if doc.get('post_id') else None
+                if socketio and post_id:
+                    socketio.emit('comment_score_update', {'comment_id': item_id, 'post_id': post_id, **payload},
+                                  room=f"post_{post_id}")
+                if cache_invalidator and post_id:
+                    cache_invalidator.invalidate_pattern(f"comments:post:{post_id}*")
+
+    if cache_invalidator and target_ids.get('post'):
+        cache_invalidator.invalidate_pattern('post:recent:*')
+
+
+class VoteBuffer:
+    """Aggregates vote counter increments and applies them in micro-batches."""
+
+    def __init__(self, db, socketio=None, cache_invalidator=None, redis_client=None,
+                 flush_interval: float = 0.25):
+        """
+        Initialize the buffer.
+
+        Args:
+            db: Database handle
+            socketio: Socket.IO server used for coalesced score broadcasts
+            cache_invalidator: CacheInvalidator for per-batch invalidation
+            redis_client: Redis client for the shared backend (None = in-process)
+            flush_interval: Seconds between flushes
+        """
+        self.db = db
+        self.socketio = socketio
+        self.cache_invalidator = cache_invalidator
+        self.redis = redis_client
+        self.flush_interval = flush_interval
+
+        self._pending: Dict[Tuple[str, str], Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._running = False
+        self._last_orphan_scan = 0.0
+        self.stats = {'votes': 0, 'flushes': 0, 'writes': 0, 'errors': 0}
+
+    @property
+    def backend(self) -> str:
+        return 'redis' if self.redis else 'memory'
+
+    def add(self, target_type: str, target_id: str, increments: Dict[str, float]) -> None:
+        """Queue counter increments for one item."""
+        if target_type not in TARGET_COLLECTIONS:
+            return
+        increments = {f: v for f, v in increments.items() if v}
+        if not increments:
+            return
+        self.stats['votes'] += 1
+
+        if self.redis:
+            try:
+                pipe = self.redis.pipeline(transaction=False)
+                for field, value in increments.items():
+                    pipe.hincrbyfloat(REDIS_PENDING_KEY, f"{target_type}|{target_id}|{field}", value)
+                pipe.execute()
+                return
+            except Exception as e:
+                # Never drop a vote: keep it locally and flush it from this process
+                logger.warning(f"Vote buffer Redis write failed, buffering locally: {e}")
+
+        self._merge_local({(target_type, target_id): increments})
+
+    def _merge_local(self, batch: Dict[Tuple[str, str], Dict[str, float]]) -> None:
+        with self._lock:
+            for key, increments in batch.items():
+                pending = self._pending[key]
+                for field, value in increments.items():
+                    pending[field] += value
+
+    def _drain_local(self) -> Dict[Tuple[str, str], Dict[str, float]]:
+        with self._lock:
+            batch = self._pending
+            self._pending = defaultdict(lambda: defaultdict(float))
+        return batch
+
+    def _drain_redis(self) -> Tuple[Dict[Tuple[str, str], Dict[str, float]], list]:
+        """Atomically take ownership of the shared pending hash (plus orphaned batches)."""
+        batch: Dict[Tuple[str, str], Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+        owned_keys = []
+
+        flushing_key = f"{REDIS_FLUSHING_PREFIX}{int(time.time())}:{uuid.uuid4().hex}"
+        try:
+            self.redis.rename(REDIS_PENDING_KEY, flushing_key)
+            owned_keys.append(flushing_key)
+        except Exception:
+            # No pending votes (RENAME fails on a missing key)
+            pass
+
+        # Adopt batches left behind by workers that died mid-flush (SCAN is costly, so rarely)
+        if time.time() - self._last_orphan_scan >= REDIS_ORPHAN_AGE_SECONDS:
+            self._last_orphan_scan = time.time()
+            owned_keys.extend(self._adopt_orphans(owned_keys))
+
+        for key in owned_keys:
+            for field, value in self.redis.hgetall(key).items():
+                field = field.decode() if isinstance(field, bytes) else field
+                target_type, target_id, counter = field.split('|', 2)
+                batch[(target_type, target_id)][counter] += float(value)
+
+        return batch, owned_keys
+
+    def _adopt_orphans(self, owned_keys: list) -> list:
+        """Rename stale flushing batches to keys owned by this worker."""
+        adopted_keys = []
+        try:
+            cutoff = time.time() - REDIS_ORPHAN_AGE_SECONDS
+            for key in self.redis.scan_iter(match=f"{REDIS_FLUSHING_PREFIX}*", count=100):
+                key_str = key.decode() if isinstance(key, bytes) else key
+                if key_str in owned_keys:
+                    continue
+                try:
+                    created = int(key_str[len(REDIS_FLUSHING_PREFIX):].split(':', 1)[0])
+                except ValueError:
+                    continue
+                if created < cutoff:
+                    adopted = f"{REDIS_FLUSHING_PREFIX}{int(time.time())}:{uuid.uuid4().hex}"
+                    try:
+                        self.redis.rename(key_str, adopted)
+                        adopted_keys.append(adopted)
+                    except Exception:
+                        pass  # Another worker adopted it first
+        except Exception as e:
+            logger.debug(f"Vote buffer orphan scan failed: {e}")
+        return adopted_keys
+
+    def flush(self) -> int:
+        """
+        Apply all pending increments.
+
+        Returns:
+            Number of items written
+        """
+        with self._flush_lock:
+            batch = self._drain_local()
+            redis_keys = []
+            if self.redis:
+                try:
+                    redis_batch, redis_keys = self._drain_redis()
+                    for key, increments in redis_batch.items():
+                        for field, value in increments.items():
+                            batch[key][field] += value
+                except Exception as e:
+                    logger.warning(f"Vote buffer Redis drain failed: {e}")
+
+            if not batch:
+                return 0
+
+            written = 0
+            now = datetime.utcnow()
+            by_collection = defaultdict(list)
+            for (target_type, target_id), increments in batch.items():
+                inc = {}
+                for field, value in increments.items():
+                    value = int(round(value)) if field in INTEGER_FIELDS else value
+                    if value:
+                        inc[field] = value
+                if inc:
+                    by_collection[target_type].append(
+                        UpdateOne({'_id': ObjectId(target_id)}, {'$inc': inc, '$set': {'updated_at': now}})
+                    )
+
+            written_types = set()
+            try:
+                for target_type, ops in by_collection.items():
+                    self.db[TARGET_COLLECTIONS[target_type]].bulk_write(ops, ordered=False)
+                    written_types.add(target_type)
+                    written += len(ops)
+            except Exception as e:
+                # Re-queue collections that were not written and retry on the next tick
+                self.stats['errors'] += 1
+                logger.error(f"Vote buffer flush failed, re-queueing: {e}")
+                self._merge_local({k: v for k, v in batch.items() if k[0] not in written_types})
+                if self.redis and redis_keys:
+                    self._delete_redis_keys(redis_keys)
+                return written
+
+            if self.redis and redis_keys:
+                self._delete_redis_keys(redis_keys)
+
+            self.stats['flushes'] += 1
+            self.stats['writes'] += written
+
+            try:
+                target_ids = defaultdict(set)
+                for target_type, target_id in batch.keys():
+                    target_ids[target_type].add(target_id)
+                publish_score_updates(self.db, self.socketio, self.cache_invalidator, target_ids)
+            except Exception as e:
+                logger.warning(f"Vote buffer broadcast failed: {e}")
+
+            return written
+
+    def _delete_redis_keys(self, keys: list) -> None:
+        try:
+            self.redis.delete(*keys)
+        except Exception as e:
+            logger.warning(f"Vote buffer failed to release Redis batch: {e}")
+
+    def start(self) -> None:
+        """Start the periodic flush loop and register the shutdown flush."""
+        if self._running:
+            return
+        self._running = True
+
+        def _run():
+            while self._running:
+                self.socketio.sleep(self.flush_interval)
+                try:
+                    self.flush()
+                except Exception as e:
+                    logger.error(f"Vote buffer loop error: {e}")
+
+        self.socketio.start_background_task(_run)
+        atexit.register(self.stop)
+        logger.info(f"Vote buffer started (backend: {self.backend}, interval: {int(self.flush_interval * 1000)}ms)")
+
+    def stop(self) -> None:
+        """Stop the loop and apply everything still pending (durability on shutdown)."""
+        self._running = False
+        try:
+            self.flush()
+        except Exception as e:
+            logger.error(f"Vote buffer final flush failed: {e}")
+
+
+def init_vote_buffer(app, socketio) -> Optional[VoteBuffer]:
+    """Create and start the app's vote buffer according to config."""
+    if not app.config.get('VOTE_BUFFER_ENABLED', True):
+        return None
+
+    redis_client = None
+    if app.config.get('VOTE_BUFFER_BACKEND', 'memory') == 'redis' and app.config.get('REDIS_AVAILABLE'):
+        redis_client = app.config.get('REDIS_CLIENT')
+
+    buffer = VoteBuffer(
+        db=app.db,
+        socketio=socketio,
+        cache_invalidator=app.config.get('CACHE_INVALIDATOR'),
+        redis_client=redis_client,
+        flush_interval=app.config.get('VOTE_BUFFER_FLUSH_MS', 250) / 1000.0
+    )
+    buffer.start()
+    app.config['VOTE_BUFFER'] = buffer
+    return buffer
+
+
+def get_vote_buffer() -> Optional[VoteBuffer]:
+    """Get the current app's vote buffer (None outside app context or when disabled)."""
+    try:
+        from flask import current_app
+        return current_app.config.get('VOTE_BUFFER')
+    except RuntimeError:
+        return None
@@ -1,7 +1,6 @@
 
 import sys
 import os
-import os
 from unittest.mock import MagicMock
 
 # Add backend to path
@@ -22,20 +21,22 @@ print("Initializing FallbackSessionInterface...")
 try:
     # Mock redis client
     redis_mock = MagicMock()
-    
-    # Initialize
-    interface = FallbackSessionInterface(
-        redis_client=redis_mock,
-        key_prefix='test:',
-        use_signer=False,
-        permanent=False,
-        session_file_dir='./flask_session_test'
-    )
-    
-    print("✅ FallbackSessionInterface initialized successfully!")
-    print(f"Redis client: {interface._redis_client}")
-    print(f"Filesystem interface: {interface.filesystem_interface}")
-    
+
+    # Initialize with the same arguments as app.py
+    for mode in ('redis', 'cookie'):
+        interface = FallbackSessionInterface(
+            redis_client=redis_mock,
+            key_prefix='test:',
+            permanent=False,
+            mode=mode,
+            refresh_interval=300,
+            revocation_check_interval=30
+        )
+        print(f"✅ FallbackSessionInterface initialized successfully (mode: {interface.mode})!")
+    print(f"Redis client: {interface.redis}")
+    legacy = interface._decode_legacy(b'\x81\xa7user_id\xa3abc')
+    print(f"Legacy Flask-Session decoding: {'available' if legacy else 'unavailable (msgspec missing)'}")
+
 except Exception as e:
     print(f"❌ Failed to initialize: {e}")
     sys.exit(1)
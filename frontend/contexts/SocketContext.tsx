@@ -253,6 +253,11 @@ export const SocketProvider: React.FC<SocketProviderProps> = ({ children }) => {
           window.dispatchEvent(new CustomEvent('post_upvoted', { detail: data }));
         }
       },
+      'post_score_update': (data: any) => {
+        if (typeof window !== 'undefined') {
+          window.dispatchEvent(new CustomEvent('post_score_update', { detail: data }));
+        }
+      },
       'new_comment': (data: any) => {
         console.log('[SocketContext] new_comment event received:', data);
         if (typeof window !== 'undefined') {
@@ -265,6 +270,11 @@ export const SocketProvider: React.FC<SocketProviderProps> = ({ children }) => {
           window.dispatchEvent(new CustomEvent('comment_upvoted', { detail: data }));
         }
       },
+      'comment_score_update': (data: any) => {
+        if (typeof window !== 'undefined') {
+          window.dispatchEvent(new CustomEvent('comment_score_update', { detail: data }));
+        }
+      },
       'new_chat_room_message': (data: any) => {
         console.log('[SocketContext] new_chat_room_message event received:', data);
         if (typeof window !== 'undefined') {